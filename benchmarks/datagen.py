@@ -0,0 +1,450 @@
+"""
+Synthetic datasets shaped like the production data, for scaling tests.
+
+Writes one NDJSON file per collection, `{out_dir}/{collection}.ndjson`, validating the
+documents against the collection specs as they are written. Documents are generated and
+written one at a time, so memory use does not grow with the size of a dataset.
+
+Datasets:
+
+    taxonomy    ncbi_taxon and ncbi_child_of_taxon: a tree with a set depth and a random
+                fan-out, loaded over a number of versions in which taxa are renamed, added
+                and removed. Documents have the fields and keys of delta loads (see
+                importers/utils/delta_load.py), and edges get a new version whenever either
+                of their vertices does.
+    go          GO_terms and GO_edges: a DAG for each of the three GO namespaces, with is_a
+                and part_of edges from each term to earlier terms in its namespace.
+    djornl      djornl_node and djornl_edge: a gene network with nested clusters.
+    wsprov      ws_object_version and ws_prov_descendant_of: workspace object versions,
+                each derived from some of the versions before it.
+
+The same seed and sizes always give the same documents.
+
+Sample usage:
+
+    python -m benchmarks.datagen --out-dir /tmp/data --dataset taxonomy --taxa 1000000 \\
+        --versions 5 --seed 1
+    python -m benchmarks.datagen --out-dir /tmp/data --go-terms 50000 --djornl-nodes 30000
+
+The files can be loaded with the RE API's bulk import, e.g. with REClient.save_docs.
+"""
+import argparse
+import json
+import math
+import os
+import random
+
+from importers.djornl.benchmark import EDGE_TYPES
+from importers.utils.delta_load import MAX_ADB_INTEGER
+
+_REPO_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "spec")
+
+# load timestamps of the versions: monthly from 2020-01-01
+BASE_TIMESTAMP = 1577836800000
+VERSION_INTERVAL = 30 * 24 * 3600 * 1000
+# releases are a week older than the loads of their data
+RELEASE_LAG = 7 * 24 * 3600 * 1000
+
+TAXON_RANKS = [
+    "no rank",
+    "superkingdom",
+    "phylum",
+    "class",
+    "order",
+    "family",
+    "genus",
+    "species",
+    "strain",
+]
+
+GO_ROOTS = [
+    ("GO:0008150", "biological_process"),
+    ("GO:0003674", "molecular_function"),
+    ("GO:0005575", "cellular_component"),
+]
+
+
+class DatasetWriter(object):
+    """
+    Write documents to an NDJSON file per collection, validating them against the
+    collection specs.
+
+    :param validate_every: (int)        validate every nth document of each collection;
+                                        0 to skip validation
+    """
+
+    def __init__(self, out_dir, validate_every=1):
+        self.out_dir = out_dir
+        self.validate_every = validate_every
+        self.counts = {}
+        self._files = {}
+        self._validators = {}
+
+    def _validator(self, coll_name):
+        if coll_name not in self._validators:
+            from relation_engine_server.utils import spec_loader
+            from relation_engine_server.utils.json_validation import (
+                get_schema_validator,
+            )
+
+            schema_file = spec_loader.get_collection(coll_name, path_only=True)
+            self._validators[coll_name] = get_schema_validator(
+                schema_file=schema_file, validate_at="/schema"
+            )
+        return self._validators[coll_name]
+
+    def write(self, coll_name, doc):
+        count = self.counts.get(coll_name, 0)
+        if self.validate_every and count % self.validate_every == 0:
+            errors = list(self._validator(coll_name).iter_errors(doc))
+            if errors:
+                raise ValueError(
+                    f"Invalid {coll_name} document {doc.get('_key')}: {errors[0].message}"
+                )
+        if coll_name not in self._files:
+            path = os.path.join(self.out_dir, coll_name + ".ndjson")
+            self._files[coll_name] = open(path, "w")
+        self._files[coll_name].write(json.dumps(doc) + "\n")
+        self.counts[coll_name] = count + 1
+
+    def write_all(self, docs):
+        """write (collection name, document) pairs"""
+        for (coll_name, doc) in docs:
+            self.write(coll_name, doc)
+
+    def close(self):
+        for fd in self._files.values():
+            fd.close()
+        self._files = {}
+        return self.counts
+
+
+def load_timestamp(version_ix):
+    return BASE_TIMESTAMP + version_ix * VERSION_INTERVAL
+
+
+def version_fields(key_id, start, end, n_versions):
+    """delta load fields of a document version current from version `start` to `end`"""
+    last = end == n_versions - 1
+    return {
+        "_key": f"{key_id}_v{start + 1}",
+        "first_version": f"v{start + 1}",
+        "last_version": f"v{end + 1}",
+        "created": load_timestamp(start),
+        "expired": MAX_ADB_INTEGER if last else load_timestamp(end + 1) - 1,
+        "release_created": load_timestamp(start) - RELEASE_LAG,
+        "release_expired": (
+            MAX_ADB_INTEGER if last else load_timestamp(end + 1) - RELEASE_LAG - 1
+        ),
+    }
+
+
+def _spans(starts, end):
+    """(start, end) of each version, from the version indexes at which they start"""
+    return list(zip(starts, [s - 1 for s in starts[1:]] + [end]))
+
+
+def _current_start(starts, version_ix):
+    """the start of the document version that is current at version_ix"""
+    return max(s for s in starts if s <= version_ix)
+
+
+def taxonomy(n_taxa, n_versions=3, depth=8, seed=0, change_rate=0.05, churn_rate=0.02):
+    """
+    Generate a taxonomy tree of about `n_taxa` taxa over `n_versions` versions.
+
+    Taxa are generated depth first, with a mean fan-out that gives about n_taxa taxa at
+    the given depth, so only the path to the current taxon is held in memory. A taxon is
+    current in a range of versions within its parent's; `churn_rate` is the chance that it
+    was added after its parent, and that it is removed before its parent. Each taxon is
+    renamed in each version with probability `change_rate`.
+
+    :return docs: (generator)           (collection name, document) pairs
+    """
+    rand = random.Random(seed)
+    fan_out = n_taxa ** (1 / depth)
+    last = n_versions - 1
+
+    def new_taxon(taxon_id, level, first, end):
+        starts = [first] + [
+            v for v in range(first + 1, end + 1) if rand.random() < change_rate
+        ]
+        rank = TAXON_RANKS[min(level, len(TAXON_RANKS) - 1)]
+        for (rev, (start, span_end)) in enumerate(_spans(starts, end)):
+            name = f"{rank.title()} {taxon_id}" + (f" rev{rev}" if rev else "")
+            doc = {
+                "id": taxon_id,
+                "scientific_name": name,
+                "rank": rank,
+                "species_or_below": level >= TAXON_RANKS.index("species"),
+                "strain": level > TAXON_RANKS.index("species"),
+                "ncbi_taxon_id": int(taxon_id),
+                "gencode": 11,
+                "aliases": [],
+            }
+            doc.update(version_fields(taxon_id, start, span_end, n_versions))
+            yield ("ncbi_taxon", doc)
+        children = 0 if level == depth else rand.randint(0, round(2 * fan_out))
+        return {
+            "id": taxon_id,
+            "level": level,
+            "life": (first, end),
+            "starts": starts,
+            "children": children,
+        }
+
+    def edges(child, parent):
+        (first, end) = child["life"]
+        starts = sorted(
+            set(child["starts"]) | {s for s in parent["starts"] if first < s <= end}
+        )
+        for (start, span_end) in _spans(starts, end):
+            child_key = f"{child['id']}_v{_current_start(child['starts'], start) + 1}"
+            parent_key = (
+                f"{parent['id']}_v{_current_start(parent['starts'], start) + 1}"
+            )
+            doc = {
+                "id": child["id"],
+                "from": child["id"],
+                "to": parent["id"],
+                "_from": f"ncbi_taxon/{child_key}",
+                "_to": f"ncbi_taxon/{parent_key}",
+            }
+            doc.update(version_fields(child["id"], start, span_end, n_versions))
+            yield ("ncbi_child_of_taxon", doc)
+
+    root_gen = new_taxon("1", 0, 0, last)
+    root = yield from root_gen
+    stack = [root]
+    count = 1
+    while count < n_taxa:
+        if not stack:
+            # every branch has ended; give the root another child
+            root["children"] = 1
+            stack = [root]
+        parent = stack[-1]
+        if parent["children"] == 0 or parent["level"] == depth:
+            stack.pop()
+            continue
+        parent["children"] -= 1
+        count += 1
+        (parent_first, parent_end) = parent["life"]
+        first = parent_first
+        if rand.random() < churn_rate:
+            first = rand.randint(parent_first, parent_end)
+        end = parent_end
+        if rand.random() < churn_rate:
+            end = rand.randint(first, parent_end)
+        child = yield from new_taxon(str(count), parent["level"] + 1, first, end)
+        yield from edges(child, parent)
+        stack.append(child)
+
+
+def go_dag(n_terms, seed=0, part_of_rate=0.2):
+    """
+    Generate a GO-like ontology of `n_terms` terms in one version. Each term has one to
+    three parents among the earlier terms of its namespace, favouring recent terms so that
+    the DAG gets deep.
+
+    :return docs: (generator)           (collection name, document) pairs
+    """
+    rand = random.Random(seed)
+
+    def term_id(ix):
+        return GO_ROOTS[ix][0] if ix < len(GO_ROOTS) else f"GO:{1000000 + ix:07d}"
+
+    for ix in range(n_terms):
+        ns_ix = ix % len(GO_ROOTS)
+        namespace = GO_ROOTS[ns_ix][1]
+        go_id = term_id(ix)
+        doc = {
+            "id": go_id,
+            "type": "CLASS",
+            "name": namespace if ix < len(GO_ROOTS) else f"{namespace} term {ix}",
+            "namespace": namespace,
+            "alt_ids": [],
+            "def": {"val": f"Definition of {go_id}.", "xrefs": ["GOC:synthetic"]},
+            "comments": [],
+            "subsets": ["goslim_generic"] if rand.random() < 0.05 else [],
+            "synonyms": [{"pred": "hasExactSynonym", "val": f"term {ix}", "xrefs": []}],
+            "xrefs": [],
+        }
+        doc.update(version_fields(go_id, 0, 0, 1))
+        yield ("GO_terms", doc)
+        # number of earlier terms in the namespace
+        n_earlier = ix // len(GO_ROOTS)
+        if not n_earlier:
+            continue
+        n_parents = 1 + (rand.random() < 0.3) + (rand.random() < 0.1)
+        parents = {
+            ns_ix + len(GO_ROOTS) * int(n_earlier * math.sqrt(rand.random()))
+            for _ in range(n_parents)
+        }
+        for parent_ix in sorted(parents):
+            edge_type = "part_of" if rand.random() < part_of_rate else "is_a"
+            parent_id = term_id(parent_ix)
+            edge_id = f"{go_id}::{parent_id}::{edge_type}"
+            edge = {
+                "id": edge_id,
+                "type": edge_type,
+                "from": go_id,
+                "to": parent_id,
+                "_from": f"GO_terms/{go_id}_v1",
+                "_to": f"GO_terms/{parent_id}_v1",
+            }
+            edge.update(version_fields(edge_id, 0, 0, 1))
+            yield ("GO_edges", edge)
+
+
+def djornl_network(n_nodes, mean_degree=10, seed=0, cluster_sizes=(50, 200, 1000)):
+    """
+    Generate a DJORNL gene network, with each node in one cluster of each of the markov_i2,
+    markov_i4 and markov_i6 clusterings, of about the given sizes.
+
+    :return docs: (generator)           (collection name, document) pairs
+    """
+    rand = random.Random(seed)
+
+    def node_key(ix):
+        return f"AT{ix // 100000 + 1}G{ix % 100000:05d}0"
+
+    for ix in range(n_nodes):
+        clusters = [
+            f"markov_i{2 * (level + 1)}:{ix // size + 1}"
+            for (level, size) in enumerate(cluster_sizes)
+        ]
+        yield (
+            "djornl_node",
+            {
+                "_key": node_key(ix),
+                "node_type": "gene",
+                "clusters": clusters,
+                "gene_symbol": f"GENE{ix}",
+                "gene_full_name": f"synthetic gene {ix}",
+                "gene_model_type": "protein_coding",
+            },
+        )
+    for ix in range(n_nodes):
+        degree = min(rand.randint(1, 2 * mean_degree - 1), n_nodes - 1)
+        # distinct offsets give distinct edges from this node
+        for offset in rand.sample(range(1, n_nodes), degree):
+            (node1, node2) = (node_key(ix), node_key((ix + offset) % n_nodes))
+            edge_type = rand.choice(EDGE_TYPES)
+            score = round(rand.random() * 10, 3)
+            yield (
+                "djornl_edge",
+                {
+                    "_key": f"{node1}__{node2}__{edge_type}__False__{score}",
+                    "_from": f"djornl_node/{node1}",
+                    "_to": f"djornl_node/{node2}",
+                    "score": score,
+                    "edge_type": edge_type,
+                    "directed": False,
+                },
+            )
+
+
+def ws_provenance(n_objects, objects_per_ws=100, max_versions=5, seed=0):
+    """
+    Generate workspace object versions, each derived from up to three object versions
+    before it, favouring recent objects.
+
+    :return docs: (generator)           (collection name, document) pairs
+    """
+    rand = random.Random(seed)
+
+    def obj_ref(obj_ix):
+        return (obj_ix // objects_per_ws + 1, obj_ix % objects_per_ws + 1)
+
+    def n_obj_versions(obj_ix):
+        # derived from the seed, so that earlier objects' versions need not be stored
+        return random.Random(f"{seed}:{obj_ix}").randint(1, max_versions)
+
+    for obj_ix in range(n_objects):
+        (ws_id, obj_id) = obj_ref(obj_ix)
+        for version in range(1, n_obj_versions(obj_ix) + 1):
+            key = f"{ws_id}:{obj_id}:{version}"
+            yield (
+                "ws_object_version",
+                {
+                    "_key": key,
+                    "workspace_id": ws_id,
+                    "object_id": obj_id,
+                    "version": version,
+                    "name": f"object_{obj_id}",
+                    "hash": "%032x" % rand.getrandbits(128),
+                    "size": rand.randint(100, 10000000),
+                    "epoch": BASE_TIMESTAMP + obj_ix * 1000 + version,
+                    "deleted": False,
+                    "is_public": rand.random() < 0.2,
+                },
+            )
+            if not obj_ix:
+                continue
+            ancestors = set()
+            for _ in range(rand.choice([0, 1, 1, 2, 3])):
+                anc_ix = obj_ix - 1 - int(obj_ix * rand.random() ** 3)
+                (anc_ws, anc_obj) = obj_ref(anc_ix)
+                anc_version = rand.randint(1, n_obj_versions(anc_ix))
+                ancestors.add(f"{anc_ws}:{anc_obj}:{anc_version}")
+            for ancestor in sorted(ancestors):
+                yield (
+                    "ws_prov_descendant_of",
+                    {
+                        "_from": f"ws_object_version/{key}",
+                        "_to": f"ws_object_version/{ancestor}",
+                    },
+                )
+
+
+DATASETS = ["taxonomy", "go", "djornl", "wsprov"]
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description="Generate synthetic NDJSON datasets matching the collection specs"
+    )
+    argparser.add_argument("--out-dir", required=True)
+    argparser.add_argument(
+        "--dataset",
+        action="append",
+        choices=DATASETS,
+        help="dataset to generate; may be repeated (default: all)",
+    )
+    argparser.add_argument("--seed", type=int, default=0)
+    argparser.add_argument("--taxa", type=int, default=100000)
+    argparser.add_argument("--versions", type=int, default=3)
+    argparser.add_argument("--depth", type=int, default=8)
+    argparser.add_argument("--go-terms", type=int, default=50000)
+    argparser.add_argument("--djornl-nodes", type=int, default=10000)
+    argparser.add_argument("--djornl-degree", type=int, default=10)
+    argparser.add_argument("--ws-objects", type=int, default=100000)
+    argparser.add_argument(
+        "--validate-every",
+        type=int,
+        default=1,
+        help="validate every nth document of each collection; 0 to skip validation",
+    )
+    args = argparser.parse_args()
+    os.environ.setdefault("SPEC_PATH", os.path.abspath(_REPO_SPEC_PATH))
+    os.makedirs(args.out_dir, exist_ok=True)
+    generators = {
+        "taxonomy": lambda: taxonomy(args.taxa, args.versions, args.depth, args.seed),
+        "go": lambda: go_dag(args.go_terms, args.seed),
+        "djornl": lambda: djornl_network(
+            args.djornl_nodes, args.djornl_degree, args.seed
+        ),
+        "wsprov": lambda: ws_provenance(args.ws_objects, seed=args.seed),
+    }
+    writer = DatasetWriter(args.out_dir, args.validate_every)
+    try:
+        for dataset in args.dataset or DATASETS:
+            print(f"Generating {dataset}")
+            writer.write_all(generators[dataset]())
+    finally:
+        counts = writer.close()
+    print(json.dumps(counts, indent=2))
+
+
+if __name__ == "__main__":
+    main()
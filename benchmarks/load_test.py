@@ -0,0 +1,493 @@
+"""
+Load test for POST /api/v1/query_results and PUT /api/v1/documents.
+
+Replays a weighted mix of operations against a running RE API, or against a local RE API
+that is backed by the in-process ArangoDB stand-in (--local), and reports the throughput,
+latency percentiles and error rate of each operation.
+
+Operations are defined by a mix, in YAML or JSON, of operation name -> settings:
+
+    taxonomy_get_lineage:
+      weight: 30                    # relative frequency of the operation
+      params:                       # bind vars, picked at random for each request
+        - {"@taxon_coll": ncbi_taxon, "@taxon_child_of": ncbi_child_of_taxon, id: "562"}
+    cursor_continuation:
+      weight: 10
+      type: cursor                  # a stored query whose cursor is read to the end
+      stored_query: taxonomy_get_children_cursor
+      batch_size: 20
+      params: [...]
+    bulk_import:
+      weight: 5
+      type: bulk_import             # an admin save of generated documents
+      collection: test_vertex
+      docs: 100
+
+Operations have type `stored_query` by default, with the operation name as the stored
+query name. The string "now" in params is replaced with the current time in ms, for `ts`
+params. The first page of a `cursor` operation is reported under its stored query name,
+and each continuation request under the operation name. Bulk imports need an RE_ADMIN
+token (--auth-token), and write documents with keys `loadtest_<n>` to their collection.
+
+Requests are sent by --concurrency workers. Without --rate, each worker sends requests back
+to back (closed loop). With --rate, requests arrive at random (Poisson) times at the given
+mean rate (open loop), and their latency includes any time spent waiting for a worker, so
+that a saturated server shows up as rising latency rather than a lower request rate.
+
+Sample usage:
+
+    # against a local RE API backed by the ArangoDB stand-in, with 2ms database latency
+    python -m benchmarks.load_test --local --db-latency 0.002 --concurrency 8 --duration 30
+
+    # against a deployed RE API
+    python -m benchmarks.load_test --api-url https://ci.kbase.us/services/relation_engine_api \\
+        --rate 50 --duration 300 --mix mix.yaml --output results.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+import yaml
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from benchmarks.microbench import collection_docs
+
+_REPO_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "spec")
+
+DEFAULT_MIX = {
+    "taxonomy_get_lineage": {
+        "weight": 30,
+        "params": [
+            {
+                "@taxon_coll": "ncbi_taxon",
+                "@taxon_child_of": "ncbi_child_of_taxon",
+                "id": taxon_id,
+                "ts": "now",
+            }
+            for taxon_id in ["562", "9606", "1280", "287"]
+        ],
+    },
+    "GO_get_descendants": {
+        "weight": 20,
+        "params": [
+            {"id": go_id, "ts": "now", "limit": 20}
+            for go_id in ["GO:0008150", "GO:0003674", "GO:0005575"]
+        ],
+    },
+    "djornl_fetch_genes": {
+        "weight": 20,
+        "params": [
+            {"gene_keys": ["AT1G01020", "AT1G01070"], "distance": 1},
+            {"gene_keys": ["AT1G01010"]},
+        ],
+    },
+    "search_compounds": {
+        "weight": 15,
+        "params": [{"search_text": text} for text in ["glucose", "pyruvate", "ATP"]],
+    },
+    "cursor_continuation": {
+        "weight": 10,
+        "type": "cursor",
+        "stored_query": "taxonomy_get_children_cursor",
+        "batch_size": 20,
+        "params": [
+            {
+                "@taxon_coll": "ncbi_taxon",
+                "@taxon_child_of": "ncbi_child_of_taxon",
+                "id": taxon_id,
+                "ts": "now",
+            }
+            for taxon_id in ["2", "1224", "1239"]
+        ],
+    },
+    "bulk_import": {
+        "weight": 5,
+        "type": "bulk_import",
+        "collection": "test_vertex",
+        "docs": 100,
+        "on_duplicate": "update",
+    },
+}
+
+
+def percentile(sorted_values, pct):
+    """nearest-rank percentile of a sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def _fill_params(params):
+    now = int(time.time() * 1000)
+    return {k: (now if v == "now" else v) for (k, v) in params.items()}
+
+
+class LoadTest(object):
+    """
+    Run a mix of operations against the RE API at `api_url`.
+
+    :param mix: (dict)                  operation name -> settings, as in DEFAULT_MIX
+    :param rate: (float)                mean requests per second, or None for closed loop
+    """
+
+    def __init__(
+        self,
+        api_url,
+        mix=None,
+        concurrency=4,
+        rate=None,
+        auth_token=None,
+        seed=0,
+        timeout=60,
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.mix = mix or DEFAULT_MIX
+        self.concurrency = concurrency
+        self.rate = rate
+        self.auth_token = auth_token
+        self.seed = seed
+        self.timeout = timeout
+        self.samples = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._docs = {}
+        self._names = list(self.mix)
+        self._weights = [self.mix[name].get("weight", 1) for name in self._names]
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _record(self, name, start, resp=None, error=None):
+        latency = time.perf_counter() - start
+        if error is None and not resp.ok:
+            error = f"HTTP {resp.status_code}"
+        with self._lock:
+            self.samples.append((name, latency, error))
+
+    def _request(self, name, start, method, path, **kw):
+        """send a request, recording its latency from `start`; returns the json or None"""
+        try:
+            resp = self._session().request(
+                method, self.api_url + path, timeout=self.timeout, **kw
+            )
+        except requests.RequestException as err:
+            self._record(name, start, error=type(err).__name__)
+            return None
+        self._record(name, start, resp)
+        return resp.json() if resp.ok else None
+
+    def run_operation(self, name, rand, start=None):
+        """run one operation, timing its first request from `start` if given"""
+        conf = self.mix[name]
+        op_type = conf.get("type", "stored_query")
+        start = time.perf_counter() if start is None else start
+        if op_type == "bulk_import":
+            self._request(
+                name,
+                start,
+                "PUT",
+                "/api/v1/documents",
+                params={
+                    "collection": conf["collection"],
+                    "on_duplicate": conf.get("on_duplicate", "update"),
+                },
+                data=self._bulk_body(name, conf),
+                headers={"Authorization": self.auth_token or ""},
+            )
+            return
+        query_name = conf.get("stored_query", name)
+        params = {"stored_query": query_name}
+        if op_type == "cursor":
+            params["batch_size"] = conf.get("batch_size", 100)
+        bind_vars = _fill_params(rand.choice(conf.get("params") or [{}]))
+        resp_json = self._request(
+            query_name if op_type == "cursor" else name,
+            start,
+            "POST",
+            "/api/v1/query_results",
+            params=params,
+            json=bind_vars,
+        )
+        if op_type != "cursor":
+            return
+        while resp_json and resp_json.get("has_more"):
+            resp_json = self._request(
+                name,
+                time.perf_counter(),
+                "POST",
+                "/api/v1/query_results",
+                params={"cursor_id": resp_json["cursor_id"]},
+            )
+
+    def _bulk_body(self, name, conf):
+        """NDJSON of generated documents for the collection, built once"""
+        if name not in self._docs:
+            from relation_engine_server.utils import spec_loader
+            from relation_engine_server.utils.json_validation import load_json_yaml
+
+            spec = load_json_yaml(spec_loader.get_collection(conf["collection"], True))
+            docs = collection_docs(spec, conf.get("docs", 100), self.seed)
+            for (i, doc) in enumerate(docs):
+                doc["_key"] = f"loadtest_{i}"
+            self._docs[name] = "\n".join(json.dumps(doc) for doc in docs)
+        return self._docs[name]
+
+    def run(self, duration=None, max_requests=None):
+        """
+        Run the load test for `duration` seconds or `max_requests` operations, whichever
+        comes first.
+
+        :return report: (dict)          the report, as returned by `report`
+        """
+        if duration is None and max_requests is None:
+            raise ValueError("Please supply a duration or a number of requests")
+        deadline = time.perf_counter() + duration if duration else float("inf")
+        budget = [max_requests if max_requests is not None else float("inf")]
+        budget_lock = threading.Lock()
+
+        def take():
+            with budget_lock:
+                if budget[0] <= 0 or time.perf_counter() >= deadline:
+                    return False
+                budget[0] -= 1
+                return True
+
+        started = time.perf_counter()
+        if self.rate is None:
+            # closed loop: each worker sends its next request when the last one is done
+            def worker(worker_id):
+                rand = random.Random(self.seed + worker_id)
+                while take():
+                    name = rand.choices(self._names, self._weights)[0]
+                    self.run_operation(name, rand)
+
+            threads = [
+                threading.Thread(target=worker, args=(i,))
+                for i in range(self.concurrency)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        else:
+            # open loop: requests are scheduled at their arrival times, whether or not a
+            # worker is free, and their latency includes the wait for a worker
+            rand = random.Random(self.seed)
+            futures = []
+            with ThreadPoolExecutor(self.concurrency) as executor:
+                arrival = time.perf_counter()
+                while True:
+                    arrival += rand.expovariate(self.rate)
+                    delay = arrival - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    if not take():
+                        break
+                    name = rand.choices(self._names, self._weights)[0]
+                    op_rand = random.Random(rand.random())
+                    futures.append(
+                        executor.submit(self.run_operation, name, op_rand, arrival)
+                    )
+                wait(futures)
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed):
+        """
+        Summarise the samples.
+
+        :return report: (dict)          {"elapsed": seconds, "total": {...},
+                                        "operations": {name: {...}}}, where each summary
+                                        has the request count, errors, error rate, requests
+                                        per second and latency percentiles in ms
+        """
+        by_name = {}
+        for (name, latency, error) in self.samples:
+            by_name.setdefault(name, []).append((latency, error))
+        by_name["total"] = [(lat, err) for (_, lat, err) in self.samples]
+        summaries = {}
+        for (name, samples) in by_name.items():
+            latencies = sorted(lat * 1000 for (lat, _) in samples)
+            errors = {}
+            for (_, error) in samples:
+                if error:
+                    errors[error] = errors.get(error, 0) + 1
+            n_errors = sum(errors.values())
+            summaries[name] = {
+                "requests": len(samples),
+                "errors": n_errors,
+                "error_rate": round(n_errors / len(samples), 4) if samples else 0,
+                "error_types": errors,
+                "rps": round(len(samples) / elapsed, 2) if elapsed else 0,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": latencies[-1] if latencies else None,
+            }
+        return {
+            "elapsed": round(elapsed, 3),
+            "concurrency": self.concurrency,
+            "rate": self.rate,
+            "total": summaries.pop("total"),
+            "operations": summaries,
+        }
+
+
+def format_report(report):
+    def fmt(value):
+        return "-" if value is None else f"{value:.1f}"
+
+    rows = sorted(report["operations"].items()) + [("total", report["total"])]
+    width = max(len(name) for (name, _) in rows)
+    lines = [
+        f"{'operation':<{width}}  {'requests':>8}  {'errors':>6}  {'rps':>8}  "
+        f"{'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}  {'max ms':>8}"
+    ]
+    for (name, summary) in rows:
+        lines.append(
+            f"{name:<{width}}  {summary['requests']:>8}  {summary['errors']:>6}  "
+            f"{summary['rps']:>8.1f}  {fmt(summary['p50']):>8}  {fmt(summary['p95']):>8}  "
+            f"{fmt(summary['p99']):>8}  {fmt(summary['max']):>8}"
+        )
+    return "\n".join(lines)
+
+
+class _AuthHandler(BaseHTTPRequestHandler):
+    """a KBase auth stand-in that accepts any token as an RE admin"""
+
+    def do_GET(self):
+        body = json.dumps({"user": "loadtest", "customroles": ["RE_ADMIN"]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def start_local_api(mix, db_latency=0, rows=100):
+    """
+    Start an RE API in this process, backed by the ArangoDB stand-in and an auth stand-in
+    that accepts any token as an RE admin.
+
+    :return (api_url, stop):            the API url, and a function to stop the servers
+    """
+    from relation_engine_server.test.mock_arango import MockArango
+
+    os.environ.setdefault("SPEC_PATH", os.path.abspath(_REPO_SPEC_PATH))
+    arango = MockArango(latency=db_latency).start()
+    arango.add_query(r"@@registry", [])
+    arango.default_results = lambda query, bind_vars: (
+        {"_key": str(i), "id": str(i)} for i in range(rows)
+    )
+    for conf in mix.values():
+        if conf.get("type") == "bulk_import":
+            arango.add_collection(conf["collection"])
+    auth = ThreadingHTTPServer(("127.0.0.1", 0), _AuthHandler)
+    threading.Thread(target=auth.serve_forever, daemon=True).start()
+
+    from relation_engine_server.main import app
+    from relation_engine_server.utils.config import get_config
+
+    # the config is shared by the server modules, so update it in place
+    config = get_config()
+    urls = {
+        "db_url": arango.url,
+        "api_url": arango.api_url,
+        "auth_url": f"http://127.0.0.1:{auth.server_address[1]}",
+    }
+    old_urls = {key: config[key] for key in urls}
+    config.update(urls)
+    server = make_server(
+        "127.0.0.1", 0, app, threaded=True, request_handler=_QuietRequestHandler
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        auth.shutdown()
+        arango.stop()
+        config.update(old_urls)
+
+    return (f"http://127.0.0.1:{server.server_port}", stop)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Load test the RE API query mix")
+    target = argparser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--api-url", help="url of a running RE API")
+    target.add_argument(
+        "--local",
+        action="store_true",
+        help="run an RE API in this process, backed by an ArangoDB stand-in",
+    )
+    argparser.add_argument("--mix", help="YAML or JSON file of the operation mix")
+    argparser.add_argument("--concurrency", type=int, default=4)
+    argparser.add_argument(
+        "--rate", type=float, help="mean requests per second (default: closed loop)"
+    )
+    argparser.add_argument("--duration", type=float, default=30, help="seconds")
+    argparser.add_argument("--requests", type=int, help="maximum number of operations")
+    argparser.add_argument("--auth-token", default=os.environ.get("KB_AUTH_TOKEN"))
+    argparser.add_argument("--seed", type=int, default=0)
+    argparser.add_argument(
+        "--db-latency",
+        type=float,
+        default=0.002,
+        help="seconds of latency for each stand-in database request, with --local",
+    )
+    argparser.add_argument(
+        "--rows",
+        type=int,
+        default=100,
+        help="number of rows the stand-in returns for each query, with --local",
+    )
+    argparser.add_argument("--output", help="file to write the JSON report to")
+    args = argparser.parse_args()
+    mix = DEFAULT_MIX
+    if args.mix:
+        with open(args.mix) as fd:
+            mix = yaml.safe_load(fd)
+    stop = None
+    api_url = args.api_url
+    auth_token = args.auth_token
+    if args.local:
+        (api_url, stop) = start_local_api(mix, args.db_latency, args.rows)
+        auth_token = auth_token or "local_admin_token"
+    try:
+        load_test = LoadTest(
+            api_url,
+            mix,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            auth_token=auth_token,
+            seed=args.seed,
+        )
+        report = load_test.run(duration=args.duration, max_requests=args.requests)
+    finally:
+        if stop:
+            stop()
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(report, fd, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,606 @@
+"""
+Microbenchmarks for the RE API and importer hot paths.
+
+Each benchmark case builds its inputs once, from the spec tree and from seeded generated
+data, and is then timed over a number of rounds. Results are written as JSON:
+
+    {
+        "meta": {"created": ..., "python": ..., "platform": ..., "seed": 0, "scale": 1, ...},
+        "results": {
+            "spec_loader.get_schema": {
+                "items": 215,               # items processed per call, e.g. specs loaded
+                "rounds": 5,
+                "number": 3,                # calls per round
+                "min": 0.0101,              # seconds per call
+                "median": 0.0104,
+                "mean": 0.0105,
+                "stdev": 0.0002,
+                "items_per_sec": 20673.1
+            },
+            ...
+        }
+    }
+
+Cases:
+
+    spec_loader.get_names                  all names of each spec type
+    spec_loader.get_schema                 every collection and stored query spec
+    json_validation.get_schema_validator   the params validator of every stored query
+    json_validation.run_validator          every stored query with params built from its
+                                           `examples`
+    bulk_import.validate[<collection>]     the per-document work of PUT /api/v1/documents
+                                           for each collection with generated documents
+    api_v1._preprocess_stored_query        every stored query
+    ensure_specs.is_obj_subset_rec[...]    matching the local index and view specs against
+                                           server-style copies, as ensure_specs does
+    DJORNL_Parser.load_data                a dry run load of a generated DJORNL release
+
+Sample usage:
+
+    python -m benchmarks.microbench run --output before.json
+    python -m benchmarks.microbench run --output after.json --filter spec_loader
+    python -m benchmarks.microbench compare before.json after.json --threshold 0.1
+
+The specs are read from SPEC_PATH, which defaults to the spec/ directory of this repo.
+"""
+import argparse
+import atexit
+import copy
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+import yaml
+
+_REPO_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "spec")
+
+# seconds to aim for in each round, when calibrating the number of calls per round
+_MIN_ROUND_TIME = 0.05
+
+_CASES: List[tuple] = []
+
+
+def case(name):
+    """
+    Register a benchmark case. The decorated function takes the options (seed, scale) and
+    returns a (func, items) pair, or a list of (name, func, items) for parametrized cases;
+    `func` is called with no arguments and processes `items` items per call.
+    """
+
+    def register(setup):
+        _CASES.append((name, setup))
+        return setup
+
+    return register
+
+
+def measure(func, rounds=5, number=None):
+    """
+    Time func over `rounds` rounds of `number` calls, calibrating `number` so that a round
+    takes at least _MIN_ROUND_TIME if it is not given.
+
+    :return timings: (dict)             seconds per call: min, median, mean and stdev
+    """
+    func()  # warm up caches
+    if number is None:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            if time.perf_counter() - start >= _MIN_ROUND_TIME or number >= 10000:
+                break
+            number *= 2
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return {
+        "rounds": rounds,
+        "number": number,
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if rounds > 1 else 0.0,
+    }
+
+
+def run(name_filter=None, rounds=5, seed=0, scale=1):
+    """
+    Run the benchmark cases whose names match the regex `name_filter`.
+
+    :return results: (dict)             results in the JSON results format
+    """
+    os.environ.setdefault("SPEC_PATH", os.path.abspath(_REPO_SPEC_PATH))
+    from relation_engine_server.utils.config import get_config
+
+    results = {}
+    for (name, setup) in _CASES:
+        # the filter is matched against the names of parametrized cases after setup
+        cases = setup(seed=seed, scale=scale)
+        if not isinstance(cases, list):
+            cases = [(name, *cases)]
+        for (case_name, func, items) in cases:
+            if name_filter and not re.search(name_filter, case_name):
+                continue
+            print(f"{case_name} ...", file=sys.stderr)
+            timings = measure(func, rounds)
+            results[case_name] = dict(
+                items=items,
+                **timings,
+                items_per_sec=round(items / timings["median"], 1),
+            )
+    meta = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "spec_path": get_config()["spec_paths"]["root"],
+        "seed": seed,
+        "scale": scale,
+        "rounds": rounds,
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(base, new, threshold=0.1):
+    """
+    Compare the median times of two runs.
+
+    :param threshold: (float)           relative change in median time below which a case
+                                        counts as unchanged
+    :return rows: (list)                (name, base median, new median, ratio, status) for
+                                        each case, where status is one of "slower",
+                                        "faster", "same", "added" or "removed"
+    """
+    rows = []
+    names = sorted(set(base["results"]) | set(new["results"]))
+    for name in names:
+        if name not in new["results"]:
+            rows.append((name, base["results"][name]["median"], None, None, "removed"))
+            continue
+        if name not in base["results"]:
+            rows.append((name, None, new["results"][name]["median"], None, "added"))
+            continue
+        (old_t, new_t) = (
+            base["results"][name]["median"],
+            new["results"][name]["median"],
+        )
+        ratio = new_t / old_t
+        if ratio > 1 + threshold:
+            status = "slower"
+        elif ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = "same"
+        rows.append((name, old_t, new_t, ratio, status))
+    return rows
+
+
+def format_comparison(rows):
+    def fmt_time(secs):
+        return "-" if secs is None else f"{secs * 1000:.3f}ms"
+
+    width = max([len(row[0]) for row in rows] + [4])
+    lines = [f"{'case':<{width}}  {'base':>12}  {'new':>12}  {'ratio':>7}  status"]
+    for (name, old_t, new_t, ratio, status) in rows:
+        ratio_s = "-" if ratio is None else f"{ratio:.2f}x"
+        lines.append(
+            f"{name:<{width}}  {fmt_time(old_t):>12}  {fmt_time(new_t):>12}  "
+            f"{ratio_s:>7}  {status}"
+        )
+    return "\n".join(lines)
+
+
+# -- inputs
+
+
+def _stored_queries():
+    """(name, path) of every stored query"""
+    from relation_engine_server.utils import spec_loader
+
+    return [
+        (name, spec_loader.get_stored_query(name, path_only=True))
+        for name in spec_loader.get_stored_query_names()
+    ]
+
+
+def _load(path):
+    from relation_engine_server.utils.json_validation import load_json_yaml
+
+    return load_json_yaml(path)
+
+
+def example_value(schema, i=0):
+    """
+    Generate a value for a JSON schema from its examples, default, const or enum, or from
+    its type; `i` picks between examples and varies generated values. Returns None where
+    no value can be generated, e.g. for strings with a pattern and no examples.
+    """
+    if "examples" in schema and schema["examples"]:
+        return copy.deepcopy(schema["examples"][i % len(schema["examples"])])
+    if "default" in schema:
+        return copy.deepcopy(schema["default"])
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return schema["enum"][i % len(schema["enum"])]
+    for key in ["oneOf", "anyOf"]:
+        if key in schema:
+            return example_value(schema[key][0], i)
+    schema_type = schema.get("type")
+    if isinstance(schema_type, list):
+        schema_type = [t for t in schema_type if t != "null"][0]
+    if schema_type == "object" or "properties" in schema:
+        obj = {}
+        required = schema.get("required", [])
+        for (prop, subschema) in schema.get("properties", {}).items():
+            if prop in required or "examples" in subschema:
+                value = example_value(subschema, i)
+                if value is not None:
+                    obj[prop] = value
+        return obj
+    if schema_type == "array":
+        n_items = schema.get("minItems", 0)
+        return [example_value(schema.get("items", {}), i + j) for j in range(n_items)]
+    if schema_type == "string" and "pattern" not in schema and "format" not in schema:
+        return f"{schema.get('title', 'value')} {i}"
+    if schema_type == "integer":
+        return max(schema.get("minimum", 0), i)
+    if schema_type == "number":
+        return float(max(schema.get("minimum", 0), i))
+    if schema_type == "boolean":
+        return bool(i % 2)
+    return None
+
+
+def example_params(params_schema):
+    """
+    Build stored query parameter sets from the `examples` of each parameter: the nth set
+    uses the nth example of each parameter, cycling through shorter lists.
+    """
+    props = params_schema.get("properties", {})
+    n_sets = max([len(p.get("examples", [])) for p in props.values()] + [0])
+    param_sets = []
+    for i in range(n_sets):
+        params = {}
+        for (name, prop) in props.items():
+            if prop.get("examples"):
+                params[name] = copy.deepcopy(
+                    prop["examples"][i % len(prop["examples"])]
+                )
+            elif name in params_schema.get("required", []):
+                value = example_value(prop, i)
+                if value is not None:
+                    params[name] = value
+        param_sets.append(params)
+    return param_sets
+
+
+def collection_docs(coll_spec, n_docs, seed=0):
+    """Generate documents for a collection from the examples and types in its schema."""
+    rand = random.Random(seed)
+    docs = []
+    for i in range(n_docs):
+        doc = example_value(coll_spec["schema"], rand.randrange(1000000))
+        doc.setdefault("_key", f"{coll_spec['name']}_{i}")
+        if coll_spec["type"] == "edge":
+            doc.setdefault("_from", f"vertex/{rand.randrange(n_docs)}")
+            doc.setdefault("_to", f"vertex/{rand.randrange(n_docs)}")
+        docs.append(doc)
+    return docs
+
+
+def write_djornl_release(data_dir, n_nodes, n_edges, n_clusters, seed=0):
+    """Write a DJORNL release with a manifest, an edge file, a node file and clusters."""
+    from importers.djornl.benchmark import EDGE_TYPES
+
+    rand = random.Random(seed)
+    node_ids = [f"AT{i:07d}" for i in range(n_nodes)]
+    with open(os.path.join(data_dir, "edges.tsv"), "w", newline="") as fd:
+        writer = csv.writer(fd, delimiter="\t")
+        writer.writerow(["node1", "node2", "score", "edge_descrip", "edge_type"])
+        # the parser rejects more than one score for an edge
+        edges = set()
+        while len(edges) < n_edges:
+            nodes = tuple(sorted(rand.sample(node_ids, 2)))
+            edge = (*nodes, rand.choice(EDGE_TYPES))
+            if edge not in edges:
+                edges.add(edge)
+                writer.writerow(
+                    [edge[0], edge[1], f"{rand.random() * 10:.3f}", "score", edge[2]]
+                )
+    with open(os.path.join(data_dir, "nodes.csv"), "w", newline="") as fd:
+        writer = csv.writer(fd)
+        writer.writerow(["node_id", "node_type", "gene_symbol", "go_terms"])
+        for (i, node_id) in enumerate(node_ids):
+            go_terms = ", ".join(f"GO:{rand.randrange(10000000):07d}" for _ in range(2))
+            writer.writerow([node_id, "gene", f"GENE{i}", go_terms])
+    with open(os.path.join(data_dir, "clusters.tsv"), "w", newline="") as fd:
+        writer = csv.writer(fd, delimiter="\t")
+        writer.writerow(["cluster_id", "node_ids"])
+        for i in range(n_clusters):
+            members = rand.sample(node_ids, min(10, n_nodes))
+            writer.writerow([f"Cluster{i}", ",".join(members)])
+    manifest = {
+        "name": "Synthetic DJORNL release",
+        "release_date": "2020-01-01",
+        "file_list": [
+            {"data_type": "edge", "path": "edges.tsv", "date": "2020-01-01"},
+            {
+                "data_type": "node",
+                "path": "nodes.csv",
+                "date": "2020-01-01",
+                "file_format": "csv",
+            },
+            {
+                "data_type": "cluster",
+                "path": "clusters.tsv",
+                "cluster_prefix": "markov_i2",
+            },
+        ],
+    }
+    with open(os.path.join(data_dir, "manifest.yaml"), "w") as fd:
+        yaml.safe_dump(manifest, fd)
+
+
+def _server_copy(spec, extra):
+    """a copy of a spec with fields added by the server, as returned by arangodb"""
+    server_spec = copy.deepcopy(spec)
+    server_spec.update(extra)
+    return server_spec
+
+
+# -- cases
+
+
+@case("spec_loader.get_names")
+def _get_names(seed, scale):
+    from relation_engine_server.utils import spec_loader
+
+    schema_types = ["collections", "data_sources", "stored_queries", "views"]
+
+    def func():
+        for schema_type in schema_types:
+            spec_loader.get_names(schema_type)
+
+    return (func, len(schema_types))
+
+
+@case("spec_loader.get_schema")
+def _get_schema(seed, scale):
+    from relation_engine_server.utils import spec_loader
+
+    names = [("collection", n) for n in spec_loader.get_collection_names()] + [
+        ("stored_query", n) for n in spec_loader.get_stored_query_names()
+    ]
+
+    def func():
+        for (schema_type, name) in names:
+            spec_loader.get_schema(schema_type, name)
+
+    return (func, len(names))
+
+
+@case("json_validation.get_schema_validator")
+def _get_schema_validator(seed, scale):
+    from relation_engine_server.utils.json_validation import get_schema_validator
+
+    paths = [path for (_, path) in _stored_queries() if "params" in _load(path)]
+
+    def func():
+        for path in paths:
+            get_schema_validator(schema_file=path, validate_at="/params")
+
+    return (func, len(paths))
+
+
+@case("json_validation.run_validator")
+def _run_validator(seed, scale):
+    from jsonschema.exceptions import ValidationError
+
+    from relation_engine_server.utils.json_validation import run_validator
+
+    inputs = []
+    for (name, path) in _stored_queries():
+        spec = _load(path)
+        for params in example_params(spec.get("params", {})):
+            try:
+                run_validator(
+                    schema_file=path, data=copy.deepcopy(params), validate_at="/params"
+                )
+            except ValidationError:
+                print(f"skipping invalid example params for {name}", file=sys.stderr)
+                continue
+            inputs.append((path, params))
+
+    def func():
+        for (path, params) in inputs:
+            run_validator(
+                schema_file=path, data=copy.deepcopy(params), validate_at="/params"
+            )
+
+    return (func, len(inputs))
+
+
+@case("bulk_import.validate")
+def _bulk_import_validate(seed, scale):
+    """the per-document work of bulk_import: parse, validate, key and serialise"""
+    from relation_engine_server.utils import spec_loader
+    from relation_engine_server.utils.bulk_import import _write_edge_key
+    from relation_engine_server.utils.json_validation import get_schema_validator
+
+    n_docs = 1000 * scale
+    cases = []
+    for coll_name in spec_loader.get_collection_names():
+        schema_file = spec_loader.get_collection(coll_name, path_only=True)
+        validator = get_schema_validator(schema_file=schema_file, validate_at="/schema")
+        docs = collection_docs(_load(schema_file), n_docs, seed)
+        if not all(validator.is_valid(doc) for doc in docs):
+            print(f"skipping {coll_name}: no valid generated docs", file=sys.stderr)
+            continue
+        lines = [json.dumps(doc) for doc in docs]
+
+        def func(validator=validator, lines=lines):
+            for line in lines:
+                json_line = json.loads(line)
+                validator.validate(json_line)
+                json_line = _write_edge_key(json_line)
+                json_line["updated_at"] = int(time.time() * 1000)
+                json.dumps(json_line)
+
+        cases.append((f"bulk_import.validate[{coll_name}]", func, n_docs))
+    return cases
+
+
+@case("api_v1._preprocess_stored_query")
+def _preprocess(seed, scale):
+    from relation_engine_server.api_versions.api_v1 import _preprocess_stored_query
+
+    specs = [_load(path) for (_, path) in _stored_queries()]
+
+    def func():
+        for spec in specs:
+            _preprocess_stored_query(spec["query"], spec)
+
+    return (func, len(specs))
+
+
+@case("ensure_specs.is_obj_subset_rec")
+def _is_obj_subset_rec(seed, scale):
+    from relation_engine_server.utils import ensure_specs
+
+    (_, coll_indexes) = ensure_specs.get_local_coll_indexes()
+    server_indexes = {
+        coll_name: [{"id": f"{coll_name}/0", "type": "primary", "fields": ["_key"]}]
+        + [
+            _server_copy(
+                index,
+                {
+                    "id": f"{coll_name}/{i + 1}",
+                    "name": f"idx_{i + 1}",
+                    "sparse": False,
+                    "unique": False,
+                    "selectivityEstimate": 1,
+                },
+            )
+            for (i, index) in enumerate(indexes)
+        ]
+        for (coll_name, indexes) in coll_indexes.items()
+    }
+    (_, views) = ensure_specs.get_local_views()
+    server_views = [
+        _server_copy(
+            view,
+            {
+                "id": str(i),
+                "globallyUniqueId": f"h{i}",
+                "cleanupIntervalStep": 2,
+                "consolidationIntervalMsec": 1000,
+                "writebufferActive": 0,
+            },
+        )
+        for (i, view) in enumerate(views)
+    ]
+
+    def match_indexes():
+        for (coll_name, indexes) in coll_indexes.items():
+            for index in indexes:
+                ensure_specs.match(index, server_indexes[coll_name])
+
+    def match_views():
+        for view in views:
+            ensure_specs.match(view, server_views)
+
+    n_indexes = sum(len(indexes) for indexes in coll_indexes.values())
+    return [
+        ("ensure_specs.is_obj_subset_rec[indexes]", match_indexes, n_indexes),
+        ("ensure_specs.is_obj_subset_rec[views]", match_views, len(views)),
+    ]
+
+
+@case("DJORNL_Parser.load_data")
+def _djornl_load_data(seed, scale):
+    from importers.djornl.parser import DJORNL_Parser
+
+    data_dir = tempfile.mkdtemp(prefix="djornl_bench_")
+    atexit.register(shutil.rmtree, data_dir, ignore_errors=True)
+    n_edges = 5000 * scale
+    write_djornl_release(data_dir, 1000 * scale, n_edges, 100 * scale, seed)
+
+    def func():
+        old_path = os.environ.get("RES_ROOT_DATA_PATH")
+        os.environ["RES_ROOT_DATA_PATH"] = data_dir
+        try:
+            summary = DJORNL_Parser().load_data(dry_run=True)
+        finally:
+            if old_path is None:
+                del os.environ["RES_ROOT_DATA_PATH"]
+            else:
+                os.environ["RES_ROOT_DATA_PATH"] = old_path
+        if summary["errors_total"]:
+            raise RuntimeError(f"DJORNL load errors: {summary['errors'][:5]}")
+
+    return (func, n_edges)
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description="RE API and importer microbenchmarks"
+    )
+    subparsers = argparser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--output", help="file to write the JSON results to")
+    run_parser.add_argument("--filter", help="regex of the case names to run")
+    run_parser.add_argument("--rounds", type=int, default=5)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument(
+        "--scale", type=int, default=1, help="multiplier for generated input sizes"
+    )
+    compare_parser = subparsers.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative change in median time to report as slower or faster",
+    )
+    compare_parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="exit with status 1 if any case is slower",
+    )
+    args = argparser.parse_args()
+    if args.command == "run":
+        results = run(args.filter, args.rounds, args.seed, args.scale)
+        output = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, "w") as fd:
+                fd.write(output + "\n")
+        else:
+            print(output)
+        return
+    with open(args.base) as fd:
+        base = json.load(fd)
+    with open(args.new) as fd:
+        new = json.load(fd)
+    rows = compare(base, new, args.threshold)
+    print(format_comparison(rows))
+    if args.fail_on_regression and any(row[4] == "slower" for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
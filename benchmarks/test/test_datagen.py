@@ -0,0 +1,92 @@
+"""
+Tests for the synthetic dataset generator
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmarks import datagen
+from importers.utils.delta_load import MAX_ADB_INTEGER
+from relation_engine_server.utils.config import get_config, get_spec_paths
+
+
+def _by_collection(docs):
+    colls = {}
+    for (coll_name, doc) in docs:
+        colls.setdefault(coll_name, []).append(doc)
+    return colls
+
+
+class TestDatagen(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # the documents are validated against the collection specs in this repo
+        cls.spec_patcher = mock.patch.dict(
+            get_config()["spec_paths"],
+            get_spec_paths(os.path.abspath(datagen._REPO_SPEC_PATH)),
+        )
+        cls.spec_patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.spec_patcher.stop()
+
+    def test_taxonomy(self):
+        """edges link the vertex versions that are current at the same time"""
+        colls = _by_collection(datagen.taxonomy(500, n_versions=4, depth=5, seed=3))
+        taxa = {t["_key"]: t for t in colls["ncbi_taxon"]}
+        self.assertEqual(len({t["id"] for t in taxa.values()}), 500)
+        self.assertGreater(len(taxa), 500)
+        self.assertTrue(max(int(t["first_version"][1:]) for t in taxa.values()) > 1)
+        for edge in colls["ncbi_child_of_taxon"]:
+            child = taxa[edge["_from"].split("/")[1]]
+            parent = taxa[edge["_to"].split("/")[1]]
+            self.assertEqual((child["id"], parent["id"]), (edge["from"], edge["to"]))
+            for vertex in [child, parent]:
+                self.assertLessEqual(vertex["created"], edge["created"])
+                self.assertGreaterEqual(vertex["expired"], edge["created"])
+        self.assertIn(MAX_ADB_INTEGER, [t["expired"] for t in taxa.values()])
+
+    def test_seeded(self):
+        self.assertEqual(
+            list(datagen.go_dag(50, seed=1)), list(datagen.go_dag(50, seed=1))
+        )
+        self.assertNotEqual(
+            list(datagen.go_dag(50, seed=1)), list(datagen.go_dag(50, seed=2))
+        )
+
+    def test_go_dag(self):
+        colls = _by_collection(datagen.go_dag(300, seed=0))
+        terms = {t["id"]: t for t in colls["GO_terms"]}
+        self.assertEqual(len(terms), 300)
+        for edge in colls["GO_edges"]:
+            self.assertIn(edge["type"], ["is_a", "part_of"])
+            # parents are earlier terms in the same namespace
+            self.assertEqual(
+                terms[edge["from"]]["namespace"], terms[edge["to"]]["namespace"]
+            )
+            self.assertLess(edge["to"], edge["from"])
+
+    def test_writer(self):
+        """documents are validated against the collection specs as they are written"""
+        docs = list(datagen.taxonomy(50, seed=0))
+        docs += list(datagen.djornl_network(30, mean_degree=3, seed=0))
+        docs += list(datagen.ws_provenance(30, objects_per_ws=10, seed=0))
+        with tempfile.TemporaryDirectory() as out_dir:
+            writer = datagen.DatasetWriter(out_dir)
+            writer.write_all(docs)
+            counts = writer.close()
+            self.assertEqual(sum(counts.values()), len(docs))
+            with open(os.path.join(out_dir, "djornl_node.ndjson")) as fd:
+                nodes = [json.loads(line) for line in fd]
+            self.assertEqual(len(nodes), 30)
+            writer = datagen.DatasetWriter(out_dir)
+            with self.assertRaisesRegex(ValueError, "Invalid ncbi_taxon document 1_v1"):
+                writer.write("ncbi_taxon", {"_key": "1_v1", "id": "1"})
+            writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
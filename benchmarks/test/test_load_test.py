@@ -0,0 +1,78 @@
+"""
+Tests for the query mix load test, against a local RE API backed by the ArangoDB stand-in
+"""
+import os
+import unittest
+from unittest import mock
+
+from benchmarks import load_test
+from relation_engine_server.utils.config import get_config, get_spec_paths
+
+
+class TestLoadTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # the API serves the stored queries in this repo
+        cls.spec_patcher = mock.patch.dict(
+            get_config()["spec_paths"],
+            get_spec_paths(os.path.abspath(load_test._REPO_SPEC_PATH)),
+        )
+        cls.spec_patcher.start()
+        (cls.api_url, cls.stop) = load_test.start_local_api(
+            load_test.DEFAULT_MIX, rows=50
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stop()
+        cls.spec_patcher.stop()
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(load_test.percentile(values, 50), 50)
+        self.assertEqual(load_test.percentile(values, 99), 99)
+        self.assertEqual(load_test.percentile([5], 95), 5)
+        self.assertIsNone(load_test.percentile([], 50))
+
+    def test_closed_loop(self):
+        runner = load_test.LoadTest(
+            self.api_url, concurrency=3, auth_token="admin_token"
+        )
+        report = runner.run(max_requests=40)
+        ops = report["operations"]
+        # cursor continuations are separate requests from the first page
+        self.assertGreater(report["total"]["requests"], 40)
+        self.assertEqual(report["total"]["errors"], 0, report)
+        for name in [
+            "taxonomy_get_lineage",
+            "GO_get_descendants",
+            "djornl_fetch_genes",
+        ]:
+            self.assertIn(name, ops)
+        self.assertIn("cursor_continuation", ops)
+        summary = ops["taxonomy_get_lineage"]
+        self.assertLessEqual(summary["p50"], summary["p95"])
+        self.assertLessEqual(summary["p95"], summary["p99"])
+
+    def test_open_loop(self):
+        mix = {
+            "search_compounds": {"weight": 1, "params": [{"search_text": "x"}]},
+            "bulk_import": {
+                "weight": 1,
+                "type": "bulk_import",
+                "collection": "test_vertex",
+                "docs": 10,
+            },
+        }
+        runner = load_test.LoadTest(self.api_url, mix, concurrency=2, rate=200)
+        report = runner.run(max_requests=20)
+        self.assertEqual(report["total"]["requests"], 20)
+        # bulk imports without an auth token fail
+        bulk = report["operations"]["bulk_import"]
+        self.assertEqual(bulk["errors"], bulk["requests"])
+        self.assertEqual(list(bulk["error_types"]), ["HTTP 400"])
+        self.assertEqual(report["operations"]["search_compounds"]["errors"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Tests for the microbenchmark runner and run comparison
+"""
+import os
+import unittest
+from unittest import mock
+
+from benchmarks import microbench
+from relation_engine_server.utils.config import get_config, get_spec_paths
+
+
+def _results(**medians):
+    return {"results": {name: {"median": median} for (name, median) in medians.items()}}
+
+
+class TestMicrobench(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # the benchmark cases load the specs in this repo
+        cls.spec_patcher = mock.patch.dict(
+            get_config()["spec_paths"],
+            get_spec_paths(os.path.abspath(microbench._REPO_SPEC_PATH)),
+        )
+        cls.spec_patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.spec_patcher.stop()
+
+    def test_measure(self):
+        calls = []
+        timings = microbench.measure(lambda: calls.append(1), rounds=3, number=2)
+        self.assertEqual((timings["rounds"], timings["number"]), (3, 2))
+        # one warm up call, and two calls in each round
+        self.assertEqual(len(calls), 7)
+        self.assertLessEqual(timings["min"], timings["median"])
+
+    def test_compare(self):
+        base = _results(a=1.0, b=1.0, c=1.0, d=1.0)
+        new = _results(a=1.5, b=0.5, c=1.05, e=1.0)
+        rows = microbench.compare(base, new, threshold=0.1)
+        self.assertEqual(
+            [(row[0], row[4]) for row in rows],
+            [
+                ("a", "slower"),
+                ("b", "faster"),
+                ("c", "same"),
+                ("d", "removed"),
+                ("e", "added"),
+            ],
+        )
+        self.assertIn("1.50x", microbench.format_comparison(rows))
+
+    def test_example_params(self):
+        schema = {
+            "required": ["id"],
+            "properties": {
+                "id": {"type": "string", "examples": ["1", "2", "3"]},
+                "limit": {"type": "integer", "examples": [10]},
+                "offset": {"type": "integer"},
+            },
+        }
+        self.assertEqual(
+            microbench.example_params(schema),
+            [
+                {"id": "1", "limit": 10},
+                {"id": "2", "limit": 10},
+                {"id": "3", "limit": 10},
+            ],
+        )
+
+    def test_collection_docs(self):
+        spec = {
+            "name": "things",
+            "type": "edge",
+            "schema": {
+                "required": ["id", "score", "kind"],
+                "properties": {
+                    "id": {"type": "string"},
+                    "score": {"type": "number", "minimum": 1},
+                    "kind": {"enum": ["a", "b"]},
+                },
+            },
+        }
+        docs = microbench.collection_docs(spec, 3, seed=1)
+        self.assertEqual(docs, microbench.collection_docs(spec, 3, seed=1))
+        self.assertEqual(
+            [d["_key"] for d in docs], ["things_0", "things_1", "things_2"]
+        )
+        for doc in docs:
+            self.assertTrue({"id", "score", "kind", "_from", "_to"} <= set(doc))
+            self.assertGreaterEqual(doc["score"], 1)
+
+    def test_run(self):
+        results = microbench.run(name_filter="_preprocess_stored_query", rounds=2)
+        self.assertEqual(list(results["results"]), ["api_v1._preprocess_stored_query"])
+        result = results["results"]["api_v1._preprocess_stored_query"]
+        self.assertGreater(result["items"], 0)
+        self.assertGreater(result["items_per_sec"], 0)
+        self.assertEqual(results["meta"]["rounds"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,11 @@
 from .main import REClient
 
 __all__ = ["REClient"]
+
+try:
+    # The asyncio client needs the optional aiohttp dependency
+    from .async_client import AsyncREClient  # noqa: F401
+
+    __all__.append("AsyncREClient")
+except ImportError:
+    pass
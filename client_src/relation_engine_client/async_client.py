@@ -0,0 +1,452 @@
+import asyncio
+import gzip
+import json
+import random
+from typing import Optional, Dict, Union, Tuple, AsyncIterator, Iterable
+
+import aiohttp
+
+from .exceptions import REServerError, RERequestError, RENotFound
+from .main import (
+    _QUERY_METHOD,
+    _QUERY_ENDPOINT,
+    _SAVE_METHOD,
+    _SAVE_ENDPOINT,
+    _RETRY_STATUSES,
+    _CURSOR_DONE,
+    _add_save_results,
+    _chunk_docs,
+    _collect_chunks,
+    _empty_save_results,
+)
+
+# Errors that fail one chunk of a save, rather than the whole save
+_CHUNK_ERRORS = (
+    REServerError,
+    RERequestError,
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+)
+
+
+class _Response:
+    """
+    The parts of an aiohttp response needed once its body has been read, with the
+    same attribute names as a requests.Response so the RE exceptions can use it.
+    """
+
+    def __init__(self, status_code: int, text: str, url: str):
+        self.status_code = status_code
+        self.text = text
+        self.url = url
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncREClient:
+    def __init__(
+        self,
+        api_url: str,
+        token: str = None,
+        timeout: Tuple[float, float] = (10, 1800),
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        max_concurrency: int = 100,
+    ):
+        """
+        asyncio version of the REClient, for running many requests concurrently.
+        Params:
+            api_url - str - URL of the Relation Engine API server
+            token - str - KBase auth token (optional)
+            timeout - (connect, read) tuple of timeouts in seconds for each request
+            max_retries - int - how many times to retry a query after a connection
+                error or a 5xx response. Ad-hoc admin queries and document saves
+                are never retried.
+            backoff_factor - float - retry N waits a random time of up to
+                backoff_factor * 2 ** N seconds
+            max_concurrency - int - maximum number of requests in flight at once,
+                which is also the size of the connection pool
+        """
+        self.api_url = api_url
+        self.token = token
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_concurrency = max_concurrency
+        # Type check the constructor parameters
+        if not self.api_url or not isinstance(self.api_url, str):
+            raise TypeError("The Relation Engine API URL was not provided.")
+        if not isinstance(max_retries, int) or max_retries < 0:
+            raise TypeError("`max_retries` argument must be a non-negative int")
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            raise TypeError("`max_concurrency` argument must be a positive int")
+        # Remove any trailing slash in the API URL so we can append paths
+        self.api_url = self.api_url.strip("/")
+        # The session and semaphore belong to an event loop, so they are created
+        # when the first request is made
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def close(self):
+        """Close all pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def admin_query(self, query: str, bind_vars: dict, raise_not_found=False):
+        """
+        Run an ad-hoc query using admin privs.
+        Params:
+            query - string - AQL query to execute
+            bind_vars - dict - JSON serializable bind variables for the query
+            raise_not_found - bool - Whether to raise an error if there are zero results. Defaults to False
+        Exceptions raised:
+            RERequestError - 400-499 error from the RE API
+            REServerError - 500+ error from the RE API
+            RENotFound - raised when raise_not_found is True and there are 0 results
+        """
+        if not isinstance(query, str):
+            raise TypeError("`query` argument must be a str")
+        if not isinstance(bind_vars, dict):
+            raise TypeError("`bind_vars` argument must be a dict")
+        if not isinstance(raise_not_found, bool):
+            raise TypeError("`raise_not_found` argument must be a bool")
+        req_body = dict(bind_vars)
+        req_body["query"] = query
+        # ad-hoc queries may write, so they are never retried
+        return await self._make_request(
+            method=_QUERY_METHOD,
+            url=self.api_url + _QUERY_ENDPOINT,
+            data=json.dumps(req_body),
+            params={},
+            raise_not_found=raise_not_found,
+        )
+
+    async def stored_query(
+        self, stored_query: str, bind_vars: dict, raise_not_found=False
+    ):
+        """
+        Run a stored query.
+        Params:
+            stored_query - string - name of the stored query to execute
+            bind_vars - JSON serializable - bind variables for the query (JSON serializable)
+            raise_not_found - bool - Whether to raise an error if there are zero results. Defaults to False
+        Exceptions raised:
+            RERequestError - 400-499 from the RE API (client error)
+            REServerError - 500+ error from the RE API
+            RENotFound - raised when raise_not_found is True and there are 0 results
+        """
+        if not isinstance(stored_query, str):
+            raise TypeError("`stored_query` argument must be a str")
+        if not isinstance(bind_vars, dict):
+            raise TypeError("`bind_vars` argument must be a dict")
+        if not isinstance(raise_not_found, bool):
+            raise TypeError("`raise_not_found` argument must be a bool")
+        return await self._make_request(
+            method=_QUERY_METHOD,
+            url=self.api_url + _QUERY_ENDPOINT,
+            data=json.dumps(dict(bind_vars)),
+            params={"stored_query": stored_query},
+            raise_not_found=raise_not_found,
+            idempotent=True,
+        )
+
+    def iter_admin_query(
+        self,
+        query: str,
+        bind_vars: dict,
+        batch_size: Optional[int] = None,
+        prefetch: int = 1,
+    ) -> AsyncIterator[dict]:
+        """
+        Run an ad-hoc query using admin privs and asynchronously iterate over every
+        result, fetching additional batches from the query cursor as needed.
+        Params:
+            query - string - AQL query to execute
+            bind_vars - dict - JSON serializable bind variables for the query
+            batch_size - int (optional) - number of results to fetch per request
+            prefetch - int (defaults to 1) - number of batches to fetch ahead in a
+                background task while the current batch is being consumed
+        Exceptions raised:
+            RERequestError - 400-499 error from the RE API
+            REServerError - 500+ error from the RE API
+        """
+        if not isinstance(query, str):
+            raise TypeError("`query` argument must be a str")
+        if not isinstance(bind_vars, dict):
+            raise TypeError("`bind_vars` argument must be a dict")
+        req_body = dict(bind_vars)
+        req_body["query"] = query
+        return self._iter_query(req_body, {}, batch_size, prefetch, idempotent=False)
+
+    def iter_stored_query(
+        self,
+        stored_query: str,
+        bind_vars: dict,
+        batch_size: Optional[int] = None,
+        prefetch: int = 1,
+    ) -> AsyncIterator[dict]:
+        """
+        Run a stored query and asynchronously iterate over every result, fetching
+        additional batches from the query cursor as needed.
+        Params:
+            stored_query - string - name of the stored query to execute
+            bind_vars - dict - JSON serializable bind variables for the query
+            batch_size - int (optional) - number of results to fetch per request
+            prefetch - int (defaults to 1) - number of batches to fetch ahead in a
+                background task while the current batch is being consumed
+        Exceptions raised:
+            RERequestError - 400-499 from the RE API (client error)
+            REServerError - 500+ error from the RE API
+        """
+        if not isinstance(stored_query, str):
+            raise TypeError("`stored_query` argument must be a str")
+        if not isinstance(bind_vars, dict):
+            raise TypeError("`bind_vars` argument must be a dict")
+        params = {"stored_query": stored_query}
+        return self._iter_query(dict(bind_vars), params, batch_size, prefetch)
+
+    async def save_docs(
+        self,
+        coll: str,
+        docs: Union[Dict, Iterable[Dict]],
+        on_duplicate: Optional[str] = None,
+        display_errors=False,
+        chunk_bytes: int = 8 * 1024 * 1024,
+        parallelism: int = 4,
+        compress: bool = False,
+    ):
+        """
+        Save documents to a collection in the relation engine.
+        Requires an auth token with RE admin privileges.
+        Documents are serialized lazily and uploaded in chunks, as for
+        REClient.save_docs. The first chunk is uploaded on its own and any error is
+        raised; later chunks are uploaded concurrently and failures are reported in
+        the response.
+        Params:
+            coll - str - collection name to save to
+            docs - a single dict or an iterable of dicts - json-serializable documents to save
+            on_duplicate - str (defaults to 'error') - what to do when a provided document
+                already exists in the collection. See options here:
+                https://github.com/kbase/relation_engine_api#put-apiv1documents
+            display_errors - bool (defaults to False) - whether to respond with
+                document save errors (the response will give you an error for every
+                document that failed to save).
+            chunk_bytes - int (defaults to 8MiB) - maximum size of the serialized
+                documents in each request, unless a single document is larger
+            parallelism - int (defaults to 4) - number of chunks to upload at once
+            compress - bool (defaults to False) - gzip each chunk. The server must
+                support gzip-encoded request bodies.
+        Returns the import counts summed over all chunks, plus a `failed_chunks` list;
+        see REClient.save_docs.
+        Exceptions raised:
+            RERequestError - 400-499 from the RE API (client error) on the first chunk
+            REServerError - 500+ error from the RE API on the first chunk
+        """
+        if isinstance(docs, dict):
+            docs = [docs]
+        if isinstance(docs, (str, bytes)) or not isinstance(docs, Iterable):
+            raise TypeError("`docs` argument must be an iterable of dicts")
+        if on_duplicate and not isinstance(on_duplicate, str):
+            raise TypeError("`on_duplicate` argument must be a str")
+        if not isinstance(display_errors, bool):
+            raise TypeError("`display_errors` argument must be a bool")
+        if not isinstance(chunk_bytes, int) or chunk_bytes < 1:
+            raise TypeError("`chunk_bytes` argument must be a positive int")
+        if not isinstance(parallelism, int) or parallelism < 1:
+            raise TypeError("`parallelism` argument must be a positive int")
+        if not isinstance(compress, bool):
+            raise TypeError("`compress` argument must be a bool")
+        params = {"collection": coll}
+        if display_errors:
+            params["display_errors"] = "1"
+        params["on_duplicate"] = on_duplicate or "error"
+        chunks = _chunk_docs(docs, chunk_bytes)
+        first = next(chunks, None)
+        if first is None:
+            raise TypeError("No documents provided to save")
+        results = _empty_save_results()
+        uploads = asyncio.Semaphore(parallelism)
+
+        async def upload(chunk):
+            _offset, _count, body = chunk
+            headers = {}
+            if compress:
+                body = gzip.compress(body)
+                headers["Content-Encoding"] = "gzip"
+            async with uploads:
+                return await self._make_request(
+                    method=_SAVE_METHOD,
+                    url=self.api_url + _SAVE_ENDPOINT,
+                    data=body,
+                    params=params,
+                    raise_not_found=False,
+                    headers=headers,
+                )
+
+        # Errors such as bad auth or an unknown collection would fail every chunk
+        _add_save_results(results, await upload(first))
+        pending: set = set()
+        for chunk in chunks:
+            if len(pending) >= parallelism * 2:
+                # Only serialize a few chunks ahead of the uploads
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                _collect_chunks(results, done, _CHUNK_ERRORS)
+            task = asyncio.ensure_future(upload(chunk))
+            task.chunk = chunk  # type: ignore
+            pending.add(task)
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            _collect_chunks(results, done, _CHUNK_ERRORS)
+        results["failed_chunks"].sort(key=lambda c: c["offset"])
+        results["error"] = bool(results["errors"] or results["failed_chunks"])
+        return results
+
+    def _iter_query(self, req_body, params, batch_size, prefetch, idempotent=True):
+        """Check the iteration arguments, then return the async result generator."""
+        if batch_size is not None:
+            if not isinstance(batch_size, int) or batch_size < 1:
+                raise TypeError("`batch_size` argument must be a positive int")
+            params["batch_size"] = batch_size
+        if not isinstance(prefetch, int) or prefetch < 1:
+            raise TypeError("`prefetch` argument must be a positive int")
+        return self._iter_cursor(req_body, params, prefetch, idempotent)
+
+    async def _iter_cursor(self, req_body, params, prefetch, idempotent):
+        """
+        Yield the results of a query and all of its subsequent batches. While the
+        caller consumes one batch, a background task fetches up to `prefetch`
+        batches ahead from the cursor.
+        """
+        first = await self._make_request(
+            method=_QUERY_METHOD,
+            url=self.api_url + _QUERY_ENDPOINT,
+            data=json.dumps(req_body),
+            params=params,
+            raise_not_found=False,
+            idempotent=idempotent,
+        )
+        if not first.get("has_more"):
+            for result in first["results"]:
+                yield result
+            return
+        batches: asyncio.Queue = asyncio.Queue(maxsize=prefetch)
+
+        async def fetch_batches():
+            resp = first
+            try:
+                while resp.get("has_more"):
+                    # Fetching from a cursor moves it on, so these are never retried
+                    resp = await self._make_request(
+                        method=_QUERY_METHOD,
+                        url=self.api_url + _QUERY_ENDPOINT,
+                        data="",
+                        params={"cursor_id": resp["cursor_id"]},
+                        raise_not_found=False,
+                    )
+                    await batches.put(resp["results"])
+            except Exception as err:
+                await batches.put(err)
+            await batches.put(_CURSOR_DONE)
+
+        task = asyncio.ensure_future(fetch_batches())
+        try:
+            for result in first["results"]:
+                yield result
+            while True:
+                batch = await batches.get()
+                if batch is _CURSOR_DONE:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+                for result in batch:
+                    yield result
+        finally:
+            # Stop fetching if the caller stopped iterating early
+            task.cancel()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Create the shared session and concurrency limit on first use."""
+        if self._session is None:
+            connect, read = self.timeout
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def _make_request(
+        self, method, url, data, params, raise_not_found, idempotent=False, headers=None
+    ):
+        """
+        Internal utility to make a generic request to the RE API and handle the
+        response.
+        Idempotent requests are retried on connection errors and 5xx responses.
+        """
+        headers = dict(headers or {})
+        if self.token:
+            headers["Authorization"] = self.token
+        session = self._get_session()
+
+        async def send():
+            async with self._semaphore:
+                async with session.request(
+                    method, url, data=data, params=params, headers=headers
+                ) as resp:
+                    text = await resp.text()
+                    return _Response(resp.status, text, str(resp.url))
+
+        if idempotent:
+            resp = await self._send_with_retries(send)
+        else:
+            resp = await send()
+        if resp.status_code >= 500:
+            # Server error
+            raise REServerError(resp)
+        elif resp.status_code >= 400 and resp.status_code < 500:
+            # Client error
+            raise RERequestError(resp)
+        elif not resp.ok:
+            raise RuntimeError(
+                f"Unknown RE API error:\nURL: {resp.url}\nMethod: {method}\n{resp.text}"
+            )
+        resp_json = resp.json()
+        if raise_not_found and not len(resp_json["results"]):
+            # Results were required to be non-empty
+            raise RENotFound(req_body=data, req_params=params)
+        return resp_json
+
+    async def _send_with_retries(self, send):
+        """
+        Await `send` until it returns a non-5xx response, retrying connection errors
+        and server errors up to `max_retries` times with jittered exponential backoff.
+        The concurrency limit is not held while waiting to retry.
+        """
+        attempt = 0
+        while True:
+            try:
+                resp = await send()
+                if resp.status_code not in _RETRY_STATUSES:
+                    return resp
+                if attempt >= self.max_retries:
+                    return resp
+            except aiohttp.ClientConnectionError:
+                if attempt >= self.max_retries:
+                    raise
+            delay = random.uniform(0, self.backoff_factor * 2**attempt)  # nosec
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -1,6 +1,17 @@
+import gzip
 import json
+import queue
+import random
+import threading
+import time
 import requests
-from typing import Optional, List, Dict, Union
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeoutError,
+    wait,
+    FIRST_COMPLETED,
+)
+from typing import Optional, List, Dict, Union, Tuple, Iterator, Iterable
 
 from .exceptions import REServerError, RERequestError, RENotFound
 
@@ -8,17 +19,77 @@ _QUERY_METHOD = "POST"
 _QUERY_ENDPOINT = "/api/v1/query_results"
 _SAVE_METHOD = "PUT"
 _SAVE_ENDPOINT = "/api/v1/documents"
+# Server responses that are worth retrying for idempotent requests
+_RETRY_STATUSES = {500, 502, 503, 504}
+# Marks the end of the batches fetched from a cursor
+_CURSOR_DONE = object()
 
 
 class REClient:
-    def __init__(self, api_url: str, token: str = None):
+    def __init__(
+        self,
+        api_url: str,
+        token: str = None,
+        timeout: Tuple[float, float] = (10, 1800),
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        pool_size: int = 10,
+        hedge_after: Optional[float] = None,
+    ):
+        """
+        Params:
+            api_url - str - URL of the Relation Engine API server
+            token - str - KBase auth token (optional)
+            timeout - (connect, read) tuple of timeouts in seconds for each request
+            max_retries - int - how many times to retry a query after a connection
+                error or a 5xx response. Ad-hoc admin queries and document saves
+                are never retried.
+            backoff_factor - float - retry N waits a random time of up to
+                backoff_factor * 2 ** N seconds
+            pool_size - int - maximum number of pooled connections to the server
+            hedge_after - float (optional) - if set, queries that have not responded
+                after this many seconds are sent a second time, and the first
+                response to arrive is used
+        """
         self.api_url = api_url
         self.token = token
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.hedge_after = hedge_after
         # Type check the constructor parameters
         if not self.api_url or not isinstance(self.api_url, str):
             raise TypeError("The Relation Engine API URL was not provided.")
+        if not isinstance(max_retries, int) or max_retries < 0:
+            raise TypeError("`max_retries` argument must be a non-negative int")
+        if not isinstance(pool_size, int) or pool_size < 1:
+            raise TypeError("`pool_size` argument must be a positive int")
+        if hedge_after is not None and not isinstance(hedge_after, (int, float)):
+            raise TypeError("`hedge_after` argument must be a number")
         # Remove any trailing slash in the API URL so we can append paths
         self.api_url = self.api_url.strip("/")
+        # Keep connections to the server alive between requests
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._pool_size = pool_size
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def close(self):
+        """Close all pooled connections and any background threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
     def admin_query(self, query: str, bind_vars: dict, raise_not_found=False):
         """
@@ -43,6 +114,7 @@ class REClient:
         req_body = dict(bind_vars)
         req_body["query"] = query
         url = str(self.api_url) + _QUERY_ENDPOINT
+        # ad-hoc queries may write, so they are never retried or hedged
         resp = self._make_request(
             method=_QUERY_METHOD,
             url=url,
@@ -80,66 +152,258 @@ class REClient:
             data=json.dumps(req_body),
             params={"stored_query": stored_query},
             raise_not_found=raise_not_found,
+            idempotent=True,
         )
 
+    def iter_admin_query(
+        self,
+        query: str,
+        bind_vars: dict,
+        batch_size: Optional[int] = None,
+        prefetch: int = 1,
+    ) -> Iterator[dict]:
+        """
+        Run an ad-hoc query using admin privs and iterate over every result,
+        fetching additional batches from the query cursor as needed.
+        Params:
+            query - string - AQL query to execute
+            bind_vars - dict - JSON serializable bind variables for the query
+            batch_size - int (optional) - number of results to fetch per request
+            prefetch - int (defaults to 1) - number of batches to fetch ahead in a
+                background thread while the current batch is being consumed
+        Exceptions raised:
+            RERequestError - 400-499 error from the RE API
+            REServerError - 500+ error from the RE API
+        """
+        if not isinstance(query, str):
+            raise TypeError("`query` argument must be a str")
+        if not isinstance(bind_vars, dict):
+            raise TypeError("`bind_vars` argument must be a dict")
+        req_body = dict(bind_vars)
+        req_body["query"] = query
+        return self._iter_query(req_body, {}, batch_size, prefetch, idempotent=False)
+
+    def iter_stored_query(
+        self,
+        stored_query: str,
+        bind_vars: dict,
+        batch_size: Optional[int] = None,
+        prefetch: int = 1,
+    ) -> Iterator[dict]:
+        """
+        Run a stored query and iterate over every result, fetching additional
+        batches from the query cursor as needed.
+        Params:
+            stored_query - string - name of the stored query to execute
+            bind_vars - dict - JSON serializable bind variables for the query
+            batch_size - int (optional) - number of results to fetch per request
+            prefetch - int (defaults to 1) - number of batches to fetch ahead in a
+                background thread while the current batch is being consumed
+        Exceptions raised:
+            RERequestError - 400-499 from the RE API (client error)
+            REServerError - 500+ error from the RE API
+        """
+        if not isinstance(stored_query, str):
+            raise TypeError("`stored_query` argument must be a str")
+        if not isinstance(bind_vars, dict):
+            raise TypeError("`bind_vars` argument must be a dict")
+        params = {"stored_query": stored_query}
+        return self._iter_query(dict(bind_vars), params, batch_size, prefetch)
+
     def save_docs(
         self,
         coll: str,
-        docs: Union[Dict, List[Dict]],
+        docs: Union[Dict, Iterable[Dict]],
         on_duplicate: Optional[str] = None,
         display_errors=False,
+        chunk_bytes: int = 8 * 1024 * 1024,
+        parallelism: int = 4,
+        compress: bool = False,
     ):
         """
         Save documents to a collection in the relation engine.
         Requires an auth token with RE admin privileges.
+        Documents are serialized lazily and uploaded in chunks, so `docs` can be a
+        generator over more documents than would fit in memory. The first chunk is
+        uploaded on its own and any error is raised; later chunks are uploaded
+        concurrently and failures are reported in the response.
         Params:
             coll - str - collection name to save to
-            docs - a single dict or list of dicts - json-serializable documents to save
+            docs - a single dict or an iterable of dicts - json-serializable documents to save
             on_duplicate - str (defaults to 'error') - what to do when a provided document
                 already exists in the collection. See options here:
                 https://github.com/kbase/relation_engine_api#put-apiv1documents
             display_errors - bool (defaults to False) - whether to respond with
                 document save errors (the response will give you an error for every
                 document that failed to save).
+            chunk_bytes - int (defaults to 8MiB) - maximum size of the serialized
+                documents in each request, unless a single document is larger
+            parallelism - int (defaults to 4) - number of chunks to upload at once
+            compress - bool (defaults to False) - gzip each chunk. The server must
+                support gzip-encoded request bodies.
+        Returns the import counts (created, errors, empty, updated, ignored) summed
+        over all chunks, plus a `failed_chunks` list with the `offset` (index of
+        the first document in `docs`), `count` and `error` for each failed chunk.
         Exceptions raised:
-            RERequestError - 400-499 from the RE API (client error)
-            REServerError - 500+ error from the RE API
+            RERequestError - 400-499 from the RE API (client error) on the first chunk
+            REServerError - 500+ error from the RE API on the first chunk
         """
         if isinstance(docs, dict):
             docs = [docs]
-        if not docs:
-            raise TypeError("No documents provided to save")
-        if not isinstance(docs, list):
-            raise TypeError("`docs` argument must be a list")
+        if isinstance(docs, (str, bytes)) or not isinstance(docs, Iterable):
+            raise TypeError("`docs` argument must be an iterable of dicts")
         if on_duplicate and not isinstance(on_duplicate, str):
             raise TypeError("`on_duplicate` argument must bea str")
         if not isinstance(display_errors, bool):
             raise TypeError("`display_errors` argument must be a bool")
+        if not isinstance(chunk_bytes, int) or chunk_bytes < 1:
+            raise TypeError("`chunk_bytes` argument must be a positive int")
+        if not isinstance(parallelism, int) or parallelism < 1:
+            raise TypeError("`parallelism` argument must be a positive int")
+        if not isinstance(compress, bool):
+            raise TypeError("`compress` argument must be a bool")
         params = {"collection": coll}
         if display_errors:
             params["display_errors"] = "1"
         params["on_duplicate"] = on_duplicate or "error"
-        req_body = "\n".join(json.dumps(d) for d in docs)
-        url = str(self.api_url) + _SAVE_ENDPOINT
-        return self._make_request(
-            method=_SAVE_METHOD,
-            url=url,
-            data=req_body,
+        chunks = _chunk_docs(docs, chunk_bytes)
+        first = next(chunks, None)
+        if first is None:
+            raise TypeError("No documents provided to save")
+        results = _empty_save_results()
+
+        def upload(chunk):
+            _offset, _count, body = chunk
+            headers = {}
+            if compress:
+                body = gzip.compress(body)
+                headers["Content-Encoding"] = "gzip"
+            return self._make_request(
+                method=_SAVE_METHOD,
+                url=str(self.api_url) + _SAVE_ENDPOINT,
+                data=body,
+                params=params,
+                raise_not_found=False,
+                headers=headers,
+            )
+
+        # Errors such as bad auth or an unknown collection would fail every chunk
+        _add_save_results(results, upload(first))
+        pending: set = set()
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            for chunk in chunks:
+                if len(pending) >= parallelism * 2:
+                    # Only serialize a few chunks ahead of the uploads
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    _collect_chunks(results, done)
+                future = executor.submit(upload, chunk)
+                future.chunk = chunk  # type: ignore
+                pending.add(future)
+            _collect_chunks(results, wait(pending).done)
+        results["failed_chunks"].sort(key=lambda c: c["offset"])
+        results["error"] = bool(results["errors"] or results["failed_chunks"])
+        return results
+
+    def _iter_query(self, req_body, params, batch_size, prefetch, idempotent=True):
+        """
+        Run the first request for a query, then return a generator over all of its
+        results. Errors in the first request are raised immediately.
+        """
+        if batch_size is not None:
+            if not isinstance(batch_size, int) or batch_size < 1:
+                raise TypeError("`batch_size` argument must be a positive int")
+            params["batch_size"] = batch_size
+        if not isinstance(prefetch, int) or prefetch < 1:
+            raise TypeError("`prefetch` argument must be a positive int")
+        first = self._make_request(
+            method=_QUERY_METHOD,
+            url=str(self.api_url) + _QUERY_ENDPOINT,
+            data=json.dumps(req_body),
             params=params,
             raise_not_found=False,
+            idempotent=idempotent,
         )
+        return self._iter_cursor(first, prefetch)
 
-    def _make_request(self, method, url, data, params, raise_not_found):
+    def _iter_cursor(self, first, prefetch):
+        """
+        Yield the results of a query response and all of its subsequent batches.
+        While the caller consumes one batch, a background thread fetches up to
+        `prefetch` batches ahead from the cursor.
+        """
+        if not first.get("has_more"):
+            yield from first["results"]
+            return
+        batches: queue.Queue = queue.Queue(maxsize=prefetch)
+        stop = threading.Event()
+
+        def put(item):
+            # Give up if the consumer has gone away
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def fetch_batches():
+            resp = first
+            try:
+                while resp.get("has_more") and not stop.is_set():
+                    # Fetching from a cursor moves it on, so these are never retried
+                    resp = self._make_request(
+                        method=_QUERY_METHOD,
+                        url=str(self.api_url) + _QUERY_ENDPOINT,
+                        data="",
+                        params={"cursor_id": resp["cursor_id"]},
+                        raise_not_found=False,
+                    )
+                    put(resp["results"])
+            except Exception as err:
+                put(err)
+            put(_CURSOR_DONE)
+
+        thread = threading.Thread(target=fetch_batches, daemon=True)
+        thread.start()
+        try:
+            yield from first["results"]
+            while True:
+                batch = batches.get()
+                if batch is _CURSOR_DONE:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+                yield from batch
+        finally:
+            stop.set()
+
+    def _make_request(
+        self, method, url, data, params, raise_not_found, idempotent=False, headers=None
+    ):
         """
         Internal utility to make a generic request to the RE API and handle the
         response.
+        Idempotent requests are retried on connection errors and 5xx responses,
+        and hedged if the client has `hedge_after` set.
         """
-        headers = {}
+        headers = dict(headers or {})
         if self.token:
             headers["Authorization"] = self.token
-        resp = requests.request(
-            method=method, url=url, data=data, params=params, headers=headers
-        )
+
+        def send():
+            return self._session.request(
+                method=method,
+                url=url,
+                data=data,
+                params=params,
+                headers=headers,
+                timeout=self.timeout,
+            )
+
+        if idempotent:
+            resp = self._send_with_retries(send)
+        else:
+            resp = send()
         if resp.status_code >= 500:
             # Server error
             raise REServerError(resp)
@@ -155,3 +419,133 @@ class REClient:
             # Results were required to be non-empty
             raise RENotFound(req_body=data, req_params=params)
         return resp_json
+
+    def _send_with_retries(self, send):
+        """
+        Call `send` until it returns a non-5xx response, retrying connection errors
+        and server errors up to `max_retries` times with jittered exponential backoff.
+        """
+        attempt = 0
+        while True:
+            try:
+                resp = self._send_hedged(send) if self.hedge_after else send()
+                if resp.status_code not in _RETRY_STATUSES:
+                    return resp
+                if attempt >= self.max_retries:
+                    return resp
+            except requests.exceptions.ConnectionError:
+                if attempt >= self.max_retries:
+                    raise
+            # "full jitter" backoff, so that many clients do not retry in lockstep
+            delay = random.uniform(0, self.backoff_factor * 2**attempt)  # nosec
+            time.sleep(delay)
+            attempt += 1
+
+    def _send_hedged(self, send):
+        """
+        Call `send`; if it has not returned after `hedge_after` seconds, call it
+        again in parallel and return whichever response arrives first. The cursor of
+        the response that is not used is deleted once it arrives.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._pool_size)
+        first = self._executor.submit(send)
+        try:
+            return first.result(timeout=self.hedge_after)
+        except FutureTimeoutError:
+            pass
+        second = self._executor.submit(send)
+        pending = {first, second}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = [f for f in done if f.exception() is None]
+            if succeeded:
+                for lost in succeeded[1:] + list(pending):
+                    lost.add_done_callback(self._delete_lost_cursor)
+                return succeeded[0].result()
+            if not pending:
+                # Both requests failed; raise the error
+                return done.pop().result()
+
+    def _delete_lost_cursor(self, future):
+        """Delete the cursor of a hedged query response that was not used."""
+        if future.exception() is not None:
+            return
+        resp = future.result()
+        try:
+            resp_json = resp.json() if resp.ok else {}
+        except ValueError:
+            return
+        if not resp_json.get("has_more") or not resp_json.get("cursor_id"):
+            return
+        try:
+            self._session.request(
+                method="DELETE",
+                url=str(self.api_url) + _QUERY_ENDPOINT,
+                params={"cursor_id": resp_json["cursor_id"]},
+                headers={"Authorization": self.token} if self.token else {},
+                timeout=self.timeout,
+            )
+        except requests.exceptions.RequestException:
+            # the cursor times out on the server anyway
+            pass
+
+
+def _chunk_docs(docs, chunk_bytes):
+    """
+    Serialize documents to JSON lines, yielding (offset, count, body) chunks of
+    at most `chunk_bytes`, where offset is the index of the first document.
+    """
+    lines: List[bytes] = []
+    size = 0
+    offset = 0
+    for idx, doc in enumerate(docs):
+        line = json.dumps(doc).encode()
+        if lines and size + len(line) + 1 > chunk_bytes:
+            yield offset, len(lines), b"\n".join(lines)
+            lines, size, offset = [], 0, idx
+        lines.append(line)
+        size += len(line) + 1
+    if lines:
+        yield offset, len(lines), b"\n".join(lines)
+
+
+_SAVE_COUNTS = ("created", "errors", "empty", "updated", "ignored")
+
+
+def _empty_save_results():
+    results: dict = {key: 0 for key in _SAVE_COUNTS}
+    results["error"] = False
+    results["failed_chunks"] = []
+    return results
+
+
+def _add_save_results(results, resp_json):
+    """Add the counts from one chunk's import response to the totals."""
+    for key in _SAVE_COUNTS:
+        results[key] += resp_json.get(key, 0)
+    if "details" in resp_json:
+        results.setdefault("details", []).extend(resp_json["details"])
+
+
+# Errors that fail one chunk of a save, rather than the whole save
+_CHUNK_ERRORS = (REServerError, RERequestError, requests.exceptions.RequestException)
+
+
+def _collect_chunks(results, futures, chunk_errors=_CHUNK_ERRORS):
+    """Add finished chunk uploads to the totals, noting any that failed."""
+    for future in futures:
+        offset, count, _ = future.chunk
+        try:
+            _add_save_results(results, future.result())
+        except chunk_errors as err:
+            resp = getattr(err, "resp", None)
+            if resp is not None:
+                # Rejected imports still report which documents were saved
+                try:
+                    _add_save_results(results, resp.json())
+                except ValueError:
+                    pass
+            results["failed_chunks"].append(
+                {"offset": offset, "count": count, "error": str(err)}
+            )
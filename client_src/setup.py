@@ -8,4 +8,5 @@ setup(
     url="https://github.com/kbase/relation_engine_api",
     packages=["relation_engine_client"],
     install_requires=["requests>=2"],
+    extras_require={"async": ["aiohttp>=3.8"]},
 )
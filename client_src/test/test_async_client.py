@@ -0,0 +1,215 @@
+"""
+Tests for the AsyncREClient, run against a small in-process stand-in for the RE API.
+"""
+import asyncio
+import json
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from relation_engine_client.async_client import AsyncREClient
+from relation_engine_client.exceptions import REServerError, RERequestError, RENotFound
+
+
+class _FakeAPI:
+    """Serves queued responses from /api/v1 and records the requests it receives."""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.delay = 0
+
+    async def handle(self, request):
+        body = await request.text()
+        self.requests.append(
+            {
+                "method": request.method,
+                "path": request.path,
+                "params": dict(request.query),
+                "body": body,
+                "headers": dict(request.headers),
+            }
+        )
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        status, resp_body = (
+            self.responses.pop(0) if self.responses else (200, {"results": []})
+        )
+        return web.json_response(resp_body, status=status)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_route("*", "/api/v1/{tail:.*}", self.handle)
+        return app
+
+
+def _batches(*batches):
+    """Responses for a query whose results come back in several batches."""
+    resps = []
+    for i, batch in enumerate(batches):
+        has_more = i < len(batches) - 1
+        resps.append((200, {"results": batch, "has_more": has_more, "cursor_id": "c1"}))
+    return resps
+
+
+class TestAsyncREClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.api = _FakeAPI()
+        self.server = TestServer(self.api.app())
+        await self.server.start_server()
+        self.client = AsyncREClient(
+            str(self.server.make_url("/")),
+            "admin_token",
+            max_retries=2,
+            # retry straight away
+            backoff_factor=0,
+        )
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.close()
+
+    async def test_stored_query(self):
+        self.api.responses = [(200, {"results": [{"_key": "1"}], "count": 1})]
+        result = await self.client.stored_query("fetch_test_vertex", {"key": "1"})
+        self.assertEqual(result["results"], [{"_key": "1"}])
+        req = self.api.requests[0]
+        self.assertEqual(req["method"], "POST")
+        self.assertEqual(req["path"], "/api/v1/query_results")
+        self.assertEqual(req["params"], {"stored_query": "fetch_test_vertex"})
+        self.assertEqual(json.loads(req["body"]), {"key": "1"})
+        self.assertEqual(req["headers"]["Authorization"], "admin_token")
+
+    async def test_admin_query(self):
+        await self.client.admin_query("RETURN @x", {"x": 1})
+        body = json.loads(self.api.requests[0]["body"])
+        self.assertEqual(body, {"x": 1, "query": "RETURN @x"})
+
+    async def test_save_docs(self):
+        self.api.responses = [(200, {"created": 2, "errors": 0})]
+        result = await self.client.save_docs(
+            "test_vertex", [{"_key": "1"}, {"_key": "2"}], on_duplicate="replace"
+        )
+        self.assertEqual(result["created"], 2)
+        req = self.api.requests[0]
+        self.assertEqual(req["method"], "PUT")
+        self.assertEqual(
+            req["params"], {"collection": "test_vertex", "on_duplicate": "replace"}
+        )
+        self.assertEqual(req["body"], '{"_key": "1"}\n{"_key": "2"}')
+
+    async def test_save_docs_chunks(self):
+        """documents are uploaded in size-limited chunks, as by REClient.save_docs"""
+        docs = ({"_key": str(i)} for i in range(5))
+        self.api.responses = [
+            (200, {"created": 2, "errors": 0}),
+            (503, {"created": 1, "errors": 1}),
+            (200, {"created": 1, "errors": 0}),
+        ]
+        result = await self.client.save_docs(
+            "test_vertex", docs, chunk_bytes=30, parallelism=1
+        )
+        bodies = [req["body"].split("\n") for req in self.api.requests]
+        self.assertEqual([len(body) for body in bodies], [2, 2, 1])
+        self.assertEqual(result["created"], 4)
+        self.assertEqual(result["failed_chunks"][0]["offset"], 2)
+        self.assertEqual(result["failed_chunks"][0]["count"], 2)
+        self.assertTrue(result["error"])
+
+    async def test_errors(self):
+        """the same exception types as the REClient are raised"""
+        self.api.responses = [(400, {"error": "bad"})]
+        with self.assertRaises(RERequestError) as ctx:
+            await self.client.stored_query("fetch_test_vertex", {})
+        self.assertEqual(ctx.exception.resp.status_code, 400)
+        self.assertIn("bad", str(ctx.exception))
+        with self.assertRaises(RENotFound):
+            await self.client.stored_query(
+                "fetch_test_vertex", {}, raise_not_found=True
+            )
+
+    async def test_retries(self):
+        """5xx responses to stored queries are retried, but admin queries and document
+        saves are not"""
+        self.api.responses = [(503, {}), (200, {"results": [1]})]
+        result = await self.client.stored_query("fetch_test_vertex", {})
+        self.assertEqual(result["results"], [1])
+        self.assertEqual(len(self.api.requests), 2)
+        self.api.responses = [(503, {}), (503, {}), (503, {})]
+        with self.assertRaises(REServerError):
+            await self.client.stored_query("fetch_test_vertex", {})
+        self.assertEqual(len(self.api.requests), 5)
+        self.api.responses = [(503, {})]
+        with self.assertRaises(REServerError):
+            await self.client.admin_query("RETURN 1", {})
+        self.assertEqual(len(self.api.requests), 6)
+        self.api.responses = [(503, {})]
+        with self.assertRaises(REServerError):
+            await self.client.save_docs("test_vertex", {"_key": "1"})
+        self.assertEqual(len(self.api.requests), 7)
+
+    async def test_concurrency_limit(self):
+        """no more than max_concurrency requests are in flight at once"""
+        client = AsyncREClient(str(self.server.make_url("/")), max_concurrency=3)
+        self.api.delay = 0.02
+        queries = [client.stored_query("fetch_test_vertex", {}) for _ in range(20)]
+        await asyncio.gather(*queries)
+        await client.close()
+        self.assertEqual(len(self.api.requests), 20)
+        self.assertEqual(self.api.max_in_flight, 3)
+
+    async def test_iter_stored_query(self):
+        """all results are yielded, following the cursor"""
+        self.api.responses = _batches([1, 2], [3, 4], [5])
+        results = self.client.iter_stored_query(
+            "list_test_vertices", {}, batch_size=2, prefetch=2
+        )
+        self.assertEqual([r async for r in results], [1, 2, 3, 4, 5])
+        params = [req["params"] for req in self.api.requests]
+        self.assertEqual(
+            params,
+            [
+                {"stored_query": "list_test_vertices", "batch_size": "2"},
+                {"cursor_id": "c1"},
+                {"cursor_id": "c1"},
+            ],
+        )
+
+    async def test_iter_admin_query_error(self):
+        """errors fetching later batches are raised in the consumer"""
+        self.api.responses = [
+            (200, {"results": [1], "has_more": True, "cursor_id": "c1"}),
+            (404, {"error": "cursor not found"}),
+        ]
+        results = []
+        with self.assertRaises(RERequestError):
+            async for result in self.client.iter_admin_query("FOR x IN 1..2", {}):
+                results.append(result)
+        self.assertEqual(results, [1])
+
+    async def test_iter_stop_early(self):
+        """breaking out of the loop stops fetching batches"""
+        self.api.responses = _batches([1], [2], [3], [4], [5], [6])
+        results = self.client.iter_stored_query("list_test_vertices", {})
+        async for result in results:
+            break
+        await results.aclose()
+        await asyncio.sleep(0)
+        self.assertLess(len(self.api.requests), 6)
+
+    async def test_invalid_args(self):
+        with self.assertRaises(TypeError):
+            await self.client.stored_query(1, {})
+        with self.assertRaises(TypeError):
+            await self.client.save_docs("test_vertex", [])
+        with self.assertRaises(TypeError):
+            self.client.iter_stored_query("list_test_vertices", {}, prefetch=0)
+        with self.assertRaises(TypeError):
+            AsyncREClient("http://re_api:5000", max_concurrency=0)
@@ -129,6 +129,19 @@ class TestREClientIntegration(unittest.TestCase):
         # Mostly make sure that the __str__ method does not throw any errs
         self.assertTrue("Request body:" in str(ctx.exception))
 
+    def test_iter_admin_query(self):
+        ids = [self._save_test_vert() for _ in range(5)]
+        query = f"FOR vert IN {_VERT_COLL} FILTER vert._key IN @ids RETURN vert._key"
+        results = self.client.iter_admin_query(query, {"ids": ids}, batch_size=2)
+        self.assertCountEqual(list(results), ids)
+
+    def test_iter_stored_query(self):
+        _id = self._save_test_vert()
+        results = self.client.iter_stored_query(
+            "fetch_test_vertex", {"key": _id}, batch_size=1, prefetch=2
+        )
+        self.assertEqual([r["_key"] for r in results], [_id])
+
     def test_save_docs_ok(self):
         _id = str(uuid4())
         docs = [{"_key": _id}]
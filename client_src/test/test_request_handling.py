@@ -0,0 +1,330 @@
+"""
+Tests for the retry, hedging and cursor behaviour of the REClient, using a mocked session.
+"""
+import gzip
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from relation_engine_client.main import REClient
+from relation_engine_client.exceptions import REServerError, RERequestError
+
+_API_URL = "http://re_api:5000"
+
+
+def _resp(status_code, json_body=None):
+    """Create a response object with the given status and JSON body."""
+    resp = mock.Mock(spec=requests.Response)
+    resp.status_code = status_code
+    resp.ok = status_code < 400
+    resp.json.return_value = json_body or {"results": [], "count": 0}
+    resp.text = str(json_body)
+    resp.url = _API_URL
+    return resp
+
+
+@mock.patch("relation_engine_client.main.time.sleep")
+class TestREClientRetries(unittest.TestCase):
+    def setUp(self):
+        self.client = REClient(_API_URL, max_retries=2)
+        self.request = mock.patch.object(self.client._session, "request").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_retry_server_error(self, sleep):
+        """5xx responses to queries are retried"""
+        ok = {"results": [{"_key": "1"}], "count": 1}
+        self.request.side_effect = [_resp(503), _resp(200, ok)]
+        result = self.client.stored_query("fetch_test_vertex", {"key": "1"})
+        self.assertEqual(result, ok)
+        self.assertEqual(self.request.call_count, 2)
+        self.assertEqual(sleep.call_count, 1)
+        # the backoff is jittered but bounded
+        self.assertLessEqual(sleep.call_args[0][0], self.client.backoff_factor)
+
+    def test_retry_connection_error(self, sleep):
+        """connection errors are retried until max_retries is reached"""
+        self.request.side_effect = requests.exceptions.ConnectionError("nope")
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.client.stored_query("fetch_test_vertex", {"key": "1"})
+        self.assertEqual(self.request.call_count, 3)
+
+    def test_no_retry_admin_query(self, sleep):
+        """ad-hoc admin queries may write, so they are never retried"""
+        self.request.return_value = _resp(503)
+        with self.assertRaises(REServerError):
+            self.client.admin_query("RETURN 1", {})
+        self.request.side_effect = requests.exceptions.ConnectionError("nope")
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            list(self.client.iter_admin_query("RETURN 1", {}))
+        self.assertEqual(self.request.call_count, 2)
+        sleep.assert_not_called()
+
+    def test_retries_exhausted(self, sleep):
+        """the last error response is raised once retries are exhausted"""
+        self.request.return_value = _resp(502)
+        with self.assertRaises(REServerError):
+            self.client.stored_query("fetch_test_vertex", {"key": "1"})
+        self.assertEqual(self.request.call_count, 3)
+
+    def test_no_retry_client_error(self, sleep):
+        """4xx responses are not retried"""
+        self.request.return_value = _resp(400)
+        with self.assertRaises(Exception):
+            self.client.stored_query("fetch_test_vertex", {})
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_no_retry_save_docs(self, sleep):
+        """document saves are not idempotent, so they are never retried"""
+        self.request.return_value = _resp(503)
+        with self.assertRaises(REServerError):
+            self.client.save_docs("test_vertex", [{"_key": "1"}])
+        self.assertEqual(self.request.call_count, 1)
+        sleep.assert_not_called()
+
+    def test_timeout_passed(self, sleep):
+        """requests are made with the configured timeouts"""
+        self.request.return_value = _resp(200)
+        self.client.stored_query("fetch_test_vertex", {"key": "1"})
+        self.assertEqual(self.request.call_args[1]["timeout"], (10, 1800))
+
+
+class TestREClientHedging(unittest.TestCase):
+    def test_hedged_request(self):
+        """a slow query is re-sent, and the fastest response wins"""
+        client = REClient(_API_URL, hedge_after=0.05)
+        release = threading.Event()
+        calls = []
+
+        def request(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                # the first request hangs until the test is over
+                release.wait(5)
+                return _resp(200, {"results": ["slow"], "count": 1})
+            return _resp(200, {"results": ["fast"], "count": 1})
+
+        with mock.patch.object(client._session, "request", side_effect=request):
+            start = time.time()
+            result = client.stored_query("fetch_test_vertex", {"key": "1"})
+            elapsed = time.time() - start
+        release.set()
+        client.close()
+        self.assertEqual(result["results"], ["fast"])
+        self.assertEqual(len(calls), 2)
+        self.assertLess(elapsed, 5)
+
+    def test_hedge_lost_cursor_deleted(self):
+        """the cursor of the hedged response that is not used is deleted"""
+        client = REClient(_API_URL, token="t", hedge_after=0.05)
+        release = threading.Event()
+        calls = []
+
+        def request(**kwargs):
+            calls.append(kwargs)
+            if kwargs["method"] == "POST" and len(calls) == 1:
+                release.wait(5)
+                body = {"results": ["slow"], "has_more": True, "cursor_id": "c1"}
+                return _resp(200, body)
+            return _resp(
+                200, {"results": ["fast"], "has_more": True, "cursor_id": "c2"}
+            )
+
+        with mock.patch.object(client._session, "request", side_effect=request):
+            result = client.stored_query("fetch_test_vertex", {"key": "1"})
+            self.assertEqual(result["cursor_id"], "c2")
+            release.set()
+            # wait for the slow request, and the deletion of its cursor
+            client._executor.shutdown(wait=True)
+        client.close()
+        deletes = [c for c in calls if c["method"] == "DELETE"]
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(deletes[0]["params"], {"cursor_id": "c1"})
+        self.assertEqual(deletes[0]["headers"], {"Authorization": "t"})
+
+    def test_admin_query_not_hedged(self):
+        client = REClient(_API_URL, hedge_after=0.01)
+        with mock.patch.object(
+            client._session,
+            "request",
+            side_effect=lambda **kw: time.sleep(0.05) or _resp(200),
+        ) as request:
+            client.admin_query("RETURN 1", {})
+        client.close()
+        self.assertEqual(request.call_count, 1)
+
+    def test_hedge_not_needed(self):
+        """fast queries are only sent once"""
+        client = REClient(_API_URL, hedge_after=1)
+        with mock.patch.object(
+            client._session, "request", return_value=_resp(200)
+        ) as request:
+            client.stored_query("fetch_test_vertex", {"key": "1"})
+        client.close()
+        self.assertEqual(request.call_count, 1)
+
+    def test_hedge_one_fails(self):
+        """if one of the hedged requests fails, the other one is used"""
+        client = REClient(_API_URL, hedge_after=0.01, max_retries=0)
+        calls = []
+
+        def request(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                time.sleep(0.05)
+                raise requests.exceptions.ConnectionError("nope")
+            time.sleep(0.1)
+            return _resp(200, {"results": ["ok"], "count": 1})
+
+        with mock.patch.object(client._session, "request", side_effect=request):
+            result = client.stored_query("fetch_test_vertex", {"key": "1"})
+        client.close()
+        self.assertEqual(result["results"], ["ok"])
+
+
+class TestREClientCursorIterator(unittest.TestCase):
+    def setUp(self):
+        self.client = REClient(_API_URL, max_retries=0)
+        self.request = mock.patch.object(self.client._session, "request").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _batches(self, *batches):
+        """Responses for a query whose results come back in several batches."""
+        resps = []
+        for i, batch in enumerate(batches):
+            has_more = i < len(batches) - 1
+            body = {"results": batch, "has_more": has_more, "cursor_id": "c1"}
+            resps.append(_resp(200, body))
+        return resps
+
+    def test_iter_stored_query(self):
+        """all results are yielded, following the cursor"""
+        self.request.side_effect = self._batches([1, 2], [3, 4], [5])
+        results = list(
+            self.client.iter_stored_query("list_test_vertices", {}, batch_size=2)
+        )
+        self.assertEqual(results, [1, 2, 3, 4, 5])
+        calls = self.request.call_args_list
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(
+            calls[0][1]["params"],
+            {"stored_query": "list_test_vertices", "batch_size": 2},
+        )
+        self.assertEqual(calls[1][1]["params"], {"cursor_id": "c1"})
+
+    def test_iter_admin_query_single_batch(self):
+        """no cursor requests are made if there is only one batch"""
+        self.request.side_effect = self._batches([1, 2])
+        results = list(self.client.iter_admin_query("FOR x IN 1..2 RETURN x", {}))
+        self.assertEqual(results, [1, 2])
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_prefetch_bounded(self):
+        """the background thread fetches at most `prefetch` batches ahead"""
+        self.request.side_effect = self._batches([1], [2], [3], [4], [5], [6])
+        results = self.client.iter_stored_query("list_test_vertices", {}, prefetch=2)
+        self.assertEqual(next(results), 1)
+        time.sleep(0.3)
+        # first request, plus two prefetched batches, plus one waiting to be queued
+        self.assertLessEqual(self.request.call_count, 4)
+        self.assertEqual(list(results), [2, 3, 4, 5, 6])
+
+    def test_cursor_error(self):
+        """errors fetching later batches are raised in the consumer"""
+        resps = self._batches([1], [2]) + [_resp(503)]
+        resps[1].json.return_value["has_more"] = True
+        self.request.side_effect = resps
+        results = self.client.iter_stored_query("list_test_vertices", {})
+        self.assertEqual(next(results), 1)
+        self.assertEqual(next(results), 2)
+        with self.assertRaises(REServerError):
+            next(results)
+
+    def test_first_request_error(self):
+        """errors in the initial query are raised straight away"""
+        self.request.return_value = _resp(400)
+        with self.assertRaises(Exception):
+            self.client.iter_stored_query("list_test_vertices", {})
+
+    def test_invalid_args(self):
+        with self.assertRaises(TypeError):
+            self.client.iter_stored_query("list_test_vertices", {}, prefetch=0)
+        with self.assertRaises(TypeError):
+            self.client.iter_admin_query("RETURN 1", {}, batch_size="x")
+
+
+class TestREClientSaveDocs(unittest.TestCase):
+    def setUp(self):
+        self.client = REClient(_API_URL, "admin_token")
+        self.request = mock.patch.object(self.client._session, "request").start()
+        self.addCleanup(mock.patch.stopall)
+        self.lock = threading.Lock()
+        self.bodies = []
+
+    def _save(self, **kwargs):
+        """Record the documents in each request, and respond with an import result."""
+        data = kwargs["data"]
+        if kwargs["headers"].get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        docs = [json.loads(line) for line in data.split(b"\n")]
+        with self.lock:
+            self.bodies.append(docs)
+        if any(doc.get("bad") for doc in docs):
+            return _resp(400, {"error": True, "created": 0, "errors": len(docs)})
+        return _resp(200, {"error": False, "created": len(docs), "errors": 0})
+
+    def test_chunked_generator(self):
+        """documents from a generator are uploaded in size-bounded chunks"""
+        self.request.side_effect = self._save
+        docs = ({"_key": str(i), "value": "x" * 50} for i in range(100))
+        result = self.client.save_docs(
+            "test_vertex", docs, chunk_bytes=1000, parallelism=3
+        )
+        self.assertEqual(result["created"], 100)
+        self.assertEqual(result["failed_chunks"], [])
+        self.assertFalse(result["error"])
+        self.assertGreater(len(self.bodies), 5)
+        keys = sorted(int(doc["_key"]) for body in self.bodies for doc in body)
+        self.assertEqual(keys, list(range(100)))
+        for call in self.request.call_args_list:
+            self.assertLessEqual(len(call[1]["data"]), 1000)
+
+    def test_compressed(self):
+        """chunks are gzipped when compress is set"""
+        self.request.side_effect = self._save
+        result = self.client.save_docs("test_vertex", [{"_key": "1"}], compress=True)
+        self.assertEqual(result["created"], 1)
+        headers = self.request.call_args[1]["headers"]
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(headers["Authorization"], "admin_token")
+
+    def test_failed_chunks(self):
+        """failures after the first chunk are reported with their offsets"""
+        self.request.side_effect = self._save
+        docs = [{"_key": str(i), "bad": i in (5, 12)} for i in range(20)]
+        # two documents per chunk
+        result = self.client.save_docs("test_vertex", docs, chunk_bytes=60)
+        offsets = [(c["offset"], c["count"]) for c in result["failed_chunks"]]
+        self.assertEqual(offsets, [(4, 2), (12, 2)])
+        self.assertEqual(result["created"], 16)
+        self.assertEqual(result["errors"], 4)
+        self.assertTrue(result["error"])
+
+    def test_first_chunk_raises(self):
+        """errors in the first chunk, like bad auth, are raised"""
+        self.request.side_effect = self._save
+        docs = [{"_key": str(i), "bad": i == 0} for i in range(20)]
+        with self.assertRaises(RERequestError):
+            self.client.save_docs("test_vertex", docs, chunk_bytes=60)
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_invalid_args(self):
+        with self.assertRaises(TypeError):
+            self.client.save_docs("test_vertex", iter([]))
+        with self.assertRaises(TypeError):
+            self.client.save_docs("test_vertex", "docs")
+        with self.assertRaises(TypeError):
+            self.client.save_docs("test_vertex", [{}], parallelism=0)
@@ -0,0 +1,113 @@
+"""
+Memory benchmark for the DJORNL parser node and edge indexes, using a synthetic network.
+
+Edges are stored in the parser's compact indexes and in plain dicts, as the parser used to
+store them, and the memory used by each is measured with tracemalloc.
+
+Sample usage:
+
+python -m importers.djornl.benchmark --nodes 100000 --edges 1000000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from importers.djornl.parser import DJORNL_Parser
+
+EDGE_TYPES = [
+    "domain-co-occurrence_AraNet_v2",
+    "pairwise-gene-coexpression_AraNet_v2",
+    "phenotype-association_AraGWAS",
+    "protein-protein-interaction_high-throughput_AraNet_v2",
+    "protein-protein-interaction_literature-curated_AraNet_v2",
+]
+
+
+def synthetic_edges(n_nodes, n_edges, seed=0):
+    """generate remapped edge data, as produced by the edge file remap functions"""
+    rand = random.Random(seed)
+    for _ in range(n_edges):
+        node1 = f"AT{rand.randrange(n_nodes):07d}"
+        node2 = f"AT{rand.randrange(n_nodes):07d}"
+        yield {
+            "node1": node1,
+            "node2": node2,
+            "_from": "djornl_node/" + node1,
+            "_to": "djornl_node/" + node2,
+            "score": round(rand.random() * 10, 3),
+            "edge_type": rand.choice(EDGE_TYPES),
+            "directed": rand.random() < 0.1,
+        }
+
+
+def store_compact(data):
+    """store edges in the parser's compact indexes"""
+    parser = DJORNL_Parser()
+    parser.edge_ix.node_name = "djornl_node"
+    for datum in data:
+        parser.store_parsed_edge_data(datum)
+    return (parser.node_ix, parser.edge_ix)
+
+
+def store_dicts(data):
+    """store edges in dicts keyed by strings, as the parser used to"""
+    node_ix = {}
+    edge_ix = {}
+    for datum in data:
+        nodes = [datum["node1"], datum["node2"]]
+        if not datum["directed"]:
+            nodes = sorted(nodes)
+        edge_key = "__".join(nodes + [datum["edge_type"], str(datum["directed"])])
+        if edge_key in edge_ix:
+            continue
+        datum["_key"] = "__".join(
+            str(datum[_]) for _ in ["node1", "node2", "edge_type", "directed", "score"]
+        )
+        for node_n in ["node1", "node2"]:
+            if datum[node_n] not in node_ix:
+                node_ix[datum[node_n]] = {"_key": datum[node_n]}
+            del datum[node_n]
+        edge_ix[edge_key] = datum
+    return (node_ix, edge_ix)
+
+
+def measure(store_fn, n_nodes, n_edges, seed=0):
+    """measure the memory held by the indexes built by store_fn"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    (node_ix, edge_ix) = store_fn(synthetic_edges(n_nodes, n_edges, seed))
+    elapsed = time.perf_counter() - start
+    (current, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "nodes": len(node_ix),
+        "edges": len(edge_ix),
+        "bytes": current,
+        "peak_bytes": peak,
+        "bytes_per_edge": round(current / max(len(edge_ix), 1), 1),
+        "seconds": round(elapsed, 3),
+    }
+
+
+def run_benchmark(n_nodes, n_edges, seed=0):
+    return {
+        "compact": measure(store_compact, n_nodes, n_edges, seed),
+        "dict": measure(store_dicts, n_nodes, n_edges, seed),
+    }
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description="Measure DJORNL parser index memory use"
+    )
+    argparser.add_argument("--nodes", type=int, default=100000)
+    argparser.add_argument("--edges", type=int, default=1000000)
+    argparser.add_argument("--seed", type=int, default=0)
+    args = argparser.parse_args()
+    print(json.dumps(run_benchmark(args.nodes, args.edges, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
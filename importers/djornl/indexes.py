@@ -0,0 +1,235 @@
+"""
+Memory-compact node and edge indexes for the DJORNL parser.
+
+Node IDs and edge types are interned, so each distinct string is stored once and edges refer
+to them by integer ID. Edges are stored as parallel arrays of (node1, node2, type, directed,
+score) and their documents are only built when they are read. Nodes that have no data other
+than their `_key` (most nodes that are only mentioned in edge files) are not stored as dicts.
+"""
+from array import array
+from collections.abc import MutableMapping, Sequence
+from itertools import chain
+
+# bits used for each part of a packed edge lookup key
+_NODE_BITS = 32
+_TYPE_BITS = 16
+
+
+class InternTable(object):
+    """Two-way mapping between strings and consecutive integer IDs, in insertion order"""
+
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+
+    def intern(self, name):
+        """get the ID for a string, adding it to the table if necessary"""
+        ix = self._ids.get(name)
+        if ix is None:
+            ix = len(self._names)
+            self._ids[name] = ix
+            self._names.append(name)
+        return ix
+
+    def get(self, name):
+        """get the ID for a string, or None if it is not in the table"""
+        return self._ids.get(name)
+
+    def name(self, ix):
+        return self._names[ix]
+
+    def __len__(self):
+        return len(self._names)
+
+
+class NodeIndex(MutableMapping):
+    """
+    dict-like index of node documents, keyed by node _key.
+
+    Nodes whose document is just {"_key": key} only take up a flag; reading one returns a new
+    dict, so changes to it must be saved by assigning it back to the index. Other nodes are
+    stored as dicts, and reading them returns the stored dict.
+
+    Nodes are iterated over in the order in which they were first added.
+    """
+
+    def __init__(self, node_ids=None):
+        self.node_ids = node_ids if node_ids is not None else InternTable()
+        # one byte per interned node ID: 1 if the node is in the index
+        self._present = bytearray()
+        # documents for nodes with more than a _key
+        self._docs = {}
+        self._len = 0
+
+    def __contains__(self, key):
+        ix = self.node_ids.get(key)
+        return ix is not None and ix < len(self._present) and self._present[ix] == 1
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        ix = self.node_ids.get(key)
+        if ix in self._docs:
+            return self._docs[ix]
+        return {"_key": key}
+
+    def __setitem__(self, key, doc):
+        ix = self.node_ids.intern(key)
+        if ix >= len(self._present):
+            self._present.extend(bytes(ix + 1 - len(self._present)))
+        if not self._present[ix]:
+            self._present[ix] = 1
+            self._len += 1
+        if doc == {"_key": key}:
+            self._docs.pop(ix, None)
+        else:
+            self._docs[ix] = doc
+
+    def add_key(self, key):
+        """add a node with no data, if it is not already in the index"""
+        if key not in self:
+            self[key] = {"_key": key}
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        ix = self.node_ids.get(key)
+        self._present[ix] = 0
+        self._docs.pop(ix, None)
+        self._len -= 1
+
+    def __iter__(self):
+        for ix, present in enumerate(self._present):
+            if present:
+                yield self.node_ids.name(ix)
+
+    def __len__(self):
+        return self._len
+
+
+class EdgeIndex(object):
+    """
+    Index of edges, unique on (node1, node2, edge type, directed). Undirected edges are
+    matched in either direction.
+
+    Edge documents have the form produced by the DJORNL edge file remap functions:
+    {"_key", "_from", "_to", "score", "edge_type", "directed"}; `node_name` is the name of the
+    node collection, used for `_from` and `_to`.
+    """
+
+    def __init__(self, node_ids=None, node_name=None):
+        self.node_ids = node_ids if node_ids is not None else InternTable()
+        self.node_name = node_name
+        self.edge_types = InternTable()
+        self.node1 = array("I")
+        self.node2 = array("I")
+        self.edge_type = array("H")
+        self.directed = array("b")
+        self.score = array("d")
+        # packed (node1, node2, edge_type, directed) -> row number
+        self._rows = {}
+
+    def _lookup_key(self, node1_ix, node2_ix, type_ix, directed):
+        if not directed and node2_ix < node1_ix:
+            node1_ix, node2_ix = node2_ix, node1_ix
+        key = (node1_ix << _NODE_BITS) | node2_ix
+        return (((key << _TYPE_BITS) | type_ix) << 1) | int(directed)
+
+    def add(self, node1, node2, edge_type, directed, score):
+        """
+        add an edge, unless there is a matching edge already
+
+        :return existing_score:         None if the edge was added; otherwise the score of the
+                                        matching edge
+        """
+        node1_ix = self.node_ids.intern(node1)
+        node2_ix = self.node_ids.intern(node2)
+        type_ix = self.edge_types.intern(edge_type)
+        if (
+            len(self.node_ids) > 2**_NODE_BITS
+            or len(self.edge_types) > 2**_TYPE_BITS
+        ):
+            raise OverflowError("too many distinct nodes or edge types for EdgeIndex")
+        lookup_key = self._lookup_key(node1_ix, node2_ix, type_ix, directed)
+        row = self._rows.get(lookup_key)
+        if row is not None:
+            return self.score[row]
+        self._rows[lookup_key] = len(self.score)
+        self.node1.append(node1_ix)
+        self.node2.append(node2_ix)
+        self.edge_type.append(type_ix)
+        self.directed.append(directed)
+        self.score.append(score)
+        return None
+
+    def doc(self, row):
+        """build the document for an edge"""
+        node1 = self.node_ids.name(self.node1[row])
+        node2 = self.node_ids.name(self.node2[row])
+        edge_type = self.edge_types.name(self.edge_type[row])
+        directed = bool(self.directed[row])
+        score = self.score[row]
+        return {
+            "_from": self.node_name + "/" + node1,
+            "_to": self.node_name + "/" + node2,
+            "score": score,
+            "edge_type": edge_type,
+            "directed": directed,
+            "_key": "__".join([node1, node2, edge_type, str(directed), str(score)]),
+        }
+
+    def values(self):
+        """a read-only sequence of the edge documents, built as they are accessed"""
+        return EdgeDocs(self)
+
+    def type_counts(self):
+        """number of edges of each type, in order of first appearance"""
+        counts = [0] * len(self.edge_types)
+        for type_ix in self.edge_type:
+            counts[type_ix] += 1
+        return {self.edge_types.name(ix): n for ix, n in enumerate(counts) if n}
+
+    def node_count(self):
+        """number of distinct nodes in the edges"""
+        return len(set(chain(self.node1, self.node2)))
+
+    def __len__(self):
+        return len(self.score)
+
+
+class EdgeDocs(Sequence):
+    """Sequence view of the documents in an EdgeIndex"""
+
+    def __init__(self, edge_ix):
+        self.edge_ix = edge_ix
+
+    def __len__(self):
+        return len(self.edge_ix)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self.edge_ix.doc(r) for r in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return self.edge_ix.doc(row)
+
+
+def ordered_union(*lists):
+    """
+    Merge lists, removing duplicates and preserving order. Hashable items are checked with a
+    set; unhashable ones (e.g. dicts) fall back to a list search.
+    """
+    merged = []
+    seen = set()
+    for item in chain(*lists):
+        try:
+            if item in seen:
+                continue
+            seen.add(item)
+        except TypeError:
+            if item in merged:
+                continue
+        merged.append(item)
+    return merged
@@ -16,77 +16,43 @@ RES_ROOT_DATA_PATH=/path/to/data/dir python -m importers.djornl.parser
 
 """
 import argparse
-import csv
 import json
 import os
-import requests
-import yaml
+from array import array
+from collections.abc import Sequence
+from itertools import islice
 
-import importers.utils.config as config
-from relation_engine_server.utils.json_validation import (
-    run_validator,
-    get_schema_validator,
-)
+from importers.utils.importer import Importer
+from importers.utils.uploader import Checkpoint
+from importers.utils import delta
+from importers.djornl.indexes import InternTable, NodeIndex, EdgeIndex, ordered_union
+from relation_engine_server.utils.json_validation import get_schema_validator
 
 
-class DJORNL_Parser(object):
+class DJORNL_Parser(Importer):
+
+    data_types = ["node", "edge", "cluster"]
+
     def __init__(self):
 
-        # dict of nodes, indexed by node ID (node1 and node2 from the file)
-        self.node_ix = {}
-        # dict of edges, indexed by node1__node2__edge_type
-        self.edge_ix = {}
+        # node and edge indexes share a table of interned node IDs
+        self.node_ids = InternTable()
+        # dict-like index of nodes, indexed by node ID (node1 and node2 from the file)
+        self.node_ix = NodeIndex(self.node_ids)
+        # index of edges, unique on node1, node2, edge_type and directed
+        self.edge_ix = EdgeIndex(self.node_ids)
+        # sets of the cluster IDs of each node, for merging cluster data
+        self._node_clusters = {}
 
         # the order in which to parse the different data files
         self.parse_order = ["edges", "nodes", "clusters"]
 
-    def config(self, value):
-        if not hasattr(self, "_config"):
-            self._configure()
-
-        if value not in self._config:
-            raise KeyError(f"No such config value: {value}")
-
-        return self._config[value]
-
-    def _configure(self):
-
-        configuration = config.load_from_env(extra_required=["ROOT_DATA_PATH"])
+    def _configure_dataset(self, configuration):
 
         # Collection name config
         configuration["node_name"] = "djornl_node"
         configuration["edge_name"] = "djornl_edge"
-
-        # fetch the manifest and make sure all the files listed actually exist
-        manifest = self._get_manifest(configuration)
-        for type in ["node", "edge", "cluster"]:
-            configuration[type + "_files"] = []
-
-        error_list = []
-        for file in manifest["file_list"]:
-            file_path = os.path.join(configuration["ROOT_DATA_PATH"], file["path"])
-
-            if not os.path.exists(file_path):
-                error_list.append(f"{file_path}: file does not exist")
-                continue
-
-            if not os.path.isfile(file_path):
-                error_list.append(f"{file_path}: not a file")
-                continue
-
-            # add the file to the appropriate list
-            file["file_path"] = file_path
-            configuration[file["data_type"] + "_files"].append(file)
-
-        if error_list:
-            raise RuntimeError("\n".join(error_list))
-
-        self._config = configuration
-        return self._config
-
-    def _get_manifest_schema_file(self):
-
-        return os.path.join(self._get_dataset_schema_dir(), "manifest.schema.json")
+        self.edge_ix.node_name = configuration["node_name"]
 
     def _get_dataset_schema_dir(self):
 
@@ -98,244 +64,6 @@ class DJORNL_Parser(object):
 
         return self._dataset_schema_dir
 
-    def _get_manifest(self, configuration):
-        """
-        Read the manifest file, which contains path and file type info, and validate it.
-        The manifest is expected to be at ROOT_DATA_PATH/manifest.yaml
-        """
-
-        schema_file = self._get_manifest_schema_file()
-
-        # load the manifest and validate it against the schema
-        manifest_file = os.path.join(configuration["ROOT_DATA_PATH"], "manifest.yaml")
-
-        try:
-            with open(manifest_file) as fd:
-                manifest = yaml.safe_load(fd)
-        except FileNotFoundError:
-            raise RuntimeError(
-                f"No manifest file found at {manifest_file}.\n"
-                "Please ensure that you have created a manifest that lists the files "
-                "in the release"
-            )
-
-        try:
-            validated_manifest = run_validator(schema_file=schema_file, data=manifest)
-        except Exception as err:
-            print(err)
-            raise RuntimeError(
-                "The manifest file failed validation. Please recheck the file and try again."
-            )
-
-        return validated_manifest
-
-    def _get_file_reader(self, fd, file):
-        """Given a dict containing file information, instantiate the correct type of parser"""
-
-        delimiter = "\t"
-        if file.get("file_format", "").lower() == "csv" or file[
-            "path"
-        ].lower().endswith(".csv"):
-            delimiter = ","
-        return csv.reader(fd, delimiter=delimiter)
-
-    def parser_gen(self, file):
-        """generator function to parse a file"""
-        expected_col_count = 0
-        with open(file["file_path"], newline="") as fd:
-            csv_reader = self._get_file_reader(fd, file)
-            line_no = 0
-            for row in csv_reader:
-                line_no += 1
-                if not len(row) or len(row[0]) and row[0][0] == "#":
-                    # comment / metadata
-                    continue
-
-                cols = [c.strip() for c in row]
-
-                if len(cols) == expected_col_count:
-                    yield (line_no, cols, None)
-                    continue
-
-                # if we didn't get the expected number of cols:
-                if expected_col_count == 0:
-                    # this is the header row; set up the expected column count
-                    expected_col_count = len(cols)
-                    yield (line_no, [c.lower() for c in cols], None)
-                    continue
-
-                # otherwise, this row does not have the correct number of columns
-                col_count = len(cols)
-                msg = f"expected {expected_col_count} cols, found {col_count}"
-                yield (line_no, None, f"{file['path']} line {line_no}: {msg}")
-
-    def check_headers(self, headers, validator=None):
-        """
-        Ensure that the file headers contain required columns for the data type. Checks the schema
-        in the validator to ensure that all required fields are present in the headers.
-
-        :param headers: (list)          list containing headers
-
-        :param validator: (obj)         validator object, with the appropriate schema loaded
-
-        :return header_errs: (dict)     dict of header errors:
-                                        'missing': required headers that are missing from the input
-                                        'invalid': headers that should not be in the input
-                                        'duplicate': duplicated headers (data would be overwritten)
-                                        If the list of headers supplied is valid--i.e. it
-                                        contains all the fields marked as required in the validator
-                                        schema--or no validator has been supplied, the method
-                                        returns an empty dict
-        """
-
-        if validator is None:
-            return {}
-
-        header_errs = {}
-
-        all_headers = {}
-        # ensure we don't have any duplicate headers
-        for h in headers:
-            if h in all_headers:
-                all_headers[h] += 1
-            else:
-                all_headers[h] = 1
-
-        duplicate_headers = [h for h in all_headers.keys() if all_headers[h] != 1]
-        if duplicate_headers:
-            header_errs["duplicate"] = duplicate_headers
-
-        # check that each required header in the schema is present in headers
-        required_props = validator.schema["required"]
-        missing_headers = [i for i in required_props if i not in headers]
-        if missing_headers:
-            header_errs["missing"] = missing_headers
-
-        if not validator.schema.get("additionalProperties", True):
-            all_props = validator.schema["properties"].keys()
-            extra_headers = [i for i in headers if i not in all_props]
-            if extra_headers:
-                header_errs["invalid"] = extra_headers
-
-        return header_errs
-
-    def remap_object(self, raw_data, remap_functions):
-        """
-        Given a dict, raw_data, create a new dict, remapped_data, using the functions in the
-        dictionary `remap_functions`.
-
-        :param raw_data: (dict)         input data for remapping
-
-        :param remap_fn: (dict)         mapping of output param names to functions
-
-                                        Each function should take the raw_data object as an
-                                        argument and return the value for the output parameter.
-                                        For parameters that can be copied over to the output
-                                        object without modification, set the value to `None`
-                                        instead of a function.
-
-        :return remapped_data: (dict)   the remapped data!
-        """
-        remapped_data = {}
-        for (key, function) in remap_functions.items():
-            # these keys get copied over unchanged to the new object if they exist in the input obj
-            if function is None:
-                if key in raw_data:
-                    remapped_data[key] = raw_data[key]
-            else:
-                remapped_data[key] = function(raw_data)
-
-        return remapped_data
-
-    def process_file(self, file, remap_fn, store_fn, err_list, validator=None):
-        """process an input file to generate a dataset and possibly an error list
-
-        Each valid line in the file is turned into a dictionary using the header row, and then
-        validated against the csv validation schema in spec/datasets/djornl/csv_<file_type>.
-        If that completes successfully, it is transformed using the functions in the dictionary
-        `remap_fn`, checked for uniqueness against existing data, and saved to a dictionary. Once
-        all files of a certain type have been processed, results can be saved to Arango.
-
-        Any errors that occur during parsing and processing are accumulated in `err_list`.
-
-        :param file: (dict)             file data
-        :param remap_fn: (dict)         mapping of output param names to functions
-                                        each function should take the row data object as input and
-                                        return the value for the output parameter
-
-        :param store_fn: (func)         function to store the results of the remapping
-
-        :param err_list: (list)         error list
-
-        :param validator: (Validator)   jsonschema validator object
-
-        """
-        print("Parsing " + file["data_type"] + " file " + file["file_path"])
-        file_parser = self.parser_gen(file)
-
-        def add_error(error):
-            err_list.append(error)
-
-        try:
-            (line_no, cols, err_str) = next(file_parser)
-        except StopIteration:
-            # no valid lines found in the file
-            add_error(f"{file['path']}: no header line found")
-            return
-
-        header_errors = self.check_headers(cols, validator)
-        if header_errors.keys():
-            err_str = {
-                "duplicate": "duplicate",
-                "missing": "missing required",
-                "invalid": "invalid additional",
-            }
-            for err_type in ["missing", "invalid", "duplicate"]:
-                if err_type in header_errors:
-                    add_error(
-                        f"{file['path']}: {err_str[err_type]} headers: "
-                        + ", ".join(sorted(header_errors[err_type]))
-                    )
-            return
-
-        headers = cols
-        n_stored = 0
-        for (line_no, cols, err_str) in file_parser:
-            # mismatch in number of cols
-            if cols is None:
-                add_error(err_str)
-                continue
-
-            # merge headers with cols to create an object
-            row_object = dict(zip(headers, cols))
-
-            if validator is not None:
-                # validate the object
-                if not validator.is_valid(row_object):
-                    for e in sorted(validator.iter_errors(row_object), key=str):
-                        add_error(f"{file['path']} line {line_no}: " + e.message)
-                    continue
-
-            try:
-                # transform it using the remap_functions
-                datum = self.remap_object(row_object, remap_fn)
-            except Exception as err:
-                err_type = type(err)
-                add_error(
-                    f"{file['path']} line {line_no}: error remapping data: {err_type} {err}"
-                )
-                continue
-
-            # and store it
-            storage_error = store_fn(datum)
-            if storage_error is None:
-                n_stored += 1
-            else:
-                add_error(f"{file['path']} line {line_no}: " + storage_error)
-
-        if not n_stored:
-            add_error(f"{file['path']}: no valid data found")
-
     def store_parsed_edge_data(self, datum):
         """
         store node and edge data in the node (node_ix) and edge (edge_ix) indexes respectively
@@ -347,65 +75,43 @@ class DJORNL_Parser(object):
         combination of node IDs and edge type, the datum is erroneous.
         """
 
-        # there should only be one value for each node<->node edge of a given type,
-        # so use these values as an index key
+        # there should only be one value for each node<->node edge of a given type
+        # the index builds the edge document, with a unique key for the DB, when it is read
+        existing_score = self.edge_ix.add(
+            datum["node1"],
+            datum["node2"],
+            datum["edge_type"],
+            datum["directed"],
+            datum["score"],
+        )
+        if existing_score is None:
+            # keep track of the nodes mentioned in this edge set
+            for node_n in ["1", "2"]:
+                self.node_ix.add_key(datum[f"node{node_n}"])
+            return None
+
+        # duplicate lines can be ignored
+        if datum["score"] == existing_score:
+            return None
+        # report non-matching data
         if datum["directed"]:
-            property_array = [
-                datum["node1"],
-                datum["node2"],
-                datum["edge_type"],
-                str(datum["directed"]),
-            ]
+            property_array = [datum["node1"], datum["node2"]]
         else:
-            # sort undirected nodes to ensure no dupes slip through
-            property_array = [
-                *sorted([datum["node1"], datum["node2"]]),
-                datum["edge_type"],
-                str(datum["directed"]),
-            ]
-
-        edge_key = "__".join(property_array)
-
-        if edge_key in self.edge_ix:
-            # duplicate lines can be ignored
-            if datum["score"] == self.edge_ix[edge_key]["score"]:
-                return None
-            # report non-matching data
-            return f"duplicate data for edge {edge_key}"
-
-        # create a unique key for the DB for this record
-        datum["_key"] = "__".join(
-            [
-                str(datum[_])
-                for _ in ["node1", "node2", "edge_type", "directed", "score"]
-            ]
+            # undirected edges match in either direction
+            property_array = sorted([datum["node1"], datum["node2"]])
+        edge_key = "__".join(
+            property_array + [datum["edge_type"], str(datum["directed"])]
         )
+        return f"duplicate data for edge {edge_key}"
 
-        # keep track of the nodes mentioned in this edge set
-        for node_n in ["1", "2"]:
-            _node_key = datum[f"node{node_n}"]
-            if _node_key not in self.node_ix:
-                self.node_ix[_node_key] = {"_key": _node_key}
-            del datum[f"node{node_n}"]
-
-        self.edge_ix[edge_key] = datum
-        return None
-
-    def load_edges(self):
-        """Load edge data from the set of edge files"""
-
-        # error accumulator
-        err_list = []
-
-        schema_file = os.path.join(self._get_dataset_schema_dir(), "csv_edge.yaml")
-        validator = get_schema_validator(schema_file=schema_file)
-
+    def edge_remap_functions(self):
+        """functions to remap the columns of an edge file"""
         node_name = self.config("node_name")
         # these functions remap the values in the columns of the input file to
         # appropriate values to go into Arango
         # note that the functions that assume the presence of a certain key in the input
         # can do so because that key is in a 'required' property in the CSV spec file
-        remap_functions = {
+        return {
             "node1": None,  # this will be deleted in the 'store' step
             "node2": None,  # as will this
             "_from": lambda row: node_name + "/" + row["node1"],
@@ -415,14 +121,27 @@ class DJORNL_Parser(object):
             "directed": lambda row: True if row.get("directed", "") == "1" else False,
         }
 
-        for file in self.config("edge_files"):
-            self.process_file(
-                file=file,
-                remap_fn=remap_functions,
-                store_fn=self.store_parsed_edge_data,
-                err_list=err_list,
-                validator=validator,
-            )
+    def edge_column_remap_functions(self):
+        """functions to remap the columns of an edge file, a whole column at a time"""
+        prefix = self.config("node_name") + "/"
+        # the schema default fills in the `directed` column if the file does not have one
+        return {
+            "node1": None,
+            "node2": None,
+            "_from": lambda cols: [prefix + n for n in cols["node1"]],
+            "_to": lambda cols: [prefix + n for n in cols["node2"]],
+            "score": lambda cols: array("d", map(float, cols["score"])),
+            "edge_type": None,
+            "directed": lambda cols: [d == "1" for d in cols["directed"]],
+        }
+
+    def load_edges(self):
+        """Load edge data from the set of edge files"""
+
+        # error accumulator
+        err_list = []
+
+        self.process_files("edges", self.store_parsed_edge_data, err_list)
 
         return {
             "nodes": self.node_ix.values(),
@@ -483,10 +202,7 @@ class DJORNL_Parser(object):
 
             if value_type == list:
                 # merge lists, preserving order. Data type agnostic.
-                merge[k] = []
-                for i in existing_node[k] + new_node[k]:
-                    if i not in merge[k]:
-                        merge[k].append(i)
+                merge[k] = ordered_union(existing_node[k], new_node[k])
                 continue
 
             elif value_type == dict:
@@ -531,26 +247,15 @@ class DJORNL_Parser(object):
 
         self.node_ix[node_ix] = datum
 
-    def load_nodes(self):
-        """Load node metadata"""
-
-        err_list = []
-
-        schema_file = os.path.join(
-            self._get_dataset_schema_dir(), "{file_format}_node.yaml"
-        )
-
-        def _get_node_validator(file_format):
-            return get_schema_validator(
-                schema_file=schema_file.format(file_format=file_format)
-            )
+    def node_remap_functions(self):
+        """functions to remap the columns of a node file"""
 
         def go_terms(row):
             if "go_terms" in row and len(row["go_terms"]):
                 return [c.strip() for c in row["go_terms"].split(",")]
             return []
 
-        remap_functions = {
+        return {
             # these pass straight through
             "gene_full_name": None,
             "gene_model_type": None,
@@ -576,14 +281,12 @@ class DJORNL_Parser(object):
             "go_terms": go_terms,
         }
 
-        for file in self.config("node_files"):
-            self.process_file(
-                file=file,
-                remap_fn=remap_functions,
-                store_fn=self.store_parsed_node_data,
-                err_list=err_list,
-                validator=_get_node_validator(file_format=file["file_format"]),
-            )
+    def load_nodes(self):
+        """Load node metadata"""
+
+        err_list = []
+
+        self.process_files("nodes", self.store_parsed_node_data, err_list)
 
         return {
             "nodes": self.node_ix.values(),
@@ -604,79 +307,161 @@ class DJORNL_Parser(object):
         cluster_id = datum["cluster_id"]
         # gather a list of cluster IDs for each node
         for node_id in datum["node_ids"]:
-            if node_id not in self.node_ix:
-                self.node_ix[node_id] = {"_key": node_id, "clusters": [cluster_id]}
-            elif "clusters" not in self.node_ix[node_id]:
-                self.node_ix[node_id]["clusters"] = [cluster_id]
-            elif cluster_id not in self.node_ix[node_id]["clusters"]:
-                self.node_ix[node_id]["clusters"].append(cluster_id)
+            node = self.node_ix.get(node_id)
+            if node is None:
+                node = {"_key": node_id}
+            if "clusters" not in node:
+                node["clusters"] = [cluster_id]
+                self._node_clusters[node_id] = {cluster_id}
+            else:
+                if node_id not in self._node_clusters:
+                    self._node_clusters[node_id] = set(node["clusters"])
+                if cluster_id in self._node_clusters[node_id]:
+                    continue
+                self._node_clusters[node_id].add(cluster_id)
+                node["clusters"].append(cluster_id)
+            self.node_ix[node_id] = node
         return None
 
-    def load_clusters(self):
-        """Annotate genes with cluster ID fields."""
-
-        err_list = []
-
-        schema_file = os.path.join(self._get_dataset_schema_dir(), "csv_cluster.yaml")
-        validator = get_schema_validator(schema_file=schema_file)
-
+    def cluster_remap_functions(self, file):
+        """functions to remap the columns of a cluster file"""
+        prefix = file["cluster_prefix"]
         # these functions remap the values in the columns of the input file to
         # appropriate values to go into Arango
-        # the 'cluster_id' remap function is assigned below on a per-file basis
-        remap_functions = {
-            "node_ids": lambda row: [n.strip() for n in row["node_ids"].split(",")]
+        return {
+            "node_ids": lambda row: [n.strip() for n in row["node_ids"].split(",")],
+            "cluster_id": lambda row: prefix
+            + ":"
+            + row["cluster_id"].replace("Cluster", ""),
         }
 
-        for file in self.config("cluster_files"):
-            prefix = file["cluster_prefix"]
-            remap_functions["cluster_id"] = (
-                lambda row: prefix + ":" + row["cluster_id"].replace("Cluster", "")
-            )
+    def load_clusters(self):
+        """Annotate genes with cluster ID fields."""
 
-            self.process_file(
-                file=file,
-                remap_fn=remap_functions,
-                store_fn=self.store_parsed_cluster_data,
-                err_list=err_list,
-                validator=validator,
-            )
+        err_list = []
+
+        self.process_files("clusters", self.store_parsed_cluster_data, err_list)
+        # the cluster ID sets are only needed while loading
+        self._node_clusters = {}
 
         return {
             "nodes": list(self.node_ix.values()),
             "err_list": err_list,
         }
 
-    def save_dataset(self, dataset=None):
+    def get_validator(self, data_type, file):
+        """get the (cached) validator for a file of the given data type"""
+        if data_type == "nodes":
+            schema_name = f"{file['file_format']}_node.yaml"
+        else:
+            schema_name = {"edges": "csv_edge.yaml", "clusters": "csv_cluster.yaml"}[
+                data_type
+            ]
+        if not hasattr(self, "_validators"):
+            self._validators = {}
+        if schema_name not in self._validators:
+            schema_file = os.path.join(self._get_dataset_schema_dir(), schema_name)
+            self._validators[schema_name] = get_schema_validator(
+                schema_file=schema_file
+            )
+        return self._validators[schema_name]
+
+    def get_remap_functions(self, data_type, file):
+        """get the remap functions for a file of the given data type"""
+        if data_type == "edges":
+            return self.edge_remap_functions()
+        if data_type == "nodes":
+            return self.node_remap_functions()
+        return self.cluster_remap_functions(file)
+
+    def get_column_remap_functions(self, data_type):
+        """get the column-wise remap functions for a data type, if there are any"""
+        if data_type == "edges":
+            return self.edge_column_remap_functions()
+        return None
+
+    def save_dataset(self, dataset=None, incremental=False):
+        """
+        Save the nodes and edges to the database, with a content hash in each document.
+
+        If `incremental` is true, only new and changed documents are saved, and documents that
+        are no longer in the dataset are removed; see importers.utils.delta.
+        """
 
         if dataset is None:
             dataset = {
                 "nodes": list(self.node_ix.values()),
-                "edges": list(self.edge_ix.values()),
+                # edge documents are built as they are uploaded
+                "edges": self.edge_ix.values(),
             }
 
-        if "nodes" in dataset and len(dataset["nodes"]) > 0:
-            self.save_docs(self.config("node_name"), dataset["nodes"])
+        if incremental:
+            self.save_dataset_changes(dataset)
+            return
 
-        if "edges" in dataset and len(dataset["edges"]) > 0:
-            self.save_docs(self.config("edge_name"), dataset["edges"])
+        # an interrupted load can be re-run with the same checkpoint file to resume
+        checkpoint = Checkpoint(self.config("CHECKPOINT_FILE"))
 
-    def save_docs(self, coll_name, docs, on_dupe="update"):
+        for (data_type, coll_name) in [
+            ("nodes", self.config("node_name")),
+            ("edges", self.config("edge_name")),
+        ]:
+            docs = dataset.get(data_type)
+            if docs is not None and len(docs) > 0:
+                if not isinstance(docs, Sequence):
+                    docs = list(docs)
+                self.save_docs(coll_name, delta.HashedDocs(docs), checkpoint=checkpoint)
 
-        resp = requests.put(
-            self.config("API_URL") + "/api/v1/documents",
-            params={"collection": coll_name, "on_duplicate": on_dupe},
-            headers={"Authorization": self.config("AUTH_TOKEN")},
-            data="\n".join(json.dumps(d) for d in docs),
-        )
-        if not resp.ok:
-            raise RuntimeError(resp.text)
+        checkpoint.remove()
+
+    def save_dataset_changes(self, dataset):
+        """
+        Save the documents in the dataset that are new or have changed since the last load,
+        then remove the documents that are not in the dataset. Edges are removed before nodes.
+        """
+        removed = {}
+        for (data_type, coll_name) in [
+            ("nodes", self.config("node_name")),
+            ("edges", self.config("edge_name")),
+        ]:
+            if data_type not in dataset:
+                continue
+            existing = delta.fetch_hashes(
+                self.config("API_URL"),
+                self.config("AUTH_TOKEN"),
+                coll_name,
+                batch_size=int(self.config("UPLOAD_CHUNK_SIZE")),
+            )
+            changed = delta.diff_docs(dataset[data_type], existing)
+            # enough changed docs per save to keep all the upload workers busy
+            chunk_size = int(self.config("UPLOAD_CHUNK_SIZE")) * int(
+                self.config("UPLOAD_WORKERS")
+            )
+            while True:
+                chunk = list(islice(changed, chunk_size))
+                if not chunk:
+                    break
+                # replace, so that fields removed from a document are removed in the DB too
+                self.save_docs(coll_name, chunk, on_dupe="replace")
+            removed[coll_name] = changed.removed
+            print(
+                f"{coll_name}: {changed.n_changed} new or changed, "
+                f"{changed.n_unchanged} unchanged, {len(changed.removed)} removed"
+            )
 
-        print(f"Saved docs to collection {coll_name}!")
-        print(resp.text)
-        print("=" * 80)
-        return resp
+        for coll_name in reversed(list(removed)):
+            if removed[coll_name]:
+                counts = delta.delete_docs(
+                    self.config("API_URL"),
+                    self.config("AUTH_TOKEN"),
+                    coll_name,
+                    removed[coll_name],
+                    chunk_size=int(self.config("UPLOAD_CHUNK_SIZE")),
+                )
+                print(f"Removed docs from collection {coll_name}!")
+                print(json.dumps(counts))
 
-    def load_data(self, dry_run=False):
+    def load_data(self, dry_run=False, incremental=False):
         all_errs = []
         method_ix = {
             "clusters": self.load_clusters,
@@ -690,7 +475,7 @@ class DJORNL_Parser(object):
 
         # if there are no errors then save the dataset unless this is a dry run
         if len(all_errs) == 0 and not dry_run:
-            self.save_dataset()
+            self.save_dataset(incremental=incremental)
 
         # report stats on the data that has been gathered
         return self.summarise_dataset(all_errs)
@@ -720,22 +505,12 @@ class DJORNL_Parser(object):
             else:
                 node_type_ix["__NO_TYPE__"] += 1
 
-        nodes_in_edge_ix = {}
-        edge_type_ix = {}
-        for edge in self.edge_ix.values():
-            nodes_in_edge_ix[edge["_from"]] = 1
-            nodes_in_edge_ix[edge["_to"]] = 1
-            if edge["edge_type"] in edge_type_ix:
-                edge_type_ix[edge["edge_type"]] += 1
-            else:
-                edge_type_ix[edge["edge_type"]] = 1
-
         return {
-            "nodes_total": len(self.node_ix.keys()),
-            "edges_total": len(self.edge_ix.keys()),
-            "nodes_in_edge": len(nodes_in_edge_ix.keys()),
+            "nodes_total": len(self.node_ix),
+            "edges_total": len(self.edge_ix),
+            "nodes_in_edge": self.edge_ix.node_count(),
             "node_type_count": node_type_ix,
-            "edge_type_count": edge_type_ix,
+            "edge_type_count": self.edge_ix.type_counts(),
             "node_data_available": {
                 "key_only": len(node_data["key_only"]),
                 "cluster": len(node_data["cluster"]),
@@ -820,6 +595,12 @@ def main():
         action="store_true",
         help="Perform all actions of the parser, except loading the data.",
     )
+    argparser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only save new and changed documents, and remove documents that are no "
+        "longer in the dataset.",
+    )
     argparser.add_argument(
         "--output",
         default="text",
@@ -829,7 +610,7 @@ def main():
     parser = DJORNL_Parser()
     summary = dict()
     try:
-        summary = parser.load_data(dry_run=args.dry)
+        summary = parser.load_data(dry_run=args.dry, incremental=args.incremental)
     except Exception as err:
         print("Unhandled exception", err)
         exit(1)
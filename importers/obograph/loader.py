@@ -0,0 +1,239 @@
+"""
+Loads an ontology in OBO Graph JSON format into the delta (time travelling) collections of
+an ontology, e.g. GO_terms, GO_edges and GO_merges. See importers/utils/delta_load.py for how
+the versions are computed.
+
+OBO Graph files can be generated from .obo or .owl files with ROBOT; see ONTOLOGY_LOAD.md.
+
+Sample usage:
+
+RES_API_URL=https://ci.kbase.us/services/relation_engine_api RES_AUTH_TOKEN=... \
+python -m importers.obograph.loader --file go.json --onto-id-prefix GO \
+    --load-namespace go_ontology --load-version 2021-01-01
+"""
+import argparse
+import json
+import time
+
+from importers.utils import config
+from importers.utils.delta_load import DeltaLoader, check_delta_collection
+
+_OBO_IN_OWL = "http://www.geneontology.org/formats/oboInOwl#"
+_NAMESPACE = _OBO_IN_OWL + "hasOBONamespace"
+_ALT_ID = _OBO_IN_OWL + "hasAlternativeId"
+_MERGE_TYPES = {
+    "http://purl.obolibrary.org/obo/IAO_0100001": "replaced_by",
+    _OBO_IN_OWL + "consider": "consider",
+}
+_TERM_TYPES = {"CLASS", "INDIVIDUAL"}
+
+
+def obo_id(uri):
+    """
+    Convert an OBO PURL to an OBO id, e.g.
+    http://purl.obolibrary.org/obo/GO_0022609 -> GO:0022609
+    Ids that are not URIs are returned as they are.
+    """
+    if "/" not in uri:
+        return uri
+    return _fragment(uri).replace("_", ":", 1)
+
+
+def _fragment(uri):
+    """the last part of a URI, e.g. http://purl.obolibrary.org/obo/go#goslim_yeast -> goslim_yeast"""
+    return uri.rstrip("/").rsplit("/", 1)[-1].rsplit("#", 1)[-1]
+
+
+def read_graph(path, graph_id=None):
+    """
+    Read a graph from an OBO Graph JSON file. `graph_id` is required if the file has more
+    than one graph.
+    """
+    with open(path) as fd:
+        graphs = json.load(fd)["graphs"]
+    if graph_id is not None:
+        graphs = [g for g in graphs if g.get("id") == graph_id]
+        if not graphs:
+            raise ValueError(f"{path}: graph {graph_id} not found")
+    if len(graphs) != 1:
+        raise ValueError(f"{path}: a graph id is required, found {len(graphs)} graphs")
+    return graphs[0]
+
+
+def _annotations(items, fields=("pred", "val", "xrefs")):
+    return [{k: item[k] for k in fields if k in item} for item in items]
+
+
+def term_doc(node):
+    """the term document for an OBO Graph node"""
+    meta = node.get("meta", {})
+    props = meta.get("basicPropertyValues", [])
+    namespaces = [p["val"] for p in props if p["pred"] == _NAMESPACE]
+    definition = meta.get("definition")
+    return {
+        "id": obo_id(node["id"]),
+        "type": node["type"],
+        "name": node.get("lbl"),
+        "namespace": namespaces[0] if namespaces else None,
+        "alt_ids": [p["val"] for p in props if p["pred"] == _ALT_ID],
+        "def": _annotations([definition])[0] if definition else None,
+        "comments": meta.get("comments", []),
+        "subsets": [_fragment(s) for s in meta.get("subsets", [])],
+        "synonyms": _annotations(meta.get("synonyms", [])),
+        "xrefs": _annotations(meta.get("xrefs", [])),
+    }
+
+
+def edge_doc(from_id, to_id, edge_type):
+    return {
+        "id": f"{from_id}::{to_id}::{edge_type}",
+        "type": edge_type,
+        "from": from_id,
+        "to": to_id,
+    }
+
+
+def parse_graph(graph, onto_id_prefix):
+    """
+    Parse an OBO Graph into term, edge and merge documents, each sorted by id. Only terms
+    with ids starting with `onto_id_prefix` are loaded.
+
+    Edge types are the labels of the edge properties, with spaces replaced by underscores,
+    e.g. "part_of"; merge edges are made from the `replaced_by` and `consider` annotations of
+    deprecated terms.
+
+    :return (terms, edges, merges): lists of documents
+    """
+    prefix = onto_id_prefix + ":"
+    terms = []
+    merges = []
+    edge_types = {"is_a": "is_a"}
+    for node in graph.get("nodes", []):
+        if node.get("type") == "PROPERTY" and node.get("lbl"):
+            edge_types[node["id"]] = node["lbl"].replace(" ", "_")
+        if node.get("type") not in _TERM_TYPES:
+            continue
+        if not obo_id(node["id"]).startswith(prefix):
+            continue
+        term = term_doc(node)
+        terms.append(term)
+        if node.get("meta", {}).get("deprecated"):
+            for prop in node["meta"].get("basicPropertyValues", []):
+                if prop["pred"] in _MERGE_TYPES:
+                    merges.append(
+                        edge_doc(
+                            term["id"], obo_id(prop["val"]), _MERGE_TYPES[prop["pred"]]
+                        )
+                    )
+    edges = [
+        edge_doc(
+            obo_id(edge["sub"]),
+            obo_id(edge["obj"]),
+            edge_types.get(edge["pred"], obo_id(edge["pred"])),
+        )
+        for edge in graph.get("edges", [])
+    ]
+    return (_sorted_unique(terms), _sorted_unique(edges), _sorted_unique(merges))
+
+
+def _sorted_unique(docs):
+    """sort documents by id, keeping the first of any with the same id"""
+    docs = sorted(docs, key=lambda d: d["id"])
+    return [d for (i, d) in enumerate(docs) if i == 0 or d["id"] != docs[i - 1]["id"]]
+
+
+def load_ontology(loader, terms, edges, merges, terms_coll, edges_coll, merges_coll):
+    """load parsed ontology documents as one versioned load"""
+
+    def load(loader):
+        key_map = loader.load_vertices(terms_coll, terms)
+        loader.load_edges(edges_coll, terms_coll, key_map, edges)
+        loader.load_edges(merges_coll, terms_coll, key_map, merges)
+        key_map.close()
+
+    return loader.run(load)
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description="Load an OBO Graph JSON ontology into delta collections"
+    )
+    argparser.add_argument("--file", required=True, help="OBO Graph JSON file")
+    argparser.add_argument(
+        "--onto-id-prefix", required=True, help="prefix of the term ids, e.g. GO"
+    )
+    argparser.add_argument(
+        "--load-namespace", required=True, help="name of the data set, e.g. go_ontology"
+    )
+    argparser.add_argument(
+        "--load-version",
+        required=True,
+        help="version of this load, e.g. a release date",
+    )
+    argparser.add_argument(
+        "--node-collection", help="term collection; defaults to {prefix}_terms"
+    )
+    argparser.add_argument(
+        "--edge-collection", help="edge collection; defaults to {prefix}_edges"
+    )
+    argparser.add_argument(
+        "--merge-edge-collection", help="merge collection; defaults to {prefix}_merges"
+    )
+    argparser.add_argument(
+        "--load-timestamp",
+        type=int,
+        help="load time in ms since the epoch; defaults to now",
+    )
+    argparser.add_argument(
+        "--release-timestamp",
+        type=int,
+        help="release time in ms since the epoch; defaults to the load time",
+    )
+    argparser.add_argument(
+        "--graph-id", help="id of the graph to load, if the file has more than one"
+    )
+    argparser.add_argument(
+        "--dry-run",
+        dest="dry",
+        action="store_true",
+        help="Parse the file and print the document counts, without loading anything.",
+    )
+    args = argparser.parse_args()
+
+    graph = read_graph(args.file, args.graph_id)
+    (terms, edges, merges) = parse_graph(graph, args.onto_id_prefix)
+    print(
+        f"Parsed {len(terms)} terms, {len(edges)} edges and {len(merges)} merges "
+        f"from {args.file}"
+    )
+    if args.dry:
+        return
+
+    conf = config.load_from_env()
+    timestamp = args.load_timestamp or int(time.time() * 1000)
+    loader = DeltaLoader(
+        conf["API_URL"],
+        conf["AUTH_TOKEN"],
+        args.load_namespace,
+        args.load_version,
+        timestamp,
+        args.release_timestamp or timestamp,
+        chunk_size=int(conf["UPLOAD_CHUNK_SIZE"]),
+        workers=int(conf["UPLOAD_WORKERS"]),
+        max_retries=int(conf["UPLOAD_RETRIES"]),
+    )
+    prefix = args.onto_id_prefix
+    terms_coll = args.node_collection or f"{prefix}_terms"
+    edges_coll = args.edge_collection or f"{prefix}_edges"
+    merges_coll = args.merge_edge_collection or f"{prefix}_merges"
+    check_delta_collection(conf["API_URL"], terms_coll, "vertex")
+    for coll_name in [edges_coll, merges_coll]:
+        check_delta_collection(conf["API_URL"], coll_name, "edge")
+    registry = load_ontology(
+        loader, terms, edges, merges, terms_coll, edges_coll, merges_coll
+    )
+    print(json.dumps(registry, indent=2))
+
+
+if __name__ == "__main__":
+    main()
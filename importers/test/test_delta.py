@@ -0,0 +1,107 @@
+"""
+Tests for incremental reloads, using a mocked session.
+"""
+import json
+import unittest
+from unittest import mock
+
+import requests
+
+from importers.utils import delta
+
+_API_URL = "http://re_api:5000"
+
+
+def _resp(status_code, json_body=None):
+    resp = mock.Mock(spec=requests.Response)
+    resp.status_code = status_code
+    resp.ok = status_code < 400
+    resp.json.return_value = json_body or {}
+    resp.text = json.dumps(json_body)
+    return resp
+
+
+class TestDelta(unittest.TestCase):
+    def test_content_hash(self):
+        """hashes depend on the content, not on key order or the fields the DB adds"""
+        doc = {"_key": "a", "score": 1.5, "tags": ["x", "y"]}
+        same = {"tags": ["x", "y"], "score": 1.5, "_key": "a", "updated_at": 1}
+        self.assertEqual(delta.content_hash(doc), delta.content_hash(same))
+        self.assertEqual(
+            delta.content_hash(doc), delta.content_hash(delta.with_hash(doc))
+        )
+        self.assertRegex(delta.content_hash(doc), "^[0-9a-f]{32}$")
+        for changed in [
+            {"_key": "a", "score": 2.0, "tags": ["x", "y"]},
+            {"_key": "a", "score": 1.5, "tags": ["y", "x"]},
+            {"_key": "a", "score": 1.5},
+        ]:
+            self.assertNotEqual(delta.content_hash(doc), delta.content_hash(changed))
+
+    def test_hashed_docs(self):
+        docs = delta.HashedDocs([{"_key": str(i)} for i in range(3)])
+        self.assertEqual(len(docs), 3)
+        self.assertEqual(docs[1]["content_hash"], delta.content_hash({"_key": "1"}))
+        self.assertEqual([d["_key"] for d in docs[1:]], ["1", "2"])
+
+    def test_diff_docs(self):
+        docs = [{"_key": "same"}, {"_key": "changed", "x": 2}, {"_key": "new"}]
+        existing = {
+            "same": delta.content_hash({"_key": "same"}),
+            "changed": delta.content_hash({"_key": "changed", "x": 1}),
+            "gone": delta.content_hash({"_key": "gone"}),
+            "no_hash": None,
+        }
+        diff = delta.diff_docs(iter(docs), existing)
+        # changed docs are yielded as the new docs are read
+        first = next(diff)
+        self.assertEqual(first["_key"], "changed")
+        self.assertEqual(first["content_hash"], delta.content_hash(docs[1]))
+        self.assertIsNone(diff.removed)
+        self.assertEqual([d["_key"] for d in diff], ["new"])
+        self.assertEqual(diff.removed, ["gone", "no_hash"])
+        self.assertEqual((diff.n_changed, diff.n_unchanged), (2, 1))
+        self.assertEqual(list(diff), [])
+
+    @mock.patch("importers.utils.delta.requests.Session.post")
+    def test_fetch_hashes(self, post):
+        """the query cursor is followed until all the batches have been read"""
+        post.side_effect = [
+            _resp(
+                200,
+                {
+                    "results": [["a", "1"], ["b", None]],
+                    "has_more": True,
+                    "cursor_id": "c",
+                },
+            ),
+            _resp(200, {"results": [["c", "3"]], "has_more": False}),
+        ]
+        hashes = delta.fetch_hashes(_API_URL, "token", "coll", batch_size=2)
+        self.assertEqual(hashes, {"a": "1", "b": None, "c": "3"})
+        (first, second) = post.call_args_list
+        self.assertEqual(
+            json.loads(first.kwargs["data"]),
+            {"query": delta._HASH_QUERY, "@coll": "coll"},
+        )
+        self.assertEqual(second.kwargs["params"], {"cursor_id": "c"})
+
+        post.side_effect = [_resp(403, {"error": "nope"})]
+        with self.assertRaisesRegex(RuntimeError, "nope"):
+            delta.fetch_hashes(_API_URL, "token", "coll")
+
+    @mock.patch("importers.utils.delta.requests.Session.delete")
+    def test_delete_docs(self, delete):
+        """keys are removed in chunks, and the counts are summed"""
+        delete.return_value = _resp(200, {"removed": 2, "not_found": 0, "errors": 0})
+        keys = [str(i) for i in range(5)]
+        counts = delta.delete_docs(_API_URL, "token", "coll", keys, chunk_size=2)
+        self.assertEqual(delete.call_count, 3)
+        self.assertEqual(counts, {"removed": 6, "not_found": 0, "errors": 0})
+        self.assertEqual(
+            [json.loads(c.kwargs["data"])["keys"] for c in delete.call_args_list],
+            [["0", "1"], ["2", "3"], ["4"]],
+        )
+        _, kwargs = delete.call_args
+        self.assertEqual(kwargs["params"], {"collection": "coll"})
+        self.assertEqual(kwargs["headers"], {"Authorization": "token"})
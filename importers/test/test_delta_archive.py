@@ -0,0 +1,106 @@
+"""
+Tests for archiving old versions of delta collections.
+"""
+import os
+import os.path as os_path
+import tempfile
+import unittest
+from unittest import mock
+
+from importers.utils.delta_archive import Archiver
+from spec import validate
+
+_SPEC_DIR = os_path.join(
+    os_path.dirname(os_path.dirname(os_path.dirname(os_path.abspath(__file__)))), "spec"
+)
+
+
+class TestDeltaArchive(unittest.TestCase):
+    def setUp(self):
+        self.archiver = Archiver("http://api", "token", "taxa", "child_of", 100)
+        self.saved = []
+        self.removed = []
+        for (name, side_effect) in [
+            ("upload_docs", self.upload),
+            ("delete_docs", self.delete),
+            ("time.sleep", None),
+            ("validate_archivable", None),
+        ]:
+            patcher = mock.patch(
+                "importers.utils.delta_archive." + name, side_effect=side_effect
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def upload(self, url, token, coll, docs, **kwargs):
+        self.saved.append((coll, docs, kwargs["on_dupe"]))
+
+    def delete(self, url, token, coll, keys):
+        self.removed.append((coll, keys))
+
+    @mock.patch("importers.utils.delta_archive.query_docs")
+    def test_run(self, query_docs):
+        """edges are moved, then relinked, then vertices are moved"""
+        results = {
+            "delta_archive_registry": [],
+            "child_of": [{"_key": "e1", "_from": "taxa_archive/t1"}],
+            "child_of_archive": [{"_key": "e0", "_from": "taxa_archive/t1"}],
+            "taxa": [{"_key": "t1"}, {"_key": "t2"}],
+        }
+
+        def query(url, token, query, bind_vars):
+            coll = bind_vars.get("@coll", bind_vars.get("@registry"))
+            if coll != "delta_archive_registry":
+                self.assertEqual(bind_vars["cutoff"], 100)
+            return iter(results[coll])
+
+        query_docs.side_effect = query
+        counts = self.archiver.run(wait=0)
+        self.assertEqual(
+            counts,
+            {"child_of": {"archived": 1, "relinked": 1}, "taxa": {"archived": 2}},
+        )
+        self.assertEqual(
+            [(coll, [d["_key"] for d in docs]) for (coll, docs, _) in self.saved],
+            [
+                ("delta_archive_registry", ["taxa", "child_of"]),
+                ("child_of_archive", ["e1"]),
+                ("child_of_archive", ["e0"]),
+                ("taxa_archive", ["t1", "t2"]),
+                ("delta_archive_registry", ["taxa", "child_of"]),
+            ],
+        )
+        self.assertEqual(self.saved[0][1][0]["cutoff"], 100)
+        self.assertEqual(self.saved[-1][1][0]["counts"], {"archived": 2})
+        self.assertEqual(self.removed, [("child_of", ["e1"]), ("taxa", ["t1", "t2"])])
+
+    @mock.patch("importers.utils.delta_archive.query_docs")
+    def test_cutoff_moves_forward(self, query_docs):
+        query_docs.return_value = iter([{"_key": "taxa", "cutoff": 200}])
+        with self.assertRaisesRegex(ValueError, "taxa is already archived up to 200"):
+            self.archiver.run(wait=0)
+        self.assertEqual(self.saved, [])
+
+    @mock.patch("importers.utils.delta_archive.query_docs")
+    def test_uncovered_queries(self, query_docs):
+        """collections read by time-travel queries without an archive block are refused"""
+        with tempfile.TemporaryDirectory() as spec_dir:
+            os.mkdir(os_path.join(spec_dir, "stored_queries"))
+            with open(os_path.join(spec_dir, "stored_queries", "q.yaml"), "w") as fd:
+                fd.write("name: get_taxa\n")
+                fd.write("query: FOR t IN taxa FILTER t.expired >= @ts RETURN t\n")
+            archiver = Archiver(
+                "http://api", "token", "taxa", None, 100, spec_dir=spec_dir
+            )
+            with mock.patch(
+                "importers.utils.delta_archive.validate_archivable",
+                validate.validate_archivable,
+            ):
+                with self.assertRaisesRegex(ValueError, "taxa: get_taxa"):
+                    archiver.run(wait=0)
+        query_docs.assert_not_called()
+        self.assertEqual(self.saved, [])
+
+    def test_spec_collections_archivable(self):
+        """the spec's time-travel queries all read the NCBI taxonomy archives"""
+        validate.validate_archivable(["ncbi_taxon", "ncbi_child_of_taxon"], _SPEC_DIR)
@@ -0,0 +1,198 @@
+"""
+Tests for versioned loads into delta collections.
+"""
+import unittest
+from unittest import mock
+
+from importers.utils.delta_load import (
+    MAX_ADB_INTEGER,
+    DeltaLoader,
+    KeyMap,
+    check_delta_collection,
+    external_sort,
+    link,
+    merge_sorted,
+)
+
+_MAX = MAX_ADB_INTEGER
+
+
+def current(id, version, **fields):
+    return dict(
+        fields,
+        id=id,
+        _key=f"{id}_{version}",
+        first_version=version,
+        last_version=version,
+        created=100,
+        expired=_MAX,
+        release_created=10,
+        release_expired=_MAX,
+    )
+
+
+class TestDeltaLoad(unittest.TestCase):
+    def setUp(self):
+        self.loader = DeltaLoader(
+            "http://api", "token", "test_ns", "v2", 200, 20, run_size=1
+        )
+
+    def test_merge_sorted(self):
+        new = [{"id": "a"}, {"id": "b"}, {"id": "d"}]
+        old = [{"id": "b", "old": 1}, {"id": "c"}]
+        self.assertEqual(
+            list(merge_sorted(new, old)),
+            [
+                ({"id": "a"}, None),
+                ({"id": "b"}, {"id": "b", "old": 1}),
+                (None, {"id": "c"}),
+                ({"id": "d"}, None),
+            ],
+        )
+
+    def test_merge_sorted_unsorted(self):
+        with self.assertRaisesRegex(ValueError, "new documents are not sorted"):
+            list(merge_sorted([{"id": "b"}, {"id": "a"}], []))
+        with self.assertRaisesRegex(ValueError, "current documents are not sorted"):
+            list(merge_sorted([], [{"id": "a"}, {"id": "a"}]))
+
+    def test_external_sort(self):
+        """documents are sorted in runs, which are merged"""
+        docs = [{"id": i % 7, "n": i} for i in range(20)]
+        expected = sorted(docs, key=lambda d: d["id"])
+        for run_size in [1, 3, 20, 100]:
+            with self.subTest(run_size=run_size):
+                result = external_sort(iter(docs), lambda d: d["id"], run_size)
+                self.assertEqual([d["id"] for d in result], [d["id"] for d in expected])
+        self.assertEqual(list(external_sort([], lambda d: d["id"], 2)), [])
+
+    def test_link(self):
+        key_map = KeyMap()
+        self.addCleanup(key_map.close)
+        for (id, key) in [("a", "a_v1"), ("c", "c_v2"), ("d", "d_v1")]:
+            key_map.add(id, key)
+        edges = [{"from": "a"}, {"from": "b"}, {"from": "c"}, {"from": "c"}]
+        counts = {"missing_vertex": 0}
+        linked = list(link(edges, key_map, "from", "_from", "v", counts))
+        self.assertEqual([d["_from"] for d in linked], ["v/a_v1", "v/c_v2", "v/c_v2"])
+        self.assertEqual(counts, {"missing_vertex": 1})
+
+    @mock.patch("importers.utils.delta_load.requests.get")
+    def test_check_delta_collection(self, get):
+        get.return_value.json.return_value = {
+            "name": "x",
+            "type": "edge",
+            "delta": True,
+        }
+        check_delta_collection("http://api", "x", "edge")
+        with self.assertRaisesRegex(RuntimeError, "x is not a vertex collection"):
+            check_delta_collection("http://api", "x", "vertex")
+        get.return_value.json.return_value = {"name": "x", "type": "edge"}
+        with self.assertRaisesRegex(RuntimeError, "x is not a delta collection"):
+            check_delta_collection("http://api", "x", "edge")
+
+    def test_diff(self):
+        """new, changed, unchanged and removed documents are versioned"""
+        new = [
+            {"id": "a", "name": "new"},
+            {"id": "b", "name": "same"},
+            {"id": "c", "name": "changed"},
+        ]
+        old = [
+            current("b", "v1", name="same"),
+            current("c", "v1", name="c"),
+            current("d", "v1", name="removed"),
+        ]
+        counts = {}
+        docs = list(self.loader.diff(new, old, counts))
+        self.assertEqual(counts, {"created": 2, "expired": 2, "unchanged": 1})
+        self.assertEqual(
+            [(d["_key"], d["last_version"], d["expired"]) for d in docs],
+            [
+                ("a_v2", "v2", _MAX),
+                ("b_v1", "v2", _MAX),
+                ("c_v1", "v1", 199),
+                ("c_v2", "v2", _MAX),
+                ("d_v1", "v1", 199),
+            ],
+        )
+        self.assertEqual(docs[0]["created"], 200)
+        self.assertEqual(docs[0]["release_created"], 20)
+        self.assertEqual(docs[2]["release_expired"], 19)
+        self.assertEqual(docs[3]["name"], "changed")
+
+    def test_diff_same_version(self):
+        """re-running a load replaces the versions it created"""
+        counts = {}
+        old = [current("a", "v2", name="a")]
+        docs = list(self.loader.diff([{"id": "a", "name": "b"}], old, counts))
+        self.assertEqual([(d["_key"], d["name"]) for d in docs], [("a_v2", "b")])
+        self.assertEqual(counts, {"created": 1, "expired": 0, "unchanged": 0})
+
+    @mock.patch("importers.utils.delta_load.upload_docs")
+    @mock.patch("importers.utils.delta_load.upload_stream")
+    @mock.patch("importers.utils.delta_load.fetch_current")
+    def test_run(self, fetch_current, upload_stream, upload_docs):
+        """
+        unsorted snapshots are loaded, and edges to vertices with new versions get new
+        versions too
+        """
+        existing = {
+            "terms": [current("t2", "v1", name="old"), current("t1", "v1")],
+            "edges": [
+                current("t1::t2::is_a", "v1", _from="terms/t1_v1", _to="terms/t2_v1"),
+            ],
+        }
+        fetch_current.side_effect = lambda url, token, coll: iter(existing[coll])
+        saved = {}
+        upload_stream.side_effect = (
+            lambda url, token, coll, docs, **kw: saved.setdefault(coll, list(docs))
+        )
+        registry = []
+        upload_docs.side_effect = lambda url, token, coll, docs, **kw: registry.append(
+            (coll, docs[0]["state"])
+        )
+
+        def load(loader):
+            key_map = loader.load_vertices(
+                "terms", [{"id": "t2", "name": "new"}, {"id": "t1"}]
+            )
+            self.assertEqual(dict(key_map), {"t1": "t1_v1", "t2": "t2_v2"})
+            edges = [
+                {"id": "t1::t9::is_a", "from": "t1", "to": "t9"},
+                {"id": "t1::t2::is_a", "from": "t1", "to": "t2"},
+            ]
+            loader.load_edges("edges", "terms", key_map, edges)
+
+        result = self.loader.run(load)
+        self.assertEqual(
+            [(d["_key"], d.get("_to"), d["expired"]) for d in saved["edges"]],
+            [
+                ("t1::t2::is_a_v1", "terms/t2_v1", 199),
+                ("t1::t2::is_a_v2", "terms/t2_v2", _MAX),
+            ],
+        )
+        self.assertEqual(
+            registry,
+            [
+                ("delta_load_registry", "in_progress"),
+                ("delta_load_registry", "complete"),
+            ],
+        )
+        self.assertEqual(result["_key"], "test_ns_v2")
+        self.assertEqual(
+            result["collections"]["edges"],
+            {"missing_vertex": 1, "created": 1, "expired": 1, "unchanged": 0},
+        )
+
+    @mock.patch("importers.utils.delta_load.upload_docs")
+    def test_run_failed(self, upload_docs):
+        states = []
+        upload_docs.side_effect = lambda *args, **kw: states.append(args[3][0]["state"])
+
+        def load(loader):
+            raise RuntimeError("oops")
+
+        with self.assertRaisesRegex(RuntimeError, "oops"):
+            self.loader.run(load)
+        self.assertEqual(states, ["in_progress", "failed"])
@@ -0,0 +1,96 @@
+"""
+Tests for the compact DJORNL parser indexes
+"""
+import unittest
+
+from importers.djornl.indexes import (
+    InternTable,
+    NodeIndex,
+    EdgeIndex,
+    ordered_union,
+)
+from importers.djornl.benchmark import run_benchmark
+
+
+class Test_DJORNL_Indexes(unittest.TestCase):
+    def test_intern_table(self):
+        table = InternTable()
+        self.assertEqual(table.intern("a"), 0)
+        self.assertEqual(table.intern("b"), 1)
+        self.assertEqual(table.intern("a"), 0)
+        self.assertEqual(table.get("b"), 1)
+        self.assertIsNone(table.get("c"))
+        self.assertEqual(table.name(1), "b")
+        self.assertEqual(len(table), 2)
+
+    def test_node_index(self):
+        """the node index behaves like a dict"""
+        node_ix = NodeIndex()
+        node_ix.add_key("b")
+        node_ix["a"] = {"_key": "a", "node_type": "gene"}
+        node_ix.add_key("a")
+        self.assertIn("a", node_ix)
+        self.assertNotIn("c", node_ix)
+        self.assertEqual(node_ix["b"], {"_key": "b"})
+        self.assertEqual(node_ix.get("c"), None)
+        self.assertEqual(list(node_ix.keys()), ["b", "a"])
+        self.assertEqual(
+            list(node_ix.values()), [{"_key": "b"}, {"_key": "a", "node_type": "gene"}]
+        )
+        self.assertEqual(len(node_ix), 2)
+
+        # key-only nodes must be assigned back to the index to update them
+        node = node_ix["b"]
+        node["clusters"] = ["x"]
+        self.assertEqual(node_ix["b"], {"_key": "b"})
+        node_ix["b"] = node
+        self.assertEqual(node_ix["b"], {"_key": "b", "clusters": ["x"]})
+
+        del node_ix["a"]
+        self.assertEqual(list(node_ix.keys()), ["b"])
+        with self.assertRaises(KeyError):
+            node_ix["a"]
+
+    def test_edge_index(self):
+        edge_ix = EdgeIndex(node_name="nodes")
+        self.assertIsNone(edge_ix.add("A", "B", "ppi", False, 1.5))
+        self.assertIsNone(edge_ix.add("A", "B", "ppi", True, 2.0))
+        self.assertIsNone(edge_ix.add("A", "B", "coexp", False, 0.5))
+        # undirected edges match in either direction; directed ones do not
+        self.assertEqual(edge_ix.add("B", "A", "ppi", False, 3.0), 1.5)
+        self.assertIsNone(edge_ix.add("B", "A", "ppi", True, 2.0))
+        self.assertEqual(len(edge_ix), 4)
+        self.assertEqual(
+            edge_ix.values()[0],
+            {
+                "_key": "A__B__ppi__False__1.5",
+                "_from": "nodes/A",
+                "_to": "nodes/B",
+                "score": 1.5,
+                "edge_type": "ppi",
+                "directed": False,
+            },
+        )
+        self.assertEqual(
+            [d["_key"] for d in edge_ix.values()[2:]],
+            ["A__B__coexp__False__0.5", "B__A__ppi__True__2.0"],
+        )
+        self.assertEqual(edge_ix.values()[-1]["_from"], "nodes/B")
+        with self.assertRaises(IndexError):
+            edge_ix.values()[4]
+        self.assertEqual(edge_ix.type_counts(), {"ppi": 3, "coexp": 1})
+        self.assertEqual(edge_ix.node_count(), 2)
+
+    def test_ordered_union(self):
+        self.assertEqual(ordered_union(["a", "b", "a"], ["c", "b"]), ["a", "b", "c"])
+        # unhashable items
+        self.assertEqual(
+            ordered_union([{"a": 1}, 1], [{"a": 1}, [2]]), [{"a": 1}, 1, [2]]
+        )
+
+    def test_benchmark(self):
+        """the memory benchmark runs, and the compact indexes use less memory"""
+        results = run_benchmark(n_nodes=100, n_edges=2000)
+        self.assertEqual(results["compact"]["edges"], results["dict"]["edges"])
+        self.assertEqual(results["compact"]["nodes"], results["dict"]["nodes"])
+        self.assertLess(results["compact"]["bytes"], results["dict"]["bytes"])
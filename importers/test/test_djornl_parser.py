@@ -9,8 +9,11 @@ These tests run within the re_api docker image.
 import json
 import unittest
 import os
+from unittest import mock
 
+from importers.utils.columnar import ColumnValidator
 from importers.djornl.parser import DJORNL_Parser
+from importers.utils.delta import content_hash
 from spec.test.helpers import modified_environ
 
 _TEST_DIR = "/app/spec/test"
@@ -335,6 +338,47 @@ class Test_DJORNL_Parser(unittest.TestCase):
             output,
         )
 
+    def test_save_dataset_incremental(self):
+        """only new and changed documents are saved, and missing ones are removed"""
+
+        RES_ROOT_DATA_PATH = os.path.join(_TEST_DIR, "djornl", "test_data")
+        parser = self.init_parser_with_path(RES_ROOT_DATA_PATH)
+        parser.load_data(dry_run=True)
+        nodes = list(parser.node_ix.values())
+        edges = list(parser.edge_ix.values())
+        # the DB has the first node unchanged, the second with different data, and a node
+        # that is no longer in the dataset; it has no edges
+        existing = {
+            "djornl_node": {
+                nodes[0]["_key"]: content_hash(nodes[0]),
+                nodes[1]["_key"]: content_hash({"_key": nodes[1]["_key"]}),
+                "old_node": content_hash({"_key": "old_node"}),
+            },
+            "djornl_edge": {},
+        }
+        with mock.patch(
+            "importers.utils.delta.fetch_hashes",
+            side_effect=lambda url, token, coll_name, **kw: existing[coll_name],
+        ), mock.patch(
+            "importers.utils.importer.upload_docs", return_value={}
+        ) as upload_docs, mock.patch(
+            "importers.utils.delta.delete_docs", return_value={}
+        ) as delete_docs:
+            parser.save_dataset(incremental=True)
+
+        (node_call, edge_call) = upload_docs.call_args_list
+        self.assertEqual(node_call.args[2], "djornl_node")
+        self.assertEqual(
+            [d["_key"] for d in node_call.args[3]], [n["_key"] for n in nodes[1:]]
+        )
+        self.assertEqual(node_call.kwargs["on_dupe"], "replace")
+        self.assertEqual(
+            [d["_key"] for d in edge_call.args[3]], [e["_key"] for e in edges]
+        )
+        self.assertEqual(edge_call.args[3][0]["content_hash"], content_hash(edges[0]))
+        delete_docs.assert_called_once()
+        self.assertEqual(delete_docs.call_args.args[2:4], ("djornl_node", ["old_node"]))
+
     def test_try_node_merge(self):
         """test node merging"""
 
@@ -470,3 +514,56 @@ class Test_DJORNL_Parser(unittest.TestCase):
             with self.subTest(desc=t["desc"]):
                 output = parser._try_node_merge(t["old"], t["new"])
                 self.assertEqual(output, t["out"])
+
+
+class Test_DJORNL_Parser_Parallel(Test_DJORNL_Parser):
+    """Run the parser tests with files parsed in a pool of worker processes"""
+
+    def init_parser_with_path(self, root_path):
+
+        with modified_environ(RES_PARSE_WORKERS="2"):
+            return super().init_parser_with_path(root_path)
+
+    def test_parse_workers(self):
+        """check that the parallel code path is in use"""
+        RES_ROOT_DATA_PATH = os.path.join(_TEST_DIR, "djornl", "test_data")
+        parser = self.init_parser_with_path(RES_ROOT_DATA_PATH)
+        self.assertEqual(parser.config("PARSE_WORKERS"), "2")
+
+
+class Test_DJORNL_Parser_Columnar(Test_DJORNL_Parser):
+    """Run the parser tests with files parsed in columnar mode"""
+
+    def init_parser_with_path(self, root_path):
+
+        # small blocks, so that the files are split over several blocks
+        with modified_environ(RES_COLUMNAR_BLOCK_SIZE="3"):
+            return super().init_parser_with_path(root_path)
+
+    def test_column_validator(self):
+        """column checks flag the rows that the schema validator rejects"""
+        RES_ROOT_DATA_PATH = os.path.join(_TEST_DIR, "djornl", "test_data")
+        parser = self.init_parser_with_path(RES_ROOT_DATA_PATH)
+        self.assertEqual(parser.config("COLUMNAR_BLOCK_SIZE"), "3")
+        validator = parser.get_validator("edges", {})
+        column_validator = ColumnValidator(validator)
+        # every edge file column can be checked column-wise
+        self.assertNotIn(None, column_validator.checks.values())
+        self.assertEqual(column_validator.defaults_for(["node1"]), {"directed": "0"})
+
+        headers = ["node1", "node2", "score", "edge_type", "directed"]
+        rows = [
+            ["AT1G01010", "AT1G01020", "2.5", "phenotype-association_AraGWAS", "1"],
+            ["A", "AT1G01020", "2.5", "phenotype-association_AraGWAS", "0"],
+            ["AT1G01010", "AT1G01020", "-2", "phenotype-association_AraGWAS", "0"],
+            ["AT1G01010", "AT1G01020", "2", "not_an_edge_type", "0"],
+            ["AT1G01010", "AT1G01020", "2", "phenotype-association_AraGWAS", "yes"],
+            # may not be a valid regular expression, so is checked by the validator
+            ["AT1G(01010", "AT1G01020", "2", "phenotype-association_AraGWAS", "0"],
+        ]
+        columns = [list(col) for col in zip(*rows)]
+        failing = column_validator.failing_rows(headers, columns)
+        self.assertEqual(failing, {1, 2, 3, 4, 5})
+        for (ix, row) in enumerate(rows):
+            row_valid = validator.is_valid(dict(zip(headers, row)))
+            self.assertTrue(row_valid or ix in failing)
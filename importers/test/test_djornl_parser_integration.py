@@ -6,6 +6,7 @@ it does not check data loading into the db.
 """
 import unittest
 import os
+from unittest import mock
 
 from importers.djornl.parser import DJORNL_Parser
 from spec.test.helpers import modified_environ, check_spec_test_env
@@ -26,3 +27,14 @@ class Test_DJORNL_Parser_Integration(unittest.TestCase):
             parser = DJORNL_Parser()
             parser.load_data()
             self.assertTrue(bool(parser.load_data()))
+
+    def test_incremental_reload(self):
+        """reloading an unchanged dataset incrementally saves nothing"""
+
+        with modified_environ(
+            RES_ROOT_DATA_PATH=os.path.join(_TEST_DIR, "djornl", "test_data")
+        ):
+            DJORNL_Parser().load_data()
+            with mock.patch("importers.utils.importer.upload_docs") as upload_docs:
+                DJORNL_Parser().load_data(incremental=True)
+            upload_docs.assert_not_called()
@@ -0,0 +1,164 @@
+"""
+Tests for the importer base class, using a small importer for a generated dataset.
+"""
+import csv
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import yaml
+
+from importers.utils.importer import Importer, unique
+from spec.test.helpers import modified_environ
+
+_MANIFEST_SCHEMA = {
+    "type": "object",
+    "required": ["file_list"],
+    "properties": {
+        "file_list": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["data_type", "path"],
+                "properties": {"data_type": {"enum": ["gene"]}},
+            },
+        }
+    },
+}
+
+
+def psv_reader(fd):
+    return csv.reader(fd, delimiter="|")
+
+
+class GeneImporter(Importer):
+    """loads gene files with `id` and `name` columns"""
+
+    data_types = ["gene"]
+    readers = dict(Importer.readers, psv=psv_reader)
+
+    def _get_dataset_schema_dir(self):
+        return os.environ["RES_ROOT_DATA_PATH"]
+
+    def get_remap_functions(self, data_type, file):
+        return {"_key": lambda row: row["id"], "name": None}
+
+
+class SlowGeneImporter(GeneImporter):
+    """takes half a second to start parsing each file"""
+
+    def get_remap_functions(self, data_type, file):
+        time.sleep(0.5)
+        return super().get_remap_functions(data_type, file)
+
+
+class TestImporter(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.data_dir = tmp_dir.name
+        files = {
+            "genes.csv": "id,name\n# comment\nG1,one\nG2,two\nG3\n",
+            "more_genes.psv": "id|name\nG2|dupe\nG4|four\n",
+            "no_data.tsv": "id\tname\n",
+        }
+        for (path, content) in files.items():
+            with open(os.path.join(self.data_dir, path), "w") as fd:
+                fd.write(content)
+        manifest = {
+            "file_list": [
+                {"data_type": "gene", "path": path, "file_format": path[-3:]}
+                for path in files
+            ]
+        }
+        with open(os.path.join(self.data_dir, "manifest.yaml"), "w") as fd:
+            yaml.dump(manifest, fd)
+        with open(os.path.join(self.data_dir, "manifest.schema.json"), "w") as fd:
+            json.dump(_MANIFEST_SCHEMA, fd)
+
+    def init_importer(self, importer_class=GeneImporter, **env):
+        with modified_environ(RES_ROOT_DATA_PATH=self.data_dir, **env):
+            importer = importer_class()
+            importer._configure()
+            return importer
+
+    def test_stream_docs(self):
+        """documents are streamed in manifest order, with errors collected"""
+        for workers in ["1", "2"]:
+            with self.subTest(workers=workers):
+                importer = self.init_importer(RES_PARSE_WORKERS=workers)
+                err_list = []
+                docs = list(importer.stream_docs("genes", err_list, key="_key"))
+                self.assertEqual(
+                    docs,
+                    [
+                        {"_key": "G1", "name": "one"},
+                        {"_key": "G2", "name": "two"},
+                        {"_key": "G4", "name": "four"},
+                    ],
+                )
+                self.assertEqual(
+                    err_list,
+                    [
+                        "genes.csv line 5: expected 2 cols, found 1",
+                        "no_data.tsv: no valid data found",
+                    ],
+                )
+
+    @mock.patch("importers.utils.importer._PARSE_CHUNK_ROWS", 1)
+    def test_stream_docs_parallel_chunks(self):
+        """parse workers save their rows to temp files, which are read back a chunk at a time"""
+        rows_dir = os.path.join(self.data_dir, "rows")
+        os.mkdir(rows_dir)
+        importer = self.init_importer(RES_PARSE_WORKERS="2")
+        with mock.patch.object(tempfile, "tempdir", rows_dir):
+            docs = importer.stream_docs("genes", [], key="_key")
+            self.assertEqual(next(docs), {"_key": "G1", "name": "one"})
+            # stopping early removes the rows files
+            docs.close()
+            self.assertEqual(os.listdir(rows_dir), [])
+            docs = list(importer.stream_docs("genes", [], key="_key"))
+        self.assertEqual([d["_key"] for d in docs], ["G1", "G2", "G4"])
+        self.assertEqual(os.listdir(rows_dir), [])
+
+    def test_parse_files_parallel(self):
+        """files are parsed at the same time, not one after another"""
+        importer = self.init_importer(SlowGeneImporter, RES_PARSE_WORKERS="3")
+        start = time.time()
+        docs = list(importer.stream_docs("genes", [], key="_key"))
+        self.assertLess(time.time() - start, 1.2)
+        self.assertEqual([d["_key"] for d in docs], ["G1", "G2", "G4"])
+
+    def test_unknown_format(self):
+        importer = self.init_importer()
+        file = {"path": "genes.xml", "file_format": "xml"}
+        with self.assertRaisesRegex(RuntimeError, "no reader for file format xml"):
+            importer._get_file_reader(None, file)
+
+    @mock.patch("importers.utils.uploader.requests.Session.put")
+    def test_load_stream(self, put):
+        """documents are uploaded in chunks as they are parsed"""
+        saved = []
+
+        def save(url, params, headers, data):
+            docs = [json.loads(line) for line in data.split("\n")]
+            saved.append(docs)
+            resp = mock.Mock(status_code=200, ok=True)
+            resp.json.return_value = {"created": len(docs)}
+            return resp
+
+        put.side_effect = save
+        importer = self.init_importer(RES_UPLOAD_CHUNK_SIZE="2", RES_UPLOAD_WORKERS="1")
+        (counts, err_list) = importer.load_stream("genes", "genes")
+        self.assertEqual(counts["created"], 3)
+        self.assertEqual(
+            [[d["_key"] for d in chunk] for chunk in saved], [["G1", "G2"], ["G4"]]
+        )
+        self.assertEqual(len(err_list), 2)
+
+    def test_unique(self):
+        docs = [{"id": 1, "x": "a"}, {"id": 2}, {"id": 1, "x": "b"}]
+        self.assertEqual(list(unique(docs, "id")), [{"id": 1, "x": "a"}, {"id": 2}])
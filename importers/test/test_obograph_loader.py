@@ -0,0 +1,129 @@
+"""
+Tests for parsing OBO Graph JSON ontologies.
+"""
+import json
+import tempfile
+import unittest
+
+from importers.obograph.loader import obo_id, parse_graph, read_graph
+
+_OBO = "http://purl.obolibrary.org/obo/"
+_OIO = "http://www.geneontology.org/formats/oboInOwl#"
+
+_GRAPH = {
+    "id": _OBO + "go.owl",
+    "nodes": [
+        {
+            "id": _OBO + "GO_0000002",
+            "type": "CLASS",
+            "lbl": "mitochondrial genome maintenance",
+            "meta": {
+                "definition": {"val": "The maintenance...", "xrefs": ["GOC:ai"]},
+                "subsets": [_OBO + "go#goslim_yeast"],
+                "synonyms": [
+                    {
+                        "pred": "hasExactSynonym",
+                        "val": "mtDNA maintenance",
+                        "xrefs": [],
+                        "synonymType": _OBO + "go#systematic_synonym",
+                    }
+                ],
+                "xrefs": [{"val": "Reactome:R-HSA-1"}],
+                "basicPropertyValues": [
+                    {"pred": _OIO + "hasOBONamespace", "val": "biological_process"},
+                    {"pred": _OIO + "hasAlternativeId", "val": "GO:0000001"},
+                ],
+            },
+        },
+        {"id": _OBO + "GO_0000003", "type": "CLASS", "lbl": "reproduction"},
+        {
+            "id": _OBO + "GO_0000004",
+            "type": "CLASS",
+            "lbl": "obsolete biological process",
+            "meta": {
+                "deprecated": True,
+                "comments": ["obsolete"],
+                "basicPropertyValues": [
+                    {"pred": _OBO + "IAO_0100001", "val": "GO:0000003"},
+                    {"pred": _OIO + "consider", "val": "GO:0000002"},
+                ],
+            },
+        },
+        {"id": _OBO + "BFO_0000050", "type": "PROPERTY", "lbl": "part of"},
+        {"id": _OBO + "CHEBI_1", "type": "CLASS", "lbl": "not a GO term"},
+    ],
+    "edges": [
+        {"sub": _OBO + "GO_0000002", "pred": "is_a", "obj": _OBO + "GO_0000003"},
+        {
+            "sub": _OBO + "GO_0000002",
+            "pred": _OBO + "BFO_0000050",
+            "obj": _OBO + "GO_0000003",
+        },
+        {"sub": _OBO + "GO_0000002", "pred": "is_a", "obj": _OBO + "GO_0000003"},
+    ],
+}
+
+
+class TestOBOGraphLoader(unittest.TestCase):
+    def test_obo_id(self):
+        self.assertEqual(obo_id(_OBO + "GO_0022609"), "GO:0022609")
+        self.assertEqual(obo_id(_OBO + "NCBITaxon_1_2"), "NCBITaxon:1_2")
+        self.assertEqual(obo_id("GO:0022609"), "GO:0022609")
+
+    def test_read_graph(self):
+        other = {"id": _OBO + "other.owl", "nodes": [], "edges": []}
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as fd:
+            json.dump({"graphs": [_GRAPH, other]}, fd)
+            fd.flush()
+            self.assertEqual(read_graph(fd.name, _OBO + "go.owl"), _GRAPH)
+            with self.assertRaisesRegex(ValueError, "a graph id is required"):
+                read_graph(fd.name)
+            with self.assertRaisesRegex(ValueError, "graph nope not found"):
+                read_graph(fd.name, "nope")
+
+    def test_parse_graph(self):
+        (terms, edges, merges) = parse_graph(_GRAPH, "GO")
+        self.assertEqual(
+            [t["id"] for t in terms], ["GO:0000002", "GO:0000003", "GO:0000004"]
+        )
+        self.assertEqual(
+            terms[0],
+            {
+                "id": "GO:0000002",
+                "type": "CLASS",
+                "name": "mitochondrial genome maintenance",
+                "namespace": "biological_process",
+                "alt_ids": ["GO:0000001"],
+                "def": {"val": "The maintenance...", "xrefs": ["GOC:ai"]},
+                "comments": [],
+                "subsets": ["goslim_yeast"],
+                "synonyms": [
+                    {"pred": "hasExactSynonym", "val": "mtDNA maintenance", "xrefs": []}
+                ],
+                "xrefs": [{"val": "Reactome:R-HSA-1"}],
+            },
+        )
+        self.assertEqual(terms[1]["def"], None)
+        self.assertEqual(terms[1]["namespace"], None)
+        self.assertEqual(
+            [e["id"] for e in edges],
+            ["GO:0000002::GO:0000003::is_a", "GO:0000002::GO:0000003::part_of"],
+        )
+        self.assertEqual(edges[1]["type"], "part_of")
+        self.assertEqual(
+            merges,
+            [
+                {
+                    "id": "GO:0000004::GO:0000002::consider",
+                    "type": "consider",
+                    "from": "GO:0000004",
+                    "to": "GO:0000002",
+                },
+                {
+                    "id": "GO:0000004::GO:0000003::replaced_by",
+                    "type": "replaced_by",
+                    "from": "GO:0000004",
+                    "to": "GO:0000003",
+                },
+            ],
+        )
@@ -0,0 +1,132 @@
+"""
+Tests for the chunked document uploader, using a mocked session.
+"""
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import requests
+
+from importers.utils.uploader import Checkpoint, upload_docs
+
+_API_URL = "http://re_api:5000"
+
+
+def _resp(status_code, json_body=None):
+    resp = mock.Mock(spec=requests.Response)
+    resp.status_code = status_code
+    resp.ok = status_code < 400
+    resp.json.return_value = json_body or {}
+    resp.text = json.dumps(json_body)
+    return resp
+
+
+@mock.patch("importers.utils.uploader.time.sleep")
+@mock.patch("importers.utils.uploader.requests.Session.put")
+class TestUploader(unittest.TestCase):
+    def setUp(self):
+        self.docs = [{"_key": str(i)} for i in range(25)]
+        self.lock = threading.Lock()
+        self.saved = []
+
+    def _save(self, url, params, headers, data):
+        """Record the documents in each request, and respond with an import result."""
+        docs = [json.loads(line) for line in data.split("\n")]
+        with self.lock:
+            self.saved.extend(docs)
+        return _resp(200, {"created": len(docs), "errors": 0})
+
+    def _saved_keys(self):
+        return sorted(int(d["_key"]) for d in self.saved)
+
+    def test_chunks(self, put, sleep):
+        """documents are saved in chunks of chunk_size"""
+        put.side_effect = self._save
+        counts = upload_docs(
+            _API_URL, "token", "coll", self.docs, chunk_size=10, workers=2
+        )
+        self.assertEqual(counts["created"], 25)
+        self.assertEqual(put.call_count, 3)
+        self.assertEqual(self._saved_keys(), list(range(25)))
+        _, kwargs = put.call_args
+        self.assertEqual(
+            kwargs["params"], {"collection": "coll", "on_duplicate": "update"}
+        )
+        self.assertEqual(kwargs["headers"], {"Authorization": "token"})
+
+    def test_retry(self, put, sleep):
+        """server errors and connection errors are retried"""
+        responses = [_resp(503), requests.exceptions.ConnectionError("nope")]
+
+        def save(url, **kwargs):
+            if responses:
+                resp = responses.pop(0)
+                if isinstance(resp, Exception):
+                    raise resp
+                return resp
+            return self._save(url, **kwargs)
+
+        put.side_effect = save
+        counts = upload_docs(_API_URL, "token", "coll", self.docs, chunk_size=100)
+        self.assertEqual(counts["created"], 25)
+        self.assertEqual(put.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_client_error(self, put, sleep):
+        """4xx responses are not retried, and raise an error with the response text"""
+        put.return_value = _resp(400, {"error": {"message": "bad doc"}})
+        with self.assertRaisesRegex(RuntimeError, "bad doc"):
+            upload_docs(_API_URL, "token", "coll", self.docs, chunk_size=100)
+        self.assertEqual(put.call_count, 1)
+
+    def test_resume(self, put, sleep):
+        """an interrupted upload resumes from the checkpoint file"""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        path = os.path.join(tmp_dir.name, "checkpoint.json")
+
+        def fail_third_chunk(url, **kwargs):
+            if '"_key": "20"' in kwargs["data"]:
+                return _resp(400, {"error": "nope"})
+            return self._save(url, **kwargs)
+
+        put.side_effect = fail_third_chunk
+        with self.assertRaises(RuntimeError):
+            upload_docs(
+                _API_URL,
+                "token",
+                "coll",
+                self.docs,
+                chunk_size=10,
+                workers=1,
+                checkpoint=Checkpoint(path),
+            )
+        self.assertEqual(self._saved_keys(), list(range(20)))
+        with open(path) as fd:
+            self.assertEqual(
+                json.load(fd), {"coll": {"chunk_size": 10, "total": 25, "done": [0, 1]}}
+            )
+
+        self.saved = []
+        put.side_effect = self._save
+        checkpoint = Checkpoint(path)
+        counts = upload_docs(
+            _API_URL, "token", "coll", self.docs, chunk_size=10, checkpoint=checkpoint
+        )
+        self.assertEqual(counts["created"], 5)
+        self.assertEqual(self._saved_keys(), list(range(20, 25)))
+        checkpoint.remove()
+        self.assertFalse(os.path.exists(path))
+
+    def test_checkpoint_mismatch(self, put, sleep):
+        """a checkpoint for a different chunk size or document count is ignored"""
+        checkpoint = Checkpoint()
+        checkpoint.start("coll", 10, 25, {0, 1})
+        put.side_effect = self._save
+        upload_docs(
+            _API_URL, "token", "coll", self.docs, chunk_size=5, checkpoint=checkpoint
+        )
+        self.assertEqual(self._saved_keys(), list(range(25)))
@@ -0,0 +1,129 @@
+"""
+Column-wise validation of data files, for the importers' columnar mode.
+
+In columnar mode, the importer reads a block of rows from a file into one list per column and
+checks each column in a single pass, using checks derived from the file's CSV schema: compiled
+regular expressions for `pattern`, set lookups for `enum` and `oneOf` lists of constants.
+Rows that fail any column check are validated again with the full jsonschema validator, so
+the error messages are exactly the same as in row-by-row mode.
+
+The column checks are conservative: a value only passes if the schema validator would accept
+it. Properties whose schemas use keywords that the column checks do not handle have no column
+check, and every row of a file with such a column is validated with the full validator.
+"""
+import re
+
+# keywords that do not affect whether a string is valid
+_ANNOTATIONS = {"$schema", "$comment", "name", "title", "description", "examples"}
+# keywords handled by the column checks
+_HANDLED = _ANNOTATIONS | {"type", "format", "pattern", "enum", "const", "oneOf"}
+# object schema keywords handled by the column validator
+_OBJECT_KEYWORDS = _ANNOTATIONS | {
+    "type",
+    "required",
+    "properties",
+    "additionalProperties",
+}
+# characters that could make a value an invalid regular expression, for `format: regex`
+_REGEX_SPECIAL = re.compile(r"[\\()\[\]{}*+?]")
+
+
+def _value_check(resolver, schema):
+    """
+    Build a function that returns True for string values that are valid under `schema`, or
+    return None if the schema cannot be checked column-wise.
+    """
+    if "$ref" in schema:
+        # draft 7 ignores the other keywords next to a $ref
+        with resolver.resolving(schema["$ref"]) as resolved:
+            return _value_check(resolver, resolved)
+
+    if set(schema) - _HANDLED - {"default"} or schema.get("type", "string") != "string":
+        return None
+
+    checks = []
+    if "pattern" in schema:
+        checks.append(re.compile(schema["pattern"]).search)
+    if schema.get("format", "regex") != "regex":
+        return None
+    if "format" in schema:
+        # values containing these characters are left to the format checker
+        checks.append(lambda value: _REGEX_SPECIAL.search(value) is None)
+    if "enum" in schema:
+        checks.append(frozenset(schema["enum"]).__contains__)
+    if "const" in schema:
+        checks.append(schema["const"].__eq__)
+    if "oneOf" in schema:
+        consts = []
+        for option in schema["oneOf"]:
+            if set(option) - _ANNOTATIONS != {"const"}:
+                return None
+            consts.append(option["const"])
+        if len(set(consts)) != len(consts):
+            return None
+        checks.append(frozenset(consts).__contains__)
+
+    if not checks:
+        return lambda value: True
+    if len(checks) == 1:
+        return checks[0]
+    return lambda value: all(check(value) for check in checks)
+
+
+class ColumnValidator(object):
+    """
+    Column-wise checks for the properties of a (flat, object) CSV file schema.
+
+    :param validator: (Validator)   jsonschema validator for the file schema
+    """
+
+    def __init__(self, validator):
+        self.validator = validator
+        schema = validator.schema
+        self.checks = {}
+        self.defaults = {}
+        for (prop, prop_schema) in schema.get("properties", {}).items():
+            self.checks[prop] = _value_check(validator.resolver, prop_schema)
+            default = self._default(prop_schema)
+            if default is not None:
+                self.defaults[prop] = default
+        # True, or a schema that extra columns must be checked against
+        self.additional = schema.get("additionalProperties", True)
+        self.object_schema_ok = not set(schema) - _OBJECT_KEYWORDS
+
+    def _default(self, prop_schema):
+        if "$ref" in prop_schema:
+            with self.validator.resolver.resolving(prop_schema["$ref"]) as resolved:
+                return self._default(resolved)
+        return prop_schema.get("default")
+
+    def defaults_for(self, headers):
+        """default values for the schema properties that are not in the file headers"""
+        return {k: v for (k, v) in self.defaults.items() if k not in headers}
+
+    def failing_rows(self, headers, columns):
+        """
+        Check a block of rows, one column at a time.
+
+        :param headers: (list)          column names
+        :param columns: (list)          one list of values per column
+
+        :return failing: (set)          indexes of the rows in the block that need to be
+                                        validated with the full validator
+        """
+        n_rows = len(columns[0]) if columns else 0
+        if not self.object_schema_ok:
+            return set(range(n_rows))
+        failing = set()
+        for (header, column) in zip(headers, columns):
+            if header not in self.checks:
+                if self.additional is True:
+                    continue
+                return set(range(n_rows))
+            check = self.checks[header]
+            if check is None:
+                return set(range(n_rows))
+            failing.update(
+                ix for (ix, valid) in enumerate(map(check, column)) if not valid
+            )
+        return failing
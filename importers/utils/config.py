@@ -7,10 +7,21 @@ from typing import List
 
 
 REQUIRED: List[str] = []
-OPTIONAL = ["AUTH_TOKEN", "API_URL"]
+OPTIONAL = [
+    "AUTH_TOKEN",
+    "API_URL",
+    "UPLOAD_CHUNK_SIZE",
+    "UPLOAD_WORKERS",
+    "UPLOAD_RETRIES",
+    "CHECKPOINT_FILE",
+]
 DEFAULTS = {
     "AUTH_TOKEN": "admin_token",  # test default
     "API_URL": "http://localhost:5000",  # test default
+    "UPLOAD_CHUNK_SIZE": 10000,
+    "UPLOAD_WORKERS": 4,
+    "UPLOAD_RETRIES": 3,
+    "CHECKPOINT_FILE": None,
 }
 
 
@@ -0,0 +1,154 @@
+"""
+Incremental (diff-based) reloads of a collection.
+
+Each document is saved with a hash of its content in the `content_hash` field. To reload a
+collection, the importer fetches the `_key` and `content_hash` of every document already in
+the collection, in batches, and compares them with the new documents:
+
+- documents with a new `_key`, or whose hash differs, are uploaded
+- documents whose hash matches are skipped
+- documents that are not in the new set are removed
+
+so the cost of a reload is proportional to the number of changed documents.
+
+Documents loaded before hashes were added have no `content_hash`, so the first incremental
+load re-uploads all of them.
+"""
+import hashlib
+import json
+from collections.abc import Sequence
+
+import requests
+
+HASH_FIELD = "content_hash"
+# fields that are not part of the content; `updated_at` is set by the RE API on save
+_EXCLUDED_FIELDS = {HASH_FIELD, "_id", "_rev", "updated_at"}
+
+_HASH_QUERY = "FOR d IN @@coll RETURN [d._key, d.content_hash]"
+
+
+def content_hash(doc):
+    """hash of a document's content, independent of key order"""
+    content = {k: v for (k, v) in doc.items() if k not in _EXCLUDED_FIELDS}
+    serialized = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(serialized.encode(), digest_size=16).hexdigest()
+
+
+def with_hash(doc):
+    """a copy of a document, with its content hash"""
+    return dict(doc, **{HASH_FIELD: content_hash(doc)})
+
+
+class HashedDocs(Sequence):
+    """Sequence view of a sequence of documents, adding the content hash to each"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __getitem__(self, ix):
+        if isinstance(ix, slice):
+            return [with_hash(doc) for doc in self.docs[ix]]
+        return with_hash(self.docs[ix])
+
+
+def fetch_hashes(api_url, auth_token, coll_name, batch_size=10000):
+    """
+    Fetch the content hashes of all the documents in a collection, following the query
+    cursor until all batches have been read.
+
+    :return hashes: (dict)          document _key -> content hash (None if it has no hash)
+    """
+    session = requests.Session()
+    session.headers["Authorization"] = auth_token
+    url = api_url + "/api/v1/query_results"
+    resp = session.post(
+        url,
+        params={"batch_size": batch_size},
+        data=json.dumps({"query": _HASH_QUERY, "@coll": coll_name}),
+    )
+    hashes = {}
+    while True:
+        if not resp.ok:
+            raise RuntimeError(resp.text)
+        resp_json = resp.json()
+        hashes.update(resp_json["results"])
+        if not resp_json["has_more"]:
+            return hashes
+        resp = session.post(url, params={"cursor_id": resp_json["cursor_id"]})
+
+
+def diff_docs(docs, existing):
+    """
+    Compare new documents with the hashes of the documents in a collection.
+
+    :param docs: (iterable)         the new documents
+    :param existing: (dict)         _key -> content hash for the current documents, as
+                                    returned by `fetch_hashes`
+
+    :return diff: (DocDiff)         iterator over the new or changed documents
+    """
+    return DocDiff(docs, existing)
+
+
+class DocDiff:
+    """
+    Iterator over the new or changed documents in `docs`, with their content hash, so that
+    the caller can save them in chunks as they are read. Once it is exhausted:
+
+        removed (list)              keys of current documents that are not in `docs`
+        n_changed (int)             number of documents yielded
+        n_unchanged (int)           number of documents that do not need saving
+    """
+
+    def __init__(self, docs, existing):
+        self.docs = iter(docs)
+        self.existing = existing
+        self.seen = set()
+        self.removed = None
+        self.n_changed = 0
+        self.n_unchanged = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        for doc in self.docs:
+            key = doc["_key"]
+            self.seen.add(key)
+            doc = with_hash(doc)
+            if self.existing.get(key) == doc[HASH_FIELD]:
+                self.n_unchanged += 1
+                continue
+            self.n_changed += 1
+            return doc
+        if self.removed is None:
+            self.removed = [key for key in self.existing if key not in self.seen]
+            self.seen = set()
+        raise StopIteration
+
+
+def delete_docs(api_url, auth_token, coll_name, keys, chunk_size=10000):
+    """
+    Remove documents from a collection by _key, `chunk_size` keys per request.
+
+    :return counts: (dict)          removal counts summed over the requests
+    """
+    counts = {"removed": 0, "not_found": 0, "errors": 0}
+    session = requests.Session()
+    url = api_url + "/api/v1/documents"
+    for start in range(0, len(keys), chunk_size):
+        end = start + chunk_size
+        resp = session.delete(
+            url,
+            params={"collection": coll_name},
+            headers={"Authorization": auth_token},
+            data=json.dumps({"keys": keys[start:end]}),
+        )
+        if not resp.ok:
+            raise RuntimeError(resp.text)
+        for (key, count) in resp.json().items():
+            counts[key] = counts.get(key, 0) + count
+    return counts
@@ -0,0 +1,261 @@
+"""
+Moves old versions in time-travel (delta) collections to companion archive collections.
+
+Versions that expired before a cutoff load timestamp are moved from a vertex collection and
+its edge collection to `{collection}_archive` collections, and the cutoff is recorded in
+the `delta_archive_registry` collection. Stored queries with an `archive` block read the
+archive collections only for timestamps older than the cutoff (see
+relation_engine_server/utils/archive.py).
+
+Archived edges that point at archived vertices have their `_from` and `_to` changed to
+point at the vertex archive collection, so traversals over both edge collections work for
+old timestamps. Edges to a vertex version expire no later than the vertex version, so they
+are archived by the same run or an earlier one; edges archived by earlier runs are relinked
+when their vertices are archived.
+
+The new cutoff is recorded before anything is moved, and the archiver then waits for the
+RE API servers' cached cutoffs (ARCHIVE_CUTOFF_TTL) to expire, so that queries never miss
+versions that have been moved. Versions are copied to the archive before they are removed
+from the live collection, so while a run is in progress, or after it was interrupted, a
+version may be in both; archive queries dedupe versions by `_key`, and running the archiver
+again with the same cutoff finishes the move (copies replace what is already archived).
+
+The archiver refuses to archive a collection that a time-travel stored query reads without
+an `archive` block covering it, as that query would silently miss the archived versions
+(see `python -m spec.validate --archivable`). The stored queries are read from the spec
+path in the RE API config (SPEC_PATH), or from --spec-path.
+
+Sample usage:
+
+RES_API_URL=http://localhost:5000 RES_AUTH_TOKEN=... \
+python -m importers.utils.delta_archive --vertex-collection ncbi_taxon \
+    --edge-collection ncbi_child_of_taxon --cutoff 1577836800000
+"""
+import argparse
+import json
+import time
+from itertools import islice
+
+from importers.utils import config
+from importers.utils.delta import delete_docs
+from importers.utils.delta_load import query_docs
+from importers.utils.uploader import upload_docs
+from spec.validate import validate_archivable
+
+REGISTRY_COLLECTION = "delta_archive_registry"
+
+_EXPIRED_QUERY = (
+    "FOR d IN @@coll FILTER d.expired < @cutoff "
+    "RETURN UNSET(d, '_id', '_rev', 'updated_at')"
+)
+
+# whether an edge end points at a vertex version that is, or is being, archived; vertices
+# that are no longer in the live collection were archived by an earlier run
+_ARCHIVED_END = (
+    "PARSE_IDENTIFIER(e.{end}).collection == @vertex_coll "
+    "AND (DOCUMENT(e.{end}) == null OR DOCUMENT(e.{end}).expired < @cutoff)"
+)
+
+_EDGE_QUERY = """
+FOR e IN @@coll
+  LET from_archived = {from_archived}
+  LET to_archived = {to_archived}
+  {filter}
+  RETURN MERGE(UNSET(e, '_id', '_rev', 'updated_at'), {{
+    _from: from_archived
+      ? CONCAT(@vertex_archive, '/', PARSE_IDENTIFIER(e._from).key) : e._from,
+    _to: to_archived
+      ? CONCAT(@vertex_archive, '/', PARSE_IDENTIFIER(e._to).key) : e._to
+  }})
+"""
+
+
+def _edge_query(filter):
+    return _EDGE_QUERY.format(
+        from_archived=_ARCHIVED_END.format(end="_from"),
+        to_archived=_ARCHIVED_END.format(end="_to"),
+        filter=filter,
+    )
+
+
+# expired live edges, to move
+_EXPIRED_EDGE_QUERY = _edge_query("FILTER e.expired < @cutoff")
+# archived edges that point at live vertex versions that are now archived, to relink
+_RELINK_EDGE_QUERY = _edge_query("FILTER from_archived OR to_archived")
+
+
+def archive_name(coll_name):
+    return coll_name + "_archive"
+
+
+class Archiver(object):
+    """
+    Archive the versions of a vertex collection, and optionally its edge collection, that
+    expired before `cutoff` (a load timestamp in ms since the epoch).
+    """
+
+    def __init__(
+        self,
+        api_url,
+        auth_token,
+        vertex_coll,
+        edge_coll,
+        cutoff,
+        chunk_size=10000,
+        max_retries=3,
+        spec_dir=None,
+    ):
+        self.api_url = api_url
+        self.auth_token = auth_token
+        self.vertex_coll = vertex_coll
+        self.edge_coll = edge_coll
+        self.cutoff = cutoff
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.spec_dir = spec_dir
+        self.colls = [c for c in [vertex_coll, edge_coll] if c]
+
+    def query(self, query, **bind_vars):
+        return query_docs(self.api_url, self.auth_token, query, bind_vars)
+
+    def check_cutoff(self):
+        """cutoffs can only move forward, as versions are never moved back"""
+        registered = self.query(
+            "FOR a IN @@registry FILTER a._key IN @names RETURN a",
+            **{"@registry": REGISTRY_COLLECTION, "names": self.colls},
+        )
+        for entry in registered:
+            if entry["cutoff"] > self.cutoff:
+                raise ValueError(
+                    f"{entry['_key']} is already archived up to {entry['cutoff']}, "
+                    f"after the cutoff {self.cutoff}"
+                )
+
+    def register(self, counts=None):
+        """record the cutoff of each collection in the registry"""
+        entries = [
+            {
+                "_key": coll_name,
+                "archive_collection": archive_name(coll_name),
+                "cutoff": self.cutoff,
+                "archived_at": int(time.time() * 1000),
+                "counts": (counts or {}).get(coll_name, {}),
+            }
+            for coll_name in self.colls
+        ]
+        upload_docs(
+            self.api_url,
+            self.auth_token,
+            REGISTRY_COLLECTION,
+            entries,
+            on_dupe="replace",
+            max_retries=self.max_retries,
+        )
+
+    def save_chunks(self, coll_name, docs, remove_from=None):
+        """
+        Save documents to a collection in chunks, removing each chunk from `remove_from`
+        once it is saved.
+
+        :return count: (int)            number of documents saved
+        """
+        docs = iter(docs)
+        count = 0
+        while True:
+            chunk = list(islice(docs, self.chunk_size))
+            if not chunk:
+                return count
+            upload_docs(
+                self.api_url,
+                self.auth_token,
+                coll_name,
+                chunk,
+                on_dupe="replace",
+                max_retries=self.max_retries,
+            )
+            if remove_from:
+                keys = [d["_key"] for d in chunk]
+                delete_docs(self.api_url, self.auth_token, remove_from, keys)
+            count += len(chunk)
+            print(f"{coll_name}: saved {count} documents")
+
+    def run(self, wait=60):
+        """
+        Archive the expired versions, waiting `wait` seconds after recording the cutoff.
+
+        :return counts: (dict)          collection name -> counts of moved documents
+        """
+        validate_archivable(self.colls, self.spec_dir)
+        self.check_cutoff()
+        self.register()
+        time.sleep(wait)
+        counts = {}
+        edge_vars = {
+            "cutoff": self.cutoff,
+            "vertex_coll": self.vertex_coll,
+            "vertex_archive": archive_name(self.vertex_coll),
+        }
+        if self.edge_coll:
+            edge_archive = archive_name(self.edge_coll)
+            edges = self.query(
+                _EXPIRED_EDGE_QUERY, **{"@coll": self.edge_coll}, **edge_vars
+            )
+            relinked = self.query(
+                _RELINK_EDGE_QUERY, **{"@coll": edge_archive}, **edge_vars
+            )
+            counts[self.edge_coll] = {
+                "archived": self.save_chunks(edge_archive, edges, self.edge_coll),
+                "relinked": self.save_chunks(edge_archive, relinked),
+            }
+        vertices = self.query(
+            _EXPIRED_QUERY, **{"@coll": self.vertex_coll, "cutoff": self.cutoff}
+        )
+        counts[self.vertex_coll] = {
+            "archived": self.save_chunks(
+                archive_name(self.vertex_coll), vertices, self.vertex_coll
+            )
+        }
+        self.register(counts)
+        return counts
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description="Move old versions in delta collections to archive collections"
+    )
+    argparser.add_argument("--vertex-collection", required=True)
+    argparser.add_argument("--edge-collection")
+    argparser.add_argument(
+        "--cutoff",
+        type=int,
+        required=True,
+        help="archive versions that expired before this load time, in ms since the epoch",
+    )
+    argparser.add_argument(
+        "--wait",
+        type=int,
+        default=60,
+        help="seconds to wait for the API servers to pick up the new cutoff; set this to "
+        "their ARCHIVE_CUTOFF_TTL",
+    )
+    argparser.add_argument(
+        "--spec-path",
+        help="the spec directory with the stored queries to check; defaults to SPEC_PATH",
+    )
+    args = argparser.parse_args()
+    conf = config.load_from_env()
+    archiver = Archiver(
+        conf["API_URL"],
+        conf["AUTH_TOKEN"],
+        args.vertex_collection,
+        args.edge_collection,
+        args.cutoff,
+        chunk_size=int(conf["UPLOAD_CHUNK_SIZE"]),
+        max_retries=int(conf["UPLOAD_RETRIES"]),
+        spec_dir=args.spec_path,
+    )
+    print(json.dumps(archiver.run(wait=args.wait), indent=2))
+
+
+if __name__ == "__main__":
+    main()
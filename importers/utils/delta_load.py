@@ -0,0 +1,504 @@
+"""
+Versioned (delta) loads into collections marked `delta: true` in their spec.
+
+Every version of a document is kept. A version has a `_key` of `{id}_{load version}` and the
+fields
+    first_version, last_version         the first and last load versions it was current in
+    created, expired                    load timestamps (ms) for when it was current
+    release_created, release_expired    the same, as release timestamps
+Current versions have `expired` (and `release_expired`) set to MAX_ADB_INTEGER. Stored
+queries select the versions that were current at a time with
+`FILTER d.created <= @ts AND d.expired >= @ts`.
+
+A load compares a complete new snapshot of the data with the current versions in the
+collection, in one streaming pass: both are sorted by `id` and compared with a merge
+    new id                  a version is created
+    missing id              the current version is expired
+    changed document        the current version is expired and a new one created
+    unchanged document      the current version's `last_version` is set to the load version
+Snapshots do not need to be sorted. They are sorted by `external_sort`, which spills sorted
+runs of documents to temporary files, so memory use is bounded by the run size rather than
+the size of the collection. Edges are linked to the current versions of their vertices by
+merge joins against the sorted `id` -> `_key` map written during the vertex load, so an edge
+whose vertex has a new version gets a new version too. All writes go through the RE API's
+batched document import.
+
+Each load is recorded in the `delta_load_registry` collection, with its state
+("in_progress", "complete" or "failed"). A failed load can be re-run with the same version.
+"""
+import argparse
+import heapq
+import json
+import tempfile
+import time
+from itertools import islice
+
+import requests
+
+from importers.utils import config
+from importers.utils.uploader import upload_docs, upload_stream
+
+# largest integer that arangodb stores exactly; the expiry time of current versions
+MAX_ADB_INTEGER = 2**53 - 1
+
+REGISTRY_COLLECTION = "delta_load_registry"
+
+# fields that are set by the load, rather than being part of a document's content
+VERSION_FIELDS = {
+    "_key",
+    "_id",
+    "_rev",
+    "_from",
+    "_to",
+    "created",
+    "expired",
+    "first_version",
+    "last_version",
+    "release_created",
+    "release_expired",
+    "updated_at",
+}
+
+_CURRENT_QUERY = (
+    "FOR d IN @@coll FILTER d.expired == @max "
+    "RETURN UNSET(d, '_id', '_rev', 'updated_at')"
+)
+
+# documents per sorted run in `external_sort`
+RUN_SIZE = 100000
+
+
+def check_delta_collection(api_url, coll_name, coll_type):
+    """
+    Make sure that a collection is a delta collection of the given type ("vertex" or "edge")
+    in the spec loaded by the RE API.
+    """
+    resp = requests.get(
+        api_url + "/api/v1/specs/collections", params={"name": coll_name}
+    )
+    if not resp.ok:
+        raise RuntimeError(resp.text)
+    spec = resp.json()
+    if not spec.get("delta"):
+        raise RuntimeError(f"{coll_name} is not a delta collection")
+    if spec.get("type") != coll_type:
+        raise RuntimeError(f"{coll_name} is not a {coll_type} collection")
+
+
+def query_docs(api_url, auth_token, query, bind_vars, batch_size=5000):
+    """
+    Generate the results of an ad-hoc query, reading the query cursor one batch at a time.
+    """
+    session = requests.Session()
+    session.headers["Authorization"] = auth_token
+    url = api_url + "/api/v1/query_results"
+    body = dict(bind_vars, query=query)
+    resp = session.post(url, params={"batch_size": batch_size}, data=json.dumps(body))
+    while True:
+        if not resp.ok:
+            raise RuntimeError(resp.text)
+        resp_json = resp.json()
+        yield from resp_json["results"]
+        if not resp_json["has_more"]:
+            return
+        resp = session.post(url, params={"cursor_id": resp_json["cursor_id"]})
+
+
+def fetch_current(api_url, auth_token, coll_name, batch_size=5000):
+    """
+    Generate the current versions of the documents in a collection, in no particular order.
+    """
+    bind_vars = {"@coll": coll_name, "max": MAX_ADB_INTEGER}
+    return query_docs(api_url, auth_token, _CURRENT_QUERY, bind_vars, batch_size)
+
+
+def external_sort(docs, key, run_size=RUN_SIZE):
+    """
+    Sort an iterable of documents by `key`, holding at most `run_size` of them in memory.
+
+    Sorted runs of documents are written to temporary files and merged as the result is
+    read; if there is only one run, it is not written out.
+
+    :param key: (func)              function returning the sort key of a document
+
+    :return docs: (generator)       the sorted documents
+    """
+    docs = iter(docs)
+    run = sorted(islice(docs, run_size), key=key)
+    next_run = sorted(islice(docs, run_size), key=key)
+    if not next_run:
+        yield from run
+        return
+    files = []
+    try:
+        while run:
+            fd = tempfile.TemporaryFile("w+")
+            files.append(fd)
+            fd.writelines(json.dumps(doc) + "\n" for doc in run)
+            fd.seek(0)
+            (run, next_run) = (next_run, sorted(islice(docs, run_size), key=key))
+        runs = [(json.loads(line) for line in fd) for fd in files]
+        yield from heapq.merge(*runs, key=key)
+    finally:
+        for fd in files:
+            fd.close()
+
+
+def _by(field):
+    return lambda doc: doc[field]
+
+
+class KeyMap(object):
+    """
+    The `id` -> `_key` map of the current versions of a vertex collection, stored in a
+    temporary file in id order. It is written during a vertex load and read afterwards;
+    iterating over it generates (id, _key) tuples.
+    """
+
+    def __init__(self):
+        self._fd = tempfile.TemporaryFile("w+")
+
+    def add(self, id, key):
+        self._fd.write(json.dumps([id, key]) + "\n")
+
+    def __iter__(self):
+        self._fd.seek(0)
+        for line in self._fd:
+            yield tuple(json.loads(line))
+
+    def close(self):
+        self._fd.close()
+
+
+def link(docs, key_map, field, target, coll_name, counts):
+    """
+    Set the `target` field of each document (`_from` or `_to`) to the current version of the
+    vertex in its `field` (`from` or `to`), with a merge join. Documents must be sorted by
+    `field`. Documents with a vertex that is not in `key_map` are counted and skipped.
+    """
+    pairs = iter(key_map)
+    pair = next(pairs, None)
+    for doc in docs:
+        while pair is not None and pair[0] < doc[field]:
+            pair = next(pairs, None)
+        if pair is None or pair[0] != doc[field]:
+            counts["missing_vertex"] += 1
+            continue
+        yield dict(doc, **{target: f"{coll_name}/{pair[1]}"})
+
+
+def merge_sorted(new_docs, current_docs):
+    """
+    Pair up documents from two iterables sorted by `id`.
+
+    :return pairs: (generator)      tuples of (new_doc, current_doc), with None for a
+                                    document that is only in one of the iterables
+    """
+    new_docs = _check_sorted(new_docs, "new")
+    current_docs = _check_sorted(current_docs, "current")
+    new = next(new_docs, None)
+    current = next(current_docs, None)
+    while new is not None or current is not None:
+        if current is None or (new is not None and new["id"] < current["id"]):
+            yield (new, None)
+            new = next(new_docs, None)
+        elif new is None or current["id"] < new["id"]:
+            yield (None, current)
+            current = next(current_docs, None)
+        else:
+            yield (new, current)
+            new = next(new_docs, None)
+            current = next(current_docs, None)
+
+
+def _check_sorted(docs, name):
+    last_id = None
+    for doc in docs:
+        if last_id is not None and doc["id"] <= last_id:
+            raise ValueError(
+                f"{name} documents are not sorted by unique id: "
+                f"{doc['id']!r} follows {last_id!r}"
+            )
+        last_id = doc["id"]
+        yield doc
+
+
+def content(doc):
+    """a document without its version fields"""
+    return {k: v for (k, v) in doc.items() if k not in VERSION_FIELDS}
+
+
+class DeltaLoader(object):
+    """
+    Load new snapshots of a set of delta collections as one versioned load.
+
+    :param api_url: (str)               RE API root url
+    :param auth_token: (str)            auth token with RE admin privileges
+    :param load_namespace: (str)        name of the data set, e.g. "go_ontology"
+    :param load_version: (str)          version of this load, e.g. a release date
+    :param timestamp: (int)             load time, in ms since the epoch
+    :param release_timestamp: (int)     release time, in ms since the epoch
+    """
+
+    def __init__(
+        self,
+        api_url,
+        auth_token,
+        load_namespace,
+        load_version,
+        timestamp,
+        release_timestamp,
+        chunk_size=10000,
+        workers=4,
+        max_retries=3,
+        run_size=RUN_SIZE,
+    ):
+        self.api_url = api_url
+        self.auth_token = auth_token
+        self.load_namespace = load_namespace
+        self.load_version = load_version
+        self.timestamp = timestamp
+        self.release_timestamp = release_timestamp
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self.run_size = run_size
+        self.registry = {
+            "_key": f"{load_namespace}_{load_version}",
+            "load_namespace": load_namespace,
+            "load_version": load_version,
+            "load_timestamp": timestamp,
+            "release_timestamp": release_timestamp,
+            "collections": {},
+        }
+
+    def new_version(self, doc):
+        """a new, current version of a document"""
+        return dict(
+            doc,
+            _key=f"{doc['id']}_{self.load_version}",
+            first_version=self.load_version,
+            last_version=self.load_version,
+            created=self.timestamp,
+            expired=MAX_ADB_INTEGER,
+            release_created=self.release_timestamp,
+            release_expired=MAX_ADB_INTEGER,
+        )
+
+    def expired_version(self, doc):
+        """a current version of a document, expired just before this load"""
+        return dict(
+            doc,
+            expired=self.timestamp - 1,
+            release_expired=self.release_timestamp - 1,
+        )
+
+    def diff(self, new_docs, current_docs, counts):
+        """
+        Compare new documents with the current versions of a collection, both sorted by id.
+
+        :param counts: (dict)           created, expired and unchanged counts are added here
+
+        :return docs: (generator)       the versions to save
+        """
+        for key in ["created", "expired", "unchanged"]:
+            counts.setdefault(key, 0)
+        for (new, current) in merge_sorted(new_docs, current_docs):
+            if new is None:
+                counts["expired"] += 1
+                yield self.expired_version(current)
+            elif current is None:
+                counts["created"] += 1
+                yield self.new_version(new)
+            elif content(new) == content(current) and all(
+                new.get(k) == current.get(k) for k in ["_from", "_to"]
+            ):
+                counts["unchanged"] += 1
+                yield dict(current, last_version=self.load_version)
+            else:
+                version = self.new_version(new)
+                if version["_key"] != current["_key"]:
+                    counts["expired"] += 1
+                    yield self.expired_version(current)
+                counts["created"] += 1
+                yield version
+
+    def sorted_by_id(self, docs):
+        return external_sort(docs, _by("id"), self.run_size)
+
+    def current(self, coll_name):
+        """the current versions of the documents in a collection, sorted by id"""
+        return self.sorted_by_id(
+            fetch_current(self.api_url, self.auth_token, coll_name)
+        )
+
+    def load_vertices(self, coll_name, docs):
+        """
+        Load a new snapshot of a vertex collection.
+
+        :param docs: (iterable)         vertex documents, with unique ids
+
+        :return key_map: (KeyMap)       id -> _key of the current version of each vertex
+        """
+        key_map = KeyMap()
+        counts = {}
+
+        def versions():
+            for doc in self.diff(
+                self.sorted_by_id(docs), self.current(coll_name), counts
+            ):
+                if doc["expired"] == MAX_ADB_INTEGER:
+                    key_map.add(doc["id"], doc["_key"])
+                yield doc
+
+        self._save(coll_name, versions(), counts)
+        return key_map
+
+    def load_edges(self, coll_name, vertex_coll_name, key_map, docs):
+        """
+        Load a new snapshot of an edge collection.
+
+        :param docs: (iterable)         edge documents, with unique ids and `from` and `to`
+                                        vertex ids
+        :param key_map: (KeyMap)        current vertices, from `load_vertices`; edges to other
+                                        vertices are skipped
+        """
+        counts = {"missing_vertex": 0}
+        docs = external_sort(docs, _by("from"), self.run_size)
+        docs = link(docs, key_map, "from", "_from", vertex_coll_name, counts)
+        docs = external_sort(docs, _by("to"), self.run_size)
+        docs = link(docs, key_map, "to", "_to", vertex_coll_name, counts)
+        versions = self.diff(self.sorted_by_id(docs), self.current(coll_name), counts)
+        self._save(coll_name, versions, counts)
+
+    def _save(self, coll_name, versions, counts):
+        upload_stream(
+            self.api_url,
+            self.auth_token,
+            coll_name,
+            versions,
+            on_dupe="update",
+            chunk_size=self.chunk_size,
+            workers=self.workers,
+            max_retries=self.max_retries,
+        )
+        self.registry["collections"][coll_name] = counts
+        print(f"{coll_name}: {json.dumps(counts)}")
+
+    def register(self, state):
+        """record the state of the load in the registry"""
+        self.registry["state"] = state
+        if state == "in_progress":
+            self.registry["start_time"] = int(time.time() * 1000)
+        else:
+            self.registry["completion_time"] = int(time.time() * 1000)
+        upload_docs(
+            self.api_url,
+            self.auth_token,
+            REGISTRY_COLLECTION,
+            [self.registry],
+            on_dupe="replace",
+            max_retries=self.max_retries,
+        )
+
+    def run(self, load_fn):
+        """
+        Run a load, recording it in the registry. `load_fn` is called with this loader, and
+        should call `load_vertices` and `load_edges` for each collection.
+        """
+        self.register("in_progress")
+        try:
+            load_fn(self)
+        except Exception:
+            self.register("failed")
+            raise
+        self.register("complete")
+        return self.registry
+
+
+def read_ndjson(path):
+    with open(path) as fd:
+        for line in fd:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description="Load snapshots of a delta vertex collection and its edges"
+    )
+    argparser.add_argument("--vertex-collection", required=True)
+    argparser.add_argument(
+        "--vertex-file",
+        required=True,
+        help="vertex documents, one JSON object with an `id` per line",
+    )
+    argparser.add_argument("--edge-collection")
+    argparser.add_argument(
+        "--edge-file",
+        help="edge documents, one JSON object with `id`, `from` and `to` per line",
+    )
+    argparser.add_argument(
+        "--load-namespace", required=True, help="name of the data set, e.g. ncbi_taxa"
+    )
+    argparser.add_argument(
+        "--load-version",
+        required=True,
+        help="version of this load, e.g. a release date",
+    )
+    argparser.add_argument(
+        "--load-timestamp",
+        type=int,
+        help="load time in ms since the epoch; defaults to now",
+    )
+    argparser.add_argument(
+        "--release-timestamp",
+        type=int,
+        help="release time in ms since the epoch; defaults to the load time",
+    )
+    argparser.add_argument(
+        "--run-size",
+        type=int,
+        default=RUN_SIZE,
+        help="documents to sort in memory at once",
+    )
+    args = argparser.parse_args()
+    if bool(args.edge_collection) != bool(args.edge_file):
+        argparser.error("--edge-collection and --edge-file must be given together")
+
+    conf = config.load_from_env()
+    check_delta_collection(conf["API_URL"], args.vertex_collection, "vertex")
+    if args.edge_collection:
+        check_delta_collection(conf["API_URL"], args.edge_collection, "edge")
+    timestamp = args.load_timestamp or int(time.time() * 1000)
+    loader = DeltaLoader(
+        conf["API_URL"],
+        conf["AUTH_TOKEN"],
+        args.load_namespace,
+        args.load_version,
+        timestamp,
+        args.release_timestamp or timestamp,
+        chunk_size=int(conf["UPLOAD_CHUNK_SIZE"]),
+        workers=int(conf["UPLOAD_WORKERS"]),
+        max_retries=int(conf["UPLOAD_RETRIES"]),
+        run_size=args.run_size,
+    )
+
+    def load(loader):
+        key_map = loader.load_vertices(
+            args.vertex_collection, read_ndjson(args.vertex_file)
+        )
+        if args.edge_collection:
+            loader.load_edges(
+                args.edge_collection,
+                args.vertex_collection,
+                key_map,
+                read_ndjson(args.edge_file),
+            )
+        key_map.close()
+
+    print(json.dumps(loader.run(load), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,769 @@
+"""
+Base class for importers that load a set of data files, listed in a manifest, into arangodb.
+
+Each file is read as a stream of rows and passed through a pipeline of generators:
+
+    reader -> parser_gen -> header checks -> validation -> remapping -> store or upload
+
+- readers turn an open file into lists of column values. CSV and TSV readers are built in;
+  subclasses can add others to `readers`, keyed by the manifest `file_format`
+- `parser_gen` skips comments, strips values and checks the number of columns
+- the header row is checked against the file schema (`check_headers`)
+- rows are validated against the file schema (`get_validator`); in columnar mode, a block
+  of rows at a time (RES_COLUMNAR_BLOCK_SIZE; see importers.utils.columnar)
+- valid rows are remapped into documents (`get_remap_functions`, `remap_object`)
+
+Files can be parsed in parallel worker processes (RES_PARSE_WORKERS). The documents can be
+stored in indexes for deduplication and merging (`process_files`), as the DJORNL parser does,
+or streamed straight to the RE API in concurrent chunks (`load_stream`), which only holds a
+few chunks of documents in memory.
+
+Subclasses set `data_types` and implement `_get_dataset_schema_dir`, `get_validator` and
+`get_remap_functions`.
+"""
+import csv
+import json
+import os
+import pickle
+import tempfile
+import yaml
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import importers.utils.config as config
+from importers.utils.columnar import ColumnValidator
+from importers.utils.uploader import upload_docs, upload_stream
+from relation_engine_server.utils.json_validation import run_validator
+
+
+# Parse workers save rows to their temp files in chunks of this many
+_PARSE_CHUNK_ROWS = 1000
+
+
+def csv_reader(fd):
+    return csv.reader(fd, delimiter=",")
+
+
+def tsv_reader(fd):
+    return csv.reader(fd, delimiter="\t")
+
+
+def unique(docs, key="_key"):
+    """
+    Drop documents whose `key` field has been seen before, keeping the first. Only the keys
+    are kept in memory.
+    """
+    seen = set()
+    for doc in docs:
+        if doc[key] in seen:
+            continue
+        seen.add(doc[key])
+        yield doc
+
+
+class Importer(object):
+
+    # the data types of the files in the manifest, e.g. ["node", "edge"]
+    data_types = []
+    # functions that turn an open file into lists of values, keyed by file format
+    readers = {"csv": csv_reader, "tsv": tsv_reader}
+    # format of files with no `file_format` in the manifest and no known extension
+    default_format = "tsv"
+
+    def config(self, value):
+        if not hasattr(self, "_config"):
+            self._configure()
+
+        if value not in self._config:
+            raise KeyError(f"No such config value: {value}")
+
+        return self._config[value]
+
+    def _configure(self):
+
+        configuration = config.load_from_env(
+            extra_required=["ROOT_DATA_PATH"],
+            extra_optional=["PARSE_WORKERS", "COLUMNAR_BLOCK_SIZE"],
+        )
+        # number of processes to parse files with
+        configuration.setdefault("PARSE_WORKERS", 1)
+        # rows per block in columnar mode; 0 parses files row by row
+        configuration.setdefault("COLUMNAR_BLOCK_SIZE", 0)
+        self._configure_dataset(configuration)
+
+        # fetch the manifest and make sure all the files listed actually exist
+        manifest = self._get_manifest(configuration)
+        for type in self.data_types:
+            configuration[type + "_files"] = []
+
+        error_list = []
+        for file in manifest["file_list"]:
+            file_path = os.path.join(configuration["ROOT_DATA_PATH"], file["path"])
+
+            if not os.path.exists(file_path):
+                error_list.append(f"{file_path}: file does not exist")
+                continue
+
+            if not os.path.isfile(file_path):
+                error_list.append(f"{file_path}: not a file")
+                continue
+
+            # add the file to the appropriate list
+            file["file_path"] = file_path
+            configuration.setdefault(file["data_type"] + "_files", []).append(file)
+
+        if error_list:
+            raise RuntimeError("\n".join(error_list))
+
+        self._config = configuration
+        return self._config
+
+    def _configure_dataset(self, configuration):
+        """add dataset-specific values, such as collection names, to the configuration"""
+        pass
+
+    def _get_manifest_schema_file(self):
+
+        return os.path.join(self._get_dataset_schema_dir(), "manifest.schema.json")
+
+    def _get_dataset_schema_dir(self):
+        """the directory holding the manifest schema and the file schemas"""
+        raise NotImplementedError()
+
+    def _get_manifest(self, configuration):
+        """
+        Read the manifest file, which contains path and file type info, and validate it.
+        The manifest is expected to be at ROOT_DATA_PATH/manifest.yaml
+        """
+
+        schema_file = self._get_manifest_schema_file()
+
+        # load the manifest and validate it against the schema
+        manifest_file = os.path.join(configuration["ROOT_DATA_PATH"], "manifest.yaml")
+
+        try:
+            with open(manifest_file) as fd:
+                manifest = yaml.safe_load(fd)
+        except FileNotFoundError:
+            raise RuntimeError(
+                f"No manifest file found at {manifest_file}.\n"
+                "Please ensure that you have created a manifest that lists the files "
+                "in the release"
+            )
+
+        try:
+            validated_manifest = run_validator(schema_file=schema_file, data=manifest)
+        except Exception as err:
+            print(err)
+            raise RuntimeError(
+                "The manifest file failed validation. Please recheck the file and try again."
+            )
+
+        return validated_manifest
+
+    def _get_file_reader(self, fd, file):
+        """Given a dict containing file information, instantiate the correct type of parser"""
+
+        file_format = file.get("file_format", "").lower()
+        if not file_format:
+            extension = os.path.splitext(file["path"])[1].lower().lstrip(".")
+            file_format = (
+                extension if extension in self.readers else self.default_format
+            )
+        if file_format not in self.readers:
+            raise RuntimeError(
+                f"{file['path']}: no reader for file format {file_format}"
+            )
+        return self.readers[file_format](fd)
+
+    def parser_gen(self, file):
+        """generator function to parse a file"""
+        expected_col_count = 0
+        with open(file["file_path"], newline="") as fd:
+            csv_reader = self._get_file_reader(fd, file)
+            line_no = 0
+            for row in csv_reader:
+                line_no += 1
+                if not len(row) or len(row[0]) and row[0][0] == "#":
+                    # comment / metadata
+                    continue
+
+                cols = [c.strip() for c in row]
+
+                if len(cols) == expected_col_count:
+                    yield (line_no, cols, None)
+                    continue
+
+                # if we didn't get the expected number of cols:
+                if expected_col_count == 0:
+                    # this is the header row; set up the expected column count
+                    expected_col_count = len(cols)
+                    yield (line_no, [c.lower() for c in cols], None)
+                    continue
+
+                # otherwise, this row does not have the correct number of columns
+                col_count = len(cols)
+                msg = f"expected {expected_col_count} cols, found {col_count}"
+                yield (line_no, None, f"{file['path']} line {line_no}: {msg}")
+
+    def check_headers(self, headers, validator=None):
+        """
+        Ensure that the file headers contain required columns for the data type. Checks the schema
+        in the validator to ensure that all required fields are present in the headers.
+
+        :param headers: (list)          list containing headers
+
+        :param validator: (obj)         validator object, with the appropriate schema loaded
+
+        :return header_errs: (dict)     dict of header errors:
+                                        'missing': required headers that are missing from the input
+                                        'invalid': headers that should not be in the input
+                                        'duplicate': duplicated headers (data would be overwritten)
+                                        If the list of headers supplied is valid--i.e. it
+                                        contains all the fields marked as required in the validator
+                                        schema--or no validator has been supplied, the method
+                                        returns an empty dict
+        """
+
+        if validator is None:
+            return {}
+
+        header_errs = {}
+
+        all_headers = {}
+        # ensure we don't have any duplicate headers
+        for h in headers:
+            if h in all_headers:
+                all_headers[h] += 1
+            else:
+                all_headers[h] = 1
+
+        duplicate_headers = [h for h in all_headers.keys() if all_headers[h] != 1]
+        if duplicate_headers:
+            header_errs["duplicate"] = duplicate_headers
+
+        # check that each required header in the schema is present in headers
+        required_props = validator.schema["required"]
+        missing_headers = [i for i in required_props if i not in headers]
+        if missing_headers:
+            header_errs["missing"] = missing_headers
+
+        if not validator.schema.get("additionalProperties", True):
+            all_props = validator.schema["properties"].keys()
+            extra_headers = [i for i in headers if i not in all_props]
+            if extra_headers:
+                header_errs["invalid"] = extra_headers
+
+        return header_errs
+
+    def remap_object(self, raw_data, remap_functions):
+        """
+        Given a dict, raw_data, create a new dict, remapped_data, using the functions in the
+        dictionary `remap_functions`.
+
+        :param raw_data: (dict)         input data for remapping
+
+        :param remap_fn: (dict)         mapping of output param names to functions
+
+                                        Each function should take the raw_data object as an
+                                        argument and return the value for the output parameter.
+                                        For parameters that can be copied over to the output
+                                        object without modification, set the value to `None`
+                                        instead of a function.
+
+        :return remapped_data: (dict)   the remapped data!
+        """
+        remapped_data = {}
+        for (key, function) in remap_functions.items():
+            # these keys get copied over unchanged to the new object if they exist in the input obj
+            if function is None:
+                if key in raw_data:
+                    remapped_data[key] = raw_data[key]
+            else:
+                remapped_data[key] = function(raw_data)
+
+        return remapped_data
+
+    def process_file(
+        self, file, remap_fn, store_fn, err_list, validator=None, column_remap_fn=None
+    ):
+        """process an input file to generate a dataset and possibly an error list
+
+        Each valid line in the file is turned into a dictionary using the header row, and then
+        validated against the file schema, if there is one (see `get_validator`).
+        If that completes successfully, it is transformed using the functions in the dictionary
+        `remap_fn`, checked for uniqueness against existing data, and saved to a dictionary. Once
+        all files of a certain type have been processed, results can be saved to Arango.
+
+        Any errors that occur during parsing and processing are accumulated in `err_list`.
+
+        :param file: (dict)             file data
+        :param remap_fn: (dict)         mapping of output param names to functions
+                                        each function should take the row data object as input and
+                                        return the value for the output parameter
+
+        :param store_fn: (func)         function to store the results of the remapping
+
+        :param err_list: (list)         error list
+
+        :param validator: (Validator)   jsonschema validator object
+
+        :param column_remap_fn: (dict)  column-wise remap functions, for columnar mode; see
+                                        `parse_file_columns`
+
+        """
+        print("Parsing " + file["data_type"] + " file " + file["file_path"])
+        rows = self.parse_file_rows(file, remap_fn, validator, column_remap_fn)
+        self.store_file_rows(file, rows, store_fn, err_list)
+
+    def parse_file_rows(self, file, remap_fn, validator=None, column_remap_fn=None):
+        """
+        Parse, validate and remap the rows of an input file, without storing them.
+
+        This does not touch the node or edge indexes, so files can be parsed in any order or in
+        parallel, as long as the rows are stored in file order by `store_file_rows`.
+
+        If RES_COLUMNAR_BLOCK_SIZE is set, the file is parsed in columnar mode; see
+        `parse_file_columns`.
+
+        :return rows: (generator)       tuples of (line_no, datum, err_str):
+                                        (line_no, datum, None) for a remapped row
+                                        (line_no, None, err_str) for a row with errors
+                                        (None, None, err_str) for errors that stop the file from
+                                        being processed, e.g. a missing or invalid header
+        """
+        if int(self.config("COLUMNAR_BLOCK_SIZE")) > 0:
+            yield from self.parse_file_columns(
+                file, remap_fn, validator, column_remap_fn
+            )
+            return
+
+        file_parser = self.parser_gen(file)
+        headers = yield from self._parse_headers(file, file_parser, validator)
+        if headers is None:
+            return
+
+        for (line_no, cols, err_str) in file_parser:
+            # mismatch in number of cols
+            if cols is None:
+                yield (line_no, None, err_str)
+                continue
+
+            # merge headers with cols to create an object
+            row_object = dict(zip(headers, cols))
+            yield from self._parse_row(file, line_no, row_object, remap_fn, validator)
+
+    def parse_file_columns(self, file, remap_fn, validator=None, column_remap_fn=None):
+        """
+        Columnar version of `parse_file_rows`, which produces the same rows and errors.
+
+        The file is read in blocks of RES_COLUMNAR_BLOCK_SIZE rows, and each block is split
+        into columns. The columns are checked against the CSV schema one at a time (see
+        importers.utils.columnar); rows that fail the column checks are validated with the
+        full validator to get their error messages. If `column_remap_fn` is supplied, the valid
+        rows are remapped a column at a time, too.
+
+        :param column_remap_fn: (dict)  mapping of output param names to functions
+
+                                        Each function should take a dict of input columns
+                                        (lists of values, keyed by header) and return the
+                                        column of values for the output parameter. As in
+                                        `remap_object`, `None` copies the input column.
+        """
+        block_size = int(self.config("COLUMNAR_BLOCK_SIZE"))
+        column_validator = None
+        if validator is not None:
+            column_validator = ColumnValidator(validator)
+
+        file_parser = self.parser_gen(file)
+        headers = yield from self._parse_headers(file, file_parser, validator)
+        if headers is None:
+            return
+
+        block = []
+        for line in file_parser:
+            block.append(line)
+            if len(block) == block_size:
+                yield from self._parse_block(
+                    file,
+                    headers,
+                    block,
+                    remap_fn,
+                    validator,
+                    column_validator,
+                    column_remap_fn,
+                )
+                block = []
+        if block:
+            yield from self._parse_block(
+                file,
+                headers,
+                block,
+                remap_fn,
+                validator,
+                column_validator,
+                column_remap_fn,
+            )
+
+    def _parse_headers(self, file, file_parser, validator):
+        """
+        Read and check the header line of a file, yielding any file-level errors.
+
+        :return headers: (list)         the headers, or None if the file cannot be processed
+        """
+        try:
+            (line_no, cols, err_str) = next(file_parser)
+        except StopIteration:
+            # no valid lines found in the file
+            yield (None, None, f"{file['path']}: no header line found")
+            return None
+
+        header_errors = self.check_headers(cols, validator)
+        if header_errors.keys():
+            err_str = {
+                "duplicate": "duplicate",
+                "missing": "missing required",
+                "invalid": "invalid additional",
+            }
+            for err_type in ["missing", "invalid", "duplicate"]:
+                if err_type in header_errors:
+                    yield (
+                        None,
+                        None,
+                        f"{file['path']}: {err_str[err_type]} headers: "
+                        + ", ".join(sorted(header_errors[err_type])),
+                    )
+            return None
+
+        return cols
+
+    def _parse_row(self, file, line_no, row_object, remap_fn, validator):
+        """validate and remap a single row, yielding the row or its errors"""
+        if validator is not None:
+            # validate the object
+            if not validator.is_valid(row_object):
+                for e in sorted(validator.iter_errors(row_object), key=str):
+                    yield (
+                        line_no,
+                        None,
+                        f"{file['path']} line {line_no}: " + e.message,
+                    )
+                return
+
+        try:
+            # transform it using the remap_functions
+            datum = self.remap_object(row_object, remap_fn)
+        except Exception as err:
+            err_type = type(err)
+            yield (
+                line_no,
+                None,
+                f"{file['path']} line {line_no}: error remapping data: {err_type} {err}",
+            )
+            return
+
+        yield (line_no, datum, None)
+
+    def _parse_block(
+        self,
+        file,
+        headers,
+        block,
+        remap_fn,
+        validator,
+        column_validator,
+        column_remap_fn,
+    ):
+        """validate and remap a block of lines column-wise; see `parse_file_columns`"""
+        rows = [(line_no, cols) for (line_no, cols, _) in block if cols is not None]
+        columns = [list(col) for col in zip(*[cols for (_, cols) in rows])]
+        failing = set()
+        if column_validator is not None and rows:
+            failing = column_validator.failing_rows(headers, columns)
+
+        # the validator fills in defaults for missing columns
+        defaults = column_validator.defaults_for(headers) if column_validator else {}
+
+        # remap the valid rows a column at a time
+        data = None
+        if column_remap_fn is not None and rows:
+            valid_ix = [ix for ix in range(len(rows)) if ix not in failing]
+            input_cols = {
+                header: [column[ix] for ix in valid_ix] if failing else column
+                for (header, column) in zip(headers, columns)
+            }
+            for (key, value) in defaults.items():
+                input_cols[key] = [value] * len(valid_ix)
+            try:
+                data = self.remap_columns(input_cols, column_remap_fn)
+            except Exception:
+                # fall back to remapping row by row, to report errors against lines
+                data = None
+            if data is not None and len(data) != len(valid_ix):
+                data = None
+            data = iter(data) if data is not None else None
+
+        row_ix = 0
+        for (line_no, cols, err_str) in block:
+            if cols is None:
+                yield (line_no, None, err_str)
+                continue
+            ix = row_ix
+            row_ix += 1
+            if ix in failing:
+                # get the error messages, or the row if only a column check failed
+                row_object = dict(zip(headers, cols))
+                yield from self._parse_row(
+                    file, line_no, row_object, remap_fn, validator
+                )
+            elif data is not None:
+                yield (line_no, next(data), None)
+            else:
+                # the row is valid, so it only needs its defaults and remapping
+                row_object = dict(zip(headers, cols), **defaults)
+                yield from self._parse_row(file, line_no, row_object, remap_fn, None)
+
+    def remap_columns(self, columns, remap_functions):
+        """
+        Column-wise version of `remap_object`: remap a dict of input columns, keyed by header,
+        using the functions in `remap_functions`.
+
+        :return remapped_data: (list)   the remapped data, as one dict per row
+        """
+        keys = []
+        output_cols = []
+        for (key, function) in remap_functions.items():
+            if function is None:
+                if key in columns:
+                    keys.append(key)
+                    output_cols.append(columns[key])
+            else:
+                keys.append(key)
+                output_cols.append(function(columns))
+
+        return [dict(zip(keys, values)) for values in zip(*output_cols)]
+
+    def store_file_rows(self, file, rows, store_fn, err_list):
+        """
+        Store the rows produced by `parse_file_rows` for a file, in order, adding any parse or
+        storage errors to `err_list`.
+        """
+        n_stored = 0
+        file_error = False
+        for (line_no, datum, err_str) in rows:
+            if err_str is not None:
+                err_list.append(err_str)
+                file_error = file_error or line_no is None
+                continue
+
+            storage_error = store_fn(datum)
+            if storage_error is None:
+                n_stored += 1
+            else:
+                err_list.append(f"{file['path']} line {line_no}: " + storage_error)
+
+        if not n_stored and not file_error:
+            err_list.append(f"{file['path']}: no valid data found")
+
+    def get_validator(self, data_type, file):
+        """get the jsonschema validator for the rows of a file, or None to skip validation"""
+        return None
+
+    def get_remap_functions(self, data_type, file):
+        """get the remap functions for a file of the given data type; see `remap_object`"""
+        raise NotImplementedError()
+
+    def get_column_remap_functions(self, data_type):
+        """get the column-wise remap functions for a data type, if there are any"""
+        return None
+
+    def parse_files(self, data_type):
+        """
+        Parse all the files of a data type, in manifest order.
+
+        If RES_PARSE_WORKERS is more than 1, the files are parsed and validated in parallel in a
+        pool of worker processes, with at most that many files being parsed at once. Each
+        worker saves the remapped rows of its file to a temp file, which is read back a chunk
+        at a time in manifest order and then removed, so workers never wait for the reader.
+
+        :return files: (generator)      tuples of (file, rows), where rows are as produced by
+                                        `parse_file_rows`
+        """
+        files = self.config(data_type[:-1] + "_files")
+        workers = int(self.config("PARSE_WORKERS"))
+        if workers < 2 or len(files) < 2:
+            for file in files:
+                print("Parsing " + file["data_type"] + " file " + file["file_path"])
+                rows = self.parse_file_rows(
+                    file,
+                    self.get_remap_functions(data_type, file),
+                    self.get_validator(data_type, file),
+                    self.get_column_remap_functions(data_type),
+                )
+                yield (file, rows)
+            return
+
+        rows_dir = tempfile.gettempdir()
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as executor:
+            # keep `workers` files in flight, and return them in manifest order
+            pending = []
+            try:
+                for file in files:
+                    job = (type(self), self._config, data_type, file, rows_dir)
+                    pending.append((file, executor.submit(_parse_file_rows, job)))
+                    if len(pending) > workers:
+                        yield from _yield_file_rows(*pending.pop(0))
+                while pending:
+                    yield from _yield_file_rows(*pending.pop(0))
+            finally:
+                # the caller stopped early; skip the files it did not read
+                for (_, future) in pending:
+                    future.cancel()
+                    future.add_done_callback(_remove_rows_file)
+
+    def process_files(self, data_type, store_fn, err_list):
+        """
+        Process all the files of a data type, storing each remapped row with `store_fn`.
+
+        Rows are stored in manifest order in this process, even if the files are parsed in
+        parallel, so the indexes and errors are the same as for a serial run.
+
+        :param data_type: (str)         the data type, pluralised, e.g. "edges"
+        :param store_fn: (func)         function to store each remapped row
+        :param err_list: (list)         error list
+        """
+        for (file, rows) in self.parse_files(data_type):
+            self.store_file_rows(file, rows, store_fn, err_list)
+
+    def stream_docs(self, data_type, err_list, key=None):
+        """
+        Generate the remapped documents from all the files of a data type, in manifest order,
+        without storing them. Errors are added to `err_list`, and rows with errors are skipped.
+
+        :param key: (str)               if set, only the first document with each value of
+                                        this field is generated
+        """
+
+        def docs():
+            for (file, rows) in self.parse_files(data_type):
+                n_valid = 0
+                file_error = False
+                for (line_no, datum, err_str) in rows:
+                    if err_str is not None:
+                        err_list.append(err_str)
+                        file_error = file_error or line_no is None
+                        continue
+                    n_valid += 1
+                    yield datum
+                if not n_valid and not file_error:
+                    err_list.append(f"{file['path']}: no valid data found")
+
+        return docs() if key is None else unique(docs(), key)
+
+    def load_stream(self, data_type, coll_name, key="_key", on_dupe="update"):
+        """
+        Stream the documents from all the files of a data type to a collection, in chunks of
+        RES_UPLOAD_CHUNK_SIZE documents with RES_UPLOAD_WORKERS requests in flight at once.
+
+        Rows with errors are not saved; the errors are returned so that the caller can decide
+        what to do about them.
+
+        :return (counts, err_list):     import counts and the list of errors
+        """
+        err_list = []
+        counts = upload_stream(
+            self.config("API_URL"),
+            self.config("AUTH_TOKEN"),
+            coll_name,
+            self.stream_docs(data_type, err_list, key),
+            on_dupe=on_dupe,
+            chunk_size=int(self.config("UPLOAD_CHUNK_SIZE")),
+            workers=int(self.config("UPLOAD_WORKERS")),
+            max_retries=int(self.config("UPLOAD_RETRIES")),
+        )
+
+        print(f"Saved docs to collection {coll_name}!")
+        print(json.dumps(counts))
+        print("=" * 80)
+        return (counts, err_list)
+
+    def save_docs(self, coll_name, docs, on_dupe="update", checkpoint=None):
+        """
+        Save docs to a collection in chunks of RES_UPLOAD_CHUNK_SIZE documents,
+        with RES_UPLOAD_WORKERS requests in flight at once. Failed chunks are
+        retried RES_UPLOAD_RETRIES times.
+        """
+        counts = upload_docs(
+            self.config("API_URL"),
+            self.config("AUTH_TOKEN"),
+            coll_name,
+            docs if isinstance(docs, Sequence) else list(docs),
+            on_dupe=on_dupe,
+            chunk_size=int(self.config("UPLOAD_CHUNK_SIZE")),
+            workers=int(self.config("UPLOAD_WORKERS")),
+            max_retries=int(self.config("UPLOAD_RETRIES")),
+            checkpoint=checkpoint,
+        )
+
+        print(f"Saved docs to collection {coll_name}!")
+        print(json.dumps(counts))
+        print("=" * 80)
+        return counts
+
+
+def _parse_file_rows(job):
+    """
+    Parse a file in a worker process, saving its rows to a temp file in pickled chunks;
+    see Importer.parse_files
+    :return path: (str)             path of the rows file, which the caller removes
+    """
+    (importer_class, configuration, data_type, file, rows_dir) = job
+    importer = importer_class()
+    importer._config = configuration
+    print("Parsing " + file["data_type"] + " file " + file["file_path"])
+    rows = importer.parse_file_rows(
+        file,
+        importer.get_remap_functions(data_type, file),
+        importer.get_validator(data_type, file),
+        importer.get_column_remap_functions(data_type),
+    )
+    (fd, path) = tempfile.mkstemp(prefix="re_rows_", suffix=".pickle", dir=rows_dir)
+    try:
+        with os.fdopen(fd, "wb") as rows_file:
+            while True:
+                chunk = list(islice(rows, _PARSE_CHUNK_ROWS))
+                if not chunk:
+                    break
+                pickle.dump(chunk, rows_file, pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def _saved_rows(rows_file):
+    """The rows saved by a parse worker, a chunk at a time"""
+    while True:
+        try:
+            chunk = pickle.load(rows_file)
+        except EOFError:
+            return
+        yield from chunk
+
+
+def _yield_file_rows(file, future):
+    """Yield a file and the rows its parse worker saved, then remove the rows file"""
+    # raise any error from the worker
+    path = future.result()
+    try:
+        with open(path, "rb") as rows_file:
+            yield (file, _saved_rows(rows_file))
+    finally:
+        os.remove(path)
+
+
+def _remove_rows_file(future):
+    """Remove the rows file of a parse that finished after the caller stopped reading"""
+    if not future.cancelled() and future.exception() is None:
+        os.remove(future.result())
@@ -0,0 +1,246 @@
+"""
+Upload documents to the RE API in chunks, with several requests in flight at once,
+per-chunk retries, and an optional checkpoint file so an interrupted load can resume.
+
+The checkpoint file holds, for each collection, the chunk size, the total number of
+documents, and the indexes of the chunks that have been saved. It is only used if
+the chunk size and document count match the current upload, so the documents must
+be produced in the same order each time.
+"""
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+
+import requests
+
+# Server responses that are worth retrying
+_RETRY_STATUSES = {500, 502, 503, 504}
+
+
+class Checkpoint:
+    """Record of the chunks that have been saved, persisted to a JSON file."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        if path and os.path.exists(path):
+            with open(path) as fd:
+                self._data = json.load(fd)
+
+    def completed(self, coll_name, chunk_size, total):
+        """Chunks of the collection saved by a previous run of the same upload."""
+        entry = self._data.get(coll_name)
+        if entry and entry["chunk_size"] == chunk_size and entry["total"] == total:
+            return set(entry["done"])
+        return set()
+
+    def start(self, coll_name, chunk_size, total, done):
+        with self._lock:
+            self._data[coll_name] = {
+                "chunk_size": chunk_size,
+                "total": total,
+                "done": sorted(done),
+            }
+            self._write()
+
+    def mark_done(self, coll_name, chunk_ix):
+        with self._lock:
+            self._data[coll_name]["done"].append(chunk_ix)
+            self._write()
+
+    def remove(self):
+        """Delete the checkpoint file once everything has been saved."""
+        self._data = {}
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _write(self):
+        if not self.path:
+            return
+        # write to a temp file first so an interruption never leaves a partial file
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as fd:
+            json.dump(self._data, fd)
+        os.replace(tmp_path, self.path)
+
+
+def upload_docs(
+    api_url,
+    auth_token,
+    coll_name,
+    docs,
+    on_dupe="update",
+    chunk_size=10000,
+    workers=4,
+    max_retries=3,
+    checkpoint=None,
+):
+    """
+    Save a list of documents to a collection, `chunk_size` documents per request.
+
+    :param api_url: (str)           RE API root url
+    :param auth_token: (str)        auth token with RE admin privileges
+    :param coll_name: (str)         collection to save to
+    :param docs: (list)             documents to save
+    :param on_dupe: (str)           on_duplicate param for the documents endpoint; the
+                                    default, "update", makes retried chunks harmless
+    :param chunk_size: (int)        number of documents per request
+    :param workers: (int)           number of requests to have in flight at once
+    :param max_retries: (int)       how many times to retry a chunk after a connection
+                                    error or a 5xx response
+    :param checkpoint: (Checkpoint) saved chunks are recorded here, and skipped
+
+    :return counts: (dict)          import counts summed over the saved chunks
+
+    Raises a RuntimeError with the server response if a chunk cannot be saved.
+    Chunks already in flight are allowed to finish, so that they are checkpointed.
+    """
+    checkpoint = checkpoint or Checkpoint()
+    n_chunks = (len(docs) + chunk_size - 1) // chunk_size
+    done = checkpoint.completed(coll_name, chunk_size, len(docs))
+    checkpoint.start(coll_name, chunk_size, len(docs), done)
+    if done:
+        print(f"{coll_name}: resuming, {len(done)} of {n_chunks} chunks already saved")
+
+    counts = _empty_counts()
+    session = requests.Session()
+
+    def save_chunk(chunk_ix):
+        start = chunk_ix * chunk_size
+        end = start + chunk_size
+        return _save_chunk(
+            session,
+            api_url,
+            auth_token,
+            coll_name,
+            docs[start:end],
+            on_dupe,
+            max_retries,
+        )
+
+    n_saved = len(done)
+    failure = None
+    todo = iter([i for i in range(n_chunks) if i not in done])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        while True:
+            # keep `workers` chunks in flight, and stop starting new ones on failure
+            while failure is None and len(pending) < workers:
+                chunk_ix = next(todo, None)
+                if chunk_ix is None:
+                    break
+                pending[executor.submit(save_chunk, chunk_ix)] = chunk_ix
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                chunk_ix = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as err:
+                    failure = failure or err
+                    continue
+                for key in counts:
+                    counts[key] += result.get(key, 0)
+                checkpoint.mark_done(coll_name, chunk_ix)
+                n_saved += 1
+                print(f"{coll_name}: saved chunk {n_saved} of {n_chunks}")
+    if failure is not None:
+        raise failure
+    return counts
+
+
+def upload_stream(
+    api_url,
+    auth_token,
+    coll_name,
+    docs,
+    on_dupe="update",
+    chunk_size=10000,
+    workers=4,
+    max_retries=3,
+):
+    """
+    Save documents from an iterable (e.g. a generator) to a collection, `chunk_size`
+    documents per request, with `workers` requests in flight at once.
+
+    Documents are read from `docs` as chunks are sent, so at most `workers + 1` chunks
+    are held in memory. Parameters and errors are as for `upload_docs`; streamed uploads
+    cannot be checkpointed.
+
+    :return counts: (dict)          import counts summed over the saved chunks
+    """
+    counts = _empty_counts()
+    session = requests.Session()
+    docs = iter(docs)
+    n_saved = 0
+    failure = None
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        while True:
+            while failure is None and len(pending) < workers:
+                chunk = list(islice(docs, chunk_size))
+                if not chunk:
+                    break
+                pending.add(
+                    executor.submit(
+                        _save_chunk,
+                        session,
+                        api_url,
+                        auth_token,
+                        coll_name,
+                        chunk,
+                        on_dupe,
+                        max_retries,
+                    )
+                )
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                try:
+                    result = future.result()
+                except Exception as err:
+                    failure = failure or err
+                    continue
+                for key in counts:
+                    counts[key] += result.get(key, 0)
+                n_saved += 1
+                print(f"{coll_name}: saved chunk {n_saved}")
+    if failure is not None:
+        raise failure
+    return counts
+
+
+def _empty_counts():
+    return {"created": 0, "errors": 0, "empty": 0, "updated": 0, "ignored": 0}
+
+
+def _save_chunk(session, api_url, auth_token, coll_name, chunk, on_dupe, max_retries):
+    """
+    Save a list of documents in one request, retrying connection errors and 5xx responses.
+    Raises a RuntimeError with the server response if the request fails.
+    """
+    url = api_url + "/api/v1/documents"
+    params = {"collection": coll_name, "on_duplicate": on_dupe}
+    headers = {"Authorization": auth_token}
+    body = "\n".join(json.dumps(d) for d in chunk)
+    attempt = 0
+    while True:
+        try:
+            resp = session.put(url, params=params, headers=headers, data=body)
+            if resp.status_code not in _RETRY_STATUSES or attempt >= max_retries:
+                break
+        except requests.exceptions.ConnectionError:
+            if attempt >= max_retries:
+                raise
+        attempt += 1
+        time.sleep(random.uniform(0, 2**attempt))  # nosec
+    if not resp.ok:
+        raise RuntimeError(resp.text)
+    return resp.json()
@@ -8,6 +8,8 @@ from relation_engine_server.utils import (
     config,
     parse_json,
     ensure_specs,
+    keyset,
+    archive,
 )
 from relation_engine_server.utils.json_validation import run_validator
 from relation_engine_server.exceptions import InvalidParameters
@@ -77,6 +79,8 @@ def run_query():
     # fetch number of documents to return
     batch_size = int(flask.request.args.get("batch_size", 10000))
     full_count = flask.request.args.get("full_count", False)
+    # stream results rather than materializing and counting them first
+    stream = _bool_arg("stream")
 
     if "query" in json_body:
         # Run an adhoc query for a sysadmin
@@ -93,6 +97,7 @@ def run_query():
             bind_vars=json_body,
             batch_size=batch_size,
             full_count=full_count,
+            options={"stream": stream} if stream is not None else None,
         )
         return flask.jsonify(resp_body)
 
@@ -105,6 +110,18 @@ def run_query():
         )
         stored_query = spec_loader.get_stored_query(query_name)
 
+        # Opt-in keyset pagination, triggered by either flag or a token from a previous page
+        page_token = flask.request.args.get("page_token")
+        keyset_conf = None
+        if page_token or _bool_arg("keyset"):
+            if stream:
+                raise InvalidParameters(
+                    "Keyset pages can't be streamed, as the whole page is returned in "
+                    "the first batch"
+                )
+            keyset_conf = keyset.get_keyset_config(stored_query, query_name)
+            keyset.apply_page_token(query_name, keyset_conf, json_body, page_token)
+
         if "params" in stored_query:
             # Validate the user params for the query
             stored_query_path = spec_loader.get_stored_query(query_name, path_only=True)
@@ -112,20 +129,38 @@ def run_query():
                 schema_file=stored_query_path, data=json_body, validate_at="/params"
             )
 
-        stored_query_source = _preprocess_stored_query(
-            stored_query["query"], stored_query
-        )
+        # keyset pages may run a separate keyset query
+        query_conf = keyset.get_query(stored_query, keyset_conf, json_body)
+        # queries for timestamps before an archive cutoff also read the archive
+        query_conf = archive.get_query(query_conf, json_body)
+        json_body.update(query_conf.get("bind_vars", {}))
+        stored_query_source = _preprocess_stored_query(query_conf["query"], query_conf)
         if "ws_ids" in stored_query_source:
             # Fetch any authorized workspace IDs using a KBase auth token, if present
             auth_token = auth.get_auth_header()
             json_body["ws_ids"] = auth.get_workspace_ids(auth_token)
 
+        options = dict(stored_query.get("options", {}))
+        if stream is not None:
+            # overrides the stored query's default
+            options["stream"] = stream
+        if keyset_conf:
+            # the whole page must come back in the first batch to find its last row
+            batch_size = max(batch_size, json_body.get(keyset_conf["limit_param"], 0))
+            options.pop("batchSize", None)
+            options.pop("stream", None)
+
         resp_body = arango_client.run_query(
             query_text=stored_query_source,
             bind_vars=json_body,
             batch_size=batch_size,
             full_count=full_count,
+            options=options,
         )
+        if keyset_conf:
+            resp_body["next"] = keyset.next_page_token(
+                query_name, keyset_conf, json_body, resp_body["results"]
+            )
         return flask.jsonify(resp_body)
 
     if "cursor_id" in flask.request.args:
@@ -137,6 +172,19 @@ def run_query():
     raise InvalidParameters("Pass in a query name or a cursor_id")
 
 
+@api_v1.route("/query_results", methods=["DELETE"])
+def delete_query_cursor():
+    """
+    Delete a query cursor whose remaining results are not needed.
+    Like fetching from a cursor, this only needs the cursor ID.
+    """
+    cursor_id = flask.request.args.get("cursor_id")
+    if not cursor_id:
+        raise InvalidParameters("Pass in a cursor_id")
+    arango_client.delete_cursor(cursor_id)
+    return flask.jsonify({"deleted": cursor_id})
+
+
 @api_v1.route("/specs", methods=["PUT"])
 def update_specs():
     """
@@ -155,6 +203,18 @@ def update_specs():
     )
 
 
+@api_v1.route("/index_jobs", methods=["GET"])
+def show_index_jobs():
+    """
+    Show the status and progress of the index builds that were started in the background.
+    Auth: admin
+    """
+    auth.require_auth_token(["RE_ADMIN"])
+    jobs = arango_client.get_index_jobs()
+    pending = sum(1 for job in jobs if job["status"] == "pending")
+    return flask.jsonify({"pending": pending, "jobs": jobs})
+
+
 @api_v1.route("/documents", methods=["PUT"])
 def save_documents():
     """
@@ -178,6 +238,25 @@ def save_documents():
         return flask.jsonify(resp)
 
 
+@api_v1.route("/documents", methods=["DELETE"])
+def delete_documents():
+    """
+    Remove many documents from a collection by _key.
+    Auth: admin
+    """
+    auth.require_auth_token(["RE_ADMIN"])
+    collection_name = flask.request.args["collection"]
+    # raises SchemaNonexistent if there is no such collection
+    spec_loader.get_collection(collection_name, path_only=True)
+    json_body = parse_json.get_json_body() or {}
+    keys = json_body.get("keys")
+    if not isinstance(keys, list) or not all(isinstance(k, str) for k in keys):
+        raise InvalidParameters("'keys' must be a list of document keys")
+    if not keys:
+        return flask.jsonify({"removed": 0, "not_found": 0, "errors": 0})
+    return flask.jsonify(arango_client.remove_documents(collection_name, keys))
+
+
 @api_v1.route("/config", methods=["GET"])
 def show_config():
     """Show public config data."""
@@ -220,6 +299,23 @@ def ensure_all_specs():
         return flask.jsonify(failed_names)
 
 
+def _bool_arg(name):
+    """
+    Parse a boolean query param, such as "true" or "0", which is None if it's not given.
+    Raises InvalidParameters for values that aren't booleans, such as "ture".
+    """
+    arg = flask.request.args.get(name)
+    if arg is None:
+        return None
+    if arg.lower() in ("1", "true", "yes"):
+        return True
+    if arg.lower() in ("0", "false", "no"):
+        return False
+    raise InvalidParameters(
+        f"The '{name}' param must be a boolean, such as 'true' or 'false', not '{arg}'"
+    )
+
+
 def _preprocess_stored_query(query_text, config):
     """Inject some default code into each stored query."""
     ws_id_text = " LET ws_ids = @ws_ids " if "ws_ids" in query_text else ""
@@ -13,6 +13,16 @@ class InvalidParameters(Exception):
         return self.msg
 
 
+class RequestTooLarge(Exception):
+    """A request body, or a line of one, is over the configured limit (yields a 413)."""
+
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+
 class MissingHeader(Exception):
     """Missing required header in a request."""
 
@@ -12,9 +12,10 @@ from relation_engine_server.exceptions import (
     UnauthorizedAccess,
     InvalidParameters,
     NotFound,
+    RequestTooLarge,
 )
 from relation_engine_server.utils.spec_loader import SchemaNonexistent
-from relation_engine_server.utils import arango_client
+from relation_engine_server.utils import arango_client, compression
 
 app = flask.Flask(__name__)
 app.config["DEBUG"] = os.environ.get("FLASK_DEBUG", True)
@@ -90,6 +91,14 @@ def generic_400(err):
     return return_error(resp, 400)
 
 
+@app.errorhandler(RequestTooLarge)
+def request_too_large(err):
+    resp = {
+        "message": str(err),
+    }
+    return return_error(resp, 413)
+
+
 @app.errorhandler(ValidationError)
 def validation_error(err):
     """Json Schema validation error."""
@@ -170,7 +179,8 @@ def after_request(resp):
         "HTTP_ACCESS_CONTROL_REQUEST_HEADERS", "Authorization, Content-Type"
     )
     resp.headers["Access-Control-Allow-Headers"] = env_allowed_headers
-    # Set JSON content type and response length
+    # Set JSON content type, compress large responses, and set the response length
     resp.headers["Content-Type"] = "application/json"
+    compression.compress_response(resp, flask.request.accept_encodings)
     resp.headers["Content-Length"] = resp.calculate_content_length()
     return resp
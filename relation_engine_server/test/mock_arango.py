@@ -0,0 +1,612 @@
+"""
+A lightweight, in-process stand-in for the parts of the ArangoDB HTTP API used by
+relation_engine_server.utils.arango_client, for benchmarks and for tests that don't need a
+real database.
+
+It serves, under /_db/{db_name}/_api (and /_api):
+
+    GET  /version
+    GET  /collection, POST /collection
+    GET  /index (with withHidden), POST /index
+    GET  /view, GET /view/{name}/properties, POST /view
+    GET  /analyzer, POST /analyzer
+    POST /import                         documents (NDJSON) with onDuplicate and overwrite
+    DELETE /document/{collection}        removal by key
+    POST /cursor, PUT /cursor/{id}, DELETE /cursor/{id}
+    POST /query                          "parses" a query, returning its bind vars
+    GET /job/{id}, PUT /job/{id}         requests sent with "x-arango-async: store" run as
+                                         async jobs, in a background thread
+
+It is not a database, and does not parse AQL. The results of a query come from the first
+handler registered with `add_query` whose pattern matches the query text, or else from
+`default_results`; other queries fail with an ArangoDB-style error. Results are returned in
+batches with cursor ids, as ArangoDB does.
+
+Every request can be delayed by a fixed latency, or a latency per route, so that pooling,
+batching and caching can be benchmarked deterministically.
+
+Sample usage:
+
+    with MockArango(latency=0.002) as arango:
+        arango.add_docs("ncbi_taxon", [{"_key": "1", "id": "1"}])
+        arango.add_query(r"FOR t IN ncbi_taxon", lambda bind_vars: arango.docs("ncbi_taxon"))
+        # point the server at the stand-in
+        os.environ["DB_URL"] = arango.url
+
+or from the command line, to run the RE API against it:
+
+    python -m relation_engine_server.test.mock_arango --port 8529 --latency 0.002
+"""
+import argparse
+import base64
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+# ArangoDB collection types
+DOCUMENT_COLLECTION = 2
+EDGE_COLLECTION = 3
+
+# ArangoDB error numbers
+_ERR_NOT_FOUND = 1203
+_ERR_DOCUMENT_NOT_FOUND = 1202
+_ERR_UNIQUE_CONSTRAINT = 1210
+_ERR_DUPLICATE_NAME = 1207
+_ERR_INVALID_EDGE = 1233
+_ERR_CURSOR_NOT_FOUND = 1600
+_ERR_QUERY = 1501
+
+_API_PREFIX = re.compile(r"^(/_db/[^/]+)?/_api/")
+
+
+class MockArangoError(Exception):
+    def __init__(self, status, error_num, message):
+        self.status = status
+        self.error_num = error_num
+        self.message = message
+
+    def json(self):
+        return {
+            "error": True,
+            "code": self.status,
+            "errorNum": self.error_num,
+            "errorMessage": self.message,
+        }
+
+
+class MockArango(object):
+    """
+    An in-process ArangoDB HTTP stand-in, served from a background thread.
+
+    :param latency: (float or dict)     seconds to delay each request by, or a dict of
+                                        "METHOD route" (e.g. "POST cursor") -> seconds,
+                                        with an optional "*" default
+    :param db_name: (str)               database name in /_db/{db_name}/_api urls
+    :param users: (dict)                username -> password; if set, requests must use
+                                        basic auth with one of these
+    """
+
+    def __init__(
+        self, latency=0, db_name="_system", users=None, host="127.0.0.1", port=0
+    ):
+        self.latency = latency
+        self.db_name = db_name
+        self.users = users
+        self.host = host
+        self.port = port
+        self.collections = {}
+        self.views = {}
+        self.analyzers = {}
+        self.queries = []
+        # callable (query, bind_vars) -> results, for queries with no registered handler
+        self.default_results = None
+        # counts of requests by "METHOD route"
+        self.requests = Counter()
+        self._cursors = {}
+        # async job id -> (status, body) once finished, or None while running
+        self._jobs = {}
+        # collection name -> indexes being built by async jobs
+        self._building = {}
+        self._ids = count(1)
+        self._lock = threading.RLock()
+        self._server = None
+
+    # -- lifecycle
+
+    @property
+    def url(self):
+        """the server url, as used for DB_URL"""
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def api_url(self):
+        """the api url, as in the RE API config"""
+        return f"{self.url}/_db/{self.db_name}/_api"
+
+    def start(self):
+        handler = type("Handler", (_Handler,), {"arango": self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # -- setup
+
+    def add_collection(self, name, edge=False):
+        """create a collection, if it doesn't exist"""
+        with self._lock:
+            if name not in self.collections:
+                self.collections[name] = {
+                    "id": str(next(self._ids)),
+                    "type": EDGE_COLLECTION if edge else DOCUMENT_COLLECTION,
+                    "docs": {},
+                    "indexes": [],
+                }
+            return self.collections[name]
+
+    def add_docs(self, coll_name, docs, edge=False):
+        """add documents to a collection, creating it if needed"""
+        coll = self.add_collection(coll_name, edge=edge)
+        with self._lock:
+            for doc in docs:
+                self._save_doc(coll_name, coll, dict(doc))
+
+    def docs(self, coll_name):
+        """the documents in a collection"""
+        return list(self.collections[coll_name]["docs"].values())
+
+    def add_query(self, pattern, results):
+        """
+        Register the results of queries matching a regex.
+
+        :param results: (list or func)  the results, or a function of the bind vars
+                                        returning them
+        """
+        self.queries.append((re.compile(pattern), results))
+
+    # -- request handling
+
+    def request_latency(self, route):
+        if isinstance(self.latency, dict):
+            return self.latency.get(route, self.latency.get("*", 0))
+        return self.latency
+
+    def handle(self, method, path, params, body):
+        """
+        Handle a request to the api.
+
+        :return (status, body[, headers]):  the response status, JSON body and any
+                                            extra headers
+        """
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        route = f"{method} {parts[0]}"
+        self.requests[route] += 1
+        time.sleep(self.request_latency(route))
+        handler = getattr(self, "_" + route.lower().replace(" ", "_"), None)
+        if handler is None:
+            raise MockArangoError(404, 404, f"unknown path /_api/{path}")
+        with self._lock:
+            return handler(parts[1:], params, body)
+
+    def start_job(self, method, path, params, body):
+        """Handle a request as an async job, returning the job id."""
+        with self._lock:
+            job_id = str(next(self._ids))
+            self._jobs[job_id] = None
+            building = None
+            if method == "POST" and path.strip("/") == "index":
+                building = dict(json.loads(body), isBuilding=True, progress=0.0)
+                self._building.setdefault(params.get("collection"), []).append(building)
+        thread = threading.Thread(
+            target=self._run_job,
+            args=(job_id, building, method, path, params, body),
+            daemon=True,
+        )
+        thread.start()
+        return job_id
+
+    def _run_job(self, job_id, building, method, path, params, body):
+        try:
+            result = self.handle(method, path, params, body)
+        except MockArangoError as err:
+            result = (err.status, err.json())
+        except (ValueError, KeyError) as err:
+            result = (400, MockArangoError(400, 400, repr(err)).json())
+        with self._lock:
+            self._jobs[job_id] = result
+            if building is not None:
+                self._building[params.get("collection")].remove(building)
+
+    def _get_job(self, parts, params, body):
+        job_id = parts[0] if parts else ""
+        if job_id not in self._jobs:
+            raise MockArangoError(404, 404, "not found")
+        if self._jobs[job_id] is None:
+            return (204, None)
+        return (200, {"error": False, "code": 200, "id": job_id})
+
+    def _put_job(self, parts, params, body):
+        """fetch, and forget, the result of a finished job"""
+        job_id = parts[0] if parts else ""
+        if job_id not in self._jobs:
+            raise MockArangoError(404, 404, "not found")
+        if self._jobs[job_id] is None:
+            return (204, None)
+        return self._jobs.pop(job_id) + ({"x-arango-async-id": job_id},)
+
+    def _get_version(self, parts, params, body):
+        return (
+            200,
+            {"server": "arango", "version": "3.9.0-mock", "license": "community"},
+        )
+
+    def _get_collection(self, parts, params, body):
+        result = [
+            {
+                "id": coll["id"],
+                "name": name,
+                "status": 3,
+                "type": coll["type"],
+                "isSystem": False,
+                "globallyUniqueId": "mock/" + coll["id"],
+            }
+            for (name, coll) in self.collections.items()
+        ]
+        return (200, {"error": False, "code": 200, "result": result})
+
+    def _post_collection(self, parts, params, body):
+        conf = json.loads(body)
+        name = conf["name"]
+        if name in self.collections:
+            raise MockArangoError(409, _ERR_DUPLICATE_NAME, "duplicate name")
+        coll = self.add_collection(name, edge=conf.get("type") == EDGE_COLLECTION)
+        return (200, {"error": False, "code": 200, "id": coll["id"], "name": name})
+
+    def _collection(self, name):
+        if name not in self.collections:
+            raise MockArangoError(
+                404, _ERR_NOT_FOUND, f"collection or view not found: {name}"
+            )
+        return self.collections[name]
+
+    def _get_index(self, parts, params, body):
+        name = params.get("collection")
+        coll = self._collection(name)
+        indexes = [
+            {"id": name + "/0", "type": "primary", "fields": ["_key"], "unique": True}
+        ]
+        if coll["type"] == EDGE_COLLECTION:
+            indexes.append(
+                {"id": name + "/1", "type": "edge", "fields": ["_from", "_to"]}
+            )
+        indexes += coll["indexes"]
+        if params.get("withHidden", "").lower() == "true":
+            indexes += self._building.get(name, [])
+        return (200, {"error": False, "code": 200, "indexes": indexes})
+
+    def _post_index(self, parts, params, body):
+        name = params.get("collection")
+        coll = self._collection(name)
+        conf = json.loads(body)
+        for index in coll["indexes"]:
+            if index["type"] == conf["type"] and index["fields"] == conf["fields"]:
+                return (200, dict(index, error=False, code=200, isNewlyCreated=False))
+        index_id = f"{name}/{next(self._ids)}"
+        conf.pop("inBackground", None)
+        index = {
+            "unique": False,
+            "sparse": False,
+            **conf,
+            "id": index_id,
+            "name": "idx_" + index_id.split("/")[1],
+        }
+        coll["indexes"].append(index)
+        return (201, dict(index, error=False, code=201, isNewlyCreated=True))
+
+    def _get_view(self, parts, params, body):
+        if parts:
+            if parts[0] not in self.views:
+                raise MockArangoError(
+                    404, _ERR_NOT_FOUND, "collection or view not found"
+                )
+            return (200, dict(self.views[parts[0]], error=False, code=200))
+        result = [
+            {"id": view["id"], "name": name, "type": view["type"]}
+            for (name, view) in self.views.items()
+        ]
+        return (200, {"error": False, "code": 200, "result": result})
+
+    def _post_view(self, parts, params, body):
+        conf = json.loads(body)
+        if conf["name"] in self.views:
+            raise MockArangoError(409, _ERR_DUPLICATE_NAME, "duplicate name")
+        view = {"links": {}, "primarySort": [], **conf, "id": str(next(self._ids))}
+        self.views[conf["name"]] = view
+        return (201, dict(view, error=False, code=201))
+
+    def _get_analyzer(self, parts, params, body):
+        result = list(self.analyzers.values())
+        return (200, {"error": False, "code": 200, "result": result})
+
+    def _post_analyzer(self, parts, params, body):
+        conf = json.loads(body)
+        name = f"{self.db_name}::{conf['name']}"
+        if name in self.analyzers:
+            if self.analyzers[name] != {"features": [], **conf, "name": name}:
+                raise MockArangoError(
+                    400, _ERR_DUPLICATE_NAME, "duplicate name with different settings"
+                )
+            return (200, dict(self.analyzers[name], error=False, code=200))
+        self.analyzers[name] = {"features": [], **conf, "name": name}
+        return (201, dict(self.analyzers[name], error=False, code=201))
+
+    def _save_doc(self, coll_name, coll, doc, on_duplicate="error"):
+        """save a document, returning the count to add to, or an error message"""
+        if coll["type"] == EDGE_COLLECTION and not (
+            isinstance(doc.get("_from"), str) and isinstance(doc.get("_to"), str)
+        ):
+            return ("errors", "edge attribute missing or invalid")
+        key = str(doc.setdefault("_key", str(next(self._ids))))
+        doc["_id"] = f"{coll_name}/{key}"
+        doc["_rev"] = str(next(self._ids))
+        existing = coll["docs"].get(key)
+        if existing is None:
+            coll["docs"][key] = doc
+            return ("created", None)
+        if on_duplicate == "update":
+            coll["docs"][key] = dict(existing, **doc)
+            return ("updated", None)
+        if on_duplicate == "replace":
+            coll["docs"][key] = doc
+            return ("updated", None)
+        if on_duplicate == "ignore":
+            return ("ignored", None)
+        return ("errors", "unique constraint violated")
+
+    def _post_import(self, parts, params, body):
+        name = params.get("collection")
+        coll = self._collection(name)
+        if params.get("overwrite", "").lower() == "true":
+            coll["docs"].clear()
+        counts = {"created": 0, "errors": 0, "empty": 0, "updated": 0, "ignored": 0}
+        details = []
+        lines = body.decode().split("\n") if params.get("type") != "array" else None
+        docs = json.loads(body) if lines is None else lines
+        for (line_no, doc) in enumerate(docs, 1):
+            if lines is not None:
+                if not doc.strip():
+                    counts["empty"] += 1
+                    continue
+                doc = json.loads(doc)
+            if not isinstance(doc, dict):
+                (result, err) = ("errors", "invalid document type")
+            else:
+                (result, err) = self._save_doc(
+                    name, coll, doc, params.get("onDuplicate", "error")
+                )
+            counts[result] += 1
+            if err:
+                details.append(f"at position {line_no}: {err}")
+        resp = dict(counts, error=False)
+        if params.get("details", "").lower() == "true":
+            resp["details"] = details
+        return (201, resp)
+
+    def _delete_document(self, parts, params, body):
+        name = parts[0]
+        coll = self._collection(name)
+        results = []
+        for key in json.loads(body):
+            key = key["_key"] if isinstance(key, dict) else key
+            doc = coll["docs"].pop(key, None)
+            if doc is None:
+                results.append(
+                    {
+                        "error": True,
+                        "errorNum": _ERR_DOCUMENT_NOT_FOUND,
+                        "errorMessage": "document not found",
+                    }
+                )
+            else:
+                results.append({"_id": doc["_id"], "_key": key, "_rev": doc["_rev"]})
+        return (200, results)
+
+    def _query_results(self, query, bind_vars):
+        for (pattern, results) in self.queries:
+            if pattern.search(query):
+                return list(results(bind_vars) if callable(results) else results)
+        if self.default_results is not None:
+            return list(self.default_results(query, bind_vars))
+        raise MockArangoError(
+            400, _ERR_QUERY, f"query not supported by the mock: {query[:200]}"
+        )
+
+    def _post_cursor(self, parts, params, body):
+        req = json.loads(body)
+        start = time.time()
+        results = self._query_results(req["query"], req.get("bindVars", {}))
+        options = req.get("options", {})
+        cursor = {
+            "results": results,
+            "batch_size": req.get("batchSize", 1000),
+            "count": len(results) if req.get("count") else None,
+            "stats": {
+                "writesExecuted": 0,
+                "scannedFull": 0,
+                "filtered": 0,
+                "executionTime": time.time() - start,
+            },
+        }
+        if options.get("fullCount"):
+            cursor["stats"]["fullCount"] = len(results)
+        return (201, self._next_batch(None, cursor))
+
+    def _put_cursor(self, parts, params, body):
+        cursor_id = parts[0] if parts else ""
+        if cursor_id not in self._cursors:
+            raise MockArangoError(404, _ERR_CURSOR_NOT_FOUND, "cursor not found")
+        return (200, self._next_batch(cursor_id, self._cursors[cursor_id]))
+
+    def _delete_cursor(self, parts, params, body):
+        cursor_id = parts[0] if parts else ""
+        if self._cursors.pop(cursor_id, None) is None:
+            raise MockArangoError(404, _ERR_CURSOR_NOT_FOUND, "cursor not found")
+        return (202, {"error": False, "code": 202, "id": cursor_id})
+
+    def _next_batch(self, cursor_id, cursor):
+        size = cursor["batch_size"]
+        (batch, cursor["results"]) = (
+            cursor["results"][:size],
+            cursor["results"][size:],
+        )
+        has_more = bool(cursor["results"])
+        resp = {
+            "error": False,
+            "code": 201 if cursor_id is None else 200,
+            "result": batch,
+            "hasMore": has_more,
+            "cached": False,
+            "extra": {"stats": cursor["stats"], "warnings": []},
+        }
+        if cursor["count"] is not None:
+            resp["count"] = cursor["count"]
+        if has_more:
+            cursor_id = cursor_id or str(next(self._ids))
+            self._cursors[cursor_id] = cursor
+            resp["id"] = cursor_id
+        elif cursor_id is not None:
+            del self._cursors[cursor_id]
+        return resp
+
+    def _post_query(self, parts, params, body):
+        query = json.loads(body)["query"]
+        # strip string literals, so that e.g. emails in strings aren't bind vars
+        code = re.sub(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"", "''", query)
+        bind_vars = sorted(set(re.findall(r"@(@?\w+)", code)))
+        return (
+            200,
+            {
+                "error": False,
+                "code": 200,
+                "parsed": True,
+                "collections": [],
+                "bindVars": bind_vars,
+            },
+        )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep connections alive, so that connection pooling can be measured
+    protocol_version = "HTTP/1.1"
+    arango: "MockArango"
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        headers = {"Content-Type": "application/json"}
+        try:
+            self._check_auth()
+            match = _API_PREFIX.match(url.path)
+            if not match:
+                raise MockArangoError(404, 404, f"unknown path {url.path}")
+            path = _API_PREFIX.sub("", url.path)
+            params = dict(parse_qsl(url.query))
+            if self.headers.get("x-arango-async") == "store":
+                job_id = self.arango.start_job(method, path, params, body)
+                headers["x-arango-async-id"] = job_id
+                (status, resp) = (202, None)
+            else:
+                (status, resp, *extra) = self.arango.handle(method, path, params, body)
+                # handlers may return response headers too
+                headers.update(*extra)
+        except MockArangoError as err:
+            (status, resp) = (err.status, err.json())
+        except (ValueError, KeyError) as err:
+            (status, resp) = (400, MockArangoError(400, 400, repr(err)).json())
+        data = b"" if resp is None else json.dumps(resp).encode()
+        self.send_response(status)
+        for (name, value) in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _check_auth(self):
+        users = self.arango.users
+        if users is None:
+            return
+        auth = self.headers.get("Authorization", "")
+        try:
+            (user, password) = (
+                base64.b64decode(auth.split(" ", 1)[1]).decode().split(":", 1)
+            )
+        except (IndexError, ValueError):
+            (user, password) = (None, None)
+        if users.get(user) != password:
+            raise MockArangoError(401, 401, "not authorized to execute this request")
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Run an ArangoDB HTTP stand-in")
+    argparser.add_argument("--host", default="127.0.0.1")
+    argparser.add_argument("--port", type=int, default=8529)
+    argparser.add_argument(
+        "--latency", type=float, default=0, help="seconds to delay each request by"
+    )
+    argparser.add_argument(
+        "--rows",
+        type=int,
+        default=10,
+        help="number of rows to return for each query",
+    )
+    args = argparser.parse_args()
+    arango = MockArango(latency=args.latency, host=args.host, port=args.port)
+    arango.default_results = lambda query, bind_vars: (
+        {"_key": str(i), "id": str(i)} for i in range(args.rows)
+    )
+    arango.start()
+    print(f"ArangoDB stand-in listening on {arango.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        arango.stop()
+
+
+if __name__ == "__main__":
+    main()
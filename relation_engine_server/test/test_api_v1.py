@@ -3,6 +3,7 @@ Simple integration tests on the API itself.
 
 These tests run within the re_api docker image, and require access to the ArangoDB, auth, and workspace images.
 """
+import gzip
 import unittest
 import requests
 import json
@@ -644,6 +645,83 @@ class TestApi(unittest.TestCase):
         }
         self.assertEqual(resp_json, expected)
 
+    def test_save_documents_gzip(self):
+        """Test saving a gzip-compressed request body."""
+        resp = requests.put(
+            API_URL + "/documents",
+            params={"on_duplicate": "replace", "collection": "test_vertex"},
+            data=gzip.compress(create_test_docs(1000).encode()),
+            headers={**HEADERS_ADMIN, "Content-Encoding": "gzip"},
+        )
+        self.assertTrue(resp.ok, resp.text)
+        self.assertEqual(resp.json()["created"] + resp.json()["updated"], 1000)
+        resp_json = requests.put(
+            API_URL + "/documents",
+            params={"collection": "test_vertex"},
+            data=b"not gzip",
+            headers={**HEADERS_ADMIN, "Content-Encoding": "gzip"},
+        ).json()
+        self.assertIn("Unable to decompress", resp_json["error"]["message"])
+
+    def test_delete_documents(self):
+        """Test removing documents by key."""
+        save_test_docs(3)
+        resp = requests.delete(
+            API_URL + "/documents",
+            params={"collection": "test_vertex"},
+            data=json.dumps({"keys": ["0", "1", "no_such_key"]}),
+            headers=HEADERS_ADMIN,
+        )
+        self.assertTrue(resp.ok, resp.text)
+        self.assertEqual(resp.json(), {"removed": 2, "not_found": 1, "errors": 0})
+        query = "for v in test_vertex filter v._key in ['0', '1', '2'] return v._key"
+        resp_json = requests.post(
+            API_URL + "/query_results",
+            headers=HEADERS_ADMIN,
+            data=json.dumps({"query": query}),
+        ).json()
+        self.assertEqual(resp_json["results"], ["2"])
+
+    def test_delete_documents_invalid(self):
+        """Test invalid requests to remove documents."""
+        self.test_request(
+            "/documents",
+            params={"collection": "test_vertex"},
+            data=json.dumps({"keys": "0"}),
+            headers=HEADERS_NON_ADMIN,
+            method="delete",
+            status_code=403,
+            resp_json={
+                "error": {
+                    "auth_response": "Missing role",
+                    "auth_url": "http://auth:5000",
+                    "message": "Unauthorized",
+                }
+            },
+        )
+        resp_json = requests.delete(
+            API_URL + "/documents",
+            params={"collection": "test_vertex"},
+            data=json.dumps({"keys": "0"}),
+            headers=HEADERS_ADMIN,
+        ).json()
+        self.assertEqual(
+            resp_json["error"]["message"], "'keys' must be a list of document keys"
+        )
+
+    def test_query_results_compressed(self):
+        """Test that large responses are compressed if the client accepts it."""
+        save_test_docs(100)
+        query = "for v in test_vertex limit 100 return v"
+        resp = requests.post(
+            API_URL + "/query_results",
+            headers={**HEADERS_ADMIN, "Accept-Encoding": "gzip"},
+            data=json.dumps({"query": query}),
+        )
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        # requests decompresses the body transparently
+        self.assertEqual(resp.json()["count"], 100)
+
     def test_admin_query(self):
         """Test an ad-hoc query made by an admin."""
         save_test_docs(1)
@@ -0,0 +1,87 @@
+"""
+Test the selection of archive queries for time-travel stored queries
+
+These tests run within the re_api docker image.
+"""
+import unittest
+from unittest import mock
+
+from relation_engine_server.utils import archive
+from relation_engine_server.utils.arango_client import ArangoServerError
+
+_STORED_QUERY = {
+    "name": "fetch_taxon",
+    "query_prefix": "WITH taxa",
+    "query": "live query",
+    "archive": {"collections": ["taxa", "child_of"], "query": "archive query"},
+}
+
+
+@mock.patch("relation_engine_server.utils.archive.arango_client.run_query")
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        archive._CACHE["expires"] = 0
+
+    def test_get_query(self, run_query):
+        """the archive query is run for timestamps before a cutoff"""
+        run_query.return_value = {"results": [["taxa", 100], ["child_of", 50]]}
+        for (ts, query) in [(99, "archive query"), (100, "live query")]:
+            with self.subTest(ts=ts):
+                query_conf = archive.get_query(_STORED_QUERY, {"ts": ts})
+                self.assertEqual(query_conf["query"], query)
+                self.assertEqual(query_conf["query_prefix"], "WITH taxa")
+        # the cutoffs are cached
+        self.assertEqual(run_query.call_count, 1)
+
+    def test_get_query_not_archived(self, run_query):
+        run_query.return_value = {"results": [["other", 100]]}
+        query_conf = archive.get_query(_STORED_QUERY, {"ts": 1})
+        self.assertEqual(query_conf["query"], "live query")
+        self.assertEqual(archive.get_query({"query": "q"}, {"ts": 1}), {"query": "q"})
+
+    def test_no_registry(self, run_query):
+        """the registry collection may not exist yet"""
+        run_query.side_effect = ArangoServerError('{"error": true}')
+        self.assertEqual(archive.get_cutoffs(), {})
+        query_conf = archive.get_query(_STORED_QUERY, {"ts": 1})
+        self.assertEqual(query_conf["query"], "live query")
+
+    def test_archive_query_prefix(self, run_query):
+        run_query.return_value = {"results": [["taxa", 100]]}
+        stored_query = dict(_STORED_QUERY)
+        stored_query["archive"] = dict(
+            _STORED_QUERY["archive"], query_prefix="WITH taxa, taxa_archive"
+        )
+        query_conf = archive.get_query(stored_query, {"ts": 1})
+        self.assertEqual(query_conf["query_prefix"], "WITH taxa, taxa_archive")
+
+    def test_collection_params(self, run_query):
+        """queries over collection params read the archives of the collections passed in"""
+        run_query.return_value = {"results": [["taxa", 100]]}
+        stored_query = {
+            "query": "live query",
+            "archive": {
+                "collections": ["taxa", "child_of"],
+                "query_prefix": "WITH @@coll, @@coll_archive",
+                "query": "FOR t IN @@coll_archive FOR e IN @@edges_archive RETURN t",
+            },
+        }
+        bind_vars = {"ts": 1, "@coll": "taxa", "@edges": "child_of"}
+        query_conf = archive.get_query(stored_query, bind_vars)
+        self.assertEqual(
+            query_conf["bind_vars"],
+            {"@coll_archive": "taxa_archive", "@edges_archive": "child_of_archive"},
+        )
+        # only the cutoffs of the collections passed in count
+        bind_vars["@coll"] = "child_of"
+        query_conf = archive.get_query(stored_query, bind_vars)
+        self.assertEqual(query_conf["query"], "live query")
+        # collections without archive collections are always read live
+        bind_vars["@coll"] = "gtdb_taxon"
+        bind_vars["@edges"] = "taxa"
+        query_conf = archive.get_query(stored_query, bind_vars)
+        self.assertEqual(query_conf["query"], "live query")
+        self.assertEqual(
+            archive.archive_collection_params(stored_query["archive"]["query"]),
+            ["@coll", "@edges"],
+        )
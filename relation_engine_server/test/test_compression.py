@@ -0,0 +1,151 @@
+"""
+Tests for request body decompression and response compression.
+"""
+import gzip
+import io
+import json
+import unittest
+from unittest import mock
+import zlib
+
+import flask
+
+from relation_engine_server.main import app, after_request
+from relation_engine_server.utils import compression
+from relation_engine_server.utils.compression import decompressed_lines
+from relation_engine_server.utils.config import get_config
+from relation_engine_server.exceptions import InvalidParameters, RequestTooLarge
+
+_DOCS = [{"_key": str(i), "name": "x" * (i % 7)} for i in range(5000)]
+_BODY = "\n".join(json.dumps(d) for d in _DOCS).encode()
+
+
+class TestDecompressedLines(unittest.TestCase):
+    def test_identity(self):
+        lines = list(decompressed_lines(io.BytesIO(b'{"a": 1}\n{"b": 2}'), None))
+        self.assertEqual(lines, [b'{"a": 1}\n', b'{"b": 2}'])
+
+    def test_gzip(self):
+        """gzip bodies decompress to the same lines as the original body"""
+        stream = io.BytesIO(gzip.compress(_BODY))
+        lines = list(decompressed_lines(stream, "gzip"))
+        self.assertEqual(lines, list(io.BytesIO(_BODY)))
+        self.assertEqual([json.loads(line) for line in lines], _DOCS)
+
+    def test_gzip_members(self):
+        """concatenated gzip members are all read"""
+        half = len(_BODY) // 2
+        stream = io.BytesIO(gzip.compress(_BODY[:half]) + gzip.compress(_BODY[half:]))
+        self.assertEqual(b"".join(decompressed_lines(stream, "GZIP")), _BODY)
+
+    def test_deflate(self):
+        stream = io.BytesIO(zlib.compress(_BODY))
+        self.assertEqual(b"".join(decompressed_lines(stream, "deflate")), _BODY)
+
+    def test_invalid(self):
+        with self.assertRaises(InvalidParameters):
+            list(decompressed_lines(io.BytesIO(b"abc"), "br"))
+        with self.assertRaises(InvalidParameters):
+            list(decompressed_lines(io.BytesIO(b"not gzip"), "gzip"))
+        with self.assertRaises(InvalidParameters):
+            list(decompressed_lines(io.BytesIO(gzip.compress(_BODY)[:-100]), "gzip"))
+
+    def test_bounded_chunks(self):
+        """highly compressed bodies are decompressed a bounded chunk at a time"""
+        body = b"x" * (10 * compression._READ_SIZE)
+        stream = io.BytesIO(gzip.compress(body) + gzip.compress(body))
+        chunks = list(compression._decompressed_chunks(stream, "gzip"))
+        self.assertEqual(b"".join(chunks), body + body)
+        self.assertLessEqual(
+            max(len(chunk) for chunk in chunks), compression._READ_SIZE
+        )
+
+    def test_long_lines(self):
+        """lines that span many chunks are joined once, and their length is checked"""
+        line = b"x" * (20 * compression._READ_SIZE)
+        body = b"a\n" + line + b"\n" + line
+        lines = list(decompressed_lines(io.BytesIO(gzip.compress(body)), "gzip"))
+        self.assertEqual(lines, [b"a\n", line + b"\n", line])
+        conf = {"request_max_line_bytes": len(line) - 1}
+        with mock.patch.dict(get_config(), conf):
+            with self.assertRaisesRegex(RequestTooLarge, "line is over"):
+                list(decompressed_lines(io.BytesIO(body)))
+
+    def test_flushed_output_checked(self):
+        """output that zlib only gives up at the end is bounded and size checked"""
+
+        class Decompressor:
+            eof = True
+            unused_data = b""
+            unconsumed_tail = b""
+
+            def __init__(self, wbits):
+                self.pending = b"y" * (3 * compression._READ_SIZE)
+
+            def decompress(self, data, max_length):
+                out = self.pending[:max_length]
+                self.pending = self.pending[max_length:]
+                return out
+
+            def flush(self):
+                return b"z" * 500
+
+        with mock.patch.object(compression.zlib, "decompressobj", Decompressor):
+            chunks = list(compression._decompressed_chunks(io.BytesIO(b"x"), "gzip"))
+            self.assertEqual(
+                [len(chunk) for chunk in chunks], [compression._READ_SIZE] * 3 + [500]
+            )
+            conf = {"request_max_body_bytes": 3 * compression._READ_SIZE + 499}
+            with mock.patch.dict(get_config(), conf):
+                with self.assertRaisesRegex(RequestTooLarge, "body is over"):
+                    list(decompressed_lines(io.BytesIO(b"x"), "gzip"))
+
+    def test_too_large(self):
+        conf = {"request_max_line_bytes": 100, "request_max_body_bytes": 1000}
+        with mock.patch.dict(get_config(), conf):
+            lines = list(decompressed_lines(io.BytesIO(b"x" * 100 + b"\n" * 900)))
+            self.assertEqual(len(lines), 900)
+            with self.assertRaisesRegex(RequestTooLarge, "line is over 100 bytes"):
+                list(decompressed_lines(io.BytesIO(gzip.compress(b"x" * 101)), "gzip"))
+            with self.assertRaisesRegex(RequestTooLarge, "body is over 1000 bytes"):
+                list(decompressed_lines(io.BytesIO(b"x\n" * 501)))
+        with app.test_request_context("/api/v1/documents", method="PUT"):
+            resp = app.make_response(
+                app.handle_user_exception(RequestTooLarge("too large"))
+            )
+        self.assertEqual(resp.status_code, 413)
+        self.assertEqual(resp.get_json()["error"]["message"], "too large")
+
+
+class TestResponseCompression(unittest.TestCase):
+    def _response(self, body, accept_encoding=None):
+        headers = {"Accept-Encoding": accept_encoding} if accept_encoding else {}
+        with app.test_request_context("/api/v1/query_results", headers=headers):
+            return after_request(flask.jsonify(body))
+
+    def test_gzip_response(self):
+        resp = self._response({"results": _DOCS}, "gzip, deflate")
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp.headers["Vary"])
+        self.assertEqual(resp.headers["Content-Type"], "application/json")
+        data = resp.get_data()
+        self.assertEqual(int(resp.headers["Content-Length"]), len(data))
+        self.assertEqual(json.loads(gzip.decompress(data)), {"results": _DOCS})
+
+    def test_deflate_response(self):
+        resp = self._response({"results": _DOCS}, "gzip;q=0.5, deflate")
+        self.assertEqual(resp.headers["Content-Encoding"], "deflate")
+        self.assertEqual(
+            json.loads(zlib.decompress(resp.get_data())), {"results": _DOCS}
+        )
+
+    def test_not_accepted(self):
+        resp = self._response({"results": _DOCS})
+        self.assertNotIn("Content-Encoding", resp.headers)
+        self.assertEqual(json.loads(resp.get_data()), {"results": _DOCS})
+
+    def test_small_response(self):
+        """responses under the size threshold are not compressed"""
+        resp = self._response({"results": []}, "gzip")
+        self.assertNotIn("Content-Encoding", resp.headers)
+        self.assertEqual(json.loads(resp.get_data()), {"results": []})
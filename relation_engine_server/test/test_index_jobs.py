@@ -0,0 +1,130 @@
+"""
+Test building indexes in the background, and the registry of index jobs
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from relation_engine_server.test.mock_arango import MockArango
+from relation_engine_server.utils import arango_client, ensure_specs, index_jobs
+
+_BG_INDEX = {"type": "persistent", "fields": ["name"], "inBackground": True}
+
+
+def _add_jobs(prefix, count):
+    for i in range(count):
+        index_jobs.add(f"{prefix}-{i}", "coll", _BG_INDEX)
+
+
+class TestIndexJobs(unittest.TestCase):
+    def setUp(self):
+        self.arango = MockArango(latency={"POST index": 0.5}).start()
+        self.addCleanup(self.arango.stop)
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        conf = {
+            "api_url": self.arango.api_url,
+            "index_jobs_path": os.path.join(temp_dir, "index_jobs.json"),
+        }
+        patcher = mock.patch.dict(arango_client._CONF, conf)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _wait_for_jobs(self, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            jobs = arango_client.get_index_jobs()
+            if all(job["status"] != "pending" for job in jobs):
+                return jobs
+            time.sleep(0.1)
+        self.fail("index jobs did not finish")
+
+    def test_background_index(self):
+        """startup doesn't wait for background indexes, and their progress is shown"""
+        config = {
+            "type": "vertex",
+            "indexes": [{"type": "persistent", "fields": ["id"]}, _BG_INDEX],
+        }
+        start = time.time()
+        arango_client.create_collection("bg_coll", config)
+        # Only the foreground index was waited for
+        self.assertLess(time.time() - start, 0.9)
+        [job] = arango_client.get_index_jobs()
+        self.assertEqual(job["status"], "pending")
+        self.assertEqual(job["name"], "bg_coll/persistent/['name']")
+        self.assertEqual(job["progress"], 0.0)
+        self.assertEqual(index_jobs.pending_names(), {job["name"]})
+        # Building indexes are not started again
+        arango_client.create_collection("bg_coll", config)
+        self.assertEqual(len(index_jobs.load()), 1)
+        [job] = self._wait_for_jobs()
+        self.assertEqual(job["status"], "done")
+        self.assertIsNotNone(job["finished"])
+        self.assertNotIn("progress", index_jobs.load()[0])
+        self.assertEqual(index_jobs.pending_names(), set())
+        indexes = arango_client._get_coll_indexes("bg_coll")
+        self.assertTrue(arango_client._index_exists(_BG_INDEX, indexes))
+
+    def test_failed_background_index(self):
+        arango_client._create_index_in_background("missing_coll", _BG_INDEX)
+        [job] = self._wait_for_jobs()
+        self.assertEqual(job["status"], "failed")
+        self.assertIn("not found", job["error"])
+
+    def test_job_result_already_fetched(self):
+        """jobs whose results were fetched elsewhere are checked against the index"""
+        self.arango.add_collection("bg_coll")
+        job = arango_client._create_index_in_background("bg_coll", _BG_INDEX)
+        time.sleep(0.7)
+        requests.put(self.arango.api_url + "/job/" + job["id"])
+        [job] = arango_client.get_index_jobs()
+        self.assertEqual(job["status"], "done")
+
+    def test_ensure_indexes(self):
+        """pending background indexes are not failures, and inBackground is ignored"""
+        self.arango.add_collection("bg_coll")
+        arango_client._create_index_in_background("bg_coll", _BG_INDEX)
+        local_indexes = {"bg_coll": [_BG_INDEX]}
+        with mock.patch.object(
+            ensure_specs,
+            "get_local_coll_indexes",
+            return_value=(["bg_coll.yaml"], local_indexes),
+        ):
+            self.assertEqual(ensure_specs.ensure_indexes()[0], [])
+            self._wait_for_jobs()
+            self.assertEqual(ensure_specs.ensure_indexes()[0], [])
+
+    def test_registry(self):
+        """finished jobs are not reverted to pending, and old ones are dropped"""
+        job = index_jobs.add("1", "coll", _BG_INDEX)
+        index_jobs.update([dict(job, status="done")])
+        index_jobs.update([job])
+        self.assertEqual(index_jobs.load()[0]["status"], "done")
+        with mock.patch.object(index_jobs, "_MAX_FINISHED", 2):
+            for job_id in ("2", "3"):
+                job = index_jobs.add(job_id, "coll", _BG_INDEX)
+                index_jobs.update([dict(job, status="done")])
+            index_jobs.add("4", "coll", _BG_INDEX)
+        self.assertEqual([job["id"] for job in index_jobs.load()], ["2", "3", "4"])
+
+    def test_registry_processes(self):
+        """jobs added by several processes at once are all kept"""
+        ctx = multiprocessing.get_context("fork")
+        procs = [ctx.Process(target=_add_jobs, args=(p, 25)) for p in "abcd"]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+            self.assertEqual(proc.exitcode, 0)
+        self.assertEqual(len(index_jobs.load()), 100)
+        self.assertEqual(len(index_jobs.pending_names()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
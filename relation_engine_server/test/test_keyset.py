@@ -0,0 +1,112 @@
+"""
+Test keyset pagination helpers
+
+These tests run within the re_api docker image.
+"""
+import unittest
+
+from relation_engine_server.utils import keyset
+from relation_engine_server.exceptions import InvalidParameters
+
+_QUERY_NAME = "ontology_get_descendants"
+_STORED_QUERY = {
+    "name": _QUERY_NAME,
+    "query": "...",
+    "keyset": {"sort_key": ["/term/_key"]},
+}
+
+
+class TestKeyset(unittest.TestCase):
+    def test_get_keyset_config(self):
+        """keyset config defaults are filled in"""
+        conf = keyset.get_keyset_config(_STORED_QUERY, _QUERY_NAME)
+        self.assertEqual(
+            conf,
+            {
+                "sort_key": ["/term/_key"],
+                "limit_param": "limit",
+                "offset_param": "offset",
+            },
+        )
+
+    def test_get_keyset_config_unsupported(self):
+        """stored queries without a keyset block cannot be keyset-paginated"""
+        with self.assertRaisesRegex(
+            InvalidParameters, "does not support keyset pagination"
+        ):
+            keyset.get_keyset_config({"name": "x", "query": "..."}, "x")
+
+    def test_token_round_trip(self):
+        """tokens decode to the values they were encoded from"""
+        for values in [["1"], ["GO:0000001", 12], [None], [{"a": [1, 2]}]]:
+            with self.subTest(values=values):
+                token = keyset.encode_token(_QUERY_NAME, values)
+                self.assertEqual(keyset.decode_token(_QUERY_NAME, token), values)
+
+    def test_decode_token_wrong_query(self):
+        """tokens from a different stored query are rejected"""
+        token = keyset.encode_token("search_compounds", ["cpd00001"])
+        with self.assertRaisesRegex(InvalidParameters, "was not issued for"):
+            keyset.decode_token(_QUERY_NAME, token)
+
+    def test_decode_token_invalid(self):
+        """garbage tokens are rejected"""
+        for token in ["", "not a token!", "bm90IGpzb24=", "WzEsMl0="]:
+            with self.subTest(token=token):
+                with self.assertRaisesRegex(InvalidParameters, "Invalid page token"):
+                    keyset.decode_token(_QUERY_NAME, token)
+
+    def test_apply_page_token(self):
+        """the decoded token is set as the `after` bind variable"""
+        conf = keyset.get_keyset_config(_STORED_QUERY, _QUERY_NAME)
+        bind_vars = keyset.apply_page_token(_QUERY_NAME, conf, {"id": "x"})
+        self.assertEqual(bind_vars, {"id": "x", "after": None})
+
+        token = keyset.encode_token(_QUERY_NAME, ["5"])
+        bind_vars = keyset.apply_page_token(_QUERY_NAME, conf, {"id": "x"}, token)
+        self.assertEqual(bind_vars, {"id": "x", "after": ["5"]})
+
+        with self.assertRaisesRegex(InvalidParameters, "'offset' cannot be used"):
+            keyset.apply_page_token(_QUERY_NAME, conf, {"offset": 20}, token)
+
+    def test_get_query(self):
+        """keyset pages run the keyset query; offset pages run the main one without `after`"""
+        stored_query = {
+            "name": "q",
+            "query": "main",
+            "keyset": {"sort_key": ["/_key"], "query": "keyset"},
+            "archive": {"collections": ["c"], "query": "a", "keyset_query": "a_keyset"},
+        }
+        conf = keyset.get_keyset_config(stored_query, "q")
+        bind_vars = {"id": "x", "after": None}
+        query_conf = keyset.get_query(stored_query, conf, bind_vars)
+        self.assertEqual(query_conf["query"], "keyset")
+        self.assertEqual(query_conf["archive"]["query"], "a_keyset")
+        self.assertEqual(bind_vars, {"id": "x", "after": None})
+
+        self.assertIs(keyset.get_query(stored_query, None, bind_vars), stored_query)
+        self.assertEqual(bind_vars, {"id": "x"})
+
+        # queries without a separate keyset query take `after` on every page
+        bind_vars = {"after": None}
+        self.assertIs(keyset.get_query(_STORED_QUERY, None, bind_vars), _STORED_QUERY)
+        self.assertEqual(bind_vars, {"after": None})
+
+    def test_next_page_token(self):
+        """a token is only returned when the page is full"""
+        conf = keyset.get_keyset_config(_STORED_QUERY, _QUERY_NAME)
+        results = [{"term": {"_key": "1"}}, {"term": {"_key": "2"}}]
+
+        token = keyset.next_page_token(_QUERY_NAME, conf, {"limit": 2}, results)
+        self.assertEqual(keyset.decode_token(_QUERY_NAME, token), ["2"])
+
+        self.assertIsNone(
+            keyset.next_page_token(_QUERY_NAME, conf, {"limit": 3}, results)
+        )
+        self.assertIsNone(keyset.next_page_token(_QUERY_NAME, conf, {"limit": 2}, []))
+
+    def test_next_page_token_missing_sort_key(self):
+        """results must contain the sort key fields"""
+        conf = keyset.get_keyset_config(_STORED_QUERY, _QUERY_NAME)
+        with self.assertRaisesRegex(InvalidParameters, "/term/_key"):
+            keyset.next_page_token(_QUERY_NAME, conf, {"limit": 1}, [{"_key": "1"}])
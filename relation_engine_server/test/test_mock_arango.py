@@ -0,0 +1,148 @@
+"""
+Test the ArangoDB HTTP stand-in against the arango client
+"""
+import json
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from relation_engine_server.test.mock_arango import MockArango
+from relation_engine_server.utils import arango_client
+
+
+class TestMockArango(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.arango = MockArango(users={"root": "", "reader": "pass"}).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.arango.stop()
+
+    def setUp(self):
+        conf = {
+            "api_url": self.arango.api_url,
+            "db_user": "root",
+            "db_pass": "",
+            "db_readonly_user": "reader",
+            "db_readonly_pass": "pass",
+        }
+        patcher = mock.patch.dict(arango_client._CONF, conf)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_server_status(self):
+        self.assertEqual(arango_client.server_status(), "connected_authorized")
+        with mock.patch.dict(arango_client._CONF, {"db_pass": "wrong"}):
+            self.assertEqual(arango_client.server_status(), "unauthorized")
+
+    def test_run_query(self):
+        """results are returned in batches, with a cursor id"""
+        docs = [{"_key": str(i)} for i in range(5)]
+        self.arango.add_query(r"FOR d IN batched", lambda bind_vars: docs)
+        resp = arango_client.run_query(
+            query_text="FOR d IN batched RETURN d", batch_size=2, full_count=True
+        )
+        self.assertEqual(resp["results"], docs[:2])
+        self.assertEqual(resp["count"], 5)
+        self.assertEqual(resp["stats"]["fullCount"], 5)
+        self.assertTrue(resp["has_more"])
+        results = resp["results"]
+        while resp["has_more"]:
+            resp = arango_client.run_query(cursor_id=resp["cursor_id"], batch_size=2)
+            results += resp["results"]
+        self.assertEqual(results, docs)
+        with self.assertRaises(arango_client.ArangoServerError) as ctx:
+            arango_client.run_query(cursor_id=resp["cursor_id"] or "123")
+        self.assertEqual(ctx.exception.resp_json["errorNum"], 1600)
+
+    def test_run_unknown_query(self):
+        with self.assertRaises(arango_client.ArangoServerError) as ctx:
+            arango_client.run_query(query_text="FOR x IN unknown RETURN x")
+        self.assertIn("not supported", ctx.exception.resp_json["errorMessage"])
+
+    def test_collections_and_indexes(self):
+        conf = {"type": "edge", "indexes": [{"type": "persistent", "fields": ["id"]}]}
+        arango_client.create_collection("mock_edges", conf)
+        # duplicates are ignored
+        arango_client.create_collection("mock_edges", conf)
+        colls = {c["name"]: c for c in arango_client.get_all_collections()}
+        self.assertEqual(colls["mock_edges"]["type"], 3)
+        indexes = arango_client.get_all_indexes()["mock_edges"]
+        self.assertEqual(
+            [idx["type"] for idx in indexes], ["primary", "edge", "persistent"]
+        )
+
+    def test_import_and_remove(self):
+        arango_client.create_collection("mock_docs", {"type": "vertex"})
+        docs = [{"_key": "a", "x": 1}, {"_key": "b", "x": 2}]
+        with tempfile.NamedTemporaryFile("w") as fd:
+            fd.write("\n".join(json.dumps(d) for d in docs) + "\n")
+            fd.flush()
+            resp = arango_client.import_from_file(
+                fd.name, {"collection": "mock_docs", "type": "documents"}
+            )
+            self.assertEqual((resp["created"], resp["errors"]), (2, 0))
+            resp = arango_client.import_from_file(
+                fd.name,
+                {
+                    "collection": "mock_docs",
+                    "type": "documents",
+                    "onDuplicate": "update",
+                },
+            )
+            self.assertEqual((resp["created"], resp["updated"]), (0, 2))
+        self.assertEqual(self.arango.docs("mock_docs")[0]["_id"], "mock_docs/a")
+        counts = arango_client.remove_documents("mock_docs", ["a", "c"])
+        self.assertEqual(counts, {"removed": 1, "not_found": 1, "errors": 0})
+        self.assertEqual([d["_key"] for d in self.arango.docs("mock_docs")], ["b"])
+
+    def test_import_edges(self):
+        """edges need _from and _to"""
+        arango_client.create_collection("mock_import_edges", {"type": "edge"})
+        docs = [{"_key": "a", "_from": "x/1", "_to": "x/2"}, {"_key": "b"}]
+        with tempfile.NamedTemporaryFile("w") as fd:
+            fd.write("\n".join(json.dumps(d) for d in docs))
+            fd.flush()
+            resp = arango_client.import_from_file(
+                fd.name,
+                {
+                    "collection": "mock_import_edges",
+                    "type": "documents",
+                    "details": True,
+                },
+            )
+        self.assertEqual((resp["created"], resp["errors"]), (1, 1))
+        self.assertIn("edge attribute", resp["details"][0])
+
+    def test_views_and_analyzers(self):
+        arango_client.create_analyzer(
+            "mock_ngram", {"name": "mock_ngram", "type": "ngram"}
+        )
+        arango_client.create_analyzer(
+            "mock_ngram", {"name": "mock_ngram", "type": "ngram"}
+        )
+        names = [a["name"] for a in arango_client.get_all_analyzers()]
+        self.assertIn("_system::mock_ngram", names)
+        arango_client.create_view("mock_view", {"links": {"mock_docs": {}}})
+        arango_client.create_view("mock_view", {"links": {"mock_docs": {}}})
+        views = {v["name"]: v for v in arango_client.get_all_views()}
+        self.assertEqual(views["mock_view"]["links"], {"mock_docs": {}})
+
+    def test_latency(self):
+        """requests are delayed by the latency of their route"""
+        with MockArango(latency={"GET version": 0.2}) as arango:
+            with mock.patch.dict(arango_client._CONF, {"api_url": arango.api_url}):
+                start = time.time()
+                arango_client.server_status()
+                self.assertGreaterEqual(time.time() - start, 0.2)
+                start = time.time()
+                arango_client.get_all_collections()
+                self.assertLess(time.time() - start, 0.2)
+            self.assertEqual(arango.requests["GET version"], 1)
+            self.assertEqual(arango.requests["GET collection"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
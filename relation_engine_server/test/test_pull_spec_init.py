@@ -0,0 +1,111 @@
+"""
+Test the concurrent initialization of collections, analyzers and views
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from relation_engine_server.test.mock_arango import MockArango
+from relation_engine_server.utils import arango_client, pull_spec
+
+_COLLECTIONS = ["init_coll_%d" % i for i in range(6)]
+
+
+class TestPullSpecInit(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.spec_dir = tempfile.mkdtemp()
+        for name in ("collections", "analyzers", "views"):
+            os.makedirs(os.path.join(cls.spec_dir, name))
+        for name in _COLLECTIONS:
+            with open(
+                os.path.join(cls.spec_dir, "collections", name + ".yaml"), "w"
+            ) as fd:
+                fd.write("name: %s\ntype: vertex\nschema: {}\n" % name)
+        analyzer = {"name": "init_ngram", "type": "ngram", "properties": {}}
+        with open(
+            os.path.join(cls.spec_dir, "analyzers", "init_ngram.json"), "w"
+        ) as fd:
+            json.dump(analyzer, fd)
+        view = {
+            "name": "init_view",
+            "type": "arangosearch",
+            "links": {
+                "init_coll_0": {
+                    "fields": {"name": {"analyzers": ["_system::init_ngram"]}}
+                }
+            },
+        }
+        with open(os.path.join(cls.spec_dir, "views", "init_view.json"), "w") as fd:
+            json.dump(view, fd)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.spec_dir)
+
+    def setUp(self):
+        self.arango = MockArango(
+            latency={"POST collection": 0.2, "POST analyzer": 0.3}
+        ).start()
+        self.addCleanup(self.arango.stop)
+        spec_paths = {
+            name: os.path.join(self.spec_dir, name)
+            for name in ("collections", "analyzers", "views")
+        }
+        for patcher in (
+            mock.patch.dict(arango_client._CONF, {"api_url": self.arango.api_url}),
+            mock.patch.dict(pull_spec._CONF["spec_paths"], spec_paths),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_do_init_all(self):
+        """resources are created concurrently, with a timing for each"""
+        start = time.time()
+        timings = pull_spec.do_init_all(workers=8)
+        # Serially, this would take at least 6 * 0.2 + 0.3 seconds
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(
+            sorted((t["type"], t["name"]) for t in timings),
+            sorted(
+                [("collection", name) for name in _COLLECTIONS]
+                + [("analyzer", "init_ngram"), ("view", "init_view")]
+            ),
+        )
+        self.assertTrue(
+            all(t["seconds"] >= 0.2 for t in timings if t["type"] != "view")
+        )
+        self.assertEqual(set(self.arango.collections), set(_COLLECTIONS))
+        self.assertIn("init_view", self.arango.views)
+
+    def test_views_wait_for_dependencies(self):
+        """views are created after the collections and analyzers they use"""
+        create_view = arango_client.create_view
+
+        def check_deps(name, config):
+            self.assertIn("init_coll_0", self.arango.collections)
+            self.assertIn("_system::init_ngram", self.arango.analyzers)
+            create_view(name, config)
+
+        with mock.patch.object(arango_client, "create_view", check_deps):
+            pull_spec.do_init_all(workers=2)
+        self.assertIn("init_view", self.arango.views)
+
+    def test_failure(self):
+        """the first error is raised once every resource has been tried"""
+        with mock.patch.object(
+            arango_client,
+            "create_analyzer",
+            side_effect=RuntimeError("bad analyzer"),
+        ):
+            with self.assertRaisesRegex(RuntimeError, "bad analyzer"):
+                pull_spec.do_init_all(workers=4)
+        self.assertEqual(set(self.arango.collections), set(_COLLECTIONS))
+
+
+if __name__ == "__main__":
+    unittest.main()
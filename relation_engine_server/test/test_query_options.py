@@ -0,0 +1,182 @@
+"""
+Test that stored query options are applied to the cursor request
+"""
+import json
+import unittest
+from unittest import mock
+
+from relation_engine_server.main import app
+from relation_engine_server.test.mock_arango import MockArango
+from relation_engine_server.utils import arango_client, archive, spec_loader
+
+_RESP = {"error": False, "result": [], "hasMore": False, "extra": {"stats": {}}}
+
+
+class TestQueryOptions(unittest.TestCase):
+    def run_query(self, **kwargs):
+        """Run a query, returning the cursor request that was sent"""
+        resp = mock.Mock(ok=True)
+        resp.json.return_value = dict(_RESP, count=0)
+        with mock.patch.object(
+            arango_client.requests, "request", return_value=resp
+        ) as request:
+            arango_client.run_query(**kwargs)
+        return json.loads(request.call_args[1]["data"])
+
+    def test_defaults(self):
+        req = self.run_query(query_text="RETURN 1")
+        self.assertEqual(req["batchSize"], arango_client.MAX_BATCH_SIZE)
+        self.assertEqual(req["memoryLimit"], arango_client.DEFAULT_MEMORY_LIMIT)
+        self.assertTrue(req["count"])
+        self.assertNotIn("options", req)
+
+    def test_options(self):
+        options = {
+            "maxRuntime": 60,
+            "batchSize": 100,
+            "memoryLimit": 1000,
+            "cache": True,
+            "ttl": 30,
+            "optimizer": {"rules": ["-use-indexes"]},
+        }
+        req = self.run_query(
+            query_text="RETURN 1", batch_size=1000, full_count=True, options=options
+        )
+        self.assertEqual(
+            {k: req[k] for k in ("batchSize", "memoryLimit", "cache", "ttl")},
+            {"batchSize": 100, "memoryLimit": 1000, "cache": True, "ttl": 30},
+        )
+        self.assertEqual(
+            req["options"],
+            {
+                "maxRuntime": 60,
+                "optimizer": {"rules": ["-use-indexes"]},
+                "fullCount": True,
+            },
+        )
+        # the batch_size param can lower the batch size, but not raise it
+        req = self.run_query(query_text="RETURN 1", batch_size=10, options=options)
+        self.assertEqual(req["batchSize"], 10)
+        # the options are not changed
+        self.assertEqual(options["batchSize"], 100)
+
+    def test_stream(self):
+        req = self.run_query(query_text="RETURN 1", options={"stream": True})
+        self.assertFalse(req["count"])
+        self.assertEqual(req["options"], {"stream": True})
+
+    def test_stream_count_unavailable(self):
+        """streaming responses say that the count is not available"""
+        with MockArango() as arango:
+            arango.add_query(r"FOR d IN docs", [{"_key": str(i)} for i in range(5)])
+            with mock.patch.dict(arango_client._CONF, {"api_url": arango.api_url}):
+                resp = arango_client.run_query(
+                    query_text="FOR d IN docs RETURN d",
+                    batch_size=2,
+                    options={"stream": True},
+                )
+                self.assertEqual(
+                    (resp["count"], resp["count_available"]), (None, False)
+                )
+                resp = arango_client.run_query(cursor_id=resp["cursor_id"])
+                self.assertEqual(
+                    (resp["count"], resp["count_available"]), (None, False)
+                )
+                resp = arango_client.run_query(
+                    query_text="FOR d IN docs RETURN d", batch_size=2
+                )
+                self.assertEqual((resp["count"], resp["count_available"]), (5, True))
+
+    def test_delete_cursor(self):
+        with MockArango() as arango:
+            arango.add_query(r"FOR d IN docs", [{"_key": str(i)} for i in range(5)])
+            with mock.patch.dict(arango_client._CONF, {"api_url": arango.api_url}):
+                resp = arango_client.run_query(
+                    query_text="FOR d IN docs RETURN d", batch_size=2
+                )
+                arango_client.delete_cursor(resp["cursor_id"])
+                with self.assertRaises(arango_client.ArangoServerError):
+                    arango_client.run_query(cursor_id=resp["cursor_id"])
+
+    def test_parallelism(self):
+        """parallelism is bound for the traversal OPTIONS that use it"""
+        query = "FOR v IN 1..3 ANY @start edges OPTIONS {parallelism: @parallelism} RETURN v"
+        req = self.run_query(
+            query_text=query, bind_vars={"start": "v/1"}, options={"parallelism": 4}
+        )
+        self.assertEqual(req["query"], query)
+        self.assertEqual(req["bindVars"], {"start": "v/1", "parallelism": 4})
+        self.assertNotIn("options", req)
+
+    def test_find_traversal_options(self):
+        """only the OPTIONS of traversals are found"""
+        query = (
+            "FOR d IN view SEARCH d.name == 'OPTIONS {}' OPTIONS {collections: ['c']} "
+            "// FOR v IN 1 ANY d edges OPTIONS {}\n"
+            "FOR p IN ANY K_SHORTEST_PATHS d TO @end edges OPTIONS {weightAttribute: 'w'} "
+            "FOR v, e IN 1..@depth OUTBOUND d edges PRUNE v.x IN [1] "
+            "OPTIONS {uniqueVertices: 'path', parallelism: @parallelism} "
+            "COLLECT k = v._key OPTIONS {method: 'hash'} "
+            "INSERT {k} INTO log OPTIONS {ignoreErrors: true}"
+        )
+        [(start, end)] = arango_client.find_traversal_options(query)
+        self.assertEqual(
+            query[start:end],
+            "OPTIONS {uniqueVertices: 'path', parallelism: @parallelism}",
+        )
+        self.assertEqual(
+            arango_client.find_traversal_options("FOR d IN c OPTIONS {} RETURN d"), []
+        )
+
+
+@mock.patch.object(archive, "get_cutoffs", return_value={})
+@mock.patch.object(arango_client, "run_query", return_value={"results": []})
+class TestQueryParams(unittest.TestCase):
+    """The `stream` and `keyset` params of POST /api/v1/query_results"""
+
+    def post(self, **params):
+        body = {"id": "GO:1", "ts": 1, "limit": 20}
+        return app.test_client().post(
+            "/api/v1/query_results",
+            query_string=dict(stored_query="GO_get_descendants", **params),
+            data=json.dumps(body),
+        )
+
+    def test_stream(self, run_query, get_cutoffs):
+        for (arg, stream) in [("true", True), ("1", True), ("False", False)]:
+            with self.subTest(arg=arg):
+                self.assertEqual(self.post(stream=arg).status_code, 200)
+                self.assertEqual(run_query.call_args[1]["options"], {"stream": stream})
+
+    def test_invalid_bool(self, run_query, get_cutoffs):
+        """values that aren't booleans are rejected, rather than taken as false"""
+        for params in [{"stream": "ture"}, {"keyset": "on"}, {"stream": ""}]:
+            with self.subTest(params=params):
+                resp = self.post(**params)
+                self.assertEqual(resp.status_code, 400)
+                self.assertIn("must be a boolean", resp.get_json()["error"]["message"])
+        run_query.assert_not_called()
+
+    def test_keyset_stream(self, run_query, get_cutoffs):
+        """keyset pages come back whole in the first batch, so aren't streamed"""
+        resp = self.post(keyset="true", stream="true")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("can't be streamed", resp.get_json()["error"]["message"])
+        run_query.assert_not_called()
+        # nor when the stored query streams by default
+        get_stored_query = spec_loader.get_stored_query
+
+        def streaming(name, path_only=False):
+            if path_only:
+                return get_stored_query(name, path_only=True)
+            options = {"stream": True, "batchSize": 5}
+            return dict(get_stored_query(name), options=options)
+
+        with mock.patch.object(spec_loader, "get_stored_query", side_effect=streaming):
+            self.assertEqual(self.post(keyset="true", batch_size=10).status_code, 200)
+        self.assertEqual(run_query.call_args[1]["options"], {})
+        self.assertEqual(run_query.call_args[1]["batch_size"], 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,13 +3,47 @@ Make ajax requests to the ArangoDB server.
 """
 import sys
 import os
+import re
 import requests
 import json
+import time
 
+from relation_engine_server.utils import index_jobs
 from relation_engine_server.utils.config import get_config
 
 _CONF = get_config()
 
+# ArangoDB error number for a missing document
+_DOCUMENT_NOT_FOUND = 1202
+
+# Most results to return in each batch of a query
+MAX_BATCH_SIZE = 5000
+# Memory limit for queries, unless a stored query sets a lower one (16gb)
+DEFAULT_MEMORY_LIMIT = 16000000000
+# Stored query options that are attributes of the cursor, rather than query options
+_CURSOR_OPTIONS = ("memoryLimit", "cache", "ttl")
+# The bind var that the `parallelism` stored query option is passed as
+PARALLELISM_PARAM = "parallelism"
+# Comments and string literals, which are blanked out before looking for traversals
+_COMMENTS_AND_STRINGS = re.compile(
+    r"//[^\n]*|/\*.*?\*/|\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'", re.DOTALL
+)
+# The start of a graph traversal, eg. "FOR v, e, p IN 1..3 ANY"; path searches such as
+# K_SHORTEST_PATHS take different options
+_TRAVERSAL = re.compile(
+    r"\bFOR\s+\w+(?:\s*,\s*\w+){0,2}\s+IN\s+(?:\S+\s+)?(?:INBOUND|OUTBOUND|ANY)\s+"
+    r"(?!(?:K_SHORTEST_PATHS|K_PATHS|SHORTEST_PATH|ALL_SHORTEST_PATHS)\b)",
+    re.IGNORECASE,
+)
+# The operation after a traversal's graph and PRUNE condition, which may be its OPTIONS
+_NEXT_OPERATION = re.compile(
+    r"\b(?:FOR|LET|FILTER|SEARCH|SORT|LIMIT|COLLECT|WINDOW|RETURN|INSERT|UPDATE"
+    r"|REPLACE|REMOVE|UPSERT|OPTIONS)\b",
+    re.IGNORECASE,
+)
+_OPTIONS_BLOCK = re.compile(r"OPTIONS\s*\{", re.IGNORECASE)
+_BRACE = re.compile(r"[{}]")
+
 
 def adb_request(req_method, url_append, **kw):
     """Make HTTP request to ArangoDB server"""
@@ -40,23 +74,47 @@ def server_status():
 
 
 def run_query(
-    query_text=None, cursor_id=None, bind_vars=None, batch_size=10000, full_count=False
+    query_text=None,
+    cursor_id=None,
+    bind_vars=None,
+    batch_size=10000,
+    full_count=False,
+    options=None,
 ):
-    """Run a query using the arangodb http api. Can return a cursor to get more results."""
+    """
+    Run a query using the arangodb http api. Can return a cursor to get more results.
+    `options` is a dict of stored query options (see spec/stored_query_schema.yaml), eg.
+    {"maxRuntime": 60, "batchSize": 100}. `batchSize` caps the batch size, `memoryLimit`,
+    `cache` and `ttl` are set on the cursor, `parallelism` is passed as the `@parallelism`
+    bind var (for traversal OPTIONS in the query text), and the rest are passed on as arango
+    query options.
+    """
+    options = dict(options or {})
     url = _CONF["api_url"] + "/cursor"
     req_json = {
-        "batchSize": min(5000, batch_size),
-        "memoryLimit": 16000000000,  # 16gb
+        "batchSize": min(
+            MAX_BATCH_SIZE, batch_size, options.pop("batchSize", batch_size)
+        ),
+        "memoryLimit": DEFAULT_MEMORY_LIMIT,
     }
     if cursor_id:
         method = "PUT"
         url += "/" + cursor_id
     else:
         method = "POST"
-        req_json["count"] = True
+        for name in _CURSOR_OPTIONS:
+            if name in options:
+                req_json[name] = options.pop(name)
+        # Streaming queries can't be counted
+        req_json["count"] = not options.get("stream")
+        parallelism = options.pop("parallelism", None)
+        if parallelism:
+            bind_vars = dict(bind_vars or {}, **{PARALLELISM_PARAM: parallelism})
         req_json["query"] = query_text
         if full_count:
-            req_json["options"] = {"fullCount": True}
+            options["fullCount"] = True
+        if options:
+            req_json["options"] = options
         if bind_vars:
             req_json["bindVars"] = bind_vars
     # Run the query as the readonly user
@@ -71,13 +129,50 @@ def run_query(
         raise ArangoServerError(resp.text)
     return {
         "results": resp_json["result"],
-        "count": resp_json["count"],
+        # Streaming queries are not counted
+        "count": resp_json.get("count"),
+        "count_available": "count" in resp_json,
         "has_more": resp_json["hasMore"],
         "cursor_id": resp_json.get("id"),
         "stats": resp_json["extra"]["stats"],
     }
 
 
+def delete_cursor(cursor_id):
+    """Delete a query cursor, freeing its results on the server before it times out."""
+    adb_request(requests.delete, "/cursor/" + cursor_id)
+
+
+def mask_comments_and_strings(query_text):
+    """Blank out the comments and strings in a query, keeping the positions of the rest."""
+    return _COMMENTS_AND_STRINGS.sub(lambda m: " " * len(m.group()), query_text)
+
+
+def find_traversal_options(query_text):
+    """
+    Find the OPTIONS blocks of the graph traversals in a query. The OPTIONS of other
+    operations (SEARCH, COLLECT, INSERT, path searches, etc.), and anything in comments
+    and strings, are left out.
+
+    :return blocks: (list)  the (start, end) positions of each block, from "OPTIONS" to
+                            just past its closing brace
+    """
+    masked = mask_comments_and_strings(query_text)
+    blocks = []
+    for traversal in _TRAVERSAL.finditer(masked):
+        operation = _NEXT_OPERATION.search(masked, traversal.end())
+        if operation and operation.group().upper() == "OPTIONS":
+            block = _OPTIONS_BLOCK.match(masked, operation.start())
+            if block:
+                depth = 1
+                for brace in _BRACE.finditer(masked, block.end()):
+                    depth += 1 if brace.group() == "{" else -1
+                    if not depth:
+                        blocks.append((block.start(), brace.end()))
+                        break
+    return blocks
+
+
 def get_all_collections():
     """
     Fetch information for all existing non-system collections
@@ -182,7 +277,7 @@ def get_all_indexes():
     return all_indexes
 
 
-def _get_coll_indexes(coll_name):
+def _get_coll_indexes(coll_name, with_hidden=False):
     """
     Fetch existing indexes for a collection
     Resp to GET /_api/index is
@@ -207,11 +302,16 @@ def _get_coll_indexes(coll_name):
         ],
         ...
     }
+    With `with_hidden`, indexes that are still being built are included, with
+    "isBuilding": true and (from ArangoDB 3.10) their "progress" as a percentage.
     """
+    params = {"collection": coll_name}
+    if with_hidden:
+        params["withHidden"] = "true"
     resp_json = adb_request(
         req_method=requests.get,
         url_append="/index",
-        params={"collection": coll_name},
+        params=params,
     )
     return resp_json["indexes"]
 
@@ -219,13 +319,17 @@ def _get_coll_indexes(coll_name):
 def _create_indexes(coll_name, config):
     """Create indexes for a collection"""
     url = _CONF["api_url"] + "/index"
-    indexes = _get_coll_indexes(coll_name)
+    # Include the indexes that are still building, so they are not started again
+    indexes = _get_coll_indexes(coll_name, with_hidden=True)
     for idx_conf in config["indexes"]:
         idx_type = idx_conf["type"]
         idx_url = url + "#" + idx_type
         if _index_exists(idx_conf, indexes):
             # POSTing again would not overwrite anyway
             continue
+        if idx_conf.get("inBackground"):
+            _create_index_in_background(coll_name, idx_conf)
+            continue
         print(f"Creating {idx_type} index for collection {coll_name}: {idx_conf}")
         resp = requests.post(
             idx_url,
@@ -240,6 +344,96 @@ def _create_indexes(coll_name, config):
         )
 
 
+def _create_index_in_background(coll_name, idx_conf):
+    """
+    Start building an index as an ArangoDB async job, and register the job in index_jobs.
+    `inBackground` keeps the collection writable while the index builds, and the async
+    job means that we don't wait for it.
+    """
+    print(f"Starting background build of index for collection {coll_name}: {idx_conf}")
+    resp = requests.post(
+        _CONF["api_url"] + "/index#" + idx_conf["type"],
+        params={"collection": coll_name},
+        data=json.dumps(idx_conf),
+        auth=(_CONF["db_user"], _CONF["db_pass"]),
+        headers={"x-arango-async": "store"},
+    )
+    if not resp.ok:
+        raise RuntimeError(resp.text)
+    return index_jobs.add(resp.headers["x-arango-async-id"], coll_name, idx_conf)
+
+
+def get_index_jobs():
+    """
+    Check on the index builds that were started in the background, returning every job
+    in index_jobs with its current status. Jobs that are still pending have a "progress"
+    percentage, if the server reports one.
+    """
+    jobs = index_jobs.load()
+    building = {}
+    for job in jobs:
+        if job["status"] != "pending":
+            continue
+        # Fetching the result of a finished async job also removes it from the server
+        resp = requests.put(
+            _CONF["api_url"] + "/job/" + job["id"],
+            auth=(_CONF["db_user"], _CONF["db_pass"]),
+        )
+        if resp.status_code == 204:
+            # Still building
+            coll_name = job["collection"]
+            if coll_name not in building:
+                building[coll_name] = _building_indexes(coll_name)
+            job["progress"] = next(
+                (
+                    idx.get("progress")
+                    for idx in building[coll_name]
+                    if _index_exists(job["index"], [idx])
+                ),
+                None,
+            )
+            continue
+        job["finished"] = int(time.time() * 1000)
+        # Job results have the job id as a header; without it, the job was not found
+        if "x-arango-async-id" not in resp.headers:
+            # The result was already fetched (eg. by another worker), or the server
+            # restarted; either way, the index tells us whether the build worked
+            if _background_index_exists(job):
+                job["status"] = "done"
+            else:
+                job["status"] = "failed"
+                job["error"] = "The job was not found and the index does not exist"
+        elif resp.ok:
+            job["status"] = "done"
+        else:
+            job["status"] = "failed"
+            try:
+                job["error"] = resp.json()["errorMessage"]
+            except (ValueError, KeyError):
+                job["error"] = resp.text
+    index_jobs.update(jobs)
+    return jobs
+
+
+def _building_indexes(coll_name):
+    """Fetch the indexes of a collection that are still being built."""
+    try:
+        indexes = _get_coll_indexes(coll_name, with_hidden=True)
+    except ArangoServerError:
+        # The collection does not exist
+        return []
+    return [idx for idx in indexes if idx.get("isBuilding")]
+
+
+def _background_index_exists(job):
+    """Check if the index of a background job exists in the database."""
+    try:
+        return _index_exists(job["index"], _get_coll_indexes(job["collection"]))
+    except ArangoServerError:
+        # The collection does not exist
+        return False
+
+
 def _index_exists(idx_conf, indexes):
     """
     Check if an index for a collection was already created in the database.
@@ -273,6 +467,30 @@ def import_from_file(file_path, query):
     return resp_json
 
 
+def remove_documents(collection, keys):
+    """
+    Remove documents from a collection by _key. Keys that are not in the collection are
+    counted, not treated as errors.
+    """
+    resp = requests.delete(
+        _CONF["api_url"] + "/document/" + collection,
+        data=json.dumps(keys),
+        auth=(_CONF["db_user"], _CONF["db_pass"]),
+        params={"ignoreRevs": "true"},
+    )
+    if not resp.ok:
+        raise ArangoServerError(resp.text)
+    counts = {"removed": 0, "not_found": 0, "errors": 0}
+    for result in resp.json():
+        if not result.get("error"):
+            counts["removed"] += 1
+        elif result.get("errorNum") == _DOCUMENT_NOT_FOUND:
+            counts["not_found"] += 1
+        else:
+            counts["errors"] += 1
+    return counts
+
+
 def get_all_views():
     """
     Fetch all existing views from server
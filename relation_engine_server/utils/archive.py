@@ -0,0 +1,107 @@
+"""
+Archived versions of time-travel collections.
+
+Versions of documents in time-travel (delta) collections that expired before a cutoff can be
+moved to companion archive collections, e.g. ncbi_taxon -> ncbi_taxon_archive (see
+importers/utils/delta_archive.py). The cutoff of each archived collection is recorded in the
+`delta_archive_registry` collection.
+
+Stored queries over archived collections declare an `archive` block with an alternative
+query that reads the archive collections as well as the live ones. It is run only when the
+query's timestamp is older than the cutoff of one of the collections it lists, so queries
+for recent timestamps only touch the live collections.
+
+Example `archive` block in a stored query spec:
+
+    archive:
+      collections: [ncbi_taxon]
+      ts_param: ts
+      query: |
+        FOR t IN UNION(
+          (FOR t IN ncbi_taxon FILTER ... RETURN t),
+          (FOR t IN ncbi_taxon_archive FILTER ... RETURN t)
+        )
+        ...
+
+Queries that take their collections as bind parameters (e.g. `@@taxon_coll`) name the
+archive collection of each as the parameter name plus `_archive` (`@@taxon_coll_archive`),
+which is set from the value of the parameter (e.g. `ncbi_taxon_archive`). The collections
+such a query reads are the ones passed in, so their cutoffs alone decide whether the
+archive query is run; the `collections` listed are the ones that have archive collections,
+and the stored query itself is run for any others.
+
+Cutoffs are cached for ARCHIVE_CUTOFF_TTL seconds.
+"""
+import re
+import time
+
+from relation_engine_server.utils import arango_client
+from relation_engine_server.utils.config import get_config
+
+REGISTRY_COLLECTION = "delta_archive_registry"
+
+_CUTOFF_QUERY = "FOR a IN @@registry RETURN [a._key, a.cutoff]"
+
+_CACHE = {"cutoffs": {}, "expires": 0}
+
+# The archive collection of a collection param `@@coll`, e.g. `@@coll_archive`
+_ARCHIVE_PARAM = re.compile(r"@@(\w+)_archive\b")
+
+
+def get_cutoffs():
+    """Return a dict of collection name -> archive cutoff for the archived collections."""
+    now = time.time()
+    if now >= _CACHE["expires"]:
+        try:
+            resp = arango_client.run_query(
+                query_text=_CUTOFF_QUERY, bind_vars={"@registry": REGISTRY_COLLECTION}
+            )
+            cutoffs = dict(resp["results"])
+        except arango_client.ArangoServerError:
+            # the registry does not exist until the specs have been loaded
+            cutoffs = {}
+        _CACHE["cutoffs"] = cutoffs
+        _CACHE["expires"] = now + get_config()["archive_cutoff_ttl"]
+    return _CACHE["cutoffs"]
+
+
+def archive_collection_params(query_text):
+    """
+    The collection params whose archive collections a query reads, e.g. `@taxon_coll`
+    for a query that reads `@@taxon_coll_archive`.
+    """
+    return sorted({"@" + name for name in _ARCHIVE_PARAM.findall(query_text)})
+
+
+def get_query(stored_query, bind_vars):
+    """
+    Return the query config (`query` and `query_prefix`) to run for a stored query: the
+    archive query if the stored query has one and the timestamp in `bind_vars` is older
+    than the cutoff of one of its archived collections, or else the stored query itself.
+    The archive query config also has the `bind_vars` to add for the archive collections
+    of collection params.
+    """
+    archive = stored_query.get("archive")
+    if not archive:
+        return stored_query
+    ts = bind_vars.get(archive.get("ts_param", "ts"))
+    if ts is None:
+        return stored_query
+    query_prefix = archive.get("query_prefix", stored_query.get("query_prefix", ""))
+    collections = archive["collections"]
+    params = archive_collection_params(query_prefix + "\n" + archive["query"])
+    if params:
+        # the query reads the collections that were passed in, which must all have
+        # archive collections
+        bound = {bind_vars.get(p) for p in params}
+        if not bound <= set(collections):
+            return stored_query
+        collections = list(bound)
+    cutoffs = get_cutoffs()
+    if not any(ts < cutoffs[c] for c in collections if c in cutoffs):
+        return stored_query
+    return {
+        "query_prefix": query_prefix,
+        "query": archive["query"],
+        "bind_vars": {p + "_archive": bind_vars[p] + "_archive" for p in params},
+    }
@@ -8,13 +8,15 @@ import hashlib
 from relation_engine_server.utils.json_validation import get_schema_validator
 from relation_engine_server.utils.spec_loader import get_collection
 from relation_engine_server.utils.arango_client import import_from_file
+from relation_engine_server.utils.compression import decompressed_lines
 
 
 def bulk_import(query_params):
     """
     Stream lines of JSON from a request body, validating each one against a
     schema, then write them into a temporary file that can be passed into the
-    arango client.
+    arango client. gzip and deflate encoded bodies are decompressed as they
+    are read.
     """
     schema_file = get_collection(query_params["collection"], path_only=True)
     validator = get_schema_validator(schema_file=schema_file, validate_at="/schema")
@@ -25,7 +27,8 @@ def bulk_import(query_params):
     try:
         # Stream request data line-by-line
         # Parse each line to json, validate the schema, and write to a file
-        for line in flask.request.stream:
+        content_encoding = flask.request.headers.get("Content-Encoding")
+        for line in decompressed_lines(flask.request.stream, content_encoding):
             json_line = json.loads(line)
             validator.validate(json_line)
             json_line = _write_edge_key(json_line)
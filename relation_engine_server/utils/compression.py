@@ -0,0 +1,122 @@
+"""
+gzip/deflate support for request bodies and responses.
+"""
+import zlib
+
+from relation_engine_server.utils.config import get_config
+from relation_engine_server.exceptions import InvalidParameters, RequestTooLarge
+
+# zlib window bits for each supported content coding
+_WBITS = {
+    "gzip": 16 + zlib.MAX_WBITS,
+    "deflate": zlib.MAX_WBITS,
+}
+_READ_SIZE = 64 * 1024
+_COMPRESS_LEVEL = 6
+
+
+def decompressed_lines(stream, content_encoding=None):
+    """
+    Iterate over the lines of a request body stream, decompressing it on the fly
+    if it has a gzip or deflate Content-Encoding. Only one chunk of the body is
+    held in memory at a time, however well it compresses.
+    Raises RequestTooLarge if a line is longer than `request_max_line_bytes`, or the
+    (decompressed) body is larger than `request_max_body_bytes`.
+    """
+    conf = get_config()
+    max_line = conf["request_max_line_bytes"]
+    max_body = conf["request_max_body_bytes"]
+
+    def check_line(line_bytes):
+        if 0 <= max_line < line_bytes:
+            raise RequestTooLarge(f"Request body line is over {max_line} bytes")
+
+    body_bytes = 0
+    # the pieces of a line that runs on from earlier chunks, joined once it ends
+    partial = []  # type: list
+    partial_bytes = 0
+    for data in _decompressed_chunks(stream, content_encoding):
+        body_bytes += len(data)
+        if 0 <= max_body < body_bytes:
+            raise RequestTooLarge(f"Request body is over {max_body} bytes")
+        start = 0
+        # just past the end of the next line, or 0 if it runs on into the next chunk
+        end = data.find(b"\n") + 1
+        while end:
+            check_line(partial_bytes + end - 1 - start)
+            partial.append(data[start:end])
+            yield b"".join(partial)
+            (partial, partial_bytes) = ([], 0)
+            start = end
+            end = data.find(b"\n", start) + 1
+        if start < len(data):
+            partial.append(data[start:])
+            partial_bytes += len(data) - start
+            check_line(partial_bytes)
+    if partial:
+        yield b"".join(partial)
+
+
+def _decompressed_chunks(stream, content_encoding):
+    """
+    Read a request body stream in chunks of at most _READ_SIZE bytes, decompressing
+    gzip or deflate bodies. Output that zlib holds back once the input has all been read
+    is drained in chunks of the same size, so it is bounded and counted like the rest.
+    """
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        yield from iter(lambda: stream.read(_READ_SIZE), b"")
+        return
+    if encoding not in _WBITS:
+        raise InvalidParameters(f"Unsupported Content-Encoding: {content_encoding}")
+    wbits = _WBITS[encoding]
+    decompressor = zlib.decompressobj(wbits)
+    try:
+        for chunk in iter(lambda: stream.read(_READ_SIZE), b""):
+            while chunk:
+                # Bound the output, keeping the rest of the input for the next pass
+                data = decompressor.decompress(chunk, _READ_SIZE)
+                chunk = decompressor.unconsumed_tail
+                if decompressor.eof and decompressor.unused_data:
+                    # concatenated gzip members, e.g. from compressing a file in parts
+                    chunk = decompressor.unused_data
+                    decompressor = zlib.decompressobj(wbits)
+                if data:
+                    yield data
+        data = decompressor.decompress(b"", _READ_SIZE)
+        while data:
+            yield data
+            data = decompressor.decompress(b"", _READ_SIZE)
+        data = decompressor.flush()
+    except zlib.error as err:
+        raise InvalidParameters(f"Unable to decompress request body: {err}")
+    if not decompressor.eof:
+        raise InvalidParameters("Unable to decompress request body: truncated data")
+    if data:
+        yield data
+
+
+def compress_response(resp, accept_encodings):
+    """
+    Compress a response body in place if the client accepts gzip or deflate and
+    the body is at least `response_compression_min_bytes` long. Small bodies are
+    not worth the CPU time.
+    Params:
+        resp - flask response object
+        accept_encodings - werkzeug Accept object for the Accept-Encoding header
+    """
+    min_bytes = get_config()["response_compression_min_bytes"]
+    if min_bytes < 0 or resp.direct_passthrough or "Content-Encoding" in resp.headers:
+        return resp
+    resp.vary.add("Accept-Encoding")
+    # prefer gzip if the client rates both equally
+    encoding = accept_encodings.best_match(["gzip", "deflate"])
+    if not encoding:
+        return resp
+    data = resp.get_data()
+    if len(data) < min_bytes:
+        return resp
+    compressor = zlib.compressobj(_COMPRESS_LEVEL, zlib.DEFLATED, _WBITS[encoding])
+    resp.set_data(compressor.compress(data) + compressor.flush())
+    resp.headers["Content-Encoding"] = encoding
+    return resp
@@ -3,6 +3,7 @@ Load configuration data from environment variables.
 """
 import os
 import functools
+import tempfile
 from urllib.parse import urljoin
 
 
@@ -31,6 +32,26 @@ def get_config():
     db_readonly_user = os.environ.get("DB_READONLY_USER", db_user)
     db_readonly_pass = os.environ.get("DB_READONLY_PASS", db_pass)
     api_url = db_url + "/_db/" + db_name + "/_api"
+    # Responses smaller than this are not compressed; set to -1 to disable compression
+    response_compression_min_bytes = int(
+        os.environ.get("RESPONSE_COMPRESSION_MIN_BYTES", 1024)
+    )
+    # Longest line and largest body (after decompression) accepted in document uploads;
+    # set to -1 for no limit
+    request_max_line_bytes = int(
+        os.environ.get("REQUEST_MAX_LINE_BYTES", 16 * 1024 * 1024)
+    )
+    request_max_body_bytes = int(
+        os.environ.get("REQUEST_MAX_BODY_BYTES", 8 * 1024 * 1024 * 1024)
+    )
+    # Seconds to cache the archive cutoffs of time-travel collections for
+    archive_cutoff_ttl = int(os.environ.get("ARCHIVE_CUTOFF_TTL", 60))
+    # Number of collections, analyzers and views to create concurrently at startup
+    spec_init_workers = int(os.environ.get("SPEC_INIT_WORKERS", 8))
+    # Registry of the index builds started in the background, shared by the API workers
+    index_jobs_path = os.environ.get(
+        "INDEX_JOBS_PATH", os.path.join(tempfile.gettempdir(), "re_index_jobs.json")
+    )
     return {
         "auth_url": auth_url,
         "workspace_url": workspace_url,
@@ -45,14 +66,25 @@ def get_config():
         "spec_repo_url": spec_repo_url,
         "spec_release_url": spec_release_url,
         "spec_release_path": spec_release_path,
-        "spec_paths": {
-            "root": spec_path,  # /spec
-            "release_id": os.path.join(spec_path, ".release_id"),
-            "collections": os.path.join(spec_path, "collections"),  # /spec/collections
-            "datasets": os.path.join(spec_path, "datasets"),
-            "data_sources": os.path.join(spec_path, "data_sources"),
-            "stored_queries": os.path.join(spec_path, "stored_queries"),
-            "views": os.path.join(spec_path, "views"),
-            "analyzers": os.path.join(spec_path, "analyzers"),
-        },
+        "response_compression_min_bytes": response_compression_min_bytes,
+        "request_max_line_bytes": request_max_line_bytes,
+        "request_max_body_bytes": request_max_body_bytes,
+        "archive_cutoff_ttl": archive_cutoff_ttl,
+        "spec_init_workers": spec_init_workers,
+        "index_jobs_path": index_jobs_path,
+        "spec_paths": get_spec_paths(spec_path),
+    }
+
+
+def get_spec_paths(spec_path):
+    """Paths of the parts of a spec directory."""
+    return {
+        "root": spec_path,  # /spec
+        "release_id": os.path.join(spec_path, ".release_id"),
+        "collections": os.path.join(spec_path, "collections"),  # /spec/collections
+        "datasets": os.path.join(spec_path, "datasets"),
+        "data_sources": os.path.join(spec_path, "data_sources"),
+        "stored_queries": os.path.join(spec_path, "stored_queries"),
+        "views": os.path.join(spec_path, "views"),
+        "analyzers": os.path.join(spec_path, "analyzers"),
     }
@@ -6,7 +6,7 @@ a subset of the top-level fields of the server specs
 from typing import Union, Callable
 
 from relation_engine_server.utils.json_validation import load_json_yaml
-from relation_engine_server.utils import arango_client
+from relation_engine_server.utils import arango_client, index_jobs
 from spec.validate import get_schema_type_paths
 
 
@@ -68,6 +68,9 @@ def ensure_indexes():
     coll_name_2_indexes_server = arango_client.get_all_indexes()
     coll_spec_paths, coll_name_2_indexes_local = get_local_coll_indexes()
 
+    # Indexes that are building in the background don't exist yet, but aren't failures
+    pending_names = index_jobs.pending_names()
+
     failed_specs = {}
     for coll_spec_path, (coll_name, indexes_local) in zip(
         coll_spec_paths, coll_name_2_indexes_local.items()
@@ -80,6 +83,11 @@ def ensure_indexes():
             failed_specs[coll_name] = []
         indexes_server = coll_name_2_indexes_server[coll_name]
         for index_local in indexes_local:
+            if index_jobs.job_name(coll_name, index_local) in pending_names:
+                print(f"Index {coll_name}/{index_local['fields']} is still building")
+                continue
+            # inBackground is an option for creating the index, not part of it
+            index_local = {k: v for k, v in index_local.items() if k != "inBackground"}
             if not match(index_local, indexes_server):
                 failed_specs[coll_name] = index_local
 
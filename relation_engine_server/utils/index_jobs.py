@@ -0,0 +1,110 @@
+"""
+A registry of the index builds that were started in the background (indexes with
+`inBackground: true` in their collection spec).
+
+The builds run as ArangoDB async jobs, so they outlive the startup script that starts
+them. The registry is kept in a JSON file (INDEX_JOBS_PATH) so that it is shared by the
+startup script and every API worker. Changes hold an exclusive `flock` on a lock file next
+to it (`{INDEX_JOBS_PATH}.lock`) while they read and rewrite the registry, so concurrent
+processes don't lose each other's jobs, and the file is replaced atomically so readers
+never see a partial write. Each job looks like:
+
+    {
+        "id": "1234",                       # the ArangoDB async job id
+        "name": "ncbi_taxon/persistent/['scientific_name']",
+        "collection": "ncbi_taxon",
+        "index": {"type": "persistent", "fields": ["scientific_name"], ...},
+        "status": "pending",                # or "done" or "failed"
+        "started": 1597000000000,           # ms since the epoch
+        "finished": None,
+        "error": None,
+    }
+"""
+import contextlib
+import fcntl
+import json
+import os
+import tempfile
+import time
+from typing import List, Set
+
+from relation_engine_server.utils.config import get_config
+
+_CONF = get_config()
+
+# Finished jobs beyond this many are dropped from the registry, oldest first
+_MAX_FINISHED = 100
+
+
+def job_name(coll_name, idx_conf):
+    """The name of an index, as used by ensure_specs, e.g. "coll/persistent/['id']"."""
+    return f"{coll_name}/{idx_conf['type']}/{idx_conf['fields']}"
+
+
+def load() -> List[dict]:
+    """Load all the jobs in the registry, oldest first."""
+    try:
+        with open(_CONF["index_jobs_path"]) as fd:
+            return json.load(fd)
+    except FileNotFoundError:
+        return []
+
+
+def add(job_id, coll_name, idx_conf):
+    """Register a newly started index build."""
+    job = {
+        "id": job_id,
+        "name": job_name(coll_name, idx_conf),
+        "collection": coll_name,
+        "index": idx_conf,
+        "status": "pending",
+        "started": int(time.time() * 1000),
+        "finished": None,
+        "error": None,
+    }
+    with _locked():
+        jobs = [j for j in load() if j["id"] != job_id]
+        _save(jobs + [job])
+    return job
+
+
+def update(jobs):
+    """Save the status of jobs that are already in the registry."""
+    by_id = {job["id"]: job for job in jobs}
+    with _locked():
+        saved = load()
+        for (i, job) in enumerate(saved):
+            # Never move a finished job back to pending
+            if job["id"] in by_id and job["status"] == "pending":
+                saved[i] = {
+                    k: v for k, v in by_id[job["id"]].items() if k != "progress"
+                }
+        _save(saved)
+
+
+def pending_names() -> Set[str]:
+    """Names of the indexes that are still building."""
+    return {job["name"] for job in load() if job["status"] == "pending"}
+
+
+@contextlib.contextmanager
+def _locked():
+    """Hold the registry lock, across processes, to read and rewrite the registry."""
+    with open(_CONF["index_jobs_path"] + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _save(jobs):
+    """Write the registry atomically, dropping the oldest finished jobs."""
+    finished = [job for job in jobs if job["status"] != "pending"]
+    dropped = {job["id"] for job in finished[: max(len(finished) - _MAX_FINISHED, 0)]}
+    jobs = [job for job in jobs if job["id"] not in dropped]
+    path = _CONF["index_jobs_path"]
+    (fd, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+    with os.fdopen(fd, "w") as tmp_file:
+        json.dump(jobs, tmp_file)
+    os.replace(tmp_path, path)
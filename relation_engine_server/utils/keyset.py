@@ -0,0 +1,132 @@
+"""
+Keyset pagination for stored queries.
+
+Stored queries that declare a `keyset` block can be paged through by sort key
+rather than by offset. Each page response carries an opaque `next` token that
+encodes the sort key of the last row returned; passing the token back as the
+`page_token` query parameter resumes the query directly after that row.
+
+Example `keyset` block in a stored query spec:
+
+    keyset:
+      sort_key: [/term/_key]
+      limit_param: limit
+      offset_param: offset
+
+The stored query must accept an `after` bind parameter (an array of sort key
+values, or null for the first page) and filter on it, e.g.
+
+    FILTER @after == null OR v._key > @after[0]
+
+If only a different query has a unique sort key, e.g. one that collects rows, it
+can be given as `keyset.query` (and `archive.keyset_query`); the main query then
+runs unchanged for offset pages, without the `after` parameter.
+
+Deep pages cost no more than the first one only where an index or view applies
+the `after` filter; otherwise the rows before the page are still read and sorted.
+"""
+import base64
+import binascii
+import json
+
+from jsonpointer import resolve_pointer, JsonPointerException
+
+from relation_engine_server.exceptions import InvalidParameters
+
+# Name of the bind parameter that receives the decoded sort key values
+AFTER_PARAM = "after"
+
+
+def get_keyset_config(stored_query, query_name):
+    """
+    Return the keyset pagination config of a stored query, filling in defaults.
+    Raises InvalidParameters if the stored query does not support keyset pagination.
+    """
+    if "keyset" not in stored_query:
+        raise InvalidParameters(
+            f"Stored query '{query_name}' does not support keyset pagination"
+        )
+    keyset = stored_query["keyset"]
+    return {
+        "sort_key": keyset["sort_key"],
+        "limit_param": keyset.get("limit_param", "limit"),
+        "offset_param": keyset.get("offset_param", "offset"),
+    }
+
+
+def get_query(stored_query, keyset, bind_vars):
+    """
+    Return the stored query config to run: for keyset pages (`keyset` is the keyset
+    config), the stored query with its `keyset.query` and `archive.keyset_query`
+    swapped in, if it has them, or else the stored query itself. Offset pages of queries
+    with a separate keyset query don't take the `after` bind variable, so it is removed.
+    """
+    keyset_query = stored_query.get("keyset", {}).get("query")
+    if not keyset_query:
+        return stored_query
+    if keyset is None:
+        bind_vars.pop(AFTER_PARAM, None)
+        return stored_query
+    query_conf = dict(stored_query, query=keyset_query)
+    if "archive" in stored_query:
+        archive = stored_query["archive"]
+        query_conf["archive"] = dict(archive, query=archive["keyset_query"])
+    return query_conf
+
+
+def apply_page_token(query_name, keyset, bind_vars, page_token=None):
+    """
+    Set up the bind variables for a keyset-paginated request.
+    If a page token is supplied, it is decoded into the `after` bind variable.
+    """
+    if bind_vars.get(keyset["offset_param"]):
+        raise InvalidParameters(
+            f"'{keyset['offset_param']}' cannot be used with keyset pagination"
+        )
+    bind_vars[AFTER_PARAM] = (
+        decode_token(query_name, page_token) if page_token else None
+    )
+    return bind_vars
+
+
+def next_page_token(query_name, keyset, bind_vars, results):
+    """
+    Return the token for the page after `results`, or None if this was the last page.
+    Must be called after the bind variables have been validated (and defaults filled in).
+    """
+    limit = bind_vars.get(keyset["limit_param"])
+    if not results or (limit is not None and len(results) < limit):
+        return None
+    return encode_token(query_name, get_sort_values(results[-1], keyset["sort_key"]))
+
+
+def get_sort_values(row, sort_key):
+    """Extract the values of the sort key fields (JSON pointers) from a result row."""
+    try:
+        return [resolve_pointer(row, pointer) for pointer in sort_key]
+    except JsonPointerException:
+        raise InvalidParameters(
+            "Keyset pagination requires the sort key fields "
+            f"{', '.join(sort_key)} to be present in the results"
+        )
+
+
+def encode_token(query_name, values):
+    """Encode the sort key values of the last row of a page as an opaque string."""
+    payload = json.dumps({"q": query_name, "k": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_token(query_name, token):
+    """Decode a page token, checking that it was issued for the same stored query."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        token_query = payload["q"]
+        values = payload["k"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidParameters("Invalid page token")
+    if token_query != query_name or not isinstance(values, list):
+        raise InvalidParameters(
+            f"Page token was not issued for stored query '{query_name}'"
+        )
+    return values
@@ -4,8 +4,10 @@ import tarfile
 import tempfile
 import shutil
 import json
+import time
 import yaml
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Iterable, List, Optional, Set
 
 from relation_engine_server.utils import arango_client
 from relation_engine_server.utils.config import get_config
@@ -57,9 +59,7 @@ def download_specs(
         shutil.rmtree(temp_dir)
     # Initialize all the collections
     if init_collections:
-        do_init_collections()
-        do_init_views()
-        do_init_analyzers()
+        do_init_all()
     # Check that local specs have matching server specs
     # Necessary because creating resources like indexes
     # does not overwrite any pre-existing indexes
@@ -72,30 +72,111 @@ def download_specs(
     return update_name
 
 
+def do_init_all(
+    schema_types: Iterable[str] = ("collection", "analyzer", "view"),
+    workers: Optional[int] = None,
+) -> List[dict]:
+    """
+    Initialize any uninitialized collections, analyzers and views in the database
+    using a bounded pool of worker threads (`SPEC_INIT_WORKERS`). A view is only
+    created once the collections it links and the analyzers it uses exist.
+    Returns a timing entry ({"type", "name", "seconds"}) for each resource.
+    """
+    if workers is None:
+        workers = _CONF["spec_init_workers"]
+    schema_types = set(schema_types)
+    start = time.time()
+    futures = {}
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        # Collections and analyzers have no dependencies on each other
+        for schema_type in ("collection", "analyzer"):
+            if schema_type not in schema_types:
+                continue
+            for name, config in _load_specs(schema_type):
+                futures[(schema_type, name)] = pool.submit(
+                    _init_resource, schema_type, name, config
+                )
+        if "view" in schema_types:
+            for name, config in _load_specs("view"):
+                deps = [
+                    futures[dep] for dep in _view_dependencies(config) if dep in futures
+                ]
+                wait(deps)
+                futures[("view", name)] = pool.submit(
+                    _init_resource, "view", name, config
+                )
+    # Raises the error of the first resource that failed to initialize
+    timings = [future.result() for future in futures.values()]
+    elapsed = time.time() - start
+    counts = {
+        schema_type: sum(1 for t in timings if t["type"] == schema_type)
+        for schema_type in ("collection", "analyzer", "view")
+    }
+    print(
+        f"Initialized {counts['collection']} collections, {counts['analyzer']} analyzers "
+        f"and {counts['view']} views in {elapsed:.2f}s with {workers} workers"
+    )
+    for timing in sorted(timings, key=lambda t: t["seconds"], reverse=True)[:10]:
+        print(f"  {timing['seconds']:8.3f}s  {timing['type']} {timing['name']}")
+    return timings
+
+
 def do_init_collections():
     """Initialize any uninitialized collections in the database from a set of collection schemas."""
-    for path in get_schema_type_paths("collection"):
-        coll_name = os.path.basename(os.path.splitext(path)[0])
-        with open(path) as fd:
-            config = yaml.safe_load(fd)
-        arango_client.create_collection(coll_name, config)
+    return do_init_all(["collection"])
 
 
 def do_init_views():
     """Initialize any uninitialized views in the database from a set of schemas."""
-    for path in get_schema_type_paths("view"):
-        view_name = os.path.basename(os.path.splitext(path)[0])
-        with open(path) as fd:
-            config = json.load(fd)
-        arango_client.create_view(view_name, config)
+    return do_init_all(["view"])
 
 
 def do_init_analyzers():
-    for path in get_schema_type_paths("analyzer"):
-        analyzer_name = os.path.basename(os.path.splitext(path)[0])
+    return do_init_all(["analyzer"])
+
+
+def _load_specs(schema_type):
+    """Load the name and config of every spec of a schema type."""
+    specs = []
+    for path in get_schema_type_paths(schema_type):
+        name = os.path.basename(os.path.splitext(path)[0])
         with open(path) as fd:
-            config = json.load(fd)
-        arango_client.create_analyzer(analyzer_name, config)
+            if path.endswith(".yaml"):
+                config = yaml.safe_load(fd)
+            else:
+                config = json.load(fd)
+        specs.append((name, config))
+    return specs
+
+
+def _init_resource(schema_type, name, config):
+    """Create a single resource, returning how long it took."""
+    start = time.time()
+    create = getattr(arango_client, "create_" + schema_type)
+    create(name, config)
+    seconds = time.time() - start
+    print(f"Initialized {schema_type} {name} in {seconds:.3f}s")
+    return {"type": schema_type, "name": name, "seconds": round(seconds, 3)}
+
+
+def _view_dependencies(config) -> Set[tuple]:
+    """Find the collections linked to a view and the analyzers its links use."""
+    deps = set()
+    for coll_name, link in config.get("links", {}).items():
+        deps.add(("collection", coll_name))
+        deps |= {("analyzer", name) for name in _link_analyzers(link)}
+    return deps
+
+
+def _link_analyzers(link):
+    """Find analyzer names anywhere in a view link; names may be prefixed with the db."""
+    if isinstance(link, dict):
+        for key, val in link.items():
+            if key == "analyzers" and isinstance(val, list):
+                for name in val:
+                    yield name.split("::")[-1]
+            else:
+                yield from _link_analyzers(val)
 
 
 def _fetch_github_release_url():
@@ -207,6 +207,65 @@ class TestNcbiTax(unittest.TestCase):
         self.assertEqual(ranks, ["Domain", "Phylum"])
         self.assertEqual(names, ["Bacteria", "Proteobacteria"])
 
+    def test_get_lineage_archived(self):
+        """Versions moved to the archive collections are found for old timestamps."""
+        create_test_docs(
+            "ncbi_taxon_archive",
+            [
+                {
+                    "_key": "9_v1",
+                    "id": "9",
+                    "scientific_name": "Archivibacter",
+                    "rank": "Class",
+                    "strain": False,
+                    "created": 0,
+                    "expired": 10,
+                }
+            ],
+        )
+        create_test_docs(
+            "ncbi_child_of_taxon_archive",
+            [
+                {
+                    "_from": "ncbi_taxon_archive/9_v1",
+                    "_to": "ncbi_taxon/4",
+                    "id": "9",
+                    "from": "9",
+                    "to": "4",
+                    "created": 0,
+                    "expired": 10,
+                }
+            ],
+        )
+        registry = [
+            {"_key": name, "archive_collection": name + "_archive", "cutoff": 20}
+            for name in ["ncbi_taxon", "ncbi_child_of_taxon"]
+        ]
+        create_test_docs("delta_archive_registry", registry)
+        self.addCleanup(
+            requests.delete,
+            _CONF["re_api_url"] + "/api/v1/documents",
+            params={"collection": "delta_archive_registry"},
+            data=json.dumps({"keys": [r["_key"] for r in registry]}),
+            headers={"Authorization": "admin_token"},
+        )
+        for (ts, names) in [(5, ["Bacteria", "Proteobacteria"]), (_NOW, [])]:
+            with self.subTest(ts=ts):
+                resp = requests.post(
+                    _CONF["re_api_url"] + "/api/v1/query_results",
+                    params={"stored_query": "ncbi_taxon_get_lineage"},
+                    data=json.dumps(
+                        {"ts": ts, "id": "9", "select": ["scientific_name"]}
+                    ),
+                ).json()
+                self.assertEqual([r["scientific_name"] for r in resp["results"]], names)
+        resp = requests.post(
+            _CONF["re_api_url"] + "/api/v1/query_results",
+            params={"stored_query": "ncbi_fetch_taxon"},
+            data=json.dumps({"ts": 5, "id": "9"}),
+        ).json()
+        self.assertEqual(resp["results"][0]["scientific_name"], "Archivibacter")
+
     def test_get_children(self):
         """Test a valid query of taxon descendants."""
         resp = requests.post(
@@ -248,6 +248,39 @@ class TestOntology(unittest.TestCase):
         ids = [r["term"]["id"] for r in resp["results"]]
         self.assertCountEqual(ids, ["ENVO:00000446", "ENVO:00000428", "ENVO:00002030"])
 
+    def test_get_descendants_keyset(self):
+        """Test paging through ontology descendants with keyset pagination."""
+        query_data = {
+            "id": "ENVO:01001110",
+            "ts": _NOW,
+            "limit": 2,
+            "@onto_terms": "ENVO_terms",
+            "@onto_edges": "ENVO_edges",
+        }
+        params = {"stored_query": "ontology_get_descendants", "keyset": "1"}
+        keys = []
+        for expected_keys in [["1", "2"], ["5"]]:
+            resp = requests.post(
+                _CONF["re_api_url"] + "/api/v1/query_results",
+                params=params,
+                data=json.dumps(query_data),
+            ).json()
+            page_keys = [r["term"]["_key"] for r in resp["results"]]
+            self.assertEqual(page_keys, expected_keys)
+            keys += page_keys
+            params["page_token"] = resp["next"]
+        # the last page was not full, so there is no next page
+        self.assertIsNone(resp["next"])
+        self.assertEqual(keys, ["1", "2", "5"])
+
+        # offsets cannot be combined with page tokens
+        resp = requests.post(
+            _CONF["re_api_url"] + "/api/v1/query_results",
+            params={"stored_query": "ontology_get_descendants", "page_token": "x"},
+            data=json.dumps({**query_data, "offset": 2}),
+        )
+        self.assertEqual(resp.status_code, 400)
+
     def test_get_ancestors(self):
         """Test query of ontology ancestors."""
         resp = requests.post(
@@ -130,3 +130,72 @@ class TestWs(unittest.TestCase):
         self.assertEqual(
             res["refs"]["data"][0]["type"]["_id"], "ws_type_version/Module.Type1-1.0"
         )
+
+    def test_fetch_shortest_paths_between_objects(self):
+        """
+        Test the bounded shortest path query, which skips paths through objects the
+        user cannot see.
+        """
+        create_test_docs(
+            "wsprov_object",
+            [
+                {"_key": "1:1:1", "workspace_id": 1, "owner": "x", "is_public": True},
+                {"_key": "2:1:1", "workspace_id": 2, "owner": "x", "is_public": False},
+                {"_key": "1:2:1", "workspace_id": 1, "owner": "x", "is_public": True},
+                {"_key": "1:3:1", "workspace_id": 1, "owner": "x", "is_public": True},
+                {"_key": "1:4:1", "workspace_id": 1, "owner": "x", "is_public": True},
+                {"_key": "1:5:1", "workspace_id": 1, "owner": "x", "is_public": True},
+            ],
+        )
+        # 1:1:1 -> 2:1:1 (private) -> 1:4:1 is shorter than 1:1:1 -> 1:2:1 -> 1:3:1 -> 1:4:1
+        create_test_docs(
+            "wsprov_links",
+            [
+                {"_from": "wsprov_object/1:1:1", "_to": "wsprov_object/2:1:1"},
+                {"_from": "wsprov_object/2:1:1", "_to": "wsprov_object/1:4:1"},
+                {"_from": "wsprov_object/1:1:1", "_to": "wsprov_object/1:2:1"},
+                {"_from": "wsprov_object/1:2:1", "_to": "wsprov_object/1:3:1"},
+                {"_from": "wsprov_object/1:3:1", "_to": "wsprov_object/1:4:1"},
+            ],
+        )
+        query = {"start_key": "1:1:1", "end_key": "1:4:1", "max_paths": 10}
+        resp = requests.post(
+            _CONF["re_api_url"] + "/api/v1/query_results",
+            params={"stored_query": "wsprov_fetch_shortest_paths_between_objects"},
+            data=json.dumps(query),
+        ).json()
+        self.assertEqual(resp["count"], 1)
+        path_keys = [v["_key"] for v in resp["results"][0]["vertices"]]
+        self.assertEqual(path_keys, ["1:1:1", "1:2:1", "1:3:1", "1:4:1"])
+
+        # the only visible path is too long
+        resp = requests.post(
+            _CONF["re_api_url"] + "/api/v1/query_results",
+            params={"stored_query": "wsprov_fetch_shortest_paths_between_objects"},
+            data=json.dumps({**query, "max_depth": 2}),
+        ).json()
+        self.assertEqual(resp["count"], 0)
+
+        # the shortest path is private, and only one candidate path is checked
+        resp = requests.post(
+            _CONF["re_api_url"] + "/api/v1/query_results",
+            params={"stored_query": "wsprov_fetch_shortest_paths_between_objects"},
+            data=json.dumps({**query, "max_candidates": 1}),
+        ).json()
+        self.assertEqual(resp["count"], 0)
+
+        # 1:5:1 is not linked to anything, so no path exists within max_depth
+        resp = requests.post(
+            _CONF["re_api_url"] + "/api/v1/query_results",
+            params={"stored_query": "wsprov_fetch_shortest_paths_between_objects"},
+            data=json.dumps({**query, "end_key": "1:5:1", "max_depth": 3}),
+        ).json()
+        self.assertEqual(resp["count"], 0)
+
+        # the number of paths is capped
+        resp = requests.post(
+            _CONF["re_api_url"] + "/api/v1/query_results",
+            params={"stored_query": "wsprov_fetch_shortest_paths_between_objects"},
+            data=json.dumps({**query, "max_paths": 1000}),
+        )
+        self.assertEqual(resp.status_code, 400)
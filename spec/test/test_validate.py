@@ -154,6 +154,32 @@ class TestValidate(unittest.TestCase):
         with self.assertRaisesRegex(ValueError, err_str):
             validate_stored_query(os_path.join(base_dir, "invalid_bind_params.yaml"))
 
+        # keyset pages must fit in one batch
+        err_str = "must have a maximum of at most 5000"
+        with self.assertRaisesRegex(ValueError, err_str):
+            validate_stored_query(
+                os_path.join(base_dir, "keyset_limit_no_maximum.yaml")
+            )
+
+        # keyset pages of archived timestamps need an archive keyset query
+        err_str = "must have an archive 'keyset_query'"
+        with self.assertRaisesRegex(ValueError, err_str):
+            validate_stored_query(
+                os_path.join(base_dir, "keyset_query_without_archive_keyset_query.yaml")
+            )
+
+        # parallelism is only for traversals
+        err_str = "must set `parallelism: @parallelism` in the OPTIONS of a traversal"
+        with self.assertRaisesRegex(ValueError, err_str):
+            validate_stored_query(
+                os_path.join(base_dir, "parallelism_without_traversal.yaml")
+            )
+        err_str = "@parallelism may only be used as `parallelism: @parallelism`"
+        with self.assertRaisesRegex(ValueError, err_str):
+            validate_stored_query(
+                os_path.join(base_dir, "parallelism_outside_traversal.yaml")
+            )
+
     def test_validate_view(self):
 
         base_dir = os_path.join(_TEST_DIR, "views")
@@ -0,0 +1,199 @@
+"""
+Tests for validating specs in parallel, and checking stored query AQL concurrently
+
+These use the ArangoDB stand-in to parse queries, so don't need an ArangoDB server.
+"""
+import os
+import os.path as os_path
+import tempfile
+import unittest
+from unittest import mock
+
+from jsonschema.exceptions import ValidationError
+
+from spec import validate
+from spec.test.helpers import capture_stdout
+from relation_engine_server.test.mock_arango import MockArango
+
+_SPEC_DIR = os_path.dirname(os_path.dirname(os_path.abspath(__file__)))
+_TEST_DIR = os_path.join(_SPEC_DIR, "test", "sample_schemas")
+
+
+class TestValidateParallel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.arango = MockArango().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.arango.stop()
+
+    def setUp(self):
+        # Use the meta-schemas from this checkout
+        schema_types = {
+            schema_type: dict(
+                info,
+                file=os_path.join(_SPEC_DIR, os_path.basename(info["file"])),
+            )
+            for (schema_type, info) in validate._VALID_SCHEMA_TYPES.items()
+        }
+        for patcher in (
+            mock.patch.dict(validate._VALID_SCHEMA_TYPES, schema_types),
+            mock.patch.dict(validate._CONF, {"db_url": self.arango.url}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        validate.get_meta_validator.cache_clear()
+        self.addCleanup(validate.get_meta_validator.cache_clear)
+
+    def test_meta_validator_compiled_once(self):
+        path = os_path.join(_TEST_DIR, "collections", "test_vertex.yaml")
+        with mock.patch.object(
+            validate, "get_schema_validator", wraps=validate.get_schema_validator
+        ) as get_schema_validator:
+            for _ in range(3):
+                validate.validate_collection(path)
+        self.assertEqual(get_schema_validator.call_count, 1)
+
+    def test_validate_all_parallel(self):
+        """the same errors are reported with one worker or many"""
+        directory = os_path.join(_TEST_DIR, "collections")
+        outputs = []
+        for workers in (1, 4):
+
+            def validate_all():
+                with self.assertRaisesRegex(ValidationError, "failed validation"):
+                    validate.validate_all("collection", directory, workers=workers)
+
+            stdout = capture_stdout(validate_all)
+            outputs.append(
+                sorted(line for line in stdout.split("\n") if line.startswith("✕"))
+            )
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertIn(
+            f"✕ {directory}/vertex_missing_key.yaml failed validation", outputs[0]
+        )
+
+    def test_stored_queries_aql(self):
+        """all the AQL errors are collected"""
+        queries = []
+        for name in ("invalid_bind_params", "invalid_bind_params"):
+            path = os_path.join(_TEST_DIR, "stored_queries", name + ".yaml")
+            queries.append((path, validate.load_and_validate(path, "stored_query")))
+        errors = validate.validate_stored_queries_aql(queries, workers=2)
+        self.assertEqual([path for (path, err) in errors], [q[0] for q in queries])
+        self.assertIn("Bind vars are invalid", errors[0][1])
+        # queries are parsed concurrently, on the query-parse endpoint
+        self.assertEqual(self.arango.requests["POST query"], 2)
+
+    def test_validate_all_by_type_without_aql(self):
+        with mock.patch.object(validate, "validate_aql_on_arango") as validate_aql:
+            stdout = capture_stdout(validate.validate_all_by_type, _SPEC_DIR, 2, False)
+        validate_aql.assert_not_called()
+        self.assertIn("Validation succeeded!", stdout)
+
+    def test_keyset_query(self):
+        """the main query of a stored query with a keyset query doesn't take `after`"""
+        path = os_path.join(
+            _SPEC_DIR, "stored_queries", "GO", "GO_get_descendants.yaml"
+        )
+        # a separate ArangoDB stand-in, to count this query's parse requests
+        with MockArango() as arango:
+            with mock.patch.dict(validate._CONF, {"db_url": arango.url}):
+                data = validate.validate_stored_query(path)
+        (main, keyset_query, archive_main, archive_keyset) = validate._aql_queries(data)
+        self.assertNotIn("after", main["params"]["properties"])
+        self.assertNotIn("@after", main["query"])
+        self.assertIn("after", keyset_query["params"]["properties"])
+        self.assertEqual(keyset_query["query"], data["keyset"]["query"])
+        self.assertNotIn("after", archive_main["params"]["properties"])
+        self.assertIn("after", archive_keyset["params"]["properties"])
+        # all the queries were checked, with their own params
+        self.assertEqual(arango.requests["POST query"], 4)
+
+    def test_archive_coverage(self):
+        """every time-travel query over an archivable collection has an archive block"""
+        self.assertEqual(validate.get_archive_coverage(spec_dir=_SPEC_DIR), {})
+        validate.validate_archivable(["ncbi_taxon", "ncbi_child_of_taxon"], _SPEC_DIR)
+
+    def test_archive_coverage_uncovered(self):
+        """time-travel queries without an archive block keep collections from being archived"""
+        with tempfile.TemporaryDirectory() as spec_dir:
+            os.mkdir(os_path.join(spec_dir, "stored_queries"))
+            for (name, query) in [
+                ("get_taxa", "FOR t IN taxa FILTER t.expired >= @ts RETURN t"),
+                ("get_any", "FOR t IN @@coll FILTER t.expired >= @ts RETURN t"),
+                ("get_all_taxa", "FOR t IN taxa RETURN t"),
+            ]:
+                path = os_path.join(spec_dir, "stored_queries", name + ".yaml")
+                with open(path, "w") as fd:
+                    fd.write(f"name: {name}\nquery: {query}\n")
+            self.assertEqual(
+                validate.get_archive_coverage(["taxa", "edges"], spec_dir),
+                {"taxa": ["get_any", "get_taxa"], "edges": ["get_any"]},
+            )
+            with self.assertRaisesRegex(ValueError, "taxa: get_any, get_taxa"):
+                validate.validate_archivable(["taxa"], spec_dir)
+
+    def test_archive_collection_params(self):
+        """archive queries are checked with the archive collections of collection params"""
+        path = os_path.join(
+            _SPEC_DIR, "stored_queries", "ontology", "ontology_get_descendants.yaml"
+        )
+        data = validate.load_json_yaml(path)
+        queries = validate._aql_queries(data)
+        self.assertEqual(len(queries), 4)
+        for query_data in queries[2:]:
+            props = query_data["params"]["properties"]
+            self.assertIn("@onto_terms_archive", props)
+            self.assertIn("@onto_edges_archive", props)
+        self.assertNotIn("@onto_terms_archive", queries[0]["params"]["properties"])
+        self.assertEqual(queries[3]["query"], data["archive"]["keyset_query"])
+
+    def test_parallelism(self):
+        """the parallelism option is bound in traversal OPTIONS, and nowhere else"""
+        traversal = "FOR v IN 1..3 INBOUND @id edges OPTIONS {%s} RETURN v"
+        data = {
+            "query": traversal % "bfs: true, parallelism: @parallelism",
+            "params": {"properties": {"id": {"type": "string"}}},
+            "options": {"parallelism": 4},
+        }
+        validate._validate_parallelism(data)
+        [query_data] = validate._aql_queries(data)
+        self.assertIn("parallelism", query_data["params"]["properties"])
+        for (query, err_str) in [
+            (traversal % "bfs: true", "must set `parallelism: @parallelism`"),
+            (
+                "FOR d IN c SEARCH d.x OPTIONS {parallelism: @parallelism} RETURN d",
+                "may only be used",
+            ),
+            (
+                traversal % "parallelism: @parallelism" + " LIMIT @parallelism",
+                "may only be used",
+            ),
+        ]:
+            with self.subTest(query=query):
+                with self.assertRaisesRegex(ValueError, err_str):
+                    validate._validate_parallelism(dict(data, query=query))
+        # comments don't count
+        query = data["query"] + " // LIMIT @parallelism"
+        validate._validate_parallelism(dict(data, query=query))
+        with self.assertRaisesRegex(ValueError, "must set the 'parallelism' option"):
+            validate._validate_parallelism(dict(data, options={}))
+
+    def test_time_travel_reads(self):
+        query = {
+            "query": "FOR t IN @@coll FILTER t.expired >= @ts FOR d IN docs RETURN t",
+            "params": {"properties": {"@coll": {"enum": ["a", "c"]}}},
+        }
+        self.assertEqual(
+            validate._time_travel_reads(query, ["a", "b", "docs"]), {"a", "docs"}
+        )
+        del query["params"]
+        self.assertEqual(validate._time_travel_reads(query, ["a", "b"]), {"a", "b"})
+        query["query"] = "FOR t IN @@coll RETURN t"
+        self.assertEqual(validate._time_travel_reads(query, ["a"]), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
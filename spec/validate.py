@@ -1,16 +1,44 @@
 """
 Validate everything in this repo, such as syntax, structure, etc.
+
+Files are validated in parallel across processes, and the AQL of the stored queries is
+then checked on ArangoDB concurrently; all the errors are collected into one report.
+
+Usage:
+
+    python -m spec.validate [validation_base_dir] [--workers N] [--no-aql]
+        [--archivable COLLECTION ...]
+
+`--archivable` also checks that every time-travel stored query that reads the given
+collections has an `archive` block covering them, so they can be archived by
+importers/utils/delta_archive.py.
 """
+import argparse
+import functools
 import sys
 import os
 import glob
 import requests
 import json
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from jsonschema.exceptions import ValidationError
 
+from relation_engine_server.utils.arango_client import (
+    MAX_BATCH_SIZE,
+    PARALLELISM_PARAM,
+    find_traversal_options,
+    mask_comments_and_strings,
+)
 from relation_engine_server.utils.config import get_config
+from relation_engine_server.utils.archive import archive_collection_params
+from relation_engine_server.utils.keyset import AFTER_PARAM
 from relation_engine_server.utils.wait_for import wait_for_arangodb
-from relation_engine_server.utils.json_validation import run_validator
+from relation_engine_server.utils.json_validation import (
+    get_schema_validator,
+    load_json_yaml,
+    run_validator,
+)
 
 _CONF = get_config()
 _BASE_DIR = "/app/spec"
@@ -38,6 +66,13 @@ _VALID_SCHEMA_TYPES = {
     },
 }
 
+# Stored queries that filter on the `expired` field of delta collections travel in time
+_TIME_TRAVEL = re.compile(r"\.expired\b")
+_COLL_PARAM = re.compile(r"@@(\w+)")
+_PARALLELISM_VAR = re.compile(r"(?<!@)@parallelism\b")
+# The position of the bind var is group 1
+_PARALLELISM_SETTING = re.compile(r"\bparallelism\s*:\s*(@parallelism)\b")
+
 
 def get_schema_type_paths(schema_type, directory=None):
     if schema_type not in _VALID_SCHEMA_TYPES.keys():
@@ -54,7 +89,7 @@ def get_schema_type_paths(schema_type, directory=None):
     return sorted(paths)
 
 
-def validate_all(schema_type, directory=None):
+def validate_all(schema_type, directory=None, workers=None, check_aql=True):
     """
     Validate the syntax of all schemas of type schema_type in a specified directory
 
@@ -62,32 +97,48 @@ def validate_all(schema_type, directory=None):
     :param directory:   (string)  the directory to look in.
                                   If not specified, the default directory for the schema_type
                                   will be used.
+    :param workers:     (int)     the number of processes to validate files in; defaults to
+                                  the number of cores. 1 validates in this process.
+    :param check_aql:   (bool)    whether to check the AQL of stored queries on ArangoDB
     """
     err_files = []
-    n_files = 0
     names = set()  # type: set
 
     print(f"Validating {schema_type} schemas in {directory}...")
 
-    for path in get_schema_type_paths(schema_type, directory):
-        n_files += 1
-        try:
-            data = validate_schema(path, schema_type)
+    paths = get_schema_type_paths(schema_type, directory)
+    if not paths:
+        print("No schema files found")
+        return
+
+    # The AQL is checked for all the stored queries at once, below
+    results = _map_files(
+        _validate_file,
+        paths,
+        [schema_type] * len(paths),
+        [False] * len(paths),
+        workers=workers,
+    )
+    valid = []
+    for (path, (data, err)) in zip(paths, results):
+        if err is None:
             # Check for any duplicate schema names
             name = data["name"]
             if name in names:
-                raise ValueError(f"Duplicate queries named '{name}'")
+                err = f"Duplicate queries named '{name}'"
             else:
                 names.add(name)
-
-        except Exception as err:
+                valid.append((path, data))
+        if err is not None:
             print(f"✕ {path} failed validation")
             print(err)
             err_files.append([path, err])
 
-    if not n_files:
-        print("No schema files found")
-        return
+    if schema_type == "stored_query" and check_aql:
+        for (path, err) in validate_stored_queries_aql(valid):
+            print(f"✕ {path} failed validation")
+            print(err)
+            err_files.append([path, err])
 
     if err_files:
         err_file_str = "\n".join([i[0] for i in err_files])
@@ -100,7 +151,7 @@ def validate_all(schema_type, directory=None):
     return
 
 
-def validate_all_by_type(validation_base_dir=None):
+def validate_all_by_type(validation_base_dir=None, workers=None, check_aql=True):
     """
     Validate the syntax of all schemas of all types in validation_base_dir
 
@@ -111,6 +162,8 @@ def validate_all_by_type(validation_base_dir=None):
     :param validation_base_dir:   (string) the directory to look in.
                                   If not specified, the default directory from the config
                                   will be used
+    :param workers:               (int) the number of processes to validate files in
+    :param check_aql:             (bool) whether to check stored query AQL on ArangoDB
 
     :return n_errors:             (int) the number of errors encountered
 
@@ -119,13 +172,12 @@ def validate_all_by_type(validation_base_dir=None):
     n_errors = []
     for schema_type in sorted(_VALID_SCHEMA_TYPES.keys()):
         try:
-            if validation_base_dir is None:
-                validate_all(schema_type)
-            else:
+            directory = None
+            if validation_base_dir is not None:
                 directory = os.path.join(
                     validation_base_dir, _VALID_SCHEMA_TYPES[schema_type]["plural"]
                 )
-                validate_all(schema_type, directory)
+            validate_all(schema_type, directory, workers=workers, check_aql=check_aql)
         except Exception as err:
             n_errors.append(err)
         print("\n")
@@ -139,21 +191,57 @@ def validate_all_by_type(validation_base_dir=None):
     return len(n_errors)
 
 
-def validate_schema(path, schema_type):
+def validate_schema(path, schema_type, check_aql=True):
     """Validate a single file against its schema"""
 
     if schema_type not in _VALID_SCHEMA_TYPES.keys():
         raise ValueError(f"No validation schema found for '{schema_type}'")
 
+    if schema_type == "stored_query":
+        return validate_stored_query(path, check_aql=check_aql)
     return globals()["validate_" + schema_type](path)
 
 
+@functools.lru_cache(maxsize=None)
+def get_meta_validator(schema_type):
+    """Get the validator for the schema of a schema type, compiled once per process"""
+    return get_schema_validator(schema_file=_VALID_SCHEMA_TYPES[schema_type]["file"])
+
+
+def load_and_validate(path, schema_type):
+    """Load a file and validate it against the schema of its type, filling in defaults"""
+    data = load_json_yaml(path)
+    # this will throw a ValidationError
+    get_meta_validator(schema_type).validate(data)
+    return data
+
+
+def _validate_file(path, schema_type, check_aql):
+    """
+    Validate a single file, in a worker process.
+    Returns (data, None), or (None, error message) as errors may not be picklable.
+    """
+    try:
+        return (validate_schema(path, schema_type, check_aql=check_aql), None)
+    except Exception as err:
+        return (None, str(err))
+
+
+def _map_files(func, *iterables, workers=None):
+    """Map func over the files across worker processes, or in this one with 1 worker"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return list(map(func, *iterables))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, *iterables, chunksize=8))
+
+
 def validate_collection(path):
     print(f"  validating {path}...")
 
     # JSON schema for vertex and edge collection schemas found in /schema
-    collection_schema_file = _VALID_SCHEMA_TYPES["collection"]["file"]
-    data = run_validator(schema_file=collection_schema_file, data_file=path)
+    data = load_and_validate(path, "collection")
     namecheck_schema(path, data)
 
     # Make sure it can be used as a JSON schema
@@ -200,19 +288,17 @@ def validate_data_source(path):
     print(f"  validating {path}...")
 
     # JSON schema for data source files in /data_sources
-    data_source_schema_file = _VALID_SCHEMA_TYPES["data_source"]["file"]
-    data = run_validator(schema_file=data_source_schema_file, data_file=path)
+    data = load_and_validate(path, "data_source")
     namecheck_schema(path, data)
 
     print(f"✓ {path} is valid.")
     return data
 
 
-def validate_stored_query(path):
+def validate_stored_query(path, check_aql=True):
     print(f"  validating {path}...")
 
-    stored_queries_schema_file = _VALID_SCHEMA_TYPES["stored_query"]["file"]
-    data = run_validator(schema_file=stored_queries_schema_file, data_file=path)
+    data = load_and_validate(path, "stored_query")
     namecheck_schema(path, data)
 
     # Make sure `params` can be used as a JSON schema
@@ -224,20 +310,255 @@ def validate_stored_query(path):
         except ValidationError:
             pass
 
+    # Keyset-paginated queries get the previous page's sort key in the `after` param
+    if data.get("keyset") and "after" not in data.get("params", {}).get(
+        "properties", {}
+    ):
+        raise ValueError(
+            "Stored queries using keyset pagination must have an 'after' param"
+        )
+
+    # The whole page must fit in the first batch, to find the sort key of its last row
+    if data.get("keyset"):
+        limit_param = data["keyset"].get("limit_param", "limit")
+        limit_schema = data.get("params", {}).get("properties", {}).get(limit_param, {})
+        if limit_schema.get("maximum", MAX_BATCH_SIZE + 1) > MAX_BATCH_SIZE:
+            raise ValueError(
+                f"The '{limit_param}' param of stored queries using keyset pagination "
+                f"must have a maximum of at most {MAX_BATCH_SIZE}"
+            )
+
+    # parallelism is passed as a bind var to the traversal OPTIONS that use it
+    _validate_parallelism(data)
+
+    # Keyset pages of queries with both a keyset and an archive query need both
+    archive = data.get("archive")
+    if archive and (
+        bool(data.get("keyset", {}).get("query")) != bool(archive.get("keyset_query"))
+    ):
+        raise ValueError(
+            "Stored queries with an archive query must have an archive 'keyset_query' "
+            "if and only if they have a keyset 'query'"
+        )
+
+    # Archive queries are selected by their timestamp param
+    if archive and archive.get("ts_param", "ts") not in data.get("params", {}).get(
+        "properties", {}
+    ):
+        raise ValueError(
+            "Stored queries with an archive query must have its 'ts_param' param"
+        )
+
     # check that the query is valid AQL
-    validate_aql_on_arango(data)
+    if check_aql:
+        for query_data in _aql_queries(data):
+            validate_aql_on_arango(query_data)
 
     print(f"✓ {path} is valid.")
     return data
 
 
+def _aql_queries(data):
+    """
+    The stored query, and its keyset and archive queries if it has them, as
+    validate_aql_on_arango data
+    """
+    main = data
+    keyset_query = data.get("keyset", {}).get("query")
+    if keyset_query:
+        # offset pages run the main query without the `after` param
+        params = dict(data.get("params", {}))
+        params["properties"] = {
+            name: schema
+            for (name, schema) in params.get("properties", {}).items()
+            if name != AFTER_PARAM
+        }
+        main = dict(data, params=params)
+    prefix = data.get("query_prefix", "")
+    queries = [(main, data["query"], prefix)]
+    if keyset_query:
+        queries.append((data, keyset_query, prefix))
+    archive = data.get("archive")
+    if archive:
+        archive_prefix = archive.get("query_prefix", prefix)
+        queries.append((_with_archive_params(main), archive["query"], archive_prefix))
+        if keyset_query:
+            queries.append(
+                (_with_archive_params(data), archive["keyset_query"], archive_prefix)
+            )
+    if PARALLELISM_PARAM in data.get("options", {}):
+        # the server binds the option's value
+        queries = [
+            (_with_param(query_data, PARALLELISM_PARAM, {"type": "integer"}), q, p)
+            for (query_data, q, p) in queries
+        ]
+    return [
+        dict(query_data, query=query, query_prefix=query_prefix)
+        for (query_data, query, query_prefix) in queries
+    ]
+
+
+def _with_param(data, name, schema):
+    """Add a param that the server sets, rather than the request, to a stored query"""
+    params = dict(data.get("params", {}))
+    params["properties"] = dict(params.get("properties", {}), **{name: schema})
+    return dict(data, params=params)
+
+
+def _validate_parallelism(data):
+    """
+    Check that each query of a stored query with the `parallelism` option sets it in
+    traversal OPTIONS with `parallelism: @parallelism`, and that `@parallelism` is used
+    nowhere else.
+    """
+    has_option = PARALLELISM_PARAM in data.get("options", {})
+    if has_option and PARALLELISM_PARAM in data.get("params", {}).get("properties", {}):
+        raise ValueError(
+            "The 'parallelism' param of stored queries is set from the 'parallelism' "
+            "option"
+        )
+    for query_data in _aql_queries(data):
+        query = query_data["query"]
+        masked = mask_comments_and_strings(query)
+        uses = [m.start() for m in _PARALLELISM_VAR.finditer(masked)]
+        if not has_option:
+            if uses:
+                raise ValueError(
+                    "Stored queries using @parallelism must set the 'parallelism' option"
+                )
+            continue
+        blocks = find_traversal_options(query)
+        settings = [
+            m.start(1)
+            for m in _PARALLELISM_SETTING.finditer(masked)
+            if any(start < m.start() and m.end() < end for (start, end) in blocks)
+        ]
+        if not uses:
+            raise ValueError(
+                "Stored queries with the 'parallelism' option must set "
+                "`parallelism: @parallelism` in the OPTIONS of a traversal"
+            )
+        if settings != uses:
+            raise ValueError(
+                "@parallelism may only be used as `parallelism: @parallelism` in the "
+                "OPTIONS of a traversal"
+            )
+
+
+def _with_archive_params(data):
+    """
+    Add the `@@{param}_archive` params that the server sets for the archive query of a
+    stored query with collection params
+    """
+    archive = data["archive"]
+    text = archive.get("query_prefix", data.get("query_prefix", "")) + "\n"
+    text += archive["query"] + "\n" + archive.get("keyset_query", "")
+    params = dict(data.get("params", {}))
+    props = dict(params.get("properties", {}))
+    for name in archive_collection_params(text):
+        if name in props:
+            props[name + "_archive"] = {"type": "string"}
+    params["properties"] = props
+    return dict(data, params=params)
+
+
+def validate_stored_queries_aql(stored_queries, workers=8):
+    """
+    Check the AQL of many stored queries on ArangoDB concurrently
+
+    :param stored_queries:  (list)  (path, data) for each stored query
+    :param workers:         (int)   the number of requests to make at once
+
+    :return errors:         (list)  (path, error message) for each query with invalid AQL
+    """
+    checks = [
+        (path, query_data)
+        for (path, data) in stored_queries
+        for query_data in _aql_queries(data)
+    ]
+
+    def check(path_and_data):
+        try:
+            validate_aql_on_arango(path_and_data[1])
+        except Exception as err:
+            return (path_and_data[0], str(err))
+        return None
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        return [err for err in pool.map(check, checks) if err is not None]
+
+
+def _time_travel_reads(data, coll_names):
+    """The collections in coll_names that a time-travel stored query may read"""
+    text = data.get("query_prefix", "") + "\n" + data["query"]
+    if not _TIME_TRAVEL.search(text):
+        return set()
+    reads = {name for name in coll_names if re.search(rf"\b{name}\b", text)}
+    # a collection bind param may be any collection, unless its schema lists them
+    props = data.get("params", {}).get("properties", {})
+    for param in _COLL_PARAM.findall(text):
+        enum = props.get("@" + param, {}).get("enum")
+        reads.update(coll_names if enum is None else set(enum) & set(coll_names))
+    return reads
+
+
+def get_archive_coverage(coll_names=None, spec_dir=None):
+    """
+    Find the time-travel stored queries that would miss the versions moved to archive
+    collections, as they read a collection without an `archive` block that covers it.
+
+    :param coll_names:  (list)    the collections to check; defaults to every collection
+                                  with a `{name}_archive` collection in the spec
+    :param spec_dir:    (string)  the spec directory; defaults to the spec path from the
+                                  config
+
+    :return uncovered:  (dict)    collection name -> sorted names of the stored queries
+                                  that read it without covering it
+    """
+
+    def paths(schema_type):
+        directory = None
+        if spec_dir is not None:
+            directory = os.path.join(
+                spec_dir, _VALID_SCHEMA_TYPES[schema_type]["plural"]
+            )
+        return get_schema_type_paths(schema_type, directory)
+
+    if coll_names is None:
+        names = {load_json_yaml(path)["name"] for path in paths("collection")}
+        coll_names = sorted(name for name in names if name + "_archive" in names)
+    uncovered = {name: [] for name in coll_names}  # type: dict
+    for path in paths("stored_query"):
+        data = load_json_yaml(path)
+        covered = set(data.get("archive", {}).get("collections", []))
+        for name in _time_travel_reads(data, coll_names) - covered:
+            uncovered[name].append(data["name"])
+    return {name: sorted(queries) for (name, queries) in uncovered.items() if queries}
+
+
+def validate_archivable(coll_names, spec_dir=None):
+    """
+    Raise a ValueError unless every time-travel stored query that reads one of coll_names
+    has an `archive` block covering it; archiving the collection would otherwise make those
+    queries silently miss old versions.
+    """
+    uncovered = get_archive_coverage(coll_names, spec_dir)
+    if uncovered:
+        raise ValueError(
+            "These stored queries need an archive block before the collections can be "
+            "archived:\n"
+            + "\n".join(
+                f"  {name}: {', '.join(qs)}" for (name, qs) in uncovered.items()
+            )
+        )
+
+
 def validate_view(path):
     """Validate the structure and syntax of an arangodb view"""
     print(f"  validating {path}...")
 
     # JSON schema for /views
-    view_schema_file = _VALID_SCHEMA_TYPES["view"]["file"]
-    data = run_validator(data_file=path, schema_file=view_schema_file)
+    data = load_and_validate(path, "view")
     namecheck_schema(path, data)
 
     print(f"✓ {path} is valid.")
@@ -249,8 +570,7 @@ def validate_analyzer(path):
     print(f"  validating {path}...")
 
     # JSON schema for /analyzers
-    analyzer_schema_file = _VALID_SCHEMA_TYPES["analyzer"]["file"]
-    data = run_validator(data_file=path, schema_file=analyzer_schema_file)
+    data = load_and_validate(path, "analyzer")
     namecheck_schema(path, data)
 
     print(f"✓ {path} is valid.")
@@ -287,11 +607,44 @@ def validate_aql_on_arango(data):
 
 if __name__ == "__main__":
 
-    validation_base_dir = None
-    if len(sys.argv) > 1:
-        validation_base_dir = sys.argv[1]
-
-    wait_for_arangodb()
-    n_errors = validate_all_by_type(validation_base_dir)
+    argparser = argparse.ArgumentParser(description="Validate the specs")
+    argparser.add_argument(
+        "validation_base_dir",
+        nargs="?",
+        default=None,
+        help="the directory to look in; defaults to the spec path from the config",
+    )
+    argparser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of processes to validate files in (default: number of cores)",
+    )
+    argparser.add_argument(
+        "--no-aql",
+        dest="check_aql",
+        action="store_false",
+        help="don't check the AQL of stored queries on ArangoDB",
+    )
+    argparser.add_argument(
+        "--archivable",
+        nargs="+",
+        default=[],
+        metavar="COLLECTION",
+        help="also check that these collections can be archived",
+    )
+    args = argparser.parse_args()
+
+    if args.check_aql:
+        wait_for_arangodb()
+    n_errors = validate_all_by_type(
+        args.validation_base_dir, workers=args.workers, check_aql=args.check_aql
+    )
+    if args.archivable:
+        try:
+            validate_archivable(args.archivable, args.validation_base_dir)
+        except ValueError as err:
+            print(err)
+            n_errors += 1
     exit_code = 0 if not n_errors else 1
     sys.exit(exit_code)